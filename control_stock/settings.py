@@ -78,11 +78,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'inventario.middleware.CorrelacionMiddleware',  # X-Request-ID en la respuesta y en los logs
+    'inventario.middleware.RendimientoMiddleware',  # Latencia y consultas por vista
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # Para multi-idioma
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventario.middleware.RolesMiddleware',  # request.roles memorizado por request
+    'inventario.middleware.PerfiladoMiddleware',  # Perfilado opt-in de requests lentas
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -109,6 +113,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.i18n',  # Para LANGUAGE_CODE en templates
                 'inventario.context_processors.translations',  # Para traducciones personalizadas
+                'inventario.context_processors.roles',  # roles.es_admin, roles.es_vendedor...
             ],
         },
     },
@@ -221,6 +226,29 @@ except ImportError:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# PDFs generados que se reutilizan mientras no cambien los datos (fuera de MEDIA_ROOT: no son públicos)
+PDF_CACHE_DIR = Path(os.environ.get('PDF_CACHE_DIR', BASE_DIR / 'cache' / 'pdf'))
+TICKETS_RETENCION_DIAS = int(os.environ.get('TICKETS_RETENCION_DIAS', '30'))  # Días que se conserva un ticket generado
+# Texto OCR de facturas, por hash del archivo (re-subir la misma factura no repite el OCR)
+OCR_CACHE_DIR = Path(os.environ.get('OCR_CACHE_DIR', BASE_DIR / 'cache' / 'ocr'))
+# Métricas de rendimiento por vista (inventario.middleware.RendimientoMiddleware)
+RENDIMIENTO_ACTIVO = os.environ.get('RENDIMIENTO_ACTIVO', 'True') == 'True'
+RENDIMIENTO_MUESTREO = float(os.environ.get('RENDIMIENTO_MUESTREO', '1.0'))  # Fracción de requests medidas
+RENDIMIENTO_INTERVALO = int(os.environ.get('RENDIMIENTO_INTERVALO', '60'))  # Segundos entre volcados a la base
+RENDIMIENTO_BUFFER = 5000  # Muestras en memoria por proceso como máximo
+RENDIMIENTO_RETENCION_DIAS = int(os.environ.get('RENDIMIENTO_RETENCION_DIAS', '14'))  # Días de MetricaVista que se conservan
+# Perfilado de requests (inventario.middleware.PerfiladoMiddleware). Usuarios,
+# muestreo, umbral y modo se pueden cambiar en /logs/perfiles/ sin redeploy
+PERFILADO_DIR = Path(os.environ.get('PERFILADO_DIR', BASE_DIR / 'cache' / 'perfiles'))
+PERFILADO_TOKEN = os.environ.get('PERFILADO_TOKEN', '')  # X-Perfilar: <token> perfila sin sesión de admin
+PERFILADO_MUESTREO = float(os.environ.get('PERFILADO_MUESTREO', '0'))  # Fracción de requests perfiladas
+PERFILADO_UMBRAL_MS = int(os.environ.get('PERFILADO_UMBRAL_MS', '2000'))  # Sólo se guardan las más lentas
+PERFILADO_MODO = os.environ.get('PERFILADO_MODO', 'muestreo')  # 'muestreo' (pilas) o 'cprofile'
+PERFILADO_INTERVALO_MS = 5
+PERFILADO_MAXIMO = 200  # Perfiles guardados como máximo
+# Logo opcional para el encabezado de tickets y cotizaciones (PNG o JPG)
+PDF_LOGO_PATH = os.environ.get('PDF_LOGO_PATH', '')
+
 # CSRF trusted origins para red local
 CSRF_TRUSTED_ORIGINS = [
     'http://192.168.18.13:8000',
@@ -265,40 +293,60 @@ from pathlib import Path
 LOGS_DIR = BASE_DIR / 'logs'
 LOGS_DIR.mkdir(exist_ok=True)
 
+# Los archivos se escriben desde un hilo aparte (utils_logging.ArchivoEnCola)
+# y además de los logs de texto se deja inventario.jsonl: una línea JSON por
+# registro, con los campos de `extra`, el id de correlación de la request y
+# los spans de tiempo ('inventario.spans')
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
+            'format': '{levelname} {asctime} {module} {process:d} {thread:d} [{correlacion}] {message}',
             'style': '{',
         },
         'simple': {
             'format': '{levelname} {asctime} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'inventario.utils_logging.FormatoJSON',
+        },
     },
     'filters': {
         'require_debug_false': {
             '()': 'django.utils.log.RequireDebugFalse',
         },
+        'correlacion': {
+            '()': 'inventario.utils_logging.FiltroCorrelacion',
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
+            '()': 'inventario.utils_logging.ArchivoEnCola',
             'filename': str(LOGS_DIR / 'inventario.log'),
             'maxBytes': 1024 * 1024 * 10,  # 10 MB
             'backupCount': 5,
             'formatter': 'verbose',
+            'filters': ['correlacion'],
         },
         'file_errors': {
             'level': 'ERROR',
-            'class': 'logging.handlers.RotatingFileHandler',
+            '()': 'inventario.utils_logging.ArchivoEnCola',
             'filename': str(LOGS_DIR / 'errors.log'),
             'maxBytes': 1024 * 1024 * 10,  # 10 MB
             'backupCount': 10,
             'formatter': 'verbose',
+            'filters': ['correlacion'],
+        },
+        'json': {
+            'level': 'INFO',
+            '()': 'inventario.utils_logging.ArchivoEnCola',
+            'filename': str(LOGS_DIR / 'inventario.jsonl'),
+            'maxBytes': 1024 * 1024 * 50,  # 50 MB
+            'backupCount': 5,
+            'formatter': 'json',
         },
         'console': {
             'level': 'DEBUG' if DEBUG else 'INFO',
@@ -308,12 +356,18 @@ LOGGING = {
     },
     'loggers': {
         'inventario': {
-            'handlers': ['file', 'file_errors', 'console'],
+            'handlers': ['file', 'file_errors', 'json', 'console'],
             'level': 'INFO',
             'propagate': False,
         },
+        # Spans de tiempo: sólo al JSON (LOG_SPANS=WARNING los apaga)
+        'inventario.spans': {
+            'handlers': ['json'],
+            'level': os.environ.get('LOG_SPANS', 'INFO'),
+            'propagate': False,
+        },
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['file', 'json', 'console'],
             'level': 'INFO',
             'propagate': False,
         },
@@ -328,43 +382,41 @@ LOGGING = {
 # ============================================================================
 
 # En desarrollo local (DEBUG=True), usar siempre LocMemCache (más rápido y sin dependencias)
-# En producción (DEBUG=False), intentar Redis si está explícitamente habilitado
+# En producción con USE_REDIS, caché en dos niveles (inventario/cache_dos_niveles.py):
+# un LRU por proceso delante de Redis, invalidado por pub/sub. Si Redis se cae,
+# el interruptor del backend sirve desde memoria y lo reintenta solo: no se
+# decide al importar settings.
 USE_REDIS = os.environ.get('USE_REDIS', 'False').lower() == 'true'
 
 if USE_REDIS and not DEBUG:
-    # Solo intentar Redis en producción si está explícitamente habilitado
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
-    try:
-        import redis
-        # Intentar conectar a Redis con timeout muy corto
-        r = redis.from_url(REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
-        r.ping()  # Probar conexión
-        CACHES = {
-            'default': {
-                'BACKEND': 'django_redis.cache.RedisCache',
-                'LOCATION': REDIS_URL,
-                'OPTIONS': {
-                    'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-                    'SOCKET_CONNECT_TIMEOUT': 1,  # Timeout de conexión muy corto
-                    'SOCKET_TIMEOUT': 1,  # Timeout de operaciones muy corto
-                    'IGNORE_EXCEPTIONS': True,  # Si Redis falla, no rompe la app
-                },
-                'KEY_PREFIX': 'stockex',
-                'TIMEOUT': 300,  # 5 minutos por defecto
-            }
-        }
-    except (ImportError, redis.ConnectionError, redis.TimeoutError, Exception):
-        # Si Redis falla, usar LocMemCache
-        CACHES = {
-            'default': {
-                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-                'LOCATION': 'unique-snowflake',
-                'OPTIONS': {
-                    'MAX_ENTRIES': 1000,  # Máximo de entradas en cache
-                },
-                'TIMEOUT': 300,  # 5 minutos por defecto
-            }
-        }
+    CACHES = {
+        'default': {
+            'BACKEND': 'inventario.cache_dos_niveles.CacheDosNiveles',
+            'LOCATION': REDIS_URL,  # Canal de invalidación entre procesos
+            'OPTIONS': {
+                'L2': 'redis',
+                'L1_MAX_ENTRIES': 5000,  # Entradas en memoria por proceso
+                'L1_TIMEOUT': 30,  # Segundos máximos en L1 (por si se pierde una invalidación)
+                'UMBRAL_FALLOS': 3,  # Errores seguidos de Redis antes de dejar de consultarlo
+                'ESPERA_REINTENTO': 10,  # Segundos antes de volver a probar Redis
+            },
+            'KEY_PREFIX': 'stockex',
+            'TIMEOUT': 300,  # 5 minutos por defecto
+        },
+        'redis': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'SOCKET_CONNECT_TIMEOUT': 1,  # Timeout de conexión muy corto
+                'SOCKET_TIMEOUT': 1,  # Timeout de operaciones muy corto
+                'IGNORE_EXCEPTIONS': False,  # Los errores los maneja el interruptor de 'default'
+            },
+            'KEY_PREFIX': 'stockex',
+            'TIMEOUT': 300,
+        },
+    }
 else:
     # DESARROLLO LOCAL: Usar siempre LocMemCache (rápido, sin dependencias)
     CACHES = {
@@ -470,6 +522,42 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutos máximo por tarea
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutos soft limit
 
+# Encolar desde un request no puede colgarlo si el broker no responde:
+# conexiones cortas y sin reintentos (ver inventario.tasks.broker_disponible)
+CELERY_BROKER_CONNECTION_TIMEOUT = 2
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'max_retries': 0,
+    'socket_connect_timeout': 2,
+    'socket_timeout': 5,
+}
+CELERY_REDIS_SOCKET_CONNECT_TIMEOUT = 2
+CELERY_REDIS_SOCKET_TIMEOUT = 5
+CELERY_RESULT_BACKEND_TRANSPORT_OPTIONS = {'retry_policy': {'max_retries': 0}}
+
+# Tareas periódicas (requiere `celery -A control_stock beat`)
+try:
+    from celery.schedules import crontab
+    CELERY_BEAT_SCHEDULE = {
+        'marcar-cuentas-vencidas': {
+            'task': 'inventario.tasks.marcar_cuentas_vencidas',
+            'schedule': crontab(hour=2, minute=0),  # Todas las noches a las 02:00
+        },
+        'podar-cambios-catalogo': {
+            'task': 'inventario.tasks.podar_cambios_catalogo',
+            'schedule': crontab(hour=2, minute=30),
+        },
+        'podar-metricas-rendimiento': {
+            'task': 'inventario.tasks.podar_metricas_rendimiento',
+            'schedule': crontab(hour=2, minute=45),
+        },
+        'podar-tickets-venta': {
+            'task': 'inventario.tasks.podar_tickets_venta',
+            'schedule': crontab(hour=3, minute=0),
+        },
+    }
+except ImportError:
+    CELERY_BEAT_SCHEDULE = {}
+
 # Si Redis no está disponible, Celery usará el broker en memoria (solo para desarrollo)
 if CELERY_TASK_ALWAYS_EAGER:
     # En modo eager, las tareas se ejecutan sincrónicamente (útil para desarrollo)
@@ -1,11 +1,13 @@
 from django.contrib import admin
+from django.urls import reverse
 from django.utils.html import format_html
 from .models import (
     Producto, Categoria, HistorialCambio, Factura, ItemFactura, Proveedor, 
     ProductoFavorito, MovimientoStock, Venta, ItemVenta, Cotizacion, 
     ItemCotizacion, NotificacionStock, Cliente, CuentaPorCobrar, PagoCliente,
     Almacen, StockAlmacen, Transferencia, ItemTransferencia, OrdenCompra,
-    ItemOrdenCompra, RecepcionMercancia
+    ItemOrdenCompra, RecepcionMercancia, MetricaVista, PerfilRequest,
+    VentaOfflineRechazada
 )
 
 @admin.register(Categoria)
@@ -88,7 +90,7 @@ class ItemFacturaInline(admin.TabularInline):
     model = ItemFactura
     extra = 0
     readonly_fields = ('subtotal', 'producto_coincidencia', 'stock_actualizado')
-    fields = ('producto', 'nombre_producto', 'cantidad', 'precio_unitario', 'subtotal', 'producto_coincidencia', 'stock_actualizado')
+    fields = ('producto', 'codigo', 'nombre_producto', 'cantidad', 'precio_unitario', 'subtotal', 'producto_coincidencia', 'confianza_coincidencia', 'stock_actualizado')
 
 @admin.register(Factura)
 class FacturaAdmin(admin.ModelAdmin):
@@ -118,7 +120,7 @@ class FacturaAdmin(admin.ModelAdmin):
 class ItemFacturaAdmin(admin.ModelAdmin):
     list_display = ('factura', 'producto', 'nombre_producto', 'cantidad', 'precio_unitario', 'subtotal', 'stock_actualizado')
     list_filter = ('stock_actualizado', 'producto_coincidencia')
-    search_fields = ('nombre_producto', 'factura__numero_factura')
+    search_fields = ('nombre_producto', 'codigo', 'factura__numero_factura')
     readonly_fields = ('subtotal',)
 
 @admin.register(ProductoFavorito)
@@ -273,8 +275,8 @@ class CuentaPorCobrarAdmin(admin.ModelAdmin):
 class PagoClienteAdmin(admin.ModelAdmin):
     list_display = ('cuenta_por_cobrar', 'monto', 'fecha_pago', 'metodo_pago', 'usuario', 'fecha_registro')
     list_filter = ('metodo_pago', 'fecha_pago', 'fecha_registro')
-    search_fields = ('cuenta_por_cobrar__numero_documento', 'cuenta_por_cobrar__cliente__nombre')
-    readonly_fields = ('fecha_registro',)
+    search_fields = ('cuenta_por_cobrar__numero_documento', 'cuenta_por_cobrar__cliente__nombre', 'clave_idempotencia')
+    readonly_fields = ('fecha_registro', 'clave_idempotencia')
     date_hierarchy = 'fecha_pago'
 
 
@@ -340,3 +342,57 @@ class RecepcionMercanciaAdmin(admin.ModelAdmin):
     search_fields = ('orden_compra__numero_orden', 'almacen__nombre')
     readonly_fields = ('fecha_recepcion',)
     date_hierarchy = 'fecha_recepcion'
+
+
+@admin.register(MetricaVista)
+class MetricaVistaAdmin(admin.ModelAdmin):
+    list_display = ('vista', 'periodo', 'peticiones', 'tiempo_promedio', 'tiempo_db_ms', 'consultas', 'duplicadas', 'duplicadas_max')
+    list_filter = ('periodo',)
+    search_fields = ('vista',)
+    date_hierarchy = 'periodo'
+    
+    def tiempo_promedio(self, obj):
+        return f"{obj.tiempo_promedio_ms:.1f} ms"
+    tiempo_promedio.short_description = "Promedio"
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PerfilRequest)
+class PerfilRequestAdmin(admin.ModelAdmin):
+    list_display = ('vista', 'ruta', 'duracion_ms', 'modo', 'motivo', 'usuario', 'fecha', 'descarga')
+    list_filter = ('modo', 'motivo', 'fecha')
+    search_fields = ('vista', 'ruta')
+    date_hierarchy = 'fecha'
+    
+    def descarga(self, obj):
+        return format_html('<a href="{}">Descargar</a>', reverse('descargar_perfil', args=[obj.id]))
+    descarga.short_description = "Archivo"
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VentaOfflineRechazada)
+class VentaOfflineRechazadaAdmin(admin.ModelAdmin):
+    list_display = ('clave', 'usuario', 'error', 'fecha', 'resuelta')
+    list_filter = ('resuelta', 'fecha')
+    search_fields = ('clave', 'error', 'usuario__username')
+    date_hierarchy = 'fecha'
+    readonly_fields = ('clave', 'usuario', 'datos', 'error', 'conflictos', 'fecha')
+    actions = ['marcar_resueltas']
+    
+    def marcar_resueltas(self, request, queryset):
+        actualizadas = queryset.update(resuelta=True)
+        self.message_user(request, f'{actualizadas} venta(s) marcada(s) como resuelta(s).')
+    marcar_resueltas.short_description = "Marcar como resueltas"
+    
+    def has_add_permission(self, request):
+        return False
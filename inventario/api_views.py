@@ -22,9 +22,11 @@ from .serializers import (
 )
 from .utils import es_admin_bossa, normalizar_texto
 from .permissions import IsAdminOrReadOnly, IsOwnerOrAdmin, IsAdminBossa
+from .pagination import PaginacionKeyset
+from .utils_condicional import CondicionalMixin
 
 
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(CondicionalMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestionar productos
     
@@ -40,6 +42,9 @@ class ProductoViewSet(viewsets.ModelViewSet):
     - ?categoria=id - Filtrar por categoría
     - ?stock_bajo=true - Solo productos con stock bajo
     - ?activo=true - Solo productos activos
+    
+    list y retrieve responden 304 si el catálogo no cambió (If-None-Match /
+    If-Modified-Since).
     """
     queryset = Producto.objects.all().select_related('categoria')
     permission_classes = [IsAdminOrReadOnly]  # Usar permiso personalizado
@@ -48,6 +53,7 @@ class ProductoViewSet(viewsets.ModelViewSet):
     search_fields = ['nombre', 'sku', 'descripcion']
     ordering_fields = ['nombre', 'precio', 'stock', 'fecha_creacion']
     ordering = ['nombre']
+    espacios_condicionales = ('catalogo',)
     
     def get_serializer_class(self):
         """Usar serializer simplificado para list, completo para detail"""
@@ -113,8 +119,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
             )
 
 
-class CategoriaViewSet(viewsets.ModelViewSet):
-    """ViewSet para gestionar categorías"""
+class CategoriaViewSet(CondicionalMixin, viewsets.ModelViewSet):
+    """ViewSet para gestionar categorías (GET condicional sobre el catálogo)"""
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     permission_classes = [IsAdminOrReadOnly]  # Usar permiso personalizado
@@ -122,6 +128,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     search_fields = ['nombre', 'descripcion']
     ordering_fields = ['nombre', 'fecha_creacion']
     ordering = ['nombre']
+    espacios_condicionales = ('catalogo',)  # producto_count depende de los productos
 
 
 class VentaViewSet(viewsets.ReadOnlyModelViewSet):
@@ -135,7 +142,8 @@ class VentaViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['metodo_pago', 'cancelada', 'usuario']
     ordering_fields = ['fecha', 'total']
-    ordering = ['-fecha']
+    ordering = ['-fecha', '-id']
+    pagination_class = PaginacionKeyset  # Cursor sobre (fecha, id); ?page=N sigue funcionando
     
     def get_queryset(self):
         """Filtrar ventas según usuario"""
@@ -191,7 +199,8 @@ class MovimientoStockViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['tipo', 'motivo', 'producto']
     ordering_fields = ['fecha']
-    ordering = ['-fecha']
+    ordering = ['-fecha', '-id']
+    pagination_class = PaginacionKeyset  # Cursor sobre (fecha, id); ?page=N sigue funcionando
 
 
 class NotificacionStockViewSet(viewsets.ReadOnlyModelViewSet):
@@ -0,0 +1,365 @@
+"""
+Backend de caché en dos niveles: L1 en memoria del proceso delante de Redis (L2)
+
+- L1: LRU acotado por proceso, con un TTL máximo corto (L1_TIMEOUT). Las
+  lecturas frecuentes (categorías, estadísticas, catálogo) no salen del proceso.
+- L2: cualquier caché de Django (normalmente django_redis); es la fuente de
+  verdad compartida entre workers.
+- Coherencia: cada escritura o borrado se publica en un canal de Redis y los
+  demás procesos descartan esa clave de su L1. Si el canal se corta, el TTL
+  corto de L1 acota cuánto puede durar un dato viejo.
+- Interruptor (circuit breaker): tras varios errores seguidos de Redis se deja
+  de consultarlo por unos segundos y se sirve sólo desde L1, en vez de decidir
+  una vez al importar settings. Al recuperarse se vacía L1.
+- get_or_set de un solo vuelo: si falta una clave, sólo un hilo (y un proceso,
+  con un candado en L2) la recalcula; el resto espera el resultado.
+
+Configuración (settings.CACHES):
+
+    'default': {
+        'BACKEND': 'inventario.cache_dos_niveles.CacheDosNiveles',
+        'LOCATION': REDIS_URL,          # canal de invalidación (pub/sub)
+        'OPTIONS': {'L2': 'redis', 'L1_MAX_ENTRIES': 5000, 'L1_TIMEOUT': 30},
+    }
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger('inventario')
+
+_AUSENTE = object()
+
+CANAL_INVALIDACION = 'stockex:cache:invalidar'
+TODAS = '*'
+
+
+class CacheLRU:
+    """
+    L1: diccionario LRU acotado con vencimiento por entrada, seguro entre hilos.
+
+    Guarda los valores serializados (como LocMemCache): cada get devuelve una
+    copia, así un llamador que modifique el objeto no altera lo que ven los
+    demás hilos ni lo que se escribió en L2.
+    """
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, defecto=_AUSENTE):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return defecto
+            valor, expira = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self._datos[clave]
+                return defecto
+            self._datos.move_to_end(clave)
+        return pickle.loads(valor)
+
+    def set(self, clave, valor, segundos):
+        expira = None if segundos is None else time.monotonic() + segundos
+        valor = pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            return self._datos.pop(clave, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class Interruptor:
+    """
+    Circuit breaker para L2: después de `umbral` errores seguidos se abre
+    durante `espera` segundos; pasado ese tiempo se vuelve a intentar.
+    """
+
+    def __init__(self, umbral: int = 3, espera: float = 10.0):
+        self.umbral = umbral
+        self.espera = espera
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+
+    @property
+    def abierto(self) -> bool:
+        return self.fallos >= self.umbral
+
+    def disponible(self) -> bool:
+        return not self.abierto or time.monotonic() >= self.abierto_hasta
+
+    def exito(self) -> bool:
+        """Registra un éxito. Returns: True si el interruptor estaba abierto (recuperación)"""
+        recuperado = self.abierto
+        self.fallos = 0
+        return recuperado
+
+    def fallo(self, error: Exception):
+        self.fallos += 1
+        if self.fallos >= self.umbral:
+            if time.monotonic() >= self.abierto_hasta:
+                logger.warning(f'Caché L2 no disponible ({error}); se usa sólo L1 por {self.espera:.0f}s')
+            self.abierto_hasta = time.monotonic() + self.espera
+
+
+class CacheDosNiveles(BaseCache):
+    """Backend de Django: L1 por proceso + L2 compartido (ver docstring del módulo)"""
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        opciones = params.get('OPTIONS', {})
+        self._url = server
+        self._alias_l2 = opciones.get('L2', 'redis')
+        self.l1_timeout = opciones.get('L1_TIMEOUT', 30)
+        self.espera_calculo = opciones.get('ESPERA_CALCULO', 10)
+        self.l1 = CacheLRU(opciones.get('L1_MAX_ENTRIES', 5000))
+        self.interruptor = Interruptor(opciones.get('UMBRAL_FALLOS', 3), opciones.get('ESPERA_REINTENTO', 10))
+        self.canal = opciones.get('CANAL', CANAL_INVALIDACION)
+        self.usar_pubsub = opciones.get('PUBSUB', bool(server))
+        self._origen = uuid.uuid4().hex
+        self._pid = None
+        self._lock_suscripcion = threading.Lock()
+        self._locks_claves = weakref.WeakValueDictionary()
+        self._lock_locks = threading.Lock()
+        self._redis = None
+
+    @property
+    def l2(self) -> BaseCache:
+        return caches[self._alias_l2]
+
+    # ------------------------------------------------------------------ L2
+
+    def _l2(self, operacion, defecto=None):
+        """Ejecuta una operación sobre L2 respetando el interruptor"""
+        if not self.interruptor.disponible():
+            return defecto
+        try:
+            resultado = operacion()
+        except Exception as e:
+            self.interruptor.fallo(e)
+            return defecto
+        if self.interruptor.exito():
+            # Mientras L2 estuvo caído otros procesos pudieron escribir: L1 no es confiable
+            self.l1.clear()
+            logger.info('Caché L2 disponible nuevamente')
+        return resultado
+
+    def _segundos(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _ttl_l1(self, segundos):
+        return self.l1_timeout if segundos is None else min(segundos, self.l1_timeout)
+
+    # ------------------------------------------------------------- pub/sub
+
+    def _asegurar_suscripcion(self):
+        """Arranca (una vez por proceso) el hilo que escucha las invalidaciones"""
+        if not self.usar_pubsub or self._pid == os.getpid():
+            return
+        with self._lock_suscripcion:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._redis = None
+            threading.Thread(target=self._escuchar, name='cache-invalidacion', daemon=True).start()
+
+    def _cliente_redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.from_url(self._url, socket_connect_timeout=1, socket_timeout=1)
+        return self._redis
+
+    def _escuchar(self):
+        espera = 1
+        while self._pid == os.getpid():
+            try:
+                import redis
+                suscripcion = redis.from_url(self._url, socket_connect_timeout=1).pubsub(ignore_subscribe_messages=True)
+                suscripcion.subscribe(self.canal)
+                # Lo que se haya publicado mientras no escuchábamos se perdió
+                self.l1.clear()
+                espera = 1
+                for mensaje in suscripcion.listen():
+                    self._recibir(mensaje['data'])
+            except Exception as e:
+                logger.debug(f'Canal de invalidación de caché caído: {e}')
+            time.sleep(espera)
+            espera = min(espera * 2, 30)
+
+    def _publicar(self, clave):
+        if self.usar_pubsub:
+            self._l2(lambda: self._cliente_redis().publish(self.canal, f'{self._origen}|{clave}'))
+
+    def _recibir(self, mensaje):
+        """Aplica una invalidación publicada por otro proceso"""
+        if isinstance(mensaje, bytes):
+            mensaje = mensaje.decode('utf-8')
+        origen, _, clave = mensaje.partition('|')
+        if origen == self._origen:
+            return
+        if clave == TODAS:
+            self.l1.clear()
+        else:
+            self.l1.delete(clave)
+
+    # ------------------------------------------------------- API de Django
+
+    def get(self, key, default=None, version=None):
+        self._asegurar_suscripcion()
+        clave = self.make_and_validate_key(key, version)
+        valor = self.l1.get(clave)
+        if valor is not _AUSENTE:
+            return valor
+        valor = self._l2(lambda: self.l2.get(key, _AUSENTE, version), _AUSENTE)
+        if valor is _AUSENTE:
+            return default
+        self.l1.set(clave, valor, self.l1_timeout)
+        return valor
+
+    def get_many(self, keys, version=None):
+        self._asegurar_suscripcion()
+        encontrados, faltan = {}, []
+        for key in keys:
+            valor = self.l1.get(self.make_and_validate_key(key, version))
+            if valor is _AUSENTE:
+                faltan.append(key)
+            else:
+                encontrados[key] = valor
+        if faltan:
+            desde_l2 = self._l2(lambda: self.l2.get_many(faltan, version), {})
+            for key, valor in desde_l2.items():
+                self.l1.set(self.make_and_validate_key(key, version), valor, self.l1_timeout)
+            encontrados.update(desde_l2)
+        return encontrados
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._asegurar_suscripcion()
+        clave = self.make_and_validate_key(key, version)
+        segundos = self._segundos(timeout)
+        self._l2(lambda: self.l2.set(key, value, segundos, version))
+        if segundos is not None and segundos <= 0:
+            self.l1.delete(clave)
+        else:
+            self.l1.set(clave, value, self._ttl_l1(segundos))
+        self._publicar(clave)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._asegurar_suscripcion()
+        clave = self.make_and_validate_key(key, version)
+        segundos = self._segundos(timeout)
+        if self.interruptor.disponible():
+            agregado = self._l2(lambda: self.l2.add(key, value, segundos, version), _AUSENTE)
+            if agregado is not _AUSENTE:
+                if agregado:
+                    self.l1.set(clave, value, self._ttl_l1(segundos))
+                return agregado
+        # Sin L2, add sólo puede garantizarse dentro del proceso
+        if self.l1.get(clave) is not _AUSENTE:
+            return False
+        self.l1.set(clave, value, self._ttl_l1(segundos))
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._l2(lambda: self.l2.touch(key, self._segundos(timeout), version), False))
+
+    def delete(self, key, version=None):
+        self._asegurar_suscripcion()
+        clave = self.make_and_validate_key(key, version)
+        en_l1 = self.l1.delete(clave)
+        borrado = self._l2(lambda: self.l2.delete(key, version), False)
+        self._publicar(clave)
+        return bool(borrado or en_l1)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _AUSENTE, version) is not _AUSENTE
+
+    def incr(self, key, delta=1, version=None):
+        clave = self.make_and_validate_key(key, version)
+        self.l1.delete(clave)
+        valor = _AUSENTE
+        if self.interruptor.disponible():
+            # incr es atómico en L2; el ValueError de clave inexistente no es una falla de L2
+            try:
+                valor = self.l2.incr(key, delta, version)
+            except ValueError:
+                raise
+            except Exception as e:
+                self.interruptor.fallo(e)
+        if valor is _AUSENTE:
+            # Sin L2 el contador sólo vive en este proceso
+            valor = super().incr(key, delta, version)
+        self._publicar(clave)
+        return valor
+
+    def clear(self):
+        self.l1.clear()
+        self._l2(lambda: self.l2.clear())
+        self._publicar(TODAS)
+
+    def close(self, **kwargs):
+        self._l2(lambda: self.l2.close(**kwargs))
+
+    # ------------------------------------------------------ un solo vuelo
+
+    def _lock_clave(self, clave) -> threading.Lock:
+        with self._lock_locks:
+            lock = self._locks_claves.get(clave)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks_claves[clave] = lock
+            return lock
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Como BaseCache.get_or_set, pero si la clave falta sólo un llamador la
+        calcula: dentro del proceso con un lock por clave y entre procesos con
+        un candado en L2 ('<clave>:calculando'). Los demás esperan el valor
+        hasta ESPERA_CALCULO segundos y, si no llega, lo calculan ellos.
+        """
+        valor = self.get(key, _AUSENTE, version)
+        if valor is not _AUSENTE:
+            return valor
+
+        with self._lock_clave(self.make_and_validate_key(key, version)):
+            valor = self.get(key, _AUSENTE, version)
+            if valor is not _AUSENTE:
+                return valor
+
+            candado = f'{key}:calculando'
+            tengo_candado = self._l2(lambda: self.l2.add(candado, self._origen, self.espera_calculo, version), True)
+            if not tengo_candado:
+                limite = time.monotonic() + self.espera_calculo
+                while time.monotonic() < limite:
+                    time.sleep(0.05)
+                    valor = self._l2(lambda: self.l2.get(key, _AUSENTE, version), _AUSENTE)
+                    if valor is not _AUSENTE:
+                        self.l1.set(self.make_and_validate_key(key, version), valor, self.l1_timeout)
+                        return valor
+            try:
+                valor = default() if callable(default) else default
+                if valor is not None:
+                    self.set(key, valor, timeout, version)
+                return valor
+            finally:
+                if tengo_candado:
+                    self._l2(lambda: self.l2.delete(candado, version))
@@ -79,6 +79,22 @@ ESTADOS_CUENTA = [
     ESTADO_CUENTA_CANCELADO,
 ]
 
+# Estados con saldo por cobrar (cuentan para saldo pendiente y antigüedad)
+ESTADOS_CUENTA_ABIERTA = [
+    ESTADO_CUENTA_PENDIENTE,
+    ESTADO_CUENTA_PARCIAL,
+    ESTADO_CUENTA_VENCIDO,
+]
+
+# Tramos de antigüedad de saldos: (clave, etiqueta, días de atraso mín, máx)
+TRAMOS_ANTIGUEDAD = [
+    ('corriente', 'Al día', None, 0),
+    ('dias_1_30', '1-30 días', 1, 30),
+    ('dias_31_60', '31-60 días', 31, 60),
+    ('dias_61_90', '61-90 días', 61, 90),
+    ('dias_90_mas', 'Más de 90 días', 91, None),
+]
+
 # Tipos de movimiento de stock
 TIPO_MOVIMIENTO_ENTRADA = 'entrada'
 TIPO_MOVIMIENTO_SALIDA = 'salida'
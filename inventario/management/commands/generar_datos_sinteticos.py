@@ -0,0 +1,439 @@
+import random
+import time as reloj
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.utils import timezone
+from inventario.models import (
+    Categoria, Producto, Proveedor, Almacen, StockAlmacen, Lote, Cliente,
+    Venta, ItemVenta, CuentaPorCobrar, MovimientoStock, ProductoFavorito,
+)
+from inventario.utils import invalidar_espacio_cache, invalidar_cache_categorias
+from inventario.utils_cobranza import invalidar_cache_antiguedad
+from inventario.utils_sincronizacion import registrar_cambios_catalogo
+
+# Todo lo generado lleva esta marca para poder identificarlo y borrarlo
+PREFIJO = 'SINT-'
+MARCA = '[sintético]'
+DOMINIO_EMAIL = 'sintetico.test'
+
+CATEGORIAS_BASE = [
+    'Cervezas', 'Vinos', 'Licores', 'Whisky', 'Ron', 'Vodka', 'Tequila', 'Gin',
+    'Pisco', 'Refrescos', 'Jugos', 'Energizantes', 'Aguas', 'Snacks', 'Hielo', 'Cigarrillos',
+]
+MARCAS = ['Andes', 'Austral', 'Cordillera', 'Pacífico', 'Patagonia', 'Valle', 'Sur', 'Norte', 'Maule', 'Elqui']
+FORMATOS = ['350cc', '500cc', '710cc', '750cc', '1 lt', '1.5 lt', '2 lt', '3 lt', 'sixpack', 'caja 12']
+
+# Estacionalidad: meses, días de la semana (lunes=0) y fechas puntuales
+FACTOR_MES = {1: 0.85, 2: 0.8, 3: 0.9, 4: 0.9, 5: 0.95, 6: 0.95, 7: 1.0, 8: 0.95, 9: 1.35, 10: 1.0, 11: 1.1, 12: 1.6}
+FACTOR_DIA_SEMANA = [0.7, 0.75, 0.8, 0.95, 1.35, 1.6, 0.9]
+FACTOR_FECHA = {(9, 17): 2.0, (9, 18): 2.8, (9, 19): 2.4, (12, 24): 2.2, (12, 31): 2.6}
+PESO_HORA = [1, 0.5, 0.2, 0.1, 0.1, 0.1, 0.2, 0.4, 0.8, 1.2, 1.5, 2, 3, 3, 2.5, 2.5, 3, 4, 6, 7.5, 7, 5, 3.5, 2]
+
+ITEMS_POR_VENTA = [1, 2, 3, 4, 5, 6, 8]
+PESO_ITEMS_POR_VENTA = [30, 25, 18, 12, 7, 5, 3]
+METODOS_PAGO = ['efectivo', 'tarjeta', 'transferencia', 'mixto']
+PESO_METODOS_PAGO = [45, 40, 12, 3]
+
+
+@contextmanager
+def fechas_manuales(*campos):
+    """Desactiva auto_now_add en los campos dados para poder fijar fechas históricas"""
+    originales = [(campo, campo.auto_now_add) for campo in campos]
+    for campo, _ in originales:
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, valor in originales:
+            campo.auto_now_add = valor
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos a escala de producción (productos, ventas con estacionalidad, '
+        'movimientos, lotes, almacenes, clientes y cuentas por cobrar) con bulk_create y semilla fija'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100000, help='Cantidad de productos (por defecto 100000)')
+        parser.add_argument('--categorias', type=int, default=40, help='Cantidad de categorías (por defecto 40)')
+        parser.add_argument('--clientes', type=int, default=20000, help='Cantidad de clientes (por defecto 20000)')
+        parser.add_argument('--ventas', type=int, default=1000000, help='Cantidad de ventas (por defecto 1000000)')
+        parser.add_argument('--movimientos', type=int, default=500000, help='Movimientos de stock adicionales (por defecto 500000)')
+        parser.add_argument('--almacenes', type=int, default=5, help='Cantidad de almacenes (por defecto 5)')
+        parser.add_argument('--lotes', type=int, default=50000, help='Cantidad de lotes (por defecto 50000)')
+        parser.add_argument('--proveedores', type=int, default=50, help='Cantidad de proveedores (por defecto 50)')
+        parser.add_argument('--dias', type=int, default=730, help='Días de historia hacia atrás (por defecto 730)')
+        parser.add_argument('--tasa-credito', type=float, default=0.08, help='Fracción de ventas con cliente que son a crédito (por defecto 0.08)')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla del generador aleatorio (por defecto 42)')
+        parser.add_argument('--tamano-lote', type=int, default=5000, help='Filas por bulk_create (por defecto 5000)')
+        parser.add_argument('--limpiar', action='store_true', help='Borra antes los datos sintéticos de una corrida anterior')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        self.lote = options['tamano_lote']
+        self.hoy = timezone.now().date()
+        inicio = reloj.perf_counter()
+
+        if Producto.objects.filter(sku__startswith=PREFIJO).exists():
+            if not options['limpiar']:
+                raise CommandError('Ya existen datos sintéticos. Usa --limpiar para regenerarlos.')
+            self.limpiar()
+
+        self.preparar_calendario(options['dias'])
+        vendedores = self.crear_vendedores()
+        categorias = self.crear_categorias(options['categorias'])
+        proveedores = self.crear_proveedores(options['proveedores'])
+        productos = self.crear_productos(options['productos'], categorias)
+        almacenes = self.crear_almacenes(options['almacenes'], productos)
+        self.crear_lotes(options['lotes'], productos, almacenes, proveedores)
+        clientes = self.crear_clientes(options['clientes'])
+        self.crear_ventas(options['ventas'], productos, clientes, vendedores, options['tasa_credito'])
+        self.crear_movimientos(options['movimientos'], productos, vendedores)
+
+        self.paso('Totales de clientes')
+        Cliente.recalcular_totales(Cliente.objects.filter(email__endswith=f'@{DOMINIO_EMAIL}'))
+
+        self.stdout.write(
+            self.style.SUCCESS(f'[COMPLETADO] Datos sintéticos generados en {reloj.perf_counter() - inicio:.1f}s')
+        )
+
+    # ---------- utilidades ----------
+
+    def paso(self, texto):
+        self.stdout.write(f'  - {texto}...')
+
+    def insertar(self, modelo, objetos):
+        """bulk_create en lotes del tamaño configurado; devuelve los objetos con pk"""
+        creados = []
+        for i in range(0, len(objetos), self.lote):
+            creados.extend(modelo.objects.bulk_create(objetos[i:i + self.lote]))
+        return creados
+
+    def preparar_calendario(self, dias):
+        """Pesos acumulados por día (estacionalidad + 20% de crecimiento anual)"""
+        self.fechas = [self.hoy - timedelta(days=d) for d in range(dias, -1, -1)]
+        pesos = []
+        for indice, fecha in enumerate(self.fechas):
+            peso = FACTOR_MES[fecha.month] * FACTOR_DIA_SEMANA[fecha.weekday()]
+            peso *= FACTOR_FECHA.get((fecha.month, fecha.day), 1)
+            peso *= 1 + 0.2 * indice / 365
+            pesos.append(peso)
+        self.pesos_fechas = list(accumulate(pesos))
+        self.pesos_horas = list(accumulate(PESO_HORA))
+
+    def fecha_hora(self, fecha=None):
+        """Fecha (según estacionalidad si no se indica) con hora según la curva diaria"""
+        if fecha is None:
+            fecha = self.rng.choices(self.fechas, cum_weights=self.pesos_fechas)[0]
+        hora = self.rng.choices(range(24), cum_weights=self.pesos_horas)[0]
+        return timezone.make_aware(datetime.combine(fecha, time(hora, self.rng.randrange(60), self.rng.randrange(60))))
+
+    def borrar_en_lotes(self, queryset):
+        """
+        Borra las filas por lotes de ids con DELETE directos: sin cargar los
+        objetos en memoria ni disparar señales por fila. Sigue las FK que
+        apuntan al modelo: CASCADE borra los dependientes (también por lotes)
+        y SET_NULL los desvincula.
+
+        Returns:
+            int: Filas borradas del modelo
+        """
+        modelo = queryset.model
+        borradas = 0
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:self.lote])
+            if not ids:
+                return borradas
+            for relacion in modelo._meta.related_objects:
+                if relacion.many_to_many:
+                    continue
+                dependientes = relacion.related_model._base_manager.filter(**{f'{relacion.field.name}__in': ids})
+                if relacion.on_delete is models.CASCADE:
+                    self.borrar_en_lotes(dependientes)
+                elif relacion.on_delete is models.SET_NULL:
+                    dependientes.update(**{relacion.field.name: None})
+            borradas += modelo._base_manager.filter(pk__in=ids)._raw_delete(queryset.db)
+
+    def limpiar(self):
+        self.paso('Borrando datos sintéticos anteriores')
+        productos = Producto.objects.filter(sku__startswith=PREFIJO)
+        clientes_reales = list(
+            Venta.objects.filter(numero_venta__startswith=PREFIJO, cliente__isnull=False)
+            .exclude(cliente__email__endswith=f'@{DOMINIO_EMAIL}')
+            .values_list('cliente_id', flat=True).distinct()
+        )
+        usuarios_favoritos = list(
+            ProductoFavorito.objects.filter(producto__in=productos).values_list('usuario_id', flat=True).distinct()
+        )
+        ids_productos = list(productos.values_list('pk', flat=True))
+
+        # En orden de dependencias: lo que se borra después ya no tiene filas que lo referencien
+        self.borrar_en_lotes(CuentaPorCobrar.objects.filter(numero_documento__startswith=PREFIJO))
+        self.borrar_en_lotes(Venta.objects.filter(numero_venta__startswith=PREFIJO))
+        self.borrar_en_lotes(productos)
+        self.borrar_en_lotes(Almacen.objects.filter(codigo__startswith=PREFIJO))
+        self.borrar_en_lotes(Cliente.objects.filter(email__endswith=f'@{DOMINIO_EMAIL}'))
+        self.borrar_en_lotes(Proveedor.objects.filter(email__endswith=f'@{DOMINIO_EMAIL}'))
+        self.borrar_en_lotes(Categoria.objects.filter(descripcion=MARCA))
+
+        # Lo que hacían las señales por fila, una sola vez
+        for i in range(0, len(ids_productos), self.lote):
+            registrar_cambios_catalogo(ids_productos[i:i + self.lote], eliminado=True)
+        if clientes_reales:
+            Cliente.recalcular_totales(Cliente.objects.filter(pk__in=clientes_reales))
+        for espacio in ('catalogo', 'categorias', 'clientes', 'ventas', 'cotizaciones', 'reportes'):
+            invalidar_espacio_cache(espacio)
+        invalidar_cache_categorias()
+        invalidar_cache_antiguedad()
+        cache.delete_many([f'favoritos_{usuario_id}' for usuario_id in usuarios_favoritos])
+
+    # ---------- catálogos ----------
+
+    def crear_vendedores(self):
+        vendedores = []
+        for i in range(1, 9):
+            usuario, _ = User.objects.get_or_create(
+                username=f'vendedor_sintetico_{i}',
+                defaults={'email': f'vendedor{i}@{DOMINIO_EMAIL}', 'is_active': True},
+            )
+            vendedores.append(usuario)
+        return vendedores
+
+    def crear_categorias(self, cantidad):
+        self.paso(f'{cantidad} categorías')
+        existentes = set(Categoria.objects.values_list('nombre', flat=True))
+        categorias = []
+        for i in range(cantidad):
+            nombre = f'{CATEGORIAS_BASE[i % len(CATEGORIAS_BASE)]} {PREFIJO}{i + 1}'
+            if nombre not in existentes:
+                categorias.append(Categoria(
+                    nombre=nombre, descripcion=MARCA, color=f'#{self.rng.randrange(0x1000000):06x}'
+                ))
+        self.insertar(Categoria, categorias)
+        return list(Categoria.objects.filter(descripcion=MARCA))
+
+    def crear_proveedores(self, cantidad):
+        self.paso(f'{cantidad} proveedores')
+        return self.insertar(Proveedor, [
+            Proveedor(nombre=f'Distribuidora {MARCAS[i % len(MARCAS)]} {i + 1}', email=f'proveedor{i + 1}@{DOMINIO_EMAIL}')
+            for i in range(cantidad)
+        ])
+
+    def crear_productos(self, cantidad, categorias):
+        """
+        Crea productos y devuelve tuplas (id, nombre, precio, precio_compra, stock).
+        La popularidad sigue una ley de potencia: pocos productos concentran las ventas.
+        """
+        self.paso(f'{cantidad} productos')
+        objetos = []
+        with fechas_manuales(Producto._meta.get_field('fecha_creacion')):
+            for i in range(cantidad):
+                precio = self.rng.choice([500, 990, 1500, 2500, 3990, 5900, 8900, 12900, 19900, 34900])
+                precio = int(precio * self.rng.uniform(0.8, 1.3))
+                stock_minimo = self.rng.choice([5, 10, 10, 20])
+                objetos.append(Producto(
+                    nombre=f'{self.rng.choice(MARCAS)} {CATEGORIAS_BASE[i % len(CATEGORIAS_BASE)].lower()} {self.rng.choice(FORMATOS)} #{i + 1}',
+                    sku=f'{PREFIJO}{i + 1:07d}',
+                    categoria=categorias[i % len(categorias)] if categorias else None,
+                    precio=precio,
+                    precio_compra=int(precio * self.rng.uniform(0.45, 0.75)),
+                    precio_promo=int(precio * 0.9) if self.rng.random() < 0.05 else None,
+                    stock=max(0, int(self.rng.gauss(stock_minimo * 3, stock_minimo * 2))),
+                    stock_minimo=stock_minimo,
+                    activo=self.rng.random() > 0.03,
+                    fecha_creacion=self.fecha_hora(self.fechas[0]),
+                ))
+                if len(objetos) >= self.lote:
+                    Producto.objects.bulk_create(objetos)
+                    objetos = []
+            Producto.objects.bulk_create(objetos)
+
+        productos = list(
+            Producto.objects.filter(sku__startswith=PREFIJO).order_by('id')
+            .values_list('id', 'nombre', 'precio', 'precio_compra', 'stock')
+        )
+        rangos = list(range(1, len(productos) + 1))
+        self.rng.shuffle(rangos)
+        self.pesos_productos = list(accumulate(1 / (rango ** 0.9) for rango in rangos))
+        return productos
+
+    def elegir_productos(self, cantidad, productos):
+        return self.rng.choices(productos, cum_weights=self.pesos_productos, k=cantidad)
+
+    def crear_almacenes(self, cantidad, productos):
+        self.paso(f'{cantidad} almacenes y su stock')
+        almacenes = self.insertar(Almacen, [
+            Almacen(nombre=f'Sucursal {MARCAS[i % len(MARCAS)]}', codigo=f'{PREFIJO}A{i + 1:02d}', notas=MARCA)
+            for i in range(cantidad)
+        ])
+        if not almacenes:
+            return almacenes
+        stock = []
+        for producto_id, _, _, _, cantidad_total in productos:
+            for almacen in almacenes:
+                stock.append(StockAlmacen(
+                    producto_id=producto_id, almacen=almacen,
+                    cantidad=cantidad_total // len(almacenes), stock_minimo=5,
+                ))
+            if len(stock) >= self.lote:
+                StockAlmacen.objects.bulk_create(stock)
+                stock = []
+        StockAlmacen.objects.bulk_create(stock)
+        return almacenes
+
+    def crear_lotes(self, cantidad, productos, almacenes, proveedores):
+        self.paso(f'{cantidad} lotes')
+        objetos = []
+        for i, (producto_id, _, _, _, _) in enumerate(self.rng.sample(productos, min(cantidad, len(productos)))):
+            fabricacion = self.rng.choice(self.fechas)
+            inicial = self.rng.randrange(12, 240, 12)
+            objetos.append(Lote(
+                producto_id=producto_id,
+                numero_lote=f'{PREFIJO}L{i + 1:07d}',
+                fecha_fabricacion=fabricacion,
+                fecha_vencimiento=fabricacion + timedelta(days=self.rng.choice([90, 180, 365, 730])),
+                cantidad_inicial=inicial,
+                cantidad_actual=self.rng.randrange(0, inicial + 1),
+                almacen=self.rng.choice(almacenes) if almacenes else None,
+                proveedor=self.rng.choice(proveedores) if proveedores else None,
+                notas=MARCA,
+            ))
+        self.insertar(Lote, objetos)
+
+    def crear_clientes(self, cantidad):
+        self.paso(f'{cantidad} clientes')
+        objetos = []
+        with fechas_manuales(Cliente._meta.get_field('fecha_registro')):
+            for i in range(cantidad):
+                empresa = self.rng.random() < 0.15
+                objetos.append(Cliente(
+                    nombre=f'{"Comercial" if empresa else "Cliente"} {MARCAS[i % len(MARCAS)]} {i + 1}',
+                    rut=f'{PREFIJO}{i + 1:08d}',
+                    tipo_cliente='empresa' if empresa else 'natural',
+                    email=f'cliente{i + 1}@{DOMINIO_EMAIL}',
+                    limite_credito=self.rng.choice([0, 100000, 300000, 1000000]) if empresa else 0,
+                    fecha_registro=self.fecha_hora(self.fechas[0]),
+                    notas=MARCA,
+                ))
+            self.insertar(Cliente, objetos)
+        return list(Cliente.objects.filter(email__endswith=f'@{DOMINIO_EMAIL}').values_list('id', flat=True))
+
+    # ---------- movimientos ----------
+
+    def crear_ventas(self, cantidad, productos, clientes, vendedores, tasa_credito):
+        """Ventas con sus items (y cuentas por cobrar si son a crédito), en lotes"""
+        self.paso(f'{cantidad} ventas con items')
+        hechas = 0
+        numero = 0
+        with fechas_manuales(Venta._meta.get_field('fecha'), CuentaPorCobrar._meta.get_field('fecha_creacion')):
+            while hechas < cantidad:
+                tamano = min(self.lote, cantidad - hechas)
+                ventas, items_por_venta = [], []
+                for _ in range(tamano):
+                    numero += 1
+                    cliente_id = self.rng.choice(clientes) if clientes and self.rng.random() < 0.35 else None
+                    es_credito = bool(cliente_id) and self.rng.random() < tasa_credito
+                    lineas = []
+                    for producto_id, nombre, precio, _, _ in self.elegir_productos(
+                        self.rng.choices(ITEMS_POR_VENTA, weights=PESO_ITEMS_POR_VENTA)[0], productos
+                    ):
+                        cantidad_item = self.rng.choices([1, 2, 3, 6, 12], weights=[70, 15, 7, 5, 3])[0]
+                        lineas.append((producto_id, nombre, cantidad_item, precio))
+                    subtotal = sum(Decimal(precio) * cantidad_item for _, _, cantidad_item, precio in lineas)
+                    descuento = (subtotal * Decimal('0.05')).quantize(Decimal('1')) if self.rng.random() < 0.1 else Decimal(0)
+                    total = subtotal - descuento
+                    metodo = 'credito' if es_credito else self.rng.choices(METODOS_PAGO, weights=PESO_METODOS_PAGO)[0]
+                    recibido = total if metodo != 'efectivo' else Decimal(-(-int(total) // 1000) * 1000)
+                    ventas.append(Venta(
+                        numero_venta=f'{PREFIJO}V{numero:09d}',
+                        cliente_id=cliente_id,
+                        usuario=self.rng.choice(vendedores),
+                        fecha=self.fecha_hora(),
+                        subtotal=subtotal, descuento=descuento, total=total,
+                        metodo_pago=metodo, monto_recibido=recibido, cambio=recibido - total,
+                        es_credito=es_credito,
+                        cancelada=self.rng.random() < 0.01,
+                    ))
+                    items_por_venta.append(lineas)
+
+                ventas = Venta.objects.bulk_create(ventas)
+                if ventas and ventas[0].pk is None:
+                    # Motores sin RETURNING: recuperar los ids por número de venta
+                    ids = dict(Venta.objects.filter(
+                        numero_venta__in=[v.numero_venta for v in ventas]
+                    ).values_list('numero_venta', 'id'))
+                    for venta in ventas:
+                        venta.pk = venta.id = ids[venta.numero_venta]
+
+                items, cuentas = [], []
+                for venta, lineas in zip(ventas, items_por_venta):
+                    for producto_id, nombre, cantidad_item, precio in lineas:
+                        stock_anterior = self.rng.randrange(cantidad_item, cantidad_item + 60)
+                        items.append(ItemVenta(
+                            venta_id=venta.pk, producto_id=producto_id, nombre_producto=nombre,
+                            cantidad=cantidad_item, precio_unitario=precio, subtotal=Decimal(precio) * cantidad_item,
+                            stock_anterior=stock_anterior, stock_despues=stock_anterior - cantidad_item,
+                        ))
+                    if venta.es_credito and not venta.cancelada:
+                        cuentas.append(self.cuenta_por_cobrar(venta))
+                self.insertar(ItemVenta, items)
+                self.insertar(CuentaPorCobrar, cuentas)
+
+                hechas += tamano
+                if hechas % (self.lote * 20) == 0 or hechas == cantidad:
+                    self.stdout.write(f'    {hechas}/{cantidad} ventas')
+
+    def cuenta_por_cobrar(self, venta):
+        """Cuenta a 30 días; las más antiguas tienden a estar pagadas"""
+        emision = venta.fecha.date()
+        vencimiento = emision + timedelta(days=30)
+        antiguedad = (self.hoy - emision).days
+        pagado = Decimal(0)
+        if self.rng.random() < min(0.95, antiguedad / 60):
+            pagado = venta.total
+        elif self.rng.random() < 0.3:
+            pagado = (venta.total * Decimal(self.rng.choice(['0.25', '0.5', '0.75']))).quantize(Decimal('1'))
+        if pagado >= venta.total:
+            estado = 'pagado'
+        elif vencimiento < self.hoy:
+            estado = 'vencido'
+        elif pagado > 0:
+            estado = 'parcial'
+        else:
+            estado = 'pendiente'
+        return CuentaPorCobrar(
+            cliente_id=venta.cliente_id, venta_id=venta.pk,
+            numero_documento=f'{PREFIJO}CC-{venta.numero_venta[len(PREFIJO):]}',
+            monto_total=venta.total, monto_pagado=pagado,
+            fecha_emision=emision, fecha_vencimiento=vencimiento,
+            estado=estado, fecha_creacion=venta.fecha, notas=MARCA,
+        )
+
+    def crear_movimientos(self, cantidad, productos, vendedores):
+        self.paso(f'{cantidad} movimientos de stock')
+        tipos = [('entrada', 'compra'), ('salida', 'venta'), ('ajuste', 'ajuste_inventario'),
+                 ('perdida', 'perdida'), ('devolucion', 'devolucion_cliente')]
+        objetos = []
+        with fechas_manuales(MovimientoStock._meta.get_field('fecha')):
+            for producto_id, _, _, _, _ in self.elegir_productos(cantidad, productos):
+                tipo, motivo = self.rng.choices(tipos, weights=[35, 50, 8, 4, 3])[0]
+                cantidad_mov = self.rng.randrange(1, 48 if tipo == 'entrada' else 12)
+                anterior = self.rng.randrange(cantidad_mov, cantidad_mov + 100)
+                nuevo = anterior + cantidad_mov if tipo in ('entrada', 'devolucion') else anterior - cantidad_mov
+                objetos.append(MovimientoStock(
+                    producto_id=producto_id, tipo=tipo, motivo=motivo, cantidad=cantidad_mov,
+                    stock_anterior=anterior, stock_nuevo=nuevo,
+                    usuario=self.rng.choice(vendedores), fecha=self.fecha_hora(), notas=MARCA,
+                ))
+                if len(objetos) >= self.lote:
+                    MovimientoStock.objects.bulk_create(objetos)
+                    objetos = []
+            MovimientoStock.objects.bulk_create(objetos)
@@ -0,0 +1,54 @@
+import csv
+import hashlib
+import io
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from inventario.models import Cliente
+from inventario.utils_cobranza import importar_pagos_clientes
+
+class Command(BaseCommand):
+    help = (
+        'Importa pagos de clientes desde un CSV (columnas: cliente_id o rut, monto, '
+        'fecha_pago (AAAA-MM-DD o DD/MM/AAAA), metodo_pago, referencia, notas, clave_idempotencia). '
+        'Reimportar el mismo archivo no duplica pagos (ni una referencia ya importada).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV')
+        parser.add_argument('--usuario', help='Username que queda como registrador de los pagos')
+        parser.add_argument('--delimitador', default=',', help='Separador de columnas (por defecto ",")')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options.get('usuario'):
+            usuario = User.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        try:
+            with open(options['archivo'], 'rb') as f:
+                contenido = f.read()
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+        texto = io.StringIO(contenido.decode('utf-8-sig'), newline='')
+        filas = list(csv.DictReader(texto, delimiter=options['delimitador']))
+
+        # Resolver RUT -> cliente_id en una sola consulta
+        ruts = {fila['rut'].strip() for fila in filas if not fila.get('cliente_id') and fila.get('rut')}
+        por_rut = dict(Cliente.objects.filter(rut__in=ruts).values_list('rut', 'id'))
+        for fila in filas:
+            if not fila.get('cliente_id') and fila.get('rut'):
+                fila['cliente_id'] = por_rut.get(fila['rut'].strip())
+
+        resultado = importar_pagos_clientes(filas, usuario=usuario, origen=hashlib.sha256(contenido).hexdigest())
+
+        for numero, error in resultado['errores']:
+            self.stdout.write(self.style.WARNING(f'[ERROR] Fila {numero}: {error}'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"[COMPLETADO] {resultado['aplicados']} pago(s) aplicado(s) "
+                f"(${resultado['monto_aplicado']:,.0f}), {resultado['duplicados']} ya registrado(s), "
+                f"{len(resultado['errores'])} con error"
+            )
+        )
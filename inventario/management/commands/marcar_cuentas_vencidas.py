@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from inventario.utils_cobranza import marcar_cuentas_vencidas
+
+class Command(BaseCommand):
+    help = 'Marca como vencidas las cuentas por cobrar cuyo vencimiento ya pasó y notifica a cobranza'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sin-notificar',
+            action='store_true',
+            help='No crear notificaciones para los usuarios de cobranza',
+        )
+
+    def handle(self, *args, **options):
+        resultado = marcar_cuentas_vencidas(notificar=not options['sin_notificar'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"[COMPLETADO] {resultado['cuentas']} cuenta(s) marcada(s) como vencidas "
+                f"(${resultado['monto']:,.0f})"
+            )
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from inventario.models import Cliente
+
+class Command(BaseCommand):
+    help = 'Recalcula los totales desnormalizados de clientes (total compras, cantidad de ventas y saldo pendiente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cliente',
+            type=int,
+            action='append',
+            help='ID de cliente a recalcular (se puede repetir). Por defecto, todos.',
+        )
+
+    def handle(self, *args, **options):
+        clientes = Cliente.objects.all()
+        if options.get('cliente'):
+            clientes = clientes.filter(pk__in=options['cliente'])
+
+        actualizados = Cliente.recalcular_totales(clientes)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'[COMPLETADO] Totales recalculados para {actualizados} cliente(s)')
+        )
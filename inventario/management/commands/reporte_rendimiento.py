@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from inventario.utils_rendimiento import peores_n_mas_1, podar_metricas, resumen_rendimiento
+
+class Command(BaseCommand):
+    help = 'Muestra p50/p95 de latencia y consultas por vista, y las vistas con más consultas repetidas (N+1)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=24, help='Período a resumir (por defecto 24 horas)')
+        parser.add_argument('--top', type=int, default=10, help='Cantidad de vistas a mostrar')
+        parser.add_argument('--podar', action='store_true',
+                            help='Borra antes las métricas más viejas que RENDIMIENTO_RETENCION_DIAS (sin Celery beat)')
+
+    def handle(self, *args, **options):
+        if options['podar']:
+            self.stdout.write(f'Métricas podadas: {podar_metricas()}')
+        resumen = resumen_rendimiento(options['horas'])
+        if not resumen:
+            self.stdout.write(self.style.WARNING(f"Sin mediciones en las últimas {options['horas']} horas"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Vistas más lentas (últimas {options['horas']} horas, por p95)"))
+        self.stdout.write(f"{'Vista':<40} {'Req':>7} {'p50 ms':>9} {'p95 ms':>9} {'BD ms':>8} {'Consultas':>10} {'Repetidas':>10}")
+        for vista in resumen[:options['top']]:
+            self.stdout.write(
+                f"{vista['vista'][:40]:<40} {vista['peticiones']:>7} {vista['p50_ms']:>9} {vista['p95_ms']:>9} "
+                f"{vista['db_ms']:>8} {vista['consultas']:>10} {vista['duplicadas']:>10}"
+            )
+
+        n_mas_1 = peores_n_mas_1(resumen, options['top'])
+        if n_mas_1:
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING('Posibles N+1 (consultas repetidas por request)'))
+            for vista in n_mas_1:
+                self.stdout.write(f"{vista['vista']}: {vista['duplicadas']} por request (máx. {vista['duplicadas_max']})")
+                self.stdout.write(f"    {vista['sql_duplicada'][:160]}")
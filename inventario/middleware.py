@@ -0,0 +1,133 @@
+"""
+Middleware de la aplicación inventario
+"""
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils.functional import SimpleLazyObject
+
+from .utils import roles_usuario
+from .utils_logging import iniciar_correlacion, terminar_correlacion
+from .utils_perfilado import Perfilador, config_perfilado, guardar_perfil, motivo_perfilado
+from .utils_rendimiento import ContadorConsultas, Muestra, debe_muestrear, registrar_muestra
+logger = logging.getLogger('inventario')
+
+_ID_VALIDO = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class CorrelacionMiddleware:
+    """
+    Id de correlación por request (ver utils_logging): se toma de la cabecera
+    X-Request-ID si viene de un proxy, o se genera, y se devuelve en la
+    respuesta. Todos los registros de log de la request lo incluyen.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recibido = request.headers.get('X-Request-ID', '')
+        token = iniciar_correlacion(recibido if _ID_VALIDO.match(recibido) else None)
+        try:
+            request.correlacion = token.var.get()
+            response = self.get_response(request)
+        finally:
+            terminar_correlacion(token)
+        response['X-Request-ID'] = request.correlacion
+        return response
+
+
+class RolesMiddleware:
+    """
+    Agrega request.roles (ver utils.Roles) después de la autenticación.
+
+    Es perezoso: las requests que no consultan roles no hacen ninguna consulta,
+    y las que sí, cargan los grupos una sola vez.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: roles_usuario(request.user))
+        return self.get_response(request)
+
+
+class RendimientoMiddleware:
+    """
+    Mide cada request (ver utils_rendimiento): tiempo total, tiempo y
+    cantidad de consultas, y consultas repetidas. Sólo suma contadores en
+    memoria; la escritura a la base es por lotes, una vez por intervalo.
+
+    Se desactiva con RENDIMIENTO_ACTIVO = False y se puede muestrear una
+    fracción de las requests con RENDIMIENTO_MUESTREO.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = getattr(settings, 'RENDIMIENTO_ACTIVO', True)
+
+    def __call__(self, request):
+        if not self.activo or not debe_muestrear():
+            return self.get_response(request)
+
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contador):
+            response = self.get_response(request)
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            registrar_muestra(Muestra(
+                vista=match.view_name or match._func_path,
+                duracion_ms=duracion_ms,
+                db_ms=contador.db_ms,
+                consultas=contador.consultas,
+                duplicadas=contador.duplicadas,
+                sql_duplicada=contador.sql_mas_repetida,
+            ))
+        return response
+
+
+class PerfiladoMiddleware:
+    """
+    Perfila las requests elegidas (cabecera X-Perfilar, usuario o muestreo,
+    ver utils_perfilado) y guarda el perfil si la request fue lenta. Va
+    después de RolesMiddleware: necesita request.user y request.roles.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = config_perfilado()
+        motivo = motivo_perfilado(request, config)
+        if motivo is None:
+            return self.get_response(request)
+
+        perfilador = Perfilador(config['modo'])
+        try:
+            perfilador.iniciar()
+        except ValueError as e:
+            # Otro perfilador activo en el proceso (cProfile es uno por vez en 3.12+)
+            logger.warning(f'No se pudo iniciar el perfilado: {e}')
+            return self.get_response(request)
+
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            perfilador.detener()
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        if motivo == 'cabecera' or duracion_ms >= config['umbral_ms']:
+            try:
+                perfil = guardar_perfil(perfilador, request, duracion_ms, motivo)
+                response['X-Perfil-ID'] = str(perfil.id)
+            except Exception as e:
+                logger.warning(f'No se pudo guardar el perfil de {request.path}: {e}')
+        return response
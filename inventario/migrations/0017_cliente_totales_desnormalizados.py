@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:26
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_totales_clientes(apps, schema_editor):
+    """Llena los totales desnormalizados desde ventas y cuentas por cobrar existentes"""
+    Cliente = apps.get_model('inventario', 'Cliente')
+    Venta = apps.get_model('inventario', 'Venta')
+    CuentaPorCobrar = apps.get_model('inventario', 'CuentaPorCobrar')
+    
+    ventas = Venta.objects.filter(cliente=OuterRef('pk'), cancelada=False).order_by().values('cliente')
+    cuentas = CuentaPorCobrar.objects.filter(
+        cliente=OuterRef('pk'), estado__in=['pendiente', 'parcial', 'vencido']
+    ).order_by().values('cliente')
+    decimal = models.DecimalField(max_digits=14, decimal_places=0)
+    
+    Cliente.objects.update(
+        total_compras=Coalesce(Subquery(ventas.annotate(s=Sum('total')).values('s')), Value(0), output_field=decimal),
+        cantidad_ventas=Coalesce(Subquery(ventas.annotate(c=Count('id')).values('c')), Value(0)),
+        saldo_pendiente=Coalesce(
+            Subquery(cuentas.annotate(s=Sum(F('monto_total') - F('monto_pagado'))).values('s')),
+            Value(0), output_field=decimal
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_producto_inventario__nombre_2dddb1_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='cantidad_ventas',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Cantidad de Ventas'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='saldo_pendiente',
+            field=models.DecimalField(decimal_places=0, default=0, editable=False, max_digits=14, verbose_name='Saldo Pendiente'),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='total_compras',
+            field=models.DecimalField(decimal_places=0, default=0, editable=False, max_digits=14, verbose_name='Total Compras'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-saldo_pendiente'], name='inventario__saldo_p_7bee14_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['-total_compras'], name='inventario__total_c_0cb821_idx'),
+        ),
+        migrations.RunPython(calcular_totales_clientes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0017_cliente_totales_desnormalizados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagocliente',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, db_index=True, help_text='Identifica el envío del pago para no registrarlo dos veces', max_length=64, null=True, verbose_name='Clave de Idempotencia'),
+        ),
+        migrations.AddConstraint(
+            model_name='pagocliente',
+            constraint=models.UniqueConstraint(fields=('clave_idempotencia', 'cuenta_por_cobrar'), name='pago_unico_por_clave_y_cuenta'),
+        ),
+    ]
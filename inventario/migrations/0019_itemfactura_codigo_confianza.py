@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0018_pagocliente_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemfactura',
+            name='codigo',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Código (texto extraído)'),
+        ),
+        migrations.AddField(
+            model_name='itemfactura',
+            name='confianza_coincidencia',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Confianza de la Coincidencia (%)'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0019_itemfactura_codigo_confianza'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='historialprecio',
+            name='inventario__product_22b3c9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='historialprecio',
+            name='inventario__fecha_6a715f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='logaccion',
+            name='inventario__fecha_211474_idx',
+        ),
+        migrations.AddIndex(
+            model_name='historialprecio',
+            index=models.Index(fields=['producto', '-fecha', '-id'], name='histprecio_prod_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialprecio',
+            index=models.Index(fields=['-fecha', '-id'], name='histprecio_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logaccion',
+            index=models.Index(fields=['-fecha', '-id'], name='logaccion_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['-fecha', '-id'], name='movstock_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', '-fecha', '-id'], name='movstock_prod_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['-fecha', '-id'], name='venta_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['usuario', '-fecha', '-id'], name='venta_usuario_fecha_id_idx'),
+        ),
+    ]
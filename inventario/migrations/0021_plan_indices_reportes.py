@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0020_indices_paginacion_keyset'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historialcambio',
+            index=models.Index(fields=['-fecha'], name='histcambio_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialcambio',
+            index=models.Index(fields=['producto', '-fecha'], name='histcambio_prod_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemventa',
+            index=models.Index(fields=['venta', 'producto', 'cantidad', 'precio_unitario'], name='itemventa_venta_prod_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', 'tipo', 'fecha'], name='movstock_prod_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['tipo', 'fecha'], name='movstock_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('cancelada', False)), fields=['fecha'], name='venta_vigente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('cancelada', False)), fields=['es_credito', 'fecha'], name='venta_vigente_credito_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(condition=models.Q(('cancelada', False)), fields=['cliente', '-fecha'], name='venta_vigente_cliente_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0021_plan_indices_reportes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaVista',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vista', models.CharField(max_length=200, verbose_name='Vista')),
+                ('periodo', models.DateTimeField(verbose_name='Período')),
+                ('peticiones', models.PositiveIntegerField(default=0, verbose_name='Peticiones')),
+                ('tiempo_total_ms', models.FloatField(default=0, verbose_name='Tiempo Total (ms)')),
+                ('tiempo_db_ms', models.FloatField(default=0, verbose_name='Tiempo en BD (ms)')),
+                ('consultas', models.PositiveIntegerField(default=0, verbose_name='Consultas')),
+                ('duplicadas', models.PositiveIntegerField(default=0, verbose_name='Consultas Repetidas')),
+                ('duplicadas_max', models.PositiveIntegerField(default=0, verbose_name='Máx. Repetidas en una Request')),
+                ('sql_duplicada', models.TextField(blank=True, verbose_name='SQL más Repetida')),
+                ('duraciones', models.JSONField(blank=True, default=list, help_text='Muestra de duraciones para calcular percentiles', verbose_name='Duraciones (ms)')),
+            ],
+            options={
+                'verbose_name': 'Métrica de Vista',
+                'verbose_name_plural': 'Métricas de Vistas',
+                'ordering': ['-periodo'],
+                'indexes': [models.Index(fields=['periodo'], name='metricavista_periodo_idx'), models.Index(fields=['vista', 'periodo'], name='metricavista_vista_idx')],
+            },
+        ),
+    ]
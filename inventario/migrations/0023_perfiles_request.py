@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0022_metricas_rendimiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vista', models.CharField(blank=True, max_length=200, verbose_name='Vista')),
+                ('ruta', models.CharField(max_length=500, verbose_name='Ruta')),
+                ('metodo', models.CharField(max_length=10, verbose_name='Método')),
+                ('duracion_ms', models.FloatField(verbose_name='Duración (ms)')),
+                ('modo', models.CharField(choices=[('muestreo', 'Muestreo de pila'), ('cprofile', 'cProfile')], max_length=20, verbose_name='Modo')),
+                ('motivo', models.CharField(choices=[('cabecera', 'Cabecera X-Perfilar'), ('usuario', 'Usuario perfilado'), ('muestreo', 'Muestreo aleatorio')], max_length=20, verbose_name='Motivo')),
+                ('muestras', models.PositiveIntegerField(default=0, verbose_name='Muestras')),
+                ('archivo', models.CharField(max_length=100, verbose_name='Archivo')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='perfiles_request', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Perfil de Request',
+                'verbose_name_plural': 'Perfiles de Requests',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0023_perfiles_request'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField(verbose_name='Producto')),
+                ('eliminado', models.BooleanField(default=False, verbose_name='Eliminado')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Cambio de Catálogo',
+                'verbose_name_plural': 'Cambios de Catálogo',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['fecha'], name='cambiocatalogo_fecha_idx')],
+            },
+        ),
+    ]
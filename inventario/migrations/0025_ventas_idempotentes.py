@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0024_cambios_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, editable=False, help_text='Generada por la terminal: un reintento con la misma clave devuelve esta venta', max_length=64, null=True, unique=True, verbose_name='Clave de Idempotencia'),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='fecha_offline',
+            field=models.DateTimeField(blank=True, help_text='Cuándo se cobró, si la venta se registró sin conexión y se envió después', null=True, verbose_name='Fecha en la Terminal'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0025_ventas_idempotentes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaOfflineRechazada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(db_index=True, max_length=64, verbose_name='Clave de Idempotencia')),
+                ('datos', models.JSONField(verbose_name='Datos Enviados')),
+                ('error', models.TextField(verbose_name='Motivo del Rechazo')),
+                ('conflictos', models.JSONField(blank=True, default=list, verbose_name='Conflictos de Stock')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Rechazo')),
+                ('resuelta', models.BooleanField(default=False, verbose_name='Resuelta')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventas_offline_rechazadas', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Venta Offline Rechazada',
+                'verbose_name_plural': 'Ventas Offline Rechazadas',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
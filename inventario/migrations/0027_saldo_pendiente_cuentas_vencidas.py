@@ -0,0 +1,36 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def recalcular_saldo_pendiente(apps, schema_editor):
+    """
+    Rehace saldo_pendiente contando también las cuentas 'vencido': en las
+    bases que ya habían aplicado 0017 el cálculo inicial sólo sumaba
+    'pendiente' y 'parcial', y los pagos de cuentas vencidas (que ajustan el
+    saldo por diferencia) lo dejaban negativo. Mismo cálculo que
+    Cliente.recalcular_totales.
+    """
+    Cliente = apps.get_model('inventario', 'Cliente')
+    CuentaPorCobrar = apps.get_model('inventario', 'CuentaPorCobrar')
+    
+    cuentas = CuentaPorCobrar.objects.filter(
+        cliente=OuterRef('pk'), estado__in=['pendiente', 'parcial', 'vencido']
+    ).order_by().values('cliente')
+    Cliente.objects.update(
+        saldo_pendiente=Coalesce(
+            Subquery(cuentas.annotate(s=Sum(F('monto_total') - F('monto_pagado'))).values('s')),
+            Value(0), output_field=models.DecimalField(max_digits=14, decimal_places=0)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0026_ventas_offline_rechazadas'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalcular_saldo_pendiente, migrations.RunPython.noop),
+    ]
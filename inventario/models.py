@@ -3,16 +3,17 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.db.models import Sum
+from django.db.models import Sum, Q
 from PIL import Image
 import os
 import uuid
 import logging
+from decimal import Decimal
 from typing import Optional
 
 from .constants import (
     STOCK_MINIMO_DEFAULT, IMAGEN_MAX_WIDTH, IMAGEN_MAX_HEIGHT,
-    IMAGEN_QUALITY, NOMBRE_PRODUCTO_MAX_LENGTH
+    IMAGEN_QUALITY, NOMBRE_PRODUCTO_MAX_LENGTH, ESTADOS_CUENTA_ABIERTA
 )
 
 logger = logging.getLogger('inventario')
@@ -225,6 +226,10 @@ class HistorialCambio(models.Model):
         verbose_name = "Historial de Cambio"
         verbose_name_plural = "Historial de Cambios"
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['-fecha'], name='histcambio_fecha_idx'),
+            models.Index(fields=['producto', '-fecha'], name='histcambio_prod_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tipo_cambio} - {self.producto.nombre} - {self.fecha}"
@@ -264,6 +269,14 @@ class MovimientoStock(models.Model):
         verbose_name = "Movimiento de Stock"
         verbose_name_plural = "Movimientos de Stock"
         ordering = ['-fecha']
+        indexes = [
+            # Paginación por cursor (fecha, id), general y por producto
+            models.Index(fields=['-fecha', '-id'], name='movstock_fecha_id_idx'),
+            models.Index(fields=['producto', '-fecha', '-id'], name='movstock_prod_fecha_id_idx'),
+            # Entradas/salidas de un producto en un período (reportes, rotación)
+            models.Index(fields=['producto', 'tipo', 'fecha'], name='movstock_prod_tipo_fecha_idx'),
+            models.Index(fields=['tipo', 'fecha'], name='movstock_tipo_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.producto.nombre} - {self.cantidad} unidades - {self.fecha}"
@@ -321,11 +334,15 @@ class Factura(models.Model):
 class ItemFactura(models.Model):
     factura = models.ForeignKey(Factura, on_delete=models.CASCADE, related_name='items', verbose_name="Factura")
     producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Producto")
+    codigo = models.CharField(max_length=50, blank=True, default='', verbose_name="Código (texto extraído)")
     nombre_producto = models.CharField(max_length=200, verbose_name="Nombre del Producto (texto extraído)")
     cantidad = models.IntegerField(default=1, validators=[MinValueValidator(1)], verbose_name="Cantidad")
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="Precio Unitario")
     subtotal = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name="Subtotal")
     producto_coincidencia = models.BooleanField(default=False, verbose_name="Producto Coincidió Automáticamente")
+    confianza_coincidencia = models.PositiveSmallIntegerField(
+        null=True, blank=True, verbose_name="Confianza de la Coincidencia (%)"
+    )
     stock_actualizado = models.BooleanField(default=False, verbose_name="Stock Actualizado")
 
     class Meta:
@@ -379,21 +396,61 @@ class Venta(models.Model):
     es_credito = models.BooleanField(default=False, verbose_name="Venta a Crédito", help_text="Si es crédito, se creará una cuenta por cobrar")
     notas = models.TextField(blank=True, null=True, verbose_name="Notas")
     cancelada = models.BooleanField(default=False, verbose_name="Venta Cancelada")
+    clave_idempotencia = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False,
+        verbose_name="Clave de Idempotencia",
+        help_text="Generada por la terminal: un reintento con la misma clave devuelve esta venta"
+    )
+    fecha_offline = models.DateTimeField(
+        null=True, blank=True, verbose_name="Fecha en la Terminal",
+        help_text="Cuándo se cobró, si la venta se registró sin conexión y se envió después"
+    )
 
     class Meta:
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
         ordering = ['-fecha']
+        indexes = [
+            # Paginación por cursor (fecha, id); los vendedores ven sólo sus ventas
+            models.Index(fields=['-fecha', '-id'], name='venta_fecha_id_idx'),
+            models.Index(fields=['usuario', '-fecha', '-id'], name='venta_usuario_fecha_id_idx'),
+            # Parciales: los reportes sólo miran ventas no canceladas
+            models.Index(fields=['fecha'], condition=Q(cancelada=False), name='venta_vigente_fecha_idx'),
+            models.Index(fields=['es_credito', 'fecha'], condition=Q(cancelada=False), name='venta_vigente_credito_idx'),
+            models.Index(fields=['cliente', '-fecha'], condition=Q(cancelada=False), name='venta_vigente_cliente_idx'),
+        ]
 
     def __str__(self):
         return f"Venta #{self.numero_venta} - ${self.total:,.0f} - {self.fecha.strftime('%d/%m/%Y %H:%M')}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._aporte_cliente_original = instancia.aporte_cliente()
+        return instancia
+    
+    def aporte_cliente(self):
+        """
+        Tupla (cliente_id, total, cantidad) con lo que esta venta suma a los
+        totales del cliente. None si faltan campos diferidos (only()/defer()).
+        """
+        if {'cliente_id', 'total', 'cancelada'} & self.get_deferred_fields():
+            return None
+        if self.cliente_id and not self.cancelada:
+            return (self.cliente_id, Decimal(self.total or 0), 1)
+        return (self.cliente_id, 0, 0)
+    
     def save(self, *args, **kwargs):
         if not self.numero_venta:
             # Generar número de venta único
             from datetime import datetime
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             self.numero_venta = f"V-{timestamp}"
+            # Varias ventas en el mismo segundo (p.ej. la cola offline del POS)
+            sufijo = 1
+            while Venta.objects.filter(numero_venta=self.numero_venta).exists():
+                sufijo += 1
+                self.numero_venta = f"V-{timestamp}-{sufijo}"
         super().save(*args, **kwargs)
 
 class ItemVenta(models.Model):
@@ -411,6 +468,10 @@ class ItemVenta(models.Model):
         verbose_name = "Item de Venta"
         verbose_name_plural = "Items de Venta"
         ordering = ['id']
+        indexes = [
+            # Cubre el reporte de productos más vendidos (join por venta, suma por producto)
+            models.Index(fields=['venta', 'producto', 'cantidad', 'precio_unitario'], name='itemventa_venta_prod_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre_producto} - {self.cantidad} x ${self.precio_unitario}"
@@ -534,6 +595,12 @@ class Cliente(models.Model):
     fecha_registro = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Registro")
     notas = models.TextField(blank=True, null=True, verbose_name="Notas")
     
+    # Totales desnormalizados: se mantienen con F() desde signals.py al guardar
+    # ventas y cuentas por cobrar, para listar/ordenar clientes sin agregados
+    total_compras = models.DecimalField(max_digits=14, decimal_places=0, default=0, editable=False, verbose_name="Total Compras")
+    cantidad_ventas = models.IntegerField(default=0, editable=False, verbose_name="Cantidad de Ventas")
+    saldo_pendiente = models.DecimalField(max_digits=14, decimal_places=0, default=0, editable=False, verbose_name="Saldo Pendiente")
+    
     class Meta:
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
@@ -542,37 +609,63 @@ class Cliente(models.Model):
             models.Index(fields=['nombre']),
             models.Index(fields=['rut']),
             models.Index(fields=['activo']),
+            models.Index(fields=['-saldo_pendiente']),
+            models.Index(fields=['-total_compras']),
         ]
     
+    CAMPOS_TOTALES = ('total_compras', 'cantidad_ventas', 'saldo_pendiente')
+    
     def __str__(self):
         return f"{self.nombre} ({self.rut or 'Sin RUT'})"
     
-    @property
-    def total_compras(self):
-        """Calcula el total de compras del cliente"""
-        from django.db.models import Sum
-        total = Venta.objects.filter(
-            cliente=self,
-            cancelada=False
-        ).aggregate(Sum('total'))['total__sum'] or 0
-        return total
-    
-    @property
-    def cantidad_ventas(self):
-        """Cuenta la cantidad de ventas del cliente"""
-        return Venta.objects.filter(cliente=self, cancelada=False).count()
+    def save(self, *args, **kwargs):
+        # Los totales solo se escriben con ajustar_totales/recalcular_totales;
+        # un save() completo con valores en memoria pisaría incrementos concurrentes
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_TOTALES
+            ]
+        super().save(*args, **kwargs)
     
-    @property
-    def saldo_pendiente(self):
-        """Calcula el saldo pendiente de cuentas por cobrar"""
-        from django.db.models import Sum
-        total = CuentaPorCobrar.objects.filter(
-            cliente=self,
-            estado__in=['pendiente', 'parcial']
-        ).aggregate(
-            saldo=Sum('monto_total') - Sum('monto_pagado')
-        )['saldo'] or 0
-        return max(0, total)
+    @staticmethod
+    def ajustar_totales(cliente_id, total_compras=0, cantidad_ventas=0, saldo_pendiente=0):
+        """
+        Aplica incrementos a los totales desnormalizados de un cliente.
+        Usa F() para que ventas/pagos concurrentes no pierdan actualizaciones.
+        """
+        if not cliente_id or not (total_compras or cantidad_ventas or saldo_pendiente):
+            return
+        Cliente.objects.filter(pk=cliente_id).update(
+            total_compras=models.F('total_compras') + total_compras,
+            cantidad_ventas=models.F('cantidad_ventas') + cantidad_ventas,
+            saldo_pendiente=models.F('saldo_pendiente') + saldo_pendiente,
+        )
+    
+    @staticmethod
+    def recalcular_totales(queryset=None):
+        """
+        Recalcula los totales desde ventas y cuentas por cobrar en un solo UPDATE.
+        Sirve para reparar desvíos (p.ej. tras cargas masivas con update()).
+        """
+        from django.db.models import Count, OuterRef, Subquery, Value
+        from django.db.models.functions import Coalesce
+        
+        ventas = Venta.objects.filter(cliente=OuterRef('pk'), cancelada=False).order_by().values('cliente')
+        cuentas = CuentaPorCobrar.objects.filter(
+            cliente=OuterRef('pk'), estado__in=CuentaPorCobrar.ESTADOS_ABIERTOS
+        ).order_by().values('cliente')
+        decimal = models.DecimalField(max_digits=14, decimal_places=0)
+        
+        queryset = Cliente.objects.all() if queryset is None else queryset
+        return queryset.update(
+            total_compras=Coalesce(Subquery(ventas.annotate(s=Sum('total')).values('s')), Value(0), output_field=decimal),
+            cantidad_ventas=Coalesce(Subquery(ventas.annotate(c=Count('id')).values('c')), Value(0)),
+            saldo_pendiente=Coalesce(
+                Subquery(cuentas.annotate(s=Sum(models.F('monto_total') - models.F('monto_pagado'))).values('s')),
+                Value(0), output_field=decimal
+            ),
+        )
 
 
 class CuentaPorCobrar(models.Model):
@@ -585,6 +678,9 @@ class CuentaPorCobrar(models.Model):
         ('cancelado', 'Cancelado'),
     ]
     
+    # Estados que cuentan para el saldo pendiente del cliente
+    ESTADOS_ABIERTOS = ESTADOS_CUENTA_ABIERTA
+    
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='cuentas_por_cobrar', verbose_name="Cliente")
     venta = models.ForeignKey(Venta, on_delete=models.SET_NULL, null=True, blank=True, related_name='cuenta_por_cobrar', verbose_name="Venta Relacionada")
     numero_documento = models.CharField(max_length=50, unique=True, verbose_name="Número de Documento")
@@ -618,7 +714,24 @@ class CuentaPorCobrar(models.Model):
     def esta_vencida(self):
         """Verifica si la cuenta está vencida"""
         from django.utils import timezone
-        return timezone.now().date() > self.fecha_vencimiento and self.estado in ['pendiente', 'parcial']
+        return timezone.now().date() > self.fecha_vencimiento and self.estado in self.ESTADOS_ABIERTOS
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._aporte_saldo_original = instancia.aporte_saldo()
+        return instancia
+    
+    def aporte_saldo(self):
+        """
+        Tupla (cliente_id, saldo) con lo que esta cuenta suma al saldo pendiente
+        del cliente. None si faltan campos diferidos (only()/defer()).
+        """
+        if {'cliente_id', 'monto_total', 'monto_pagado', 'estado'} & self.get_deferred_fields():
+            return None
+        if self.estado in self.ESTADOS_ABIERTOS:
+            return (self.cliente_id, max(Decimal(0), Decimal(self.monto_total or 0) - Decimal(self.monto_pagado or 0)))
+        return (self.cliente_id, 0)
     
     def save(self, *args, **kwargs):
         """Actualiza el estado según el monto pagado"""
@@ -627,10 +740,10 @@ class CuentaPorCobrar(models.Model):
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             self.numero_documento = f"CC-{timestamp}"
         
-        # Actualizar estado según pagos
+        # Actualizar estado según pagos (un abono no quita la marca de vencida)
         if self.monto_pagado >= self.monto_total:
             self.estado = 'pagado'
-        elif self.monto_pagado > 0:
+        elif self.monto_pagado > 0 and self.estado != 'vencido':
             self.estado = 'parcial'
         elif self.estado == 'pagado' and self.monto_pagado < self.monto_total:
             self.estado = 'pendiente'
@@ -656,6 +769,7 @@ class PagoCliente(models.Model):
     notas = models.TextField(blank=True, null=True, verbose_name="Notas")
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Registrado por")
     fecha_registro = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Registro")
+    clave_idempotencia = models.CharField(max_length=64, blank=True, null=True, db_index=True, verbose_name="Clave de Idempotencia", help_text="Identifica el envío del pago para no registrarlo dos veces")
     
     class Meta:
         verbose_name = "Pago de Cliente"
@@ -664,20 +778,34 @@ class PagoCliente(models.Model):
         indexes = [
             models.Index(fields=['cuenta_por_cobrar', 'fecha_pago']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['clave_idempotencia', 'cuenta_por_cobrar'], name='pago_unico_por_clave_y_cuenta'),
+        ]
     
     def __str__(self):
         return f"Pago ${self.monto:,.0f} - {self.cuenta_por_cobrar.cliente.nombre} - {self.fecha_pago}"
     
     def save(self, *args, **kwargs):
-        """Actualiza el monto pagado de la cuenta por cobrar"""
-        super().save(*args, **kwargs)
-        # Actualizar monto pagado de la cuenta
-        cuenta = self.cuenta_por_cobrar
+        """
+        Actualiza el monto pagado de la cuenta por cobrar. La cuenta se bloquea
+        antes de recalcular para no perder pagos concurrentes; el registro
+        habitual de pagos pasa por utils_cobranza.aplicar_pago_cliente.
+        """
+        from django.db import transaction
         from django.db.models import Sum
-        cuenta.monto_pagado = cuenta.pagos.aggregate(
-            total=Sum('monto')
-        )['total'] or 0
-        cuenta.save()
+        with transaction.atomic():
+            cuenta = CuentaPorCobrar.objects.select_for_update().get(pk=self.cuenta_por_cobrar_id)
+            super().save(*args, **kwargs)
+            cuenta.monto_pagado = cuenta.pagos.aggregate(
+                total=Sum('monto')
+            )['total'] or 0
+            cuenta.save()
+        # Reflejar el resultado en la instancia que tiene quien llamó
+        relacionada = self.cuenta_por_cobrar
+        if relacionada is not cuenta:
+            relacionada.monto_pagado = cuenta.monto_pagado
+            relacionada.estado = cuenta.estado
+            relacionada._aporte_saldo_original = cuenta._aporte_saldo_original
 
 
 class Almacen(models.Model):
@@ -942,7 +1070,7 @@ class LogAccion(models.Model):
         indexes = [
             models.Index(fields=['usuario', '-fecha']),
             models.Index(fields=['modulo', 'tipo_accion']),
-            models.Index(fields=['-fecha']),
+            models.Index(fields=['-fecha', '-id'], name='logaccion_fecha_id_idx'),
         ]
     
     def __str__(self):
@@ -1002,8 +1130,8 @@ class HistorialPrecio(models.Model):
         verbose_name_plural = "Historial de Precios"
         ordering = ['-fecha']
         indexes = [
-            models.Index(fields=['producto', '-fecha']),
-            models.Index(fields=['-fecha']),
+            models.Index(fields=['producto', '-fecha', '-id'], name='histprecio_prod_fecha_id_idx'),
+            models.Index(fields=['-fecha', '-id'], name='histprecio_fecha_id_idx'),
         ]
     
     def __str__(self):
@@ -1223,7 +1351,7 @@ class Devolucion(models.Model):
                 cuentas = CuentaPorCobrar.objects.filter(
                     cliente=self.cliente,
                     venta=self.venta,
-                    estado__in=['pendiente', 'parcial']
+                    estado__in=CuentaPorCobrar.ESTADOS_ABIERTOS
                 )
                 for cuenta in cuentas:
                     cuenta.monto_pagado += self.monto_devolver
@@ -1563,4 +1691,122 @@ class WidgetDashboard(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.usuario.username} - {self.get_tipo_display()}"
\ No newline at end of file
+        return f"{self.usuario.username} - {self.get_tipo_display()}"
+
+# ========== MÉTRICAS DE RENDIMIENTO ==========
+
+class MetricaVista(models.Model):
+    """
+    Rendimiento agregado de una vista en un período (ver utils_rendimiento).
+    Cada fila resume las requests de un proceso entre dos volcados.
+    """
+    vista = models.CharField(max_length=200, verbose_name="Vista")
+    periodo = models.DateTimeField(verbose_name="Período")
+    peticiones = models.PositiveIntegerField(default=0, verbose_name="Peticiones")
+    tiempo_total_ms = models.FloatField(default=0, verbose_name="Tiempo Total (ms)")
+    tiempo_db_ms = models.FloatField(default=0, verbose_name="Tiempo en BD (ms)")
+    consultas = models.PositiveIntegerField(default=0, verbose_name="Consultas")
+    duplicadas = models.PositiveIntegerField(default=0, verbose_name="Consultas Repetidas")
+    duplicadas_max = models.PositiveIntegerField(default=0, verbose_name="Máx. Repetidas en una Request")
+    sql_duplicada = models.TextField(blank=True, verbose_name="SQL más Repetida")
+    duraciones = models.JSONField(default=list, blank=True, verbose_name="Duraciones (ms)", help_text="Muestra de duraciones para calcular percentiles")
+    
+    class Meta:
+        verbose_name = "Métrica de Vista"
+        verbose_name_plural = "Métricas de Vistas"
+        ordering = ['-periodo']
+        indexes = [
+            models.Index(fields=['periodo'], name='metricavista_periodo_idx'),
+            models.Index(fields=['vista', 'periodo'], name='metricavista_vista_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.vista} @ {self.periodo:%d/%m/%Y %H:%M} ({self.peticiones})"
+    
+    @property
+    def tiempo_promedio_ms(self):
+        return self.tiempo_total_ms / self.peticiones if self.peticiones else 0
+
+
+class PerfilRequest(models.Model):
+    """
+    Perfil de una request lenta (ver utils_perfilado). El archivo está en
+    PERFILADO_DIR: pilas en formato collapsed (.folded) o estadísticas de
+    cProfile (.prof).
+    """
+    MODO_CHOICES = [
+        ('muestreo', 'Muestreo de pila'),
+        ('cprofile', 'cProfile'),
+    ]
+    
+    MOTIVO_CHOICES = [
+        ('cabecera', 'Cabecera X-Perfilar'),
+        ('usuario', 'Usuario perfilado'),
+        ('muestreo', 'Muestreo aleatorio'),
+    ]
+    
+    vista = models.CharField(max_length=200, blank=True, verbose_name="Vista")
+    ruta = models.CharField(max_length=500, verbose_name="Ruta")
+    metodo = models.CharField(max_length=10, verbose_name="Método")
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='perfiles_request', verbose_name="Usuario")
+    duracion_ms = models.FloatField(verbose_name="Duración (ms)")
+    modo = models.CharField(max_length=20, choices=MODO_CHOICES, verbose_name="Modo")
+    motivo = models.CharField(max_length=20, choices=MOTIVO_CHOICES, verbose_name="Motivo")
+    muestras = models.PositiveIntegerField(default=0, verbose_name="Muestras")
+    archivo = models.CharField(max_length=100, verbose_name="Archivo")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+    
+    class Meta:
+        verbose_name = "Perfil de Request"
+        verbose_name_plural = "Perfiles de Requests"
+        ordering = ['-fecha']
+    
+    def __str__(self):
+        return f"{self.vista or self.ruta} ({self.duracion_ms:.0f} ms)"
+
+
+class CambioCatalogo(models.Model):
+    """
+    Registro de cambios del catálogo para la sincronización incremental del
+    POS (ver utils_sincronizacion). El id es el cursor: cada terminal pide los
+    cambios posteriores al último id que vio. No referencia al producto con
+    una FK para que los borrados queden registrados.
+    """
+    producto_id = models.BigIntegerField(verbose_name="Producto")
+    eliminado = models.BooleanField(default=False, verbose_name="Eliminado")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+    
+    class Meta:
+        verbose_name = "Cambio de Catálogo"
+        verbose_name_plural = "Cambios de Catálogo"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['fecha'], name='cambiocatalogo_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.id} producto {self.producto_id}{' (eliminado)' if self.eliminado else ''}"
+
+
+class VentaOfflineRechazada(models.Model):
+    """
+    Venta cobrada sin conexión que el servidor no pudo registrar (p.ej. sin
+    stock al sincronizar). La terminal la saca de su cola, así que se guarda
+    aquí con los datos tal como llegaron para resolverla a mano: el cliente
+    ya pagó.
+    """
+    clave = models.CharField(max_length=64, db_index=True, verbose_name="Clave de Idempotencia")
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ventas_offline_rechazadas', verbose_name="Vendedor")
+    datos = models.JSONField(verbose_name="Datos Enviados")
+    error = models.TextField(verbose_name="Motivo del Rechazo")
+    conflictos = models.JSONField(default=list, blank=True, verbose_name="Conflictos de Stock")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Rechazo")
+    resuelta = models.BooleanField(default=False, verbose_name="Resuelta")
+    
+    class Meta:
+        verbose_name = "Venta Offline Rechazada"
+        verbose_name_plural = "Ventas Offline Rechazadas"
+        ordering = ['-fecha']
+    
+    def __str__(self):
+        return f"{self.clave} ({'resuelta' if self.resuelta else 'pendiente'})"
@@ -0,0 +1,78 @@
+"""
+Paginación personalizada para la API REST
+"""
+from collections import OrderedDict
+
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .utils_paginacion import paginar_keyset
+
+# Signo de ConteoEstimado -> "count_tipo" de la respuesta
+TIPOS_CONTEO = {'': 'exacto', '~': 'estimado', '+': 'minimo'}
+
+
+class PaginacionKeyset(BasePagination):
+    """
+    Paginación por cursor sobre (fecha, id) para historiales grandes.
+
+    Respuesta: {"next", "previous", "results"} y, si se pide ?contar=1,
+    "count_estimado" (número) con "count_tipo": 'exacto', 'estimado' (por el
+    planificador) o 'minimo' (acotado: hay al menos esa cantidad).
+
+    El cursor siempre recorre del más reciente al más antiguo. Si llega
+    ?page=N, o un ?ordering= (otro orden que el cursor no puede seguir), se
+    usa la paginación numerada de siempre.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    campo = 'fecha'
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(tamano, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.numerada = None
+        if request.query_params.get('page') or request.query_params.get(api_settings.ORDERING_PARAM):
+            self.numerada = PageNumberPagination()
+            return self.numerada.paginate_queryset(queryset, request, view)
+        self.pagina = paginar_keyset(
+            queryset, request, self.get_page_size(request), self.campo,
+            contar=bool(request.query_params.get('contar')),
+        )
+        return list(self.pagina)
+
+    def get_paginated_response(self, data):
+        if self.numerada is not None:
+            return self.numerada.get_paginated_response(data)
+        respuesta = OrderedDict([
+            ('next', self._absoluta(self.pagina.url_siguiente)),
+            ('previous', self._absoluta(self.pagina.url_anterior)),
+        ])
+        if self.pagina.conteo is not None:
+            respuesta['count_estimado'] = self.pagina.conteo.valor
+            respuesta['count_tipo'] = TIPOS_CONTEO[self.pagina.conteo.signo]
+        respuesta['results'] = data
+        return Response(respuesta)
+
+    def _absoluta(self, url):
+        return self.request.build_absolute_uri(url) if url else None
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count_estimado': {'type': 'integer'},
+                'count_tipo': {'type': 'string', 'enum': list(TIPOS_CONTEO.values())},
+                'results': schema,
+            },
+        }
@@ -1,10 +1,18 @@
 """
 Señales para capturar cambios automáticamente
 """
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Producto, HistorialPrecio
+from django.core.cache import cache
+from .models import (
+    Producto, HistorialPrecio, Venta, CuentaPorCobrar, Cliente, Categoria, ProductoFavorito,
+    Cotizacion, NotificacionUsuario, ItemVenta, MovimientoStock,
+)
+from .utils_cobranza import invalidar_cache_antiguedad
+from .utils_sincronizacion import registrar_cambios_catalogo
+from .utils_tickets import borrar_tickets_venta
+from .utils import limpiar_roles, invalidar_roles_usuarios, invalidar_espacio_cache, invalidar_cache_categorias
 import logging
 
 logger = logging.getLogger('inventario')
@@ -79,3 +87,149 @@ def registrar_cambio_precio(sender, instance, created, **kwargs):
             )
             logger.info(f'Historial de precio registrado para {instance.nombre}')
 
+
+
+# ========== TOTALES DESNORMALIZADOS DEL CLIENTE ==========
+# Venta.aporte_cliente() y CuentaPorCobrar.aporte_saldo() devuelven
+# (cliente_id, *valores); aquí se aplica la diferencia con el estado cargado.
+
+CAMPOS_APORTE_VENTA = ('total_compras', 'cantidad_ventas')
+CAMPOS_APORTE_CUENTA = ('saldo_pendiente',)
+
+
+def _aplicar_diferencia_aporte(instance, anterior, actual, campos):
+    """Ajusta los totales del cliente con la diferencia entre dos aportes"""
+    if actual is None or anterior is None:
+        # Sin estado conocido (campos diferidos o instancia construida a mano)
+        cliente_ids = [instance.cliente_id] + ([anterior[0]] if anterior else [])
+        cliente_ids = [cliente_id for cliente_id in cliente_ids if cliente_id]
+        if cliente_ids:
+            Cliente.recalcular_totales(Cliente.objects.filter(pk__in=cliente_ids))
+        return
+    
+    cliente_anterior, valores_anteriores = anterior[0], anterior[1:]
+    cliente_actual, valores_actuales = actual[0], actual[1:]
+    if cliente_anterior == cliente_actual:
+        deltas = [nuevo - viejo for nuevo, viejo in zip(valores_actuales, valores_anteriores)]
+        Cliente.ajustar_totales(cliente_actual, **dict(zip(campos, deltas)))
+    else:
+        Cliente.ajustar_totales(cliente_anterior, **{c: -v for c, v in zip(campos, valores_anteriores)})
+        Cliente.ajustar_totales(cliente_actual, **dict(zip(campos, valores_actuales)))
+
+
+def _aporte_vacio(campos):
+    return (None,) + (0,) * len(campos)
+
+
+@receiver(post_save, sender=Venta)
+def actualizar_totales_cliente_venta(sender, instance, created, **kwargs):
+    """Aplica al cliente la diferencia de total/cantidad que produjo guardar la venta"""
+    anterior = _aporte_vacio(CAMPOS_APORTE_VENTA) if created else getattr(instance, '_aporte_cliente_original', None)
+    actual = instance.aporte_cliente()
+    _aplicar_diferencia_aporte(instance, anterior, actual, CAMPOS_APORTE_VENTA)
+    instance._aporte_cliente_original = actual
+
+
+@receiver(post_delete, sender=Venta)
+def descontar_totales_cliente_venta(sender, instance, **kwargs):
+    """Resta del cliente el aporte de una venta eliminada"""
+    anterior = getattr(instance, '_aporte_cliente_original', None)
+    _aplicar_diferencia_aporte(instance, anterior, _aporte_vacio(CAMPOS_APORTE_VENTA), CAMPOS_APORTE_VENTA)
+
+
+@receiver(post_save, sender=CuentaPorCobrar)
+def actualizar_saldo_cliente_cuenta(sender, instance, created, **kwargs):
+    """Aplica al cliente la diferencia de saldo que produjo guardar la cuenta (pagos, devoluciones)"""
+    anterior = _aporte_vacio(CAMPOS_APORTE_CUENTA) if created else getattr(instance, '_aporte_saldo_original', None)
+    actual = instance.aporte_saldo()
+    _aplicar_diferencia_aporte(instance, anterior, actual, CAMPOS_APORTE_CUENTA)
+    instance._aporte_saldo_original = actual
+    invalidar_cache_antiguedad()
+
+
+@receiver(post_delete, sender=CuentaPorCobrar)
+def descontar_saldo_cliente_cuenta(sender, instance, **kwargs):
+    """Resta del cliente el saldo de una cuenta eliminada"""
+    anterior = getattr(instance, '_aporte_saldo_original', None)
+    _aplicar_diferencia_aporte(instance, anterior, _aporte_vacio(CAMPOS_APORTE_CUENTA), CAMPOS_APORTE_CUENTA)
+    invalidar_cache_antiguedad()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def limpiar_roles_memorizados(sender, instance, action, reverse, pk_set, **kwargs):
+    """Los roles memorizados en el usuario dejan de valer si cambian sus grupos"""
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # group.user_set.add(...): pk_set son ids de usuarios (None en clear)
+        invalidar_roles_usuarios(pk_set)
+    else:
+        limpiar_roles(instance)
+        invalidar_roles_usuarios([instance.pk])
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_cache_catalogo(sender, instance, **kwargs):
+    """Las estadísticas y listados cacheados del catálogo quedan obsoletos"""
+    invalidar_espacio_cache('catalogo')
+    invalidar_espacio_cache('reportes')  # rentabilidad por stock
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def registrar_cambio_catalogo(sender, instance, **kwargs):
+    """Anota el cambio para la sincronización incremental del POS"""
+    registrar_cambios_catalogo([instance.pk], eliminado=kwargs['signal'] is post_delete)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_cache_categoria(sender, instance, **kwargs):
+    invalidar_cache_categorias()
+    invalidar_espacio_cache('catalogo')
+    invalidar_espacio_cache('categorias')  # tarjetas de producto de inicio
+
+
+@receiver(post_save, sender=ProductoFavorito)
+@receiver(post_delete, sender=ProductoFavorito)
+def invalidar_cache_favoritos(sender, instance, **kwargs):
+    cache.delete(f'favoritos_{instance.usuario_id}')
+
+
+@receiver(post_save, sender=NotificacionUsuario)
+@receiver(post_delete, sender=NotificacionUsuario)
+def invalidar_version_notificaciones(sender, instance, **kwargs):
+    """Cambia el ETag del polling de notificaciones del usuario"""
+    invalidar_espacio_cache(f'notificaciones:{instance.usuario_id}')
+
+
+ESPACIOS_COMERCIALES = {Cliente: 'clientes', Venta: 'ventas', Cotizacion: 'cotizaciones'}
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_save, sender=Venta)
+@receiver(post_delete, sender=Venta)
+@receiver(post_save, sender=Cotizacion)
+@receiver(post_delete, sender=Cotizacion)
+def invalidar_version_comercial(sender, instance, **kwargs):
+    """Versiones 'clientes', 'ventas' y 'cotizaciones' (ETags de la búsqueda global)"""
+    invalidar_espacio_cache(ESPACIOS_COMERCIALES[sender])
+
+
+@receiver(post_save, sender=Venta)
+@receiver(post_delete, sender=Venta)
+@receiver(post_save, sender=ItemVenta)
+@receiver(post_delete, sender=ItemVenta)
+@receiver(post_save, sender=MovimientoStock)
+@receiver(post_delete, sender=MovimientoStock)
+def invalidar_cache_reportes(sender, instance, **kwargs):
+    """Los resúmenes cacheados de reportes_avanzados incluyen ventas y movimientos"""
+    invalidar_espacio_cache('reportes')
+
+
+@receiver(post_delete, sender=Venta)
+def borrar_tickets_generados(sender, instance, **kwargs):
+    """Los tickets pre-generados de la venta ya no sirven"""
+    borrar_tickets_venta(instance)
@@ -2,14 +2,76 @@
 Tareas asíncronas con Celery
 """
 from celery import shared_task
+from celery.signals import task_prerun, task_postrun
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
+from urllib.parse import urlparse
 import logging
+import socket
+import threading
+import time
+
+from .utils_logging import iniciar_correlacion, terminar_correlacion
 
 logger = logging.getLogger('inventario')
 
+_correlacion_tareas = {}
+
+# Sondeo del broker antes de encolar desde un request (ver broker_disponible)
+TIMEOUT_SONDEO_BROKER = 0.25
+INTERVALO_SONDEO_BROKER = 30
+PUERTOS_BROKER = {'redis': 6379, 'rediss': 6380, 'amqp': 5672, 'amqps': 5671, 'pyamqp': 5672}
+_sondeo_broker = {'disponible': True, 'fecha': None}
+_sondeo_lock = threading.Lock()
+
+
+def broker_disponible():
+    """
+    Indica si el broker de Celery acepta conexiones, con un connect TCP de
+    TIMEOUT_SONDEO_BROKER segundos. El resultado se recuerda
+    INTERVALO_SONDEO_BROKER segundos, así un despliegue sin Redis paga el
+    sondeo una vez cada 30 s y no los reintentos de conexión de Celery en
+    cada venta o factura.
+
+    Los brokers sin host (memory://, modo eager) se dan por disponibles.
+
+    Returns:
+        bool: True si se puede encolar
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        return True
+    url = urlparse(settings.CELERY_BROKER_URL or '')
+    puerto = url.port or PUERTOS_BROKER.get(url.scheme)
+    if puerto is None:
+        return True
+    with _sondeo_lock:
+        ahora = time.monotonic()
+        if _sondeo_broker['fecha'] is not None and ahora - _sondeo_broker['fecha'] < INTERVALO_SONDEO_BROKER:
+            return _sondeo_broker['disponible']
+        try:
+            socket.create_connection((url.hostname or 'localhost', puerto), timeout=TIMEOUT_SONDEO_BROKER).close()
+            disponible = True
+        except OSError:
+            disponible = False
+            logger.warning(f'Broker de Celery no disponible ({url.hostname}:{puerto}); se usa el camino local')
+        _sondeo_broker.update(disponible=disponible, fecha=time.monotonic())
+        return disponible
+
+
+@task_prerun.connect
+def _iniciar_correlacion_tarea(task_id=None, **kwargs):
+    """Los logs y spans de una tarea llevan su id como correlación"""
+    _correlacion_tareas[task_id] = iniciar_correlacion(task_id)
+
+
+@task_postrun.connect
+def _terminar_correlacion_tarea(task_id=None, **kwargs):
+    token = _correlacion_tareas.pop(task_id, None)
+    if token is not None:
+        terminar_correlacion(token)
+
 
 @shared_task(bind=True, max_retries=3)
 def procesar_factura_ocr_async(self, factura_id):
@@ -166,6 +228,9 @@ def enviar_reporte_por_email(reporte_id, email_destino):
         # Por ahora solo simulamos
         subject = f'Reporte: {reporte.nombre}'
         message = f'Adjunto encontrarás el reporte: {reporte.nombre}'
+        if reporte.tipo_reporte in ('cuentas_cobrar', 'completo'):
+            from .utils_cobranza import obtener_resumen_antiguedad, formatear_resumen_antiguedad
+            message += '\n\n' + formatear_resumen_antiguedad(obtener_resumen_antiguedad())
         
         send_mail(
             subject,
@@ -182,3 +247,80 @@ def enviar_reporte_por_email(reporte_id, email_destino):
         logger.error(f'Error enviando reporte {reporte_id}: {str(exc)}')
         return {'status': 'error', 'message': str(exc)}
 
+
+
+@shared_task
+def marcar_cuentas_vencidas():
+    """
+    Marca en bloque las cuentas por cobrar vencidas y notifica a cobranza
+    Se ejecuta cada noche (ver CELERY_BEAT_SCHEDULE en settings)
+    """
+    from .utils_cobranza import marcar_cuentas_vencidas as marcar
+    
+    try:
+        resultado = marcar()
+        return {'status': 'success', 'cuentas': resultado['cuentas'], 'monto': float(resultado['monto'])}
+    except Exception as exc:
+        logger.error(f'Error marcando cuentas vencidas: {str(exc)}')
+        return {'status': 'error', 'message': str(exc)}
+
+
+@shared_task
+def generar_tickets_venta_async(venta_id):
+    """
+    Pre-genera los tickets (térmica, A4 y ESC/POS) de una venta recién registrada
+    Se encola desde registrar_venta al confirmar la transacción
+    """
+    from .utils_tickets import generar_tickets_venta
+    
+    try:
+        formatos = generar_tickets_venta(venta_id)
+        return {'status': 'success', 'venta_id': venta_id, 'formatos': formatos}
+    except Exception as exc:
+        logger.error(f'Error generando tickets de la venta {venta_id}: {str(exc)}')
+        return {'status': 'error', 'message': str(exc)}
+
+
+@shared_task
+def podar_cambios_catalogo():
+    """
+    Borra el registro de cambios del catálogo más viejo que la retención
+    Se ejecuta cada noche (ver CELERY_BEAT_SCHEDULE en settings)
+    """
+    from .utils_sincronizacion import podar_cambios_catalogo as podar
+    
+    try:
+        return {'status': 'success', 'borrados': podar()}
+    except Exception as exc:
+        logger.error(f'Error podando cambios del catálogo: {str(exc)}')
+        return {'status': 'error', 'message': str(exc)}
+
+
+@shared_task
+def podar_tickets_venta():
+    """
+    Borra los tickets de venta generados más viejos que la retención
+    Se ejecuta cada noche (ver CELERY_BEAT_SCHEDULE en settings)
+    """
+    from .utils_tickets import podar_tickets
+    
+    try:
+        return {'status': 'success', 'borrados': podar_tickets()}
+    except Exception as exc:
+        logger.error(f'Error podando tickets de venta: {str(exc)}')
+        return {'status': 'error', 'message': str(exc)}
+
+
+@shared_task
+def podar_metricas_rendimiento():
+    """
+    Borra las métricas de rendimiento más viejas que la retención
+    Se ejecuta cada noche (ver CELERY_BEAT_SCHEDULE en settings)
+    """
+    from .utils_rendimiento import podar_metricas
+    
+    try:
+        return {'status': 'success', 'borrados': podar_metricas()}
+    except Exception as exc:
+        logger.error(f'Error podando métricas de rendimiento: {str(exc)}')
+        return {'status': 'error', 'message': str(exc)}
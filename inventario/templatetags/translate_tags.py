@@ -2,27 +2,69 @@
 Template tags para traducción simple
 """
 from django import template
-from inventario.translations import translate, get_translations_dict
+from django.utils.html import conditional_escape
+from django.utils.translation import get_language
+
+from inventario.translations import TABLAS, get_translations_dict, idioma_de_request, resolver_idioma, translate
 
 register = template.Library()
 
 
-@register.simple_tag
-def trans(text):
+def _idioma_contexto(context):
+    request = context.get('request')
+    if request is not None:
+        return idioma_de_request(request)
+    return resolver_idioma(get_language())
+
+
+class TraduccionNode(template.Node):
+    """
+    Traducción de {% trans %}. Si el texto es literal, las traducciones a
+    todos los idiomas se calculan al compilar el template (una vez por
+    proceso con el cargador en caché) y al renderizar sólo se elige una.
+    """
+
+    def __init__(self, expresion, variable=None):
+        self.expresion = expresion
+        self.variable = variable
+        self.por_idioma = None
+        if expresion.is_var is False and not expresion.filters:
+            texto = str(expresion.var)
+            self.por_idioma = {idioma: tabla.get(texto, texto) for idioma, tabla in TABLAS.items()}
+            self.por_idioma[None] = texto
+
+    def render(self, context):
+        idioma = _idioma_contexto(context)
+        if self.por_idioma is not None:
+            texto = self.por_idioma.get(idioma, self.por_idioma[None])
+        else:
+            texto = translate(str(self.expresion.resolve(context)), idioma)
+        if self.variable:
+            context[self.variable] = texto
+            return ''
+        return conditional_escape(texto) if context.autoescape else texto
+
+
+@register.tag
+def trans(parser, token):
     """
     Template tag para traducir texto
-    
-    Uso: {% trans "Texto a traducir" %}
+
+    Uso: {% trans "Texto a traducir" %} o {% trans "Texto" as variable %}
     """
-    return translate(text)
+    bits = token.split_contents()
+    if len(bits) == 2:
+        return TraduccionNode(parser.compile_filter(bits[1]))
+    if len(bits) == 4 and bits[2] == 'as':
+        return TraduccionNode(parser.compile_filter(bits[1]), bits[3])
+    raise template.TemplateSyntaxError(f'Uso: {{% {bits[0]} "texto" [as variable] %}}')
 
 
 @register.simple_tag
 def get_translations():
     """
     Template tag para obtener todas las traducciones como diccionario
-    
+
     Uso: {% get_translations as translations %}
     """
     return get_translations_dict()
-
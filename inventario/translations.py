@@ -1,7 +1,16 @@
 """
 Sistema de traducción simple para STOCKEX
 Proporciona traducciones básicas sin necesidad de gettext
+
+Las tablas se congelan una vez al importar el módulo y el idioma de cada
+request se resuelve una sola vez (ver idioma_de_request).
 """
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional
+
+from django.conf import settings
 from django.utils.translation import get_language
 
 # Diccionario de traducciones
@@ -123,6 +132,69 @@ TRANSLATIONS = {
 }
 
 
+IDIOMA_POR_DEFECTO = 'es'
+
+# Tablas de solo lectura por idioma: se comparten entre requests sin copiarlas
+TABLAS = MappingProxyType({
+    idioma: MappingProxyType(dict(textos)) for idioma, textos in TRANSLATIONS.items()
+})
+
+_CODIGO_BASE = re.compile(r'\s*([A-Za-z]{2,3})(?:[-_]|$)')
+
+
+@lru_cache(maxsize=1)
+def idiomas_soportados() -> frozenset:
+    return frozenset(codigo.split('-')[0].lower() for codigo, _ in settings.LANGUAGES)
+
+
+@lru_cache(maxsize=128)
+def resolver_idioma(codigo: Optional[str]) -> str:
+    """
+    Código base soportado para un código de idioma cualquiera
+    ('es-CL' -> 'es', 'EN' -> 'en'); lo desconocido cae en español.
+    """
+    match = _CODIGO_BASE.match(codigo or '')
+    idioma = match.group(1).lower() if match else IDIOMA_POR_DEFECTO
+    return idioma if idioma in idiomas_soportados() else IDIOMA_POR_DEFECTO
+
+
+def tabla_idioma(idioma: str) -> Mapping[str, str]:
+    """Tabla congelada de un idioma ya resuelto"""
+    return TABLAS.get(idioma, TABLAS[IDIOMA_POR_DEFECTO])
+
+
+@lru_cache(maxsize=None)
+def traductor(idioma: str) -> Callable[[str], str]:
+    """Función de traducción de un idioma ya resuelto (una por idioma, compartida)"""
+    tabla = tabla_idioma(idioma)
+
+    def traducir(text: str) -> str:
+        return tabla.get(text, text)
+    return traducir
+
+
+def idioma_de_request(request) -> str:
+    """
+    Idioma de la request, en orden: sesión, cookie, idioma activo de Django.
+    Se calcula una vez y queda guardado en la request.
+    """
+    idioma = getattr(request, '_idioma_traducciones', None)
+    if idioma is not None:
+        return idioma
+
+    codigo = None
+    session = getattr(request, 'session', None)
+    if session:
+        codigo = session.get('django_language') or session.get('language')
+    if not codigo:
+        cookies = getattr(request, 'COOKIES', {})
+        codigo = (cookies.get(getattr(settings, 'LANGUAGE_COOKIE_NAME', 'django_language'))
+                  or cookies.get('django_language') or cookies.get('language'))
+    idioma = resolver_idioma(codigo or get_language())
+    request._idioma_traducciones = idioma
+    return idioma
+
+
 def translate(text: str, language: str = None) -> str:
     """
     Traduce un texto al idioma actual o especificado
@@ -134,20 +206,10 @@ def translate(text: str, language: str = None) -> str:
     Returns:
         str: Texto traducido o el texto original si no hay traducción
     """
-    if language is None:
-        language = get_language() or 'es'
-    
-    # Obtener solo el código base del idioma (ej: 'es' de 'es-es')
-    lang_code = language.split('-')[0] if '-' in language else language
-    
-    # Obtener traducciones para el idioma
-    translations = TRANSLATIONS.get(lang_code, TRANSLATIONS['es'])
-    
-    # Retornar traducción o texto original
-    return translations.get(text, text)
+    return traductor(resolver_idioma(language or get_language()))(text)
 
 
-def get_translations_dict(language: str = None) -> dict:
+def get_translations_dict(language: str = None) -> Mapping[str, str]:
     """
     Obtiene el diccionario completo de traducciones para un idioma
     
@@ -155,11 +217,6 @@ def get_translations_dict(language: str = None) -> dict:
         language: Idioma (opcional, usa el idioma actual si no se especifica)
         
     Returns:
-        dict: Diccionario de traducciones
+        Mapping: Diccionario de traducciones (solo lectura)
     """
-    if language is None:
-        language = get_language() or 'es'
-    
-    lang_code = language.split('-')[0] if '-' in language else language
-    return TRANSLATIONS.get(lang_code, TRANSLATIONS['es'])
-
+    return tabla_idioma(resolver_idioma(language or get_language()))
@@ -80,7 +80,9 @@ urlpatterns = [
     # Punto de Venta (POS)
     path('pos/', views_pos.punto_venta, name='punto_venta'),
     path('pos/buscar-producto/', views_pos.buscar_producto_pos, name='buscar_producto_pos'),
+    path('pos/catalogo/', views_pos.sincronizar_catalogo_pos, name='sincronizar_catalogo_pos'),
     path('pos/procesar-venta/', views_pos.procesar_venta, name='procesar_venta'),
+    path('pos/ventas-pendientes/', views_pos.sincronizar_ventas_pos, name='sincronizar_ventas_pos'),
     path('ventas/', views_pos.listar_ventas, name='listar_ventas'),
     path('ventas/limpiar-historial/', views_pos.limpiar_historial_ventas, name='limpiar_historial_ventas'),
     path('ventas/<int:venta_id>/', views_pos.detalle_venta, name='detalle_venta'),
@@ -108,6 +110,7 @@ urlpatterns = [
     path('clientes/<int:cliente_id>/cuenta/', views_cuentas_cobrar.crear_cuenta_cobrar, name='crear_cuenta_cobrar_cliente'),
     path('cuentas-cobrar/<int:cuenta_id>/', views_cuentas_cobrar.detalle_cuenta_cobrar, name='detalle_cuenta_cobrar'),
     path('cuentas-cobrar/<int:cuenta_id>/pago/', views_cuentas_cobrar.registrar_pago, name='registrar_pago'),
+    path('clientes/<int:cliente_id>/pago/', views_cuentas_cobrar.registrar_pago_cliente, name='registrar_pago_cliente'),
     # Almacenes
     path('almacenes/', views_almacenes.listar_almacenes, name='listar_almacenes'),
     path('almacenes/crear/', views_almacenes.crear_almacen, name='crear_almacen'),
@@ -132,6 +135,9 @@ urlpatterns = [
     path('logs/', views_logs_auditoria.listar_logs, name='listar_logs'),
     path('logs/<int:log_id>/', views_logs_auditoria.detalle_log, name='detalle_log'),
     path('logs/exportar/', views_logs_auditoria.exportar_logs, name='exportar_logs'),
+    path('logs/rendimiento/', views_logs_auditoria.rendimiento_vistas, name='rendimiento_vistas'),
+    path('logs/perfiles/', views_logs_auditoria.listar_perfiles, name='listar_perfiles'),
+    path('logs/perfiles/<int:perfil_id>/descargar/', views_logs_auditoria.descargar_perfil, name='descargar_perfil'),
     # Notificaciones
     path('notificaciones/', views_notificaciones.centro_notificaciones, name='centro_notificaciones'),
     path('api/notificaciones/', views_notificaciones.obtener_notificaciones_api, name='obtener_notificaciones_api'),
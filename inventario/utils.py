@@ -1,19 +1,127 @@
 """
 Utilidades compartidas para la aplicación inventario
 """
+import time as _time
 import unicodedata
 import logging
-from typing import Optional, List, Dict, Any
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Optional, List, Dict, Any, Union
 from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.core.cache import cache
 from django.contrib.auth.models import User
 from .models import HistorialCambio, Producto, Categoria
 from .constants import CACHE_TIMEOUT_LARGO
+from .utils_cache import cached_computation
 
 # Logger con formato estructurado
 logger = logging.getLogger('inventario')
 
 
+GRUPO_ADMINISTRADOR = 'Administrador'
+GRUPO_VENDEDOR = 'Vendedor'
+GRUPO_ALMACENERO = 'Almacenero'
+
+
+class Roles:
+    """
+    Roles y permisos de un usuario, cargados una sola vez.
+
+    Los grupos se leen con una consulta al crear el objeto; los permisos,
+    recién la primera vez que se consultan (y también una sola vez).
+    """
+    __slots__ = ('_usuario', 'grupos', 'es_admin', 'es_vendedor', 'es_almacenero', '_permisos')
+
+    def __init__(self, usuario: Optional[User], grupos=frozenset(), es_admin: bool = False):
+        self._usuario = usuario
+        self.grupos = frozenset(grupos)
+        self.es_admin = es_admin
+        self.es_vendedor = es_admin or GRUPO_VENDEDOR in self.grupos
+        self.es_almacenero = es_admin or GRUPO_ALMACENERO in self.grupos
+        self._permisos = None
+
+    @property
+    def permisos(self) -> frozenset:
+        """Permisos 'app_label.codename' (propios y de grupos)"""
+        if self._permisos is None:
+            self._permisos = frozenset(self._usuario.get_all_permissions()) if self._usuario else frozenset()
+        return self._permisos
+
+    def tiene_permiso(self, permiso: str) -> bool:
+        return self.es_admin or permiso in self.permisos
+
+    def __repr__(self):
+        return f'<Roles admin={self.es_admin} grupos={sorted(self.grupos)}>'
+
+
+ROLES_ANONIMO = Roles(None)
+
+# Generación de los grupos de cada usuario (clave None: todos). Sube cuando los
+# grupos cambian desde el lado del grupo (group.user_set.add(...)): ahí la
+# señal sólo trae ids y no los objetos User que tienen roles memorizados.
+_generacion_roles = Counter()
+
+
+def _marca_roles(user: User) -> tuple:
+    return (_generacion_roles[None], _generacion_roles[user.pk])
+
+
+def roles_usuario(user: Optional[User]) -> Roles:
+    """
+    Roles del usuario, memorizados en el propio objeto.
+
+    request.user es un objeto nuevo en cada request, así que los grupos se
+    consultan a lo sumo una vez por request aunque la vista, los permisos de
+    la API y los templates pregunten varias veces.
+
+    Args:
+        user: Usuario de Django (o AnonymousUser / None)
+
+    Returns:
+        Roles: Roles del usuario
+    """
+    if not user or not user.is_authenticated:
+        return ROLES_ANONIMO
+    roles = getattr(user, '_roles_cache', None)
+    if roles is not None and getattr(user, '_roles_marca', None) != _marca_roles(user):
+        limpiar_roles(user)
+        roles = None
+    if roles is None:
+        grupos = frozenset(user.groups.values_list('name', flat=True))
+        # Compatibilidad: el usuario 'bossa' y los superusuarios siempre son admin
+        es_admin = user.username == 'bossa' or user.is_superuser or GRUPO_ADMINISTRADOR in grupos
+        roles = Roles(user, grupos, es_admin)
+        user._roles_cache = roles
+        user._roles_marca = _marca_roles(user)
+    return roles
+
+
+def limpiar_roles(user: Optional[User]) -> None:
+    """Descarta los roles memorizados (p.ej. después de cambiar los grupos del usuario)"""
+    if user is None:
+        return
+    for atributo in ('_roles_cache', '_perm_cache', '_user_perm_cache', '_group_perm_cache'):
+        try:
+            delattr(user, atributo)
+        except AttributeError:
+            pass
+
+
+def invalidar_roles_usuarios(ids=None) -> None:
+    """
+    Deja obsoletos los roles memorizados de esos usuarios en cualquier objeto
+    User del proceso (se recargan en la próxima consulta).
+
+    Args:
+        ids: Ids de los usuarios afectados (None: todos)
+    """
+    for clave in (ids if ids is not None else [None]):
+        _generacion_roles[clave] += 1
+
+
 def es_admin_bossa(user: User) -> bool:
     """
     Verifica si el usuario es el admin bossa o tiene permisos de administrador
@@ -29,22 +137,7 @@ def es_admin_bossa(user: User) -> bool:
     Returns:
         bool: True si es admin, False en caso contrario
     """
-    if not user or not user.is_authenticated:
-        return False
-    
-    # Compatibilidad: usuario 'bossa' siempre es admin
-    if user.username == 'bossa':
-        return True
-    
-    # Verificar si es superuser
-    if user.is_superuser:
-        return True
-    
-    # Verificar si está en el grupo Administrador
-    if user.groups.filter(name='Administrador').exists():
-        return True
-    
-    return False
+    return roles_usuario(user).es_admin
 
 
 def tiene_permiso(user: User, permiso_codename: str, model_class=None) -> bool:
@@ -59,36 +152,21 @@ def tiene_permiso(user: User, permiso_codename: str, model_class=None) -> bool:
     Returns:
         bool: True si tiene el permiso, False en caso contrario
     """
-    if not user or not user.is_authenticated:
-        return False
-    
-    # Superuser y admin bossa tienen todos los permisos
-    if es_admin_bossa(user):
-        return True
-    
-    # Verificar permiso directamente
+    roles = roles_usuario(user)
     if model_class:
-        from django.contrib.contenttypes.models import ContentType
-        ct = ContentType.objects.get_for_model(model_class)
-        permiso = f"{ct.app_label}.{permiso_codename}"
-        return user.has_perm(permiso)
-    
-    # Verificar permiso genérico
-    return user.has_perm(permiso_codename)
+        # El app_label sale de los metadatos del modelo, sin pasar por ContentType
+        return roles.tiene_permiso(f"{model_class._meta.app_label}.{permiso_codename}")
+    return roles.tiene_permiso(permiso_codename)
 
 
 def es_vendedor(user: User) -> bool:
     """Verifica si el usuario es vendedor"""
-    if not user or not user.is_authenticated:
-        return False
-    return user.groups.filter(name='Vendedor').exists() or es_admin_bossa(user)
+    return roles_usuario(user).es_vendedor
 
 
 def es_almacenero(user: User) -> bool:
     """Verifica si el usuario es almacenero"""
-    if not user or not user.is_authenticated:
-        return False
-    return user.groups.filter(name='Almacenero').exists() or es_admin_bossa(user)
+    return roles_usuario(user).es_almacenero
 
 
 def normalizar_texto(texto: Optional[str]) -> str:
@@ -197,23 +275,88 @@ def calcular_ganancia_unitaria(precio_venta: float, precio_compra: Optional[floa
     return None
 
 
+def version_cache(espacio: str) -> int:
+    """
+    Versión vigente de un espacio de claves de caché (p.ej. 'catalogo')
+    
+    La primera versión sale del reloj, así que si el caché se vacía no se
+    vuelve a entregar una versión ya usada (claves, fragmentos, ETags).
+    
+    Args:
+        espacio: Nombre del espacio
+        
+    Returns:
+        int: Versión actual
+    """
+    return cache.get_or_set(f'version:{espacio}', lambda: int(_time.time() * 1000), None)
+
+
+def clave_cache(espacio: str, *partes: Any) -> str:
+    """
+    Clave versionada: 'catalogo:v3:stats_inicio'. Al invalidar el espacio
+    cambia la versión y todas sus claves quedan obsoletas de una vez (las
+    viejas vencen solas).
+    
+    Args:
+        espacio: Nombre del espacio
+        *partes: Resto de la clave
+        
+    Returns:
+        str: Clave para usar con cache.get/set
+    """
+    return ':'.join([espacio, f'v{version_cache(espacio)}', *map(str, partes)])
+
+
+def _incrementar_version(espacio: str) -> None:
+    try:
+        cache.incr(f'version:{espacio}')
+    except ValueError:
+        cache.set(f'version:{espacio}', int(_time.time() * 1000), None)
+    cache.set(f'modificado:{espacio}', _time.time(), None)
+
+
+def invalidar_espacio_cache(espacio: str) -> None:
+    """
+    Invalida todas las claves de un espacio incrementando su versión
+    
+    Dentro de una transacción se vuelve a incrementar al confirmarla: lo que
+    otra request haya cacheado mientras tanto (con los datos sin confirmar
+    todavía invisibles) queda obsoleto también.
+    
+    Args:
+        espacio: Nombre del espacio
+        
+    Returns:
+        None
+    """
+    _incrementar_version(espacio)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _incrementar_version(espacio))
+    logger.debug(f'Espacio de caché invalidado: {espacio}')
+
+
+def _cargar_categorias() -> List[Dict[str, Any]]:
+    categorias = list(
+        Categoria.objects.all()
+        .order_by('nombre')
+        .values('id', 'nombre', 'color', 'descripcion')
+    )
+    logger.debug(f'Categorías cacheadas: {len(categorias)} categorías')
+    return categorias
+
+
 def get_categorias_cached() -> List[Dict[str, Any]]:
     """
     Obtiene categorías desde caché o base de datos
     
+    Si varias requests encuentran el caché vacío o vencido a la vez, sólo una
+    consulta la base y el resto espera o recibe el valor anterior
+    (ver utils_cache.cached_computation).
+    
     Returns:
         List[Dict]: Lista de categorías con sus datos
     """
-    categorias = cache.get('categorias_list')
-    if categorias is None:
-        categorias = list(
-            Categoria.objects.all()
-            .order_by('nombre')
-            .values('id', 'nombre', 'color', 'descripcion')
-        )
-        cache.set('categorias_list', categorias, CACHE_TIMEOUT_LARGO)
-        logger.debug(f'Categorías cacheadas: {len(categorias)} categorías')
-    return categorias
+    return cached_computation('categorias_list', _cargar_categorias, CACHE_TIMEOUT_LARGO)
 
 
 def invalidar_cache_categorias() -> None:
@@ -226,3 +369,38 @@ def invalidar_cache_categorias() -> None:
     cache.delete('categorias_list')
     logger.debug('Cache de categorías invalidado')
 
+
+def _como_fecha(valor: Union[date, str, None]) -> Optional[date]:
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, str):
+        try:
+            return parse_date(valor.strip())
+        except ValueError:
+            return None
+    return valor
+
+
+def rango_fechas(campo: str, desde: Union[date, str, None] = None,
+                 hasta: Union[date, str, None] = None) -> Q:
+    """
+    Filtro por días completos sobre un DateTimeField, en la zona horaria actual.
+
+    Equivale a campo__date__gte=desde / campo__date__lte=hasta, pero compara
+    la columna directamente ([desde 00:00, hasta+1 00:00)), así la consulta
+    usa los índices sobre `campo` en vez de convertir cada fila a fecha.
+
+    Args:
+        campo: Nombre del campo (p.ej. 'fecha' o 'venta__fecha')
+        desde, hasta: Fechas (date o 'YYYY-MM-DD'); vacías o inválidas se ignoran
+
+    Returns:
+        Q: Filtro combinable con .filter()
+    """
+    filtro = Q()
+    desde, hasta = _como_fecha(desde), _como_fecha(hasta)
+    if desde:
+        filtro &= Q(**{f'{campo}__gte': timezone.make_aware(datetime.combine(desde, time.min))})
+    if hasta:
+        filtro &= Q(**{f'{campo}__lt': timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))})
+    return filtro
@@ -0,0 +1,170 @@
+"""
+Cálculos caros cacheados sin estampidas
+
+cached_computation() guarda junto al valor cuándo vence y cuánto tardó en
+calcularse, y con eso evita que el vencimiento del caché mande a todas las
+requests a recalcular a la vez:
+
+- Refresco anticipado probabilístico (XFetch): poco antes de vencer, cada
+  lectura tiene una probabilidad creciente de recalcular, mayor cuanto más
+  caro es el cálculo. Así el valor suele renovarse antes de vencer.
+- Servir vencido mientras se revalida: el valor queda en el caché un rato más
+  (`margen_stale`) después de vencer. Mientras una request recalcula, las
+  demás reciben el valor anterior.
+- Candado por clave: sólo quien lo obtiene recalcula. El candado es el caché
+  compartido (add atómico en Redis); con un caché local por proceso se usa un
+  advisory lock de PostgreSQL, y en otros motores un lock del proceso.
+- En frío (sin valor) el resto espera a que el primero termine.
+"""
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+
+logger = logging.getLogger('inventario')
+
+# Segundos como máximo que una request espera a que otra termine el cálculo
+ESPERA_CALCULO = 15
+INTERVALO_ESPERA = 0.05
+
+_locks_proceso = weakref.WeakValueDictionary()
+_lock_locks = threading.Lock()
+
+
+@dataclass
+class Entrada:
+    """Lo que se guarda en el caché: el valor y cuándo/cuánto costó calcularlo"""
+    valor: Any
+    vence: float
+    duracion: float
+
+
+def cache_compartido() -> bool:
+    """
+    True si el caché por defecto es compartido entre procesos (Redis, dos
+    niveles). `cache` es un proxy: se mira el backend real de caches['default'].
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _lock_del_proceso(clave: str) -> threading.Lock:
+    with _lock_locks:
+        lock = _locks_proceso.get(clave)
+        if lock is None:
+            lock = threading.Lock()
+            _locks_proceso[clave] = lock
+        return lock
+
+
+def _id_advisory(clave: str) -> int:
+    return int.from_bytes(hashlib.blake2b(clave.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+@contextmanager
+def candado(clave: str, esperar: bool):
+    """
+    Candado por clave entre procesos. Devuelve True si se obtuvo.
+
+    Args:
+        clave: Clave del cálculo
+        esperar: Si es False, no bloquea (devuelve False si otro lo tiene)
+    """
+    limite = time.monotonic() + ESPERA_CALCULO
+    if cache_compartido():
+        token, clave_candado = uuid.uuid4().hex, f'{clave}:candado'
+        obtenido = cache.add(clave_candado, token, ESPERA_CALCULO)
+        while not obtenido and esperar and time.monotonic() < limite:
+            time.sleep(INTERVALO_ESPERA)
+            obtenido = cache.add(clave_candado, token, ESPERA_CALCULO)
+        try:
+            yield obtenido
+        finally:
+            if obtenido and cache.get(clave_candado) == token:
+                cache.delete(clave_candado)
+    elif connection.vendor == 'postgresql':
+        identificador = _id_advisory(clave)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [identificador])
+            obtenido = cursor.fetchone()[0]
+            while not obtenido and esperar and time.monotonic() < limite:
+                time.sleep(INTERVALO_ESPERA)
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [identificador])
+                obtenido = cursor.fetchone()[0]
+        try:
+            yield obtenido
+        finally:
+            if obtenido:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [identificador])
+    else:
+        lock = _lock_del_proceso(clave)
+        obtenido = lock.acquire(timeout=ESPERA_CALCULO) if esperar else lock.acquire(blocking=False)
+        try:
+            yield obtenido
+        finally:
+            if obtenido:
+                lock.release()
+
+
+def _guardar(clave: str, calcular: Callable[[], Any], timeout: int, margen_stale: int) -> Any:
+    inicio = time.monotonic()
+    valor = calcular()
+    duracion = time.monotonic() - inicio
+    cache.set(clave, Entrada(valor, time.time() + timeout, duracion), timeout + margen_stale)
+    logger.debug(f'Cálculo cacheado {clave}: {duracion * 1000:.0f} ms')
+    return valor
+
+
+def _debe_refrescar(entrada: Entrada, beta: float) -> bool:
+    """XFetch: vence "antes" con probabilidad proporcional al costo del cálculo"""
+    adelanto = entrada.duracion * beta * -math.log(1.0 - random.random())
+    return time.time() + adelanto >= entrada.vence
+
+
+def cached_computation(clave: str, calcular: Callable[[], Any], timeout: int = 300,
+                       margen_stale: Optional[int] = None, beta: float = 1.0) -> Any:
+    """
+    Devuelve el valor cacheado de `calcular()` sin estampidas al vencer.
+
+    Args:
+        clave: Clave del caché
+        calcular: Función sin argumentos que calcula el valor
+        timeout: Segundos de validez del valor
+        margen_stale: Segundos que se sigue sirviendo vencido mientras otro
+            recalcula (por defecto, igual a timeout)
+        beta: Agresividad del refresco anticipado (0 lo desactiva)
+
+    Returns:
+        El valor (recién calculado, vigente o vencido en revalidación)
+    """
+    margen_stale = timeout if margen_stale is None else margen_stale
+    entrada = cache.get(clave)
+    if isinstance(entrada, Entrada):
+        if not _debe_refrescar(entrada, beta):
+            return entrada.valor
+        with candado(clave, esperar=False) as obtenido:
+            if obtenido:
+                return _guardar(clave, calcular, timeout, margen_stale)
+        # Otro lo está recalculando: servir el valor anterior
+        return entrada.valor
+
+    # En frío: uno calcula y los demás esperan su resultado
+    with candado(clave, esperar=True) as obtenido:
+        entrada = cache.get(clave)
+        if isinstance(entrada, Entrada) and entrada.vence > time.time():
+            return entrada.valor
+        if not obtenido:
+            logger.warning(f'Tiempo de espera agotado para el cálculo {clave}; se calcula sin candado')
+        return _guardar(clave, calcular, timeout, margen_stale)
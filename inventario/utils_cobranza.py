@@ -0,0 +1,433 @@
+"""
+Utilidades de cobranza: antigüedad de saldos, marcado de cuentas vencidas
+y aplicación de pagos de clientes
+"""
+import hashlib
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Dict, Any, Iterable, List
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction, IntegrityError
+from django.db.models import Q, F, Sum, Count, DecimalField, Case, When, Value, CharField
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .constants import (
+    TRAMOS_ANTIGUEDAD, CACHE_TIMEOUT_DEFAULT,
+    ESTADO_CUENTA_PARCIAL, ESTADO_CUENTA_PAGADO, ESTADO_CUENTA_VENCIDO,
+)
+from .models import Cliente, CuentaPorCobrar, PagoCliente, NotificacionUsuario
+from .utils import invalidar_espacio_cache
+from .utils_cache import cached_computation
+
+logger = logging.getLogger('inventario')
+
+CACHE_KEY_RESUMEN_ANTIGUEDAD = 'cobranza_resumen_antiguedad'
+
+
+def _filtro_tramo(hoy: date, dias_min: Optional[int], dias_max: Optional[int]) -> Q:
+    """Traduce un tramo de días de atraso a un filtro sobre fecha_vencimiento"""
+    filtro = Q()
+    if dias_min is not None:
+        filtro &= Q(fecha_vencimiento__lte=hoy - timedelta(days=dias_min))
+    if dias_max is not None:
+        filtro &= Q(fecha_vencimiento__gte=hoy - timedelta(days=dias_max))
+    return filtro
+
+
+def calcular_antiguedad_saldos(hoy: Optional[date] = None, cuentas=None) -> Dict[str, Any]:
+    """
+    Agrupa el saldo de las cuentas abiertas por cliente y tramo de antigüedad
+    en una sola consulta (agregación condicional con GROUP BY cliente).
+
+    Args:
+        hoy: Fecha de referencia (por defecto, hoy)
+        cuentas: QuerySet de CuentaPorCobrar a considerar (por defecto, todas)
+
+    Returns:
+        Dict con 'clientes' (una fila por cliente, ordenadas por saldo total),
+        'totales' (suma de cada tramo sobre todos los clientes) y 'por_tramo'
+        (los mismos totales como lista, para iterar en templates)
+    """
+    hoy = hoy or timezone.now().date()
+    cuentas = CuentaPorCobrar.objects.all() if cuentas is None else cuentas
+    saldo = F('monto_total') - F('monto_pagado')
+    salida = DecimalField(max_digits=14, decimal_places=0)
+
+    agregados = {
+        clave: Sum(saldo, filter=_filtro_tramo(hoy, dias_min, dias_max), output_field=salida)
+        for clave, _, dias_min, dias_max in TRAMOS_ANTIGUEDAD
+    }
+    filas = (
+        cuentas.filter(estado__in=CuentaPorCobrar.ESTADOS_ABIERTOS)
+        .order_by()
+        .values('cliente_id', 'cliente__nombre')
+        .annotate(cuentas=Count('id'), total=Sum(saldo, output_field=salida), **agregados)
+        .order_by('-total')
+    )
+
+    claves = [clave for clave, _, _, _ in TRAMOS_ANTIGUEDAD]
+    totales = {clave: Decimal(0) for clave in claves + ['total']}
+    totales['cuentas'] = 0
+    clientes = []
+    for fila in filas:
+        for clave in claves + ['total']:
+            fila[clave] = fila[clave] or Decimal(0)
+            totales[clave] += fila[clave]
+        totales['cuentas'] += fila['cuentas']
+        clientes.append(fila)
+
+    return {
+        'fecha': hoy,
+        'tramos': [(clave, etiqueta) for clave, etiqueta, _, _ in TRAMOS_ANTIGUEDAD],
+        'clientes': clientes,
+        'totales': totales,
+        'por_tramo': [
+            {'clave': clave, 'etiqueta': etiqueta, 'monto': totales[clave]}
+            for clave, etiqueta, _, _ in TRAMOS_ANTIGUEDAD
+        ],
+    }
+
+
+def obtener_resumen_antiguedad(limite_clientes: int = 10) -> Dict[str, Any]:
+    """
+    Resumen de antigüedad cacheado para el dashboard y los reportes programados
+
+    Args:
+        limite_clientes: Cantidad de clientes con mayor saldo a incluir
+
+    Returns:
+        Dict con 'totales', 'por_tramo', 'tramos' y 'top_clientes'
+    """
+    # Se cachea la lista completa (ordenada por saldo) y se recorta al leer:
+    # así cada llamador recibe su propio límite
+    antiguedad = cached_computation(CACHE_KEY_RESUMEN_ANTIGUEDAD, calcular_antiguedad_saldos, CACHE_TIMEOUT_DEFAULT)
+    return {
+        'fecha': antiguedad['fecha'],
+        'tramos': antiguedad['tramos'],
+        'totales': antiguedad['totales'],
+        'por_tramo': antiguedad['por_tramo'],
+        'top_clientes': antiguedad['clientes'][:limite_clientes],
+        'clientes_con_saldo': len(antiguedad['clientes']),
+    }
+
+
+def invalidar_cache_antiguedad() -> None:
+    """Invalida el resumen de antigüedad (tras pagos, nuevas cuentas, etc.)"""
+    cache.delete(CACHE_KEY_RESUMEN_ANTIGUEDAD)
+
+
+def formatear_resumen_antiguedad(resumen: Dict[str, Any]) -> str:
+    """Texto plano del resumen de antigüedad (para emails de reportes programados)"""
+    lineas = [f"Antigüedad de saldos al {resumen['fecha'].strftime('%d/%m/%Y')}:"]
+    for clave, etiqueta in resumen['tramos']:
+        lineas.append(f"  {etiqueta}: ${resumen['totales'][clave]:,.0f}")
+    lineas.append(f"  Total por cobrar: ${resumen['totales']['total']:,.0f} ({resumen['totales']['cuentas']} cuentas)")
+    if resumen['top_clientes']:
+        lineas.append('Clientes con mayor saldo:')
+        for fila in resumen['top_clientes']:
+            lineas.append(f"  {fila['cliente__nombre']}: ${fila['total']:,.0f}")
+    return '\n'.join(lineas)
+
+
+def _usuarios_cobranza():
+    """Usuarios que reciben las alertas de cuentas vencidas"""
+    return User.objects.filter(
+        Q(username='bossa') | Q(is_superuser=True) | Q(groups__name='Administrador'),
+        is_active=True
+    ).distinct()
+
+
+def marcar_cuentas_vencidas(hoy: Optional[date] = None, notificar: bool = True) -> Dict[str, Any]:
+    """
+    Marca como 'vencido' en bloque las cuentas pendientes/parciales cuyo
+    vencimiento ya pasó, y deja una alerta por usuario de cobranza.
+
+    El UPDATE masivo no dispara signals; no hace falta porque 'vencido' sigue
+    contando para el saldo del cliente (ver ESTADOS_CUENTA_ABIERTA).
+
+    Args:
+        hoy: Fecha de referencia (por defecto, hoy)
+        notificar: Si True, crea NotificacionUsuario con el resumen
+
+    Returns:
+        Dict con 'cuentas' (cantidad marcada) y 'monto' (saldo vencido nuevo)
+    """
+    hoy = hoy or timezone.now().date()
+    por_vencer = CuentaPorCobrar.objects.filter(
+        estado__in=['pendiente', 'parcial'],
+        fecha_vencimiento__lt=hoy,
+    )
+
+    with transaction.atomic():
+        ids = list(por_vencer.select_for_update().values_list('id', flat=True))
+        if not ids:
+            return {'cuentas': 0, 'monto': Decimal(0)}
+
+        nuevas = CuentaPorCobrar.objects.filter(pk__in=ids)
+        monto = nuevas.aggregate(
+            total=Sum(F('monto_total') - F('monto_pagado'), output_field=DecimalField(max_digits=14, decimal_places=0))
+        )['total'] or Decimal(0)
+        nuevas.update(estado=ESTADO_CUENTA_VENCIDO)
+
+        if notificar:
+            usuarios = list(_usuarios_cobranza())
+            NotificacionUsuario.objects.bulk_create([
+                NotificacionUsuario(
+                    usuario=usuario,
+                    tipo='cuenta_vencida',
+                    titulo=f'{len(ids)} cuenta(s) por cobrar vencida(s)',
+                    mensaje=f'Se marcaron {len(ids)} cuenta(s) como vencidas por un total de ${monto:,.0f}.',
+                    url_relacionada='/cuentas-cobrar/?estado=vencido',
+                    datos_adicionales={'cuenta_ids': ids[:500], 'monto': float(monto), 'fecha': hoy.isoformat()},
+                )
+                for usuario in usuarios
+            ])
+            # bulk_create no dispara post_save: el polling de notificaciones se invalida a mano
+            for usuario in usuarios:
+                invalidar_espacio_cache(f'notificaciones:{usuario.pk}')
+
+    invalidar_cache_antiguedad()
+    logger.info(f'Cuentas marcadas como vencidas: {len(ids)} (${monto:,.0f})')
+    return {'cuentas': len(ids), 'monto': monto}
+
+
+def _pagos_existentes(clave_idempotencia: Optional[str]) -> List[PagoCliente]:
+    """Pagos ya registrados con la misma clave de idempotencia"""
+    if not clave_idempotencia:
+        return []
+    return list(PagoCliente.objects.filter(clave_idempotencia=clave_idempotencia).order_by('id'))
+
+
+def _resultado_pago(pagos: List[PagoCliente], duplicado: bool) -> Dict[str, Any]:
+    return {
+        'pagos': pagos,
+        'monto_aplicado': sum((pago.monto for pago in pagos), Decimal(0)),
+        'duplicado': duplicado,
+    }
+
+
+def aplicar_pago_cliente(cliente_id: int, monto, fecha_pago: Optional[date] = None,
+                         metodo_pago: str = 'efectivo', referencia: Optional[str] = None,
+                         notas: Optional[str] = None, usuario=None, cuenta_ids: Optional[Iterable[int]] = None,
+                         clave_idempotencia: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Aplica un pago de un cliente a sus cuentas abiertas, de la más antigua a la
+    más nueva, dentro de una transacción.
+
+    Las cuentas se bloquean (select_for_update) siempre en el mismo orden para
+    evitar deadlocks, y monto_pagado se incrementa con F() para que dos pagos
+    simultáneos no se pisen. Si llega de nuevo la misma clave de idempotencia
+    (doble envío del formulario, reintento de una importación) se devuelven los
+    pagos ya registrados sin volver a aplicarlos.
+
+    Args:
+        cliente_id: ID del cliente que paga
+        monto: Monto total del pago
+        fecha_pago: Fecha del pago (por defecto, hoy)
+        metodo_pago: Uno de PagoCliente.METODO_PAGO_CHOICES
+        referencia: Número de cheque, transferencia, etc.
+        notas: Notas del pago
+        usuario: Usuario que registra el pago
+        cuenta_ids: Limita la aplicación a estas cuentas (por defecto, todas las abiertas)
+        clave_idempotencia: Identificador único del envío
+
+    Returns:
+        Dict con 'pagos' (un PagoCliente por cuenta afectada), 'monto_aplicado'
+        y 'duplicado' (True si la clave ya se había procesado)
+
+    Raises:
+        ValueError: Si el monto no es positivo o supera el saldo de las cuentas
+    """
+    try:
+        monto = Decimal(str(monto))
+    except (InvalidOperation, TypeError):
+        raise ValueError('Monto inválido.')
+    if monto <= 0:
+        raise ValueError('El monto debe ser mayor a cero.')
+    fecha_pago = fecha_pago or timezone.now().date()
+
+    try:
+        with transaction.atomic():
+            cuentas = CuentaPorCobrar.objects.select_for_update().filter(
+                cliente_id=cliente_id,
+                estado__in=CuentaPorCobrar.ESTADOS_ABIERTOS,
+            )
+            if cuenta_ids is not None:
+                cuentas = cuentas.filter(pk__in=list(cuenta_ids))
+            cuentas = list(cuentas.order_by('fecha_vencimiento', 'fecha_emision', 'id'))
+
+            # Con las cuentas del cliente bloqueadas, un envío repetido espera
+            # aquí al primero y encuentra sus pagos
+            existentes = _pagos_existentes(clave_idempotencia)
+            if existentes:
+                return _resultado_pago(existentes, duplicado=True)
+
+            saldo_total = sum((cuenta.saldo_pendiente for cuenta in cuentas), Decimal(0))
+            if monto > saldo_total:
+                raise ValueError(f'El monto no puede ser mayor al saldo pendiente (${saldo_total:,.0f}).')
+
+            pagos = []
+            restante = monto
+            for cuenta in cuentas:
+                if restante <= 0:
+                    break
+                parte = min(restante, cuenta.saldo_pendiente)
+                if parte <= 0:
+                    continue
+                restante -= parte
+                pagos.append(PagoCliente(
+                    cuenta_por_cobrar=cuenta,
+                    monto=parte,
+                    fecha_pago=fecha_pago,
+                    metodo_pago=metodo_pago,
+                    referencia=referencia,
+                    notas=notas,
+                    usuario=usuario,
+                    clave_idempotencia=clave_idempotencia,
+                ))
+                # El estado se resuelve en el mismo UPDATE; un abono no quita la marca de vencida
+                nuevo_pagado = F('monto_pagado') + parte
+                CuentaPorCobrar.objects.filter(pk=cuenta.pk).update(
+                    monto_pagado=nuevo_pagado,
+                    estado=Case(
+                        When(monto_total__lte=nuevo_pagado, then=Value(ESTADO_CUENTA_PAGADO)),
+                        When(estado=ESTADO_CUENTA_VENCIDO, then=Value(ESTADO_CUENTA_VENCIDO)),
+                        default=Value(ESTADO_CUENTA_PARCIAL),
+                        output_field=CharField(),
+                    ),
+                )
+
+            # bulk_create no pasa por PagoCliente.save(): las cuentas ya se actualizaron arriba
+            PagoCliente.objects.bulk_create(pagos)
+            Cliente.ajustar_totales(cliente_id, saldo_pendiente=-monto)
+            transaction.on_commit(invalidar_cache_antiguedad)
+    except IntegrityError:
+        # Otro proceso registró la misma clave entre la verificación y el INSERT
+        existentes = _pagos_existentes(clave_idempotencia)
+        if existentes:
+            return _resultado_pago(existentes, duplicado=True)
+        raise
+
+    logger.info(f'Pago de ${monto:,.0f} aplicado a {len(pagos)} cuenta(s) del cliente {cliente_id}')
+    return _resultado_pago(pagos, duplicado=False)
+
+
+def clave_idempotencia_importacion(fila: Dict[str, Any], origen: str, numero: int) -> str:
+    """
+    Clave para una fila importada sin clave propia
+
+    Con número de comprobante o referencia, la clave es cliente + referencia:
+    el mismo pago no se registra dos veces aunque venga en otro archivo. Sin
+    referencia, es el archivo + número de fila: dos pagos iguales (mismo
+    cliente, monto, fecha y método) en filas distintas son dos pagos.
+
+    Args:
+        fila: Fila del archivo
+        origen: Huella del archivo (ver huella_importacion)
+        numero: Número de fila (desde 1)
+    """
+    referencia = str(fila.get('referencia') or '').strip()
+    if referencia:
+        partes = ['ref', str(fila.get('cliente_id') or ''), referencia]
+    else:
+        partes = ['fila', origen, str(numero)]
+    return 'imp-' + hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()[:60]
+
+
+def huella_importacion(filas: List[Dict[str, Any]]) -> str:
+    """Huella del contenido de un lote de filas (si no se tiene la del archivo)"""
+    contenido = '\n'.join('|'.join(f'{k}={fila[k]}' for k in sorted(fila)) for fila in filas)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def fecha_importacion(valor) -> Optional[date]:
+    """
+    Fecha de pago de una fila importada: ISO (AAAA-MM-DD) o DD/MM/AAAA.
+
+    Args:
+        valor: Texto de la columna (o una fecha ya convertida)
+
+    Returns:
+        date, o None si la columna está vacía
+
+    Raises:
+        ValueError: Si no es una fecha válida en ninguno de los formatos
+    """
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    valor = str(valor or '').strip()
+    if not valor:
+        return None
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        try:
+            fecha = datetime.strptime(valor, '%d/%m/%Y').date()
+        except ValueError:
+            raise ValueError(f'Fecha de pago inválida: {valor}')
+    return fecha
+
+
+def importar_pagos_clientes(filas: Iterable[Dict[str, Any]], usuario=None,
+                            origen: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Importa pagos en lote aplicando cada fila con aplicar_pago_cliente.
+
+    Cada fila se aplica en su propia transacción: un error no revierte las
+    demás, y reimportar el mismo archivo no duplica pagos (las filas sin
+    'clave_idempotencia' usan su referencia o el archivo y número de fila,
+    ver clave_idempotencia_importacion).
+
+    Args:
+        filas: Dicts con 'cliente_id', 'monto' y opcionalmente 'fecha_pago'
+               (ver fecha_importacion), 'metodo_pago', 'referencia', 'notas' y 'clave_idempotencia'
+        usuario: Usuario que registra los pagos
+        origen: Huella del archivo (por defecto, la del contenido de las filas)
+
+    Returns:
+        Dict con 'aplicados', 'duplicados', 'monto_aplicado' y 'errores'
+        (lista de (número de fila, mensaje))
+    """
+    filas = list(filas)
+    origen = origen or huella_importacion(filas)
+    resultado = {'aplicados': 0, 'duplicados': 0, 'monto_aplicado': Decimal(0), 'errores': []}
+    for numero, fila in enumerate(filas, start=1):
+        if not fila.get('cliente_id'):
+            resultado['errores'].append((numero, 'Cliente no encontrado'))
+            continue
+        try:
+            aplicado = aplicar_pago_cliente(
+                cliente_id=int(fila['cliente_id']),
+                monto=fila['monto'],
+                fecha_pago=fecha_importacion(fila.get('fecha_pago')),
+                metodo_pago=fila.get('metodo_pago') or 'efectivo',
+                referencia=fila.get('referencia') or None,
+                notas=fila.get('notas') or None,
+                usuario=usuario,
+                clave_idempotencia=(fila.get('clave_idempotencia')
+                                    or clave_idempotencia_importacion(fila, origen, numero)),
+            )
+        except KeyError as e:
+            resultado['errores'].append((numero, f'Falta la columna {e}'))
+            continue
+        except (TypeError, ValueError) as e:
+            resultado['errores'].append((numero, str(e)))
+            continue
+        except ValidationError as e:
+            resultado['errores'].append((numero, '; '.join(e.messages)))
+            continue
+        if aplicado['duplicado']:
+            resultado['duplicados'] += 1
+        else:
+            resultado['aplicados'] += 1
+            resultado['monto_aplicado'] += aplicado['monto_aplicado']
+    return resultado
@@ -0,0 +1,177 @@
+"""
+Coincidencia de líneas de factura con productos del catálogo
+
+Se arma un índice en memoria (una consulta) con los SKU y los nombres
+normalizados de los productos activos, y cada línea se resuelve contra él en
+una pasada: SKU exacto, nombre exacto, prefijo y similitud por tokens
+(ponderada por lo raro que es cada token en el catálogo). El índice se
+reutiliza mientras no cambie el catálogo.
+"""
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, List, Sequence
+
+from django.db.models import Count, Max
+
+from .models import Producto
+
+# Desde esta confianza la línea se asigna al producto sin intervención
+CONFIANZA_AUTOMATICA = 90
+# Desde esta confianza se sugiere el producto en la pantalla de edición
+CONFIANZA_SUGERENCIA = 60
+MAX_CANDIDATOS_SIMILITUD = 25
+
+_UNIDADES = re.compile(r'(\d+)\s+(cc|ml|lt|l|kg|gr|g|un|u)\b')
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def _normalizar_para_indice(texto: str) -> str:
+    """
+    Clave de comparación del índice: minúsculas, sin acentos ni signos, con
+    cantidades y unidades juntas ("350 cc" -> "350cc"). Más agresiva que
+    utils.normalizar_texto (la de las búsquedas), que sólo quita tildes.
+    """
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode('ascii').lower()
+    texto = _NO_ALFANUMERICO.sub(' ', texto)
+    return _UNIDADES.sub(r'\1\2', texto).strip()
+
+
+def normalizar_codigo(codigo: str) -> str:
+    """SKU o código de proveedor sin espacios, guiones ni puntos"""
+    return re.sub(r'[^A-Z0-9]', '', (codigo or '').upper())
+
+
+@dataclass(frozen=True)
+class Candidato:
+    """Producto candidato para una línea de factura"""
+    producto_id: int
+    nombre: str
+    confianza: int
+    criterio: str  # 'sku', 'nombre', 'prefijo' o 'similitud'
+
+
+class IndiceProductos:
+    """Índice en memoria de SKU y nombres normalizados del catálogo"""
+
+    def __init__(self, productos):
+        """
+        Args:
+            productos: Iterable de tuplas (id, sku, nombre)
+        """
+        self.nombres: Dict[int, str] = {}
+        self.por_sku: Dict[str, int] = {}
+        self.por_nombre: Dict[str, int] = {}
+        self.tokens: Dict[int, frozenset] = {}
+        self.por_token: Dict[str, set] = defaultdict(set)
+        nombres_ordenados = []
+
+        for producto_id, sku, nombre in productos:
+            self.nombres[producto_id] = nombre
+            if sku:
+                self.por_sku.setdefault(normalizar_codigo(sku), producto_id)
+            normalizado = _normalizar_para_indice(nombre)
+            self.por_nombre.setdefault(normalizado, producto_id)
+            nombres_ordenados.append((normalizado, producto_id))
+            tokens = frozenset(normalizado.split())
+            self.tokens[producto_id] = tokens
+            for token in tokens:
+                self.por_token[token].add(producto_id)
+
+        nombres_ordenados.sort()
+        self._claves_ordenadas = [nombre for nombre, _ in nombres_ordenados]
+        self._ids_ordenados = [producto_id for _, producto_id in nombres_ordenados]
+        total = max(1, len(self.nombres))
+        # Un token presente en pocos productos pesa más que uno común ("cerveza")
+        self.peso = {token: math.log(1 + total / len(ids)) for token, ids in self.por_token.items()}
+
+    @classmethod
+    def desde_catalogo(cls) -> 'IndiceProductos':
+        return cls(Producto.objects.filter(activo=True).values_list('id', 'sku', 'nombre'))
+
+    def _peso(self, token: str) -> float:
+        return self.peso.get(token, math.log(1 + max(1, len(self.nombres))))
+
+    def _por_prefijo(self, descripcion: str) -> List[int]:
+        """Productos cuyo nombre empieza con la descripción (p.ej. texto truncado por el proveedor)"""
+        inicio = bisect_left(self._claves_ordenadas, descripcion)
+        encontrados = []
+        for posicion in range(inicio, min(inicio + 5, len(self._claves_ordenadas))):
+            if not self._claves_ordenadas[posicion].startswith(descripcion):
+                break
+            encontrados.append(self._ids_ordenados[posicion])
+        return encontrados
+
+    def buscar(self, codigo: str = '', descripcion: str = '', limite: int = 3) -> List[Candidato]:
+        """
+        Candidatos para una línea, de mayor a menor confianza (0-100).
+
+        Args:
+            codigo: Código de la línea (se compara con el SKU)
+            descripcion: Descripción de la línea
+            limite: Máximo de candidatos
+        """
+        codigo = normalizar_codigo(codigo)
+        if codigo and codigo in self.por_sku:
+            producto_id = self.por_sku[codigo]
+            return [Candidato(producto_id, self.nombres[producto_id], 100, 'sku')]
+
+        descripcion = _normalizar_para_indice(descripcion)
+        if not descripcion:
+            return []
+        if descripcion in self.por_nombre:
+            producto_id = self.por_nombre[descripcion]
+            return [Candidato(producto_id, self.nombres[producto_id], 95, 'nombre')]
+
+        puntajes: Dict[int, tuple] = {}
+        if len(descripcion) >= 6:
+            for producto_id in self._por_prefijo(descripcion):
+                cobertura = len(descripcion) / max(1, len(_normalizar_para_indice(self.nombres[producto_id])))
+                puntajes[producto_id] = (int(75 + 15 * cobertura), 'prefijo')
+
+        tokens = set(descripcion.split())
+        vistos = defaultdict(float)
+        for token in tokens:
+            for producto_id in self.por_token.get(token, ()):
+                vistos[producto_id] += self._peso(token)
+        mejores = sorted(vistos.items(), key=lambda par: par[1], reverse=True)[:MAX_CANDIDATOS_SIMILITUD]
+        for producto_id, compartido in mejores:
+            union = sum(self._peso(token) for token in tokens | self.tokens[producto_id])
+            jaccard = compartido / union if union else 0
+            parecido = SequenceMatcher(None, descripcion, _normalizar_para_indice(self.nombres[producto_id])).ratio()
+            confianza = int(round(100 * (0.7 * jaccard + 0.3 * parecido) * 0.9))
+            if confianza > puntajes.get(producto_id, (0,))[0]:
+                puntajes[producto_id] = (confianza, 'similitud')
+
+        ordenados = sorted(puntajes.items(), key=lambda par: (-par[1][0], self.nombres[par[0]]))[:limite]
+        return [Candidato(producto_id, self.nombres[producto_id], confianza, criterio)
+                for producto_id, (confianza, criterio) in ordenados]
+
+    def emparejar(self, lineas: Sequence, limite: int = 3) -> List[List[Candidato]]:
+        """Candidatos para cada línea (objetos con .codigo y .descripcion), en el mismo orden"""
+        return [self.buscar(getattr(linea, 'codigo', ''), getattr(linea, 'descripcion', ''), limite)
+                for linea in lineas]
+
+
+_indice_cache: Dict[str, object] = {'version': None, 'indice': None}
+_indice_lock = threading.Lock()
+
+
+def obtener_indice() -> IndiceProductos:
+    """
+    Índice del catálogo activo. Se reconstruye sólo si cambió algún producto
+    (cantidad o última fecha_actualizacion), verificado con una consulta liviana.
+    """
+    datos = Producto.objects.filter(activo=True).aggregate(ultima=Max('fecha_actualizacion'), cantidad=Count('id'))
+    version = f"{datos['cantidad']}-{datos['ultima'].timestamp() if datos['ultima'] else 0}"
+    with _indice_lock:
+        if _indice_cache['version'] != version:
+            _indice_cache['indice'] = IndiceProductos.desde_catalogo()
+            _indice_cache['version'] = version
+        return _indice_cache['indice']
+
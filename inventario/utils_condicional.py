@@ -0,0 +1,119 @@
+"""
+GET condicional (ETag / Last-Modified) para las APIs de lectura
+
+El ETag de una respuesta se arma con la ruta completa, el usuario y la versión
+de los espacios de caché de los que depende (ver utils.version_cache): cada
+alta, edición o borrado que invalida el espacio cambia el ETag. Last-Modified
+es el momento de la última invalidación de esos espacios.
+
+Si nada cambió, el cliente recibe un 304 sin cuerpo y la vista no consulta la
+base: comprobarlo cuesta unas lecturas al caché.
+
+Las versiones viven en el caché, así que sólo sirven si es compartido (Redis):
+con un LocMemCache por proceso, un worker que no atendió la escritura seguiría
+con la versión vieja y respondería 304 con datos desactualizados. En ese caso
+las respuestas se envían completas, sin ETag ni Last-Modified.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from typing import Iterable, List, Optional
+
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .utils import version_cache
+from .utils_cache import cache_compartido
+
+
+def _resolver(request, espacios: Iterable[str]) -> List[str]:
+    """Los espacios por usuario se escriben 'notificaciones:{usuario}'"""
+    usuario = getattr(request, 'user', None)
+    return [espacio.format(usuario=getattr(usuario, 'pk', None)) for espacio in espacios]
+
+
+def etag_espacios(request, espacios: Iterable[str]) -> str:
+    """
+    ETag de la respuesta a `request` según la versión de `espacios`
+
+    Args:
+        request: Request (Django o DRF)
+        espacios: Espacios de caché de los que depende la respuesta
+
+    Returns:
+        str: ETag (sin comillas)
+    """
+    espacios = _resolver(request, espacios)
+    usuario = getattr(request, 'user', None)
+    partes = [request.get_full_path(), str(getattr(usuario, 'pk', ''))]
+    partes += [f'{espacio}={version_cache(espacio)}' for espacio in espacios]
+    return hashlib.blake2b('|'.join(partes).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def modificado_espacios(request, espacios: Iterable[str]) -> Optional[datetime]:
+    """
+    Última invalidación de cualquiera de `espacios`. Si el caché no la
+    recuerda (p.ej. se vació) se toma "ahora" y se guarda: nunca se
+    responde 304 por una fecha que no se conoce.
+
+    Returns:
+        datetime: Fecha en UTC
+    """
+    marcas = []
+    for espacio in _resolver(request, espacios):
+        clave = f'modificado:{espacio}'
+        marca = cache.get(clave)
+        if marca is None:
+            cache.add(clave, time.time(), None)
+            marca = cache.get(clave, time.time())
+        marcas.append(marca)
+    return datetime.fromtimestamp(max(marcas), tz=dt_timezone.utc) if marcas else None
+
+
+def condicional(*espacios: str):
+    """
+    Decorador de vistas GET: agrega ETag y Last-Modified y responde 304 si
+    el cliente ya tiene la versión vigente (sólo con caché compartido, ver
+    arriba). Va debajo de @login_required.
+
+    Las respuestas van con "Cache-Control: private, no-cache": el navegador
+    las guarda pero revalida siempre (sin no-cache, con Last-Modified podría
+    reutilizarlas sin preguntar).
+
+    Args:
+        *espacios: Espacios de caché de los que depende la respuesta
+            ('catalogo', 'notificaciones:{usuario}', ...)
+    """
+    def decorador(vista):
+        vista_condicional = condition(
+            etag_func=lambda request, *args, **kwargs: etag_espacios(request, espacios),
+            last_modified_func=lambda request, *args, **kwargs: modificado_espacios(request, espacios),
+        )(vista)
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if cache_compartido():
+                respuesta = vista_condicional(request, *args, **kwargs)
+            else:
+                respuesta = vista(request, *args, **kwargs)
+            patch_cache_control(respuesta, private=True, no_cache=True)
+            return respuesta
+        return envoltura
+    return decorador
+
+
+class CondicionalMixin:
+    """
+    GET condicional para list y retrieve de un ViewSet de DRF
+
+    Los ViewSets declaran de qué espacios dependen en `espacios_condicionales`.
+    """
+    espacios_condicionales = ()
+
+    def list(self, request, *args, **kwargs):
+        return condicional(*self.espacios_condicionales)(super().list)(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return condicional(*self.espacios_condicionales)(super().retrieve)(request, *args, **kwargs)
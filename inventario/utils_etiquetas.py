@@ -0,0 +1,183 @@
+"""
+Motor de etiquetas: dibuja directamente sobre el canvas de ReportLab
+
+Cada producto se dibuja una sola vez como Form XObject del PDF y las copias
+lo referencian, así 2.000 etiquetas de 50 productos pesan lo mismo que 50.
+Soporta hojas tipo Avery (N etiquetas por página) y rollos (una por página).
+"""
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+from reportlab.graphics.barcode import code128
+from reportlab.lib.pagesizes import letter, A4
+from reportlab.lib.units import inch, mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas as pdf_canvas
+
+
+@dataclass(frozen=True)
+class FormatoEtiqueta:
+    """Geometría de una hoja o rollo de etiquetas (medidas en puntos)"""
+    nombre: str
+    pagina: Tuple[float, float]
+    ancho: float
+    alto: float
+    columnas: int = 1
+    filas: int = 1
+    margen_izquierdo: float = 0
+    margen_superior: float = 0
+    separacion_horizontal: float = 0
+    separacion_vertical: float = 0
+    relleno: float = 0.1 * inch
+    fuente_nombre: int = 9
+    fuente_precio: int = 14
+
+    @property
+    def por_pagina(self) -> int:
+        return self.columnas * self.filas
+
+    @property
+    def es_hoja(self) -> bool:
+        return self.por_pagina > 1
+
+    def posicion(self, indice: int) -> Tuple[float, float]:
+        """Esquina inferior izquierda de la etiqueta número `indice` de la página"""
+        columna = indice % self.columnas
+        fila = indice // self.columnas
+        x = self.margen_izquierdo + columna * (self.ancho + self.separacion_horizontal)
+        y = self.pagina[1] - self.margen_superior - (fila + 1) * self.alto - fila * self.separacion_vertical
+        return x, y
+
+
+FORMATOS_ETIQUETA = {
+    # Rollos: la página es la etiqueta
+    'estandar': FormatoEtiqueta('Rollo 4" x 2"', (4 * inch, 2 * inch), 4 * inch, 2 * inch,
+                                relleno=0.2 * inch, fuente_nombre=10, fuente_precio=14),
+    'compacta': FormatoEtiqueta('Rollo 3" x 1.5"', (3 * inch, 1.5 * inch), 3 * inch, 1.5 * inch,
+                                relleno=0.15 * inch, fuente_nombre=9, fuente_precio=12),
+    'detallada': FormatoEtiqueta('Rollo 4" x 3"', (4 * inch, 3 * inch), 4 * inch, 3 * inch,
+                                 relleno=0.2 * inch, fuente_nombre=12, fuente_precio=18),
+    # Hojas
+    'avery_5160': FormatoEtiqueta('Hoja Carta 30 (Avery 5160)', letter, 2.625 * inch, 1 * inch,
+                                  columnas=3, filas=10, margen_izquierdo=0.1875 * inch, margen_superior=0.5 * inch,
+                                  separacion_horizontal=0.125 * inch, relleno=0.06 * inch,
+                                  fuente_nombre=7, fuente_precio=10),
+    'avery_l7160': FormatoEtiqueta('Hoja A4 21 (Avery L7160)', A4, 63.5 * mm, 38.1 * mm,
+                                   columnas=3, filas=7, margen_izquierdo=7.2 * mm, margen_superior=15.1 * mm,
+                                   separacion_horizontal=2.5 * mm, relleno=2.5 * mm,
+                                   fuente_nombre=8, fuente_precio=12),
+    'a4_65': FormatoEtiqueta('Hoja A4 65 (38.1 x 21.2 mm)', A4, 38.1 * mm, 21.2 * mm,
+                             columnas=5, filas=13, margen_izquierdo=4.7 * mm, margen_superior=10.7 * mm,
+                             separacion_horizontal=2.5 * mm, relleno=1.2 * mm,
+                             fuente_nombre=5, fuente_precio=8),
+}
+
+
+@dataclass(frozen=True)
+class DatosEtiqueta:
+    """Lo que se imprime de un producto (independiente del modelo)"""
+    clave: str
+    nombre: str
+    precio: str
+    sku: str = ''
+
+
+# Los Code128 cacheados guardan el canvas mientras dibujan: un hilo a la vez
+_bloqueo_barras = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def codigo_barras(sku: str, ancho_maximo: float, alto: float):
+    """
+    Code128 del SKU ajustado al ancho disponible. Se cachea por SKU y tamaño:
+    la codificación sólo se calcula la primera vez que se imprime cada producto.
+    """
+    ancho_barra = 0.8 * mm
+    barcode = code128.Code128(sku, barWidth=ancho_barra, barHeight=alto, quiet=False)
+    if barcode.width > ancho_maximo:
+        barcode = code128.Code128(sku, barWidth=ancho_barra * ancho_maximo / barcode.width, barHeight=alto, quiet=False)
+    return barcode
+
+
+def _dibujar_etiqueta(c, formato: FormatoEtiqueta, datos: DatosEtiqueta, incluir_precio: bool, incluir_codigo_barras: bool):
+    """Dibuja una etiqueta con origen en (0, 0) dentro de un Form XObject"""
+    ancho_util = formato.ancho - 2 * formato.relleno
+    y = formato.alto - formato.relleno
+
+    lineas = simpleSplit(datos.nombre, 'Helvetica', formato.fuente_nombre, ancho_util)[:2]
+    c.setFont('Helvetica', formato.fuente_nombre)
+    for linea in lineas:
+        y -= formato.fuente_nombre * 1.15
+        c.drawString(formato.relleno, y, linea)
+
+    if incluir_precio:
+        y -= formato.fuente_precio * 1.2
+        c.setFont('Helvetica-Bold', formato.fuente_precio)
+        c.drawString(formato.relleno, y, datos.precio)
+
+    if incluir_codigo_barras and datos.sku:
+        fuente_sku = max(4, formato.fuente_nombre - 2)
+        alto_barras = min(15 * mm, y - formato.relleno - fuente_sku * 1.4)
+        if alto_barras >= 4 * mm:
+            try:
+                barcode = codigo_barras(datos.sku, ancho_util, round(alto_barras, 1))
+            except Exception:
+                # SKU con caracteres que Code128 no admite
+                return
+            x = formato.relleno + (ancho_util - barcode.width) / 2
+            with _bloqueo_barras:
+                barcode.drawOn(c, x, formato.relleno + fuente_sku * 1.3)
+            c.setFont('Helvetica', fuente_sku)
+            c.drawCentredString(formato.ancho / 2, formato.relleno, datos.sku)
+
+
+def generar_pdf_etiquetas(salida, formato: FormatoEtiqueta, etiquetas: Iterable[Tuple[DatosEtiqueta, int]],
+                          incluir_precio: bool = True, incluir_codigo_barras: bool = True,
+                          posicion_inicial: int = 0) -> int:
+    """
+    Escribe el PDF de etiquetas en `salida` (archivo o buffer).
+
+    Args:
+        salida: Archivo binario donde escribir el PDF
+        formato: Hoja o rollo (ver FORMATOS_ETIQUETA)
+        etiquetas: Pares (DatosEtiqueta, copias)
+        incluir_precio: Imprimir el precio
+        incluir_codigo_barras: Imprimir el código de barras del SKU
+        posicion_inicial: Etiquetas ya usadas en la primera hoja (para reaprovecharla)
+
+    Returns:
+        Cantidad de etiquetas impresas
+    """
+    c = pdf_canvas.Canvas(salida, pagesize=formato.pagina, pageCompression=1)
+    posicion = posicion_inicial % formato.por_pagina if formato.es_hoja else 0
+    impresas = 0
+    formularios: List[str] = []
+
+    for datos, copias in etiquetas:
+        if copias <= 0:
+            continue
+        nombre_form = f'etq{len(formularios)}'
+        c.beginForm(nombre_form, lowerx=0, lowery=0, upperx=formato.ancho, uppery=formato.alto)
+        _dibujar_etiqueta(c, formato, datos, incluir_precio, incluir_codigo_barras)
+        c.endForm()
+        formularios.append(nombre_form)
+
+        for _ in range(copias):
+            if impresas and posicion == 0:
+                c.showPage()
+            x, y = formato.posicion(posicion)
+            c.saveState()
+            c.translate(x, y)
+            c.doForm(nombre_form)
+            c.restoreState()
+            impresas += 1
+            posicion = (posicion + 1) % formato.por_pagina
+
+    if not impresas:
+        c.setFont('Helvetica', 8)
+        c.drawString(formato.relleno, formato.pagina[1] / 2, 'Sin etiquetas para imprimir')
+    c.showPage()
+    c.save()
+    return impresas
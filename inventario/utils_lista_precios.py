@@ -0,0 +1,158 @@
+"""
+Lista de precios en PDF
+
+Los productos se leen con .iterator() ordenados por categoría y se reparten en
+tablas chicas con anchos fijos (ver utils_pdf.tablas_por_bloques).
+El PDF resultante se guarda en disco y se reutiliza mientras no cambien los
+productos de la lista (ni el día).
+"""
+import hashlib
+import logging
+import time
+from itertools import groupby
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Spacer
+
+from .utils import version_cache
+from .utils_pdf import PLANTILLAS, estilo, tablas_por_bloques, renderizar_pdf, archivo_en_cache
+
+logger = logging.getLogger('inventario')
+
+DIAS_CACHE_LISTA = 2
+
+
+def columnas_lista(incluir_precio_compra: bool, incluir_stock: bool):
+    """
+    Encabezados y anchos (en puntos) de la tabla de precios.
+
+    Returns:
+        tuple: (encabezados, anchos)
+    """
+    encabezados, anchos = ['Producto', 'Precio Venta'], [3.2 * inch, 1.1 * inch]
+    if incluir_precio_compra:
+        encabezados += ['Precio Compra', 'Margen %']
+        anchos += [1.1 * inch, 0.8 * inch]
+    if incluir_stock:
+        encabezados.append('Stock')
+        anchos.append(0.6 * inch)
+    return encabezados, anchos
+
+
+def version_lista(productos) -> str:
+    """
+    Versión de los datos de la lista: cambia si se crea, borra o modifica
+    (precio, stock, nombre...) cualquier producto incluido, o si se renombra
+    una categoría (Categoria no tiene fecha de actualización; se usa la
+    versión del espacio de caché 'categorias', que invalidan sus señales).
+    """
+    datos = productos.order_by().aggregate(ultima=Max('fecha_actualizacion'), cantidad=Count('id'))
+    ultima = datos['ultima'].timestamp() if datos['ultima'] else 0
+    return f"{datos['cantidad']}-{ultima:.6f}-c{version_cache('categorias')}"
+
+
+def generar_pdf_lista_precios(salida, productos, titulo: str,
+                              incluir_precio_compra: bool = False, incluir_stock: bool = False) -> int:
+    """
+    Escribe la lista de precios agrupada por categoría.
+
+    Args:
+        salida: Archivo binario donde escribir el PDF
+        productos: QuerySet de Producto ya filtrado
+        titulo: Título del documento
+        incluir_precio_compra: Agregar precio de compra y margen
+        incluir_stock: Agregar columna de stock
+
+    Returns:
+        Cantidad de productos listados
+    """
+    encabezados, anchos = columnas_lista(incluir_precio_compra, incluir_stock)
+    elements = [Paragraph(titulo, estilo('reporte.titulo')), Spacer(1, 0.2 * inch)]
+
+    productos = productos.select_related('categoria').only(
+        'nombre', 'precio', 'precio_compra', 'stock', 'categoria__nombre'
+    ).order_by('categoria__nombre', 'nombre')
+
+    total = 0
+
+    def fila(producto):
+        nonlocal total
+        total += 1
+        datos = [producto.nombre[:50], f"${producto.precio:,.0f}"]
+        if incluir_precio_compra:
+            precio_compra = f"${producto.precio_compra:,.0f}" if producto.precio_compra else '-'
+            margen = f"{producto.margen_ganancia:.1f}%" if producto.margen_ganancia else '-'
+            datos.extend([precio_compra, margen])
+        if incluir_stock:
+            datos.append(str(producto.stock))
+        return datos
+
+    por_categoria = groupby(
+        productos.iterator(chunk_size=2000),
+        key=lambda producto: producto.categoria.nombre if producto.categoria else 'Sin categoría',
+    )
+    for categoria, grupo in por_categoria:
+        elements.append(Paragraph(categoria, estilo('reporte.categoria')))
+        elements += tablas_por_bloques(encabezados, (fila(producto) for producto in grupo), anchos)
+
+    if not total:
+        elements.append(Paragraph('No hay productos para los filtros seleccionados', estilo('normal')))
+    renderizar_pdf(salida, PLANTILLAS['reporte'], elements)
+    return total
+
+
+def _limpiar_cache(directorio: Path) -> None:
+    """Borra las listas generadas hace más de DIAS_CACHE_LISTA días"""
+    limite = time.time() - DIAS_CACHE_LISTA * 86400
+    for archivo in directorio.glob('lista_precios_*.pdf'):
+        try:
+            if archivo.stat().st_mtime < limite:
+                archivo.unlink()
+        except OSError:
+            pass
+
+
+def obtener_lista_precios(productos, titulo: str, categoria_id: Optional[str] = None,
+                          incluir_precio_compra: bool = False, incluir_stock: bool = False,
+                          solo_con_stock: bool = False) -> Path:
+    """
+    Devuelve la ruta del PDF de la lista de precios, generándolo sólo si no
+    existe uno para la misma categoría, fecha, variante y versión de los datos.
+
+    Args:
+        productos: QuerySet de Producto ya filtrado
+        titulo: Título del documento
+        categoria_id: Categoría filtrada (parte de la clave)
+        incluir_precio_compra, incluir_stock, solo_con_stock: Variante de la lista
+
+    Returns:
+        Path: Archivo PDF listo para enviar
+    """
+    clave = '|'.join([
+        str(categoria_id or 'todas'),
+        timezone.localdate().isoformat(),
+        version_lista(productos),
+        f'{int(incluir_precio_compra)}{int(incluir_stock)}{int(solo_con_stock)}',
+        titulo,
+    ])
+    directorio = Path(settings.PDF_CACHE_DIR)
+    ruta = directorio / f"lista_precios_{hashlib.sha1(clave.encode('utf-8')).hexdigest()}.pdf"
+    if ruta.exists():
+        return ruta
+
+    if directorio.exists():
+        _limpiar_cache(directorio)
+    total = 0
+
+    def escribir(archivo):
+        nonlocal total
+        total = generar_pdf_lista_precios(archivo, productos, titulo, incluir_precio_compra, incluir_stock)
+
+    archivo_en_cache(ruta, escribir)
+    logger.info(f'Lista de precios generada: {total} productos', extra={'archivo': ruta.name})
+    return ruta
@@ -0,0 +1,185 @@
+"""
+Logging estructurado: formato JSON, id de correlación y spans de tiempo
+
+- FormatoJSON escribe una línea JSON por registro, conservando los campos
+  de `extra=` (venta_id, producto_id, user...).
+- Cada request tiene un id de correlación (CorrelacionMiddleware, cabecera
+  X-Request-ID) que se agrega a todos sus registros y spans.
+- span('bloqueo_stock') mide una sección (como `with` o como decorador) y
+  registra su duración en el logger 'inventario.spans'.
+- ArchivoEnCola escribe a disco desde un hilo propio: el request sólo deja
+  el registro en una cola.
+
+Este módulo se importa al configurar el logging, antes de cargar las apps:
+no debe importar modelos.
+"""
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import ContextDecorator
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+logger_spans = logging.getLogger('inventario.spans')
+
+_correlacion = contextvars.ContextVar('correlacion', default=None)
+_spans_abiertos = contextvars.ContextVar('spans_abiertos', default=())
+
+# Atributos propios de LogRecord: todo lo demás vino en `extra=`
+_ATRIBUTOS_RECORD = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'correlacion'}
+
+
+def correlacion_actual() -> Optional[str]:
+    """Id de correlación de la request (o tarea) en curso"""
+    return _correlacion.get()
+
+
+def iniciar_correlacion(valor: Optional[str] = None) -> contextvars.Token:
+    """
+    Fija el id de correlación del contexto actual (uno nuevo si no se da).
+
+    Returns:
+        Token para restaurar el valor anterior con terminar_correlacion()
+    """
+    return _correlacion.set(valor or uuid.uuid4().hex[:16])
+
+
+def terminar_correlacion(token: contextvars.Token) -> None:
+    _correlacion.reset(token)
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos de `extra` y la correlación"""
+
+    def format(self, record):
+        datos = {
+            'ts': datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+            'modulo': record.module,
+            'proceso': record.process,
+            'hilo': record.thread,
+        }
+        correlacion = getattr(record, 'correlacion', None) or correlacion_actual()
+        if correlacion and correlacion != '-':
+            datos['correlacion'] = correlacion
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD and not clave.startswith('_'):
+                datos[clave] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            datos['excepcion'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class ArchivoEnCola(QueueHandler):
+    """
+    Handler para LOGGING: encola el registro y un QueueListener lo escribe en
+    un RotatingFileHandler desde otro hilo. El formatter y el nivel que se
+    configuran en LOGGING se aplican al archivo.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8'):
+        super().__init__(queue.SimpleQueue())
+        self.archivo = RotatingFileHandler(filename, maxBytes=maxBytes, backupCount=backupCount,
+                                           encoding=encoding, delay=True)
+        self._lock_listener = threading.Lock()
+        self._iniciar_listener()
+
+    def _iniciar_listener(self):
+        # Un proceso hijo (fork de gunicorn/Celery) no hereda el hilo que escribe
+        self._pid = os.getpid()
+        self.listener = QueueListener(self.queue, self.archivo, respect_handler_level=True)
+        self.listener.start()
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            with self._lock_listener:
+                if self._pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    self._iniciar_listener()
+        super().enqueue(record)
+
+    def setFormatter(self, fmt):
+        self.archivo.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Copia el registro con el mensaje ya interpolado y la traza como texto
+        (los argumentos y la excepción no siempre son seguros entre hilos),
+        conservando los campos de `extra` y la correlación del request.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if getattr(record, 'correlacion', None) is None:
+            record.correlacion = correlacion_actual()
+        return record
+
+    def close(self):
+        # logging.shutdown() llama a close al salir: se vacía la cola antes de terminar
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.archivo.close()
+        super().close()
+
+
+class FiltroCorrelacion(logging.Filter):
+    """Agrega record.correlacion para los formatos de texto (%(correlacion)s)"""
+
+    def filter(self, record):
+        if getattr(record, 'correlacion', None) is None:
+            record.correlacion = correlacion_actual() or '-'
+        return True
+
+
+class span(ContextDecorator):
+    """
+    Mide una sección con nombre y la registra en 'inventario.spans':
+
+        with span('bloqueo_stock', productos=3):
+            ...
+
+        @span('render_pdf')
+        def generar(...): ...
+
+    Los spans anidados se registran con su ruta ('registrar_venta/bloqueo_stock').
+    Si la sección lanza una excepción, el span se registra con error=<tipo>.
+    """
+
+    def __init__(self, nombre: str, **campos):
+        self.nombre = nombre
+        self.campos = campos
+
+    def _recreate_cm(self):
+        # Como decorador, cada llamada usa su propio span (hilos, recursión)
+        return type(self)(self.nombre, **self.campos)
+
+    def __enter__(self):
+        abiertos = _spans_abiertos.get()
+        self.ruta = '/'.join(abiertos + (self.nombre,))
+        self._token = _spans_abiertos.set(abiertos + (self.nombre,))
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.duracion_ms = (time.perf_counter() - self._inicio) * 1000
+        _spans_abiertos.reset(self._token)
+        if logger_spans.isEnabledFor(logging.INFO):
+            extra = dict(self.campos, span=self.ruta, duracion_ms=round(self.duracion_ms, 2))
+            if tipo is not None:
+                extra['error'] = tipo.__name__
+            logger_spans.info(f'span {self.ruta} {self.duracion_ms:.1f} ms', extra=extra)
+        return False
@@ -1,7 +1,21 @@
+import hashlib
+import logging
+import multiprocessing
 import pytesseract
 import re
 import os
-from PIL import Image
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.db import close_old_connections
+
+from .utils_logging import span
+
+logger = logging.getLogger('inventario')
 
 # Intentar importar cv2 (opcional)
 try:
@@ -12,7 +26,7 @@ except ImportError:
 
 # Intentar importar pdf2image (para PDFs)
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     PDF2IMAGE_AVAILABLE = True
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
@@ -29,18 +43,54 @@ if os.name == 'nt':  # Windows
 OCR_LANG = "spa+eng"  # Español + Inglés para mejor detección de números y caracteres
 
 
+# Rasterización: 300 DPI es lo que recomienda Tesseract; más resolución sólo
+# agrega tiempo. Se procesan como máximo MAX_PAGINAS_OCR páginas por archivo.
+OCR_DPI = 300
+MAX_PAGINAS_OCR = 3
+
+# Saturación media (0-255) desde la que un documento se considera "a color"
+UMBRAL_SATURACION_COLOR = 40
+
+
+def elegir_variante(img):
+    """
+    Heurística barata para decidir el preprocesamiento: con una miniatura se
+    mide la saturación media. Un documento casi gris se binariza mejor en
+    escala de grises con autocontraste; uno con texto o fondos de color pierde
+    contraste al pasar a gris, así que se deja en color.
+
+    Returns:
+        str: 'gris' o 'color'
+    """
+    miniatura = img.convert('RGB')
+    miniatura.thumbnail((256, 256))
+    saturacion = miniatura.convert('HSV').getchannel('S')
+    media = sum(valor * cantidad for valor, cantidad in enumerate(saturacion.histogram())) / max(1, saturacion.width * saturacion.height)
+    return 'color' if media >= UMBRAL_SATURACION_COLOR else 'gris'
+
+
+def preprocesar_imagen(img, variante=None):
+    """Aplica la variante elegida (ver elegir_variante) a la imagen"""
+    variante = variante or elegir_variante(img)
+    if variante == 'gris':
+        return ImageOps.autocontrast(img.convert('L'))
+    return img.convert('RGB')
+
+
 def procesar_imagen_ocr(img, usar_color=False):
     """
     Procesa una imagen (PIL o numpy array) con OCR.
     
     Args:
         img: Imagen PIL o numpy array
-        usar_color: Si True, intenta procesar en color (mejor para algunas facturas)
+        usar_color: Si True, procesa en color; si False, en escala de grises
     
     Returns:
         str: Texto extraído
     """
     try:
+        if isinstance(img, Image.Image):
+            img = preprocesar_imagen(img, 'color' if usar_color else 'gris')
         # Procesar con Tesseract directamente
         texto = pytesseract.image_to_string(
             img,
@@ -49,132 +99,337 @@ def procesar_imagen_ocr(img, usar_color=False):
         )
         return texto.strip()
     except Exception as e:
-        print(f"Error en OCR: {str(e)}")
+        logger.error(f"Error en OCR: {str(e)}")
         return ""
 
 
+def _ocr_imagen(img):
+    """OCR de una imagen con una sola pasada, usando la variante elegida por heurística"""
+    return procesar_imagen_ocr(img, usar_color=elegir_variante(img) == 'color')
+
+
+def _ocr_pagina_pdf(ruta_archivo, pagina):
+    """Rasteriza y reconoce una página del PDF (se ejecuta en un proceso del pool)"""
+    with span('ocr_pagina', pagina=pagina):
+        imagenes = convert_from_path(ruta_archivo, dpi=OCR_DPI, first_page=pagina, last_page=pagina)
+        return _ocr_imagen(imagenes[0]) if imagenes else ""
+
+
+def _paginas_pdf(ruta_archivo):
+    try:
+        return int(pdfinfo_from_path(ruta_archivo).get('Pages', 1))
+    except Exception:
+        return 1
+
+
+_pool_local = None
+_pool_paginas = None
+_pool_lock = threading.Lock()
+
+
+def _pool_procesos():
+    """
+    Pool de procesos para las páginas de los PDF, uno por proceso web y
+    creado al primer uso. Los procesos se arrancan con forkserver (o spawn):
+    hacer fork del proceso web desde un hilo copia locks tomados por otros
+    hilos y conexiones abiertas.
+    """
+    global _pool_paginas
+    with _pool_lock:
+        if _pool_paginas is None:
+            metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool_paginas = ProcessPoolExecutor(
+                max_workers=min(MAX_PAGINAS_OCR, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context(metodo),
+            )
+        return _pool_paginas
+
+
+def _descartar_pool_procesos(pool):
+    global _pool_paginas
+    with _pool_lock:
+        if _pool_paginas is pool:
+            _pool_paginas = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _ocr_pdf(ruta_archivo):
+    """OCR de las primeras páginas del PDF, una por proceso"""
+    paginas = list(range(1, min(_paginas_pdf(ruta_archivo), MAX_PAGINAS_OCR) + 1))
+    with span('ocr_pdf', paginas=len(paginas)):
+        if len(paginas) == 1:
+            textos = [_ocr_pagina_pdf(ruta_archivo, 1)]
+        else:
+            pool = _pool_procesos()
+            try:
+                textos = list(pool.map(_ocr_pagina_pdf, [ruta_archivo] * len(paginas), paginas))
+            except BrokenProcessPool:
+                # Un proceso murió (p.ej. sin memoria): se recrea el pool la próxima vez
+                logger.warning('Pool de OCR roto; se procesan las páginas en este proceso')
+                _descartar_pool_procesos(pool)
+                textos = [_ocr_pagina_pdf(ruta_archivo, pagina) for pagina in paginas]
+    return "\n".join(texto for texto in textos if texto.strip())
+
+
+def hash_archivo(ruta_archivo):
+    """SHA-256 del contenido del archivo (clave del caché de OCR)"""
+    digest = hashlib.sha256()
+    with open(ruta_archivo, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def _ruta_cache_ocr(huella):
+    return Path(settings.OCR_CACHE_DIR) / huella[:2] / f'{huella}.txt'
+
+
+def texto_ocr_cacheado(ruta_archivo):
+    """Texto OCR ya calculado para este contenido, o None si nunca se procesó"""
+    ruta_cache = _ruta_cache_ocr(hash_archivo(ruta_archivo))
+    return ruta_cache.read_text(encoding='utf-8') if ruta_cache.exists() else None
+
+
 def extraer_texto_ocr(ruta_archivo):
     """
     Recibe la ruta de una imagen o PDF y devuelve el texto OCR.
     Soporta: JPG, PNG, PDF
     Optimizado para facturas chilenas con tablas.
+    
+    El resultado se guarda por hash del contenido: volver a subir el mismo
+    archivo no vuelve a ejecutar Tesseract.
     """
     # Verificar que el archivo existe
     if not os.path.exists(ruta_archivo):
         return ""
     
+    ruta_cache = _ruta_cache_ocr(hash_archivo(ruta_archivo))
+    if ruta_cache.exists():
+        return ruta_cache.read_text(encoding='utf-8')
+    
     try:
-        # Verificar si es PDF
         if ruta_archivo.lower().endswith('.pdf'):
             if not PDF2IMAGE_AVAILABLE:
                 return ""
-            
-            try:
-                # Convertir PDF a imágenes (alta resolución para mejor OCR)
-                # Aumentar DPI para mejor calidad en facturas
-                images = convert_from_path(ruta_archivo, dpi=350, first_page=1, last_page=1)
-                
-                if not images:
-                    return ""
-                
-                # Procesar la primera página (o todas si es necesario)
-                texto_completo = []
-                for img in images[:3]:  # Máximo 3 páginas
-                    texto = procesar_imagen_ocr(img, usar_color=False)
-                    if texto.strip():
-                        texto_completo.append(texto)
-                
-                return "\n".join(texto_completo)
-            except Exception as e:
-                print(f"Error procesando PDF: {str(e)}")
-                return ""
-        
-        # Es una imagen (JPG, PNG, etc.)
-        if CV2_AVAILABLE:
-            img = cv2.imread(ruta_archivo)
-            if img is None:
-                # Intentar con PIL si OpenCV falla
-                try:
-                    img = Image.open(ruta_archivo)
-                except:
-                    return ""
-            else:
-                # Convertir a PIL para compatibilidad
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(img_rgb)
+            texto = _ocr_pdf(ruta_archivo)
         else:
-            img = Image.open(ruta_archivo)
-        
-        # Procesar imagen (optimizado: solo probar sin color primero, color solo si es necesario)
-        texto1 = procesar_imagen_ocr(img, usar_color=False)
-        
-        # Solo probar con color si el resultado sin color es muy corto (probablemente falló)
-        if len(texto1) < 200:  # Si el resultado es muy corto, probar con color
-            texto2 = procesar_imagen_ocr(img, usar_color=True)
-            if len(texto2) > len(texto1) * 1.2:  # Solo usar color si es significativamente mejor
-                return texto2
-        
-        return texto1 if texto1 else ""
-            
+            # Es una imagen (JPG, PNG, etc.)
+            img = None
+            if CV2_AVAILABLE:
+                img_cv = cv2.imread(ruta_archivo)
+                if img_cv is not None:
+                    # Convertir a PIL para compatibilidad
+                    img = Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
+            if img is None:
+                img = Image.open(ruta_archivo)
+            texto = _ocr_imagen(img)
     except Exception as e:
-        print(f"Error en OCR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Error en OCR de {ruta_archivo}: {str(e)}", exc_info=True)
         return ""
+    
+    # Sólo se cachean resultados con texto: un fallo puntual no queda guardado
+    if texto:
+        ruta_cache.parent.mkdir(parents=True, exist_ok=True)
+        ruta_cache.write_text(texto, encoding='utf-8')
+    return texto
 
 
-def extraer_items_factura(texto):
+def procesar_factura_ocr(factura):
     """
-    Extrae items desde texto OCR de facturas.
-    Versión simplificada.
+    Ejecuta el OCR de una factura, guarda el texto y crea los items detectados.
+    
+    Args:
+        factura: Factura con archivo subido
+    
+    Returns:
+        int: Cantidad de items detectados
     """
-    items = []
+    from .models import ItemFactura
+    from .utils_coincidencias import CONFIANZA_AUTOMATICA, obtener_indice
+    
+    texto = extraer_texto_ocr(factura.archivo.path)
+    factura.texto_extraido = texto
+    factura.save(update_fields=['texto_extraido'])
     
-    if not texto or not texto.strip():
-        return items
+    lineas = extraer_lineas_factura(texto)
+    candidatos = obtener_indice().emparejar(lineas, limite=1) if lineas else []
+    items = []
+    for linea, encontrados in zip(lineas, candidatos):
+        mejor = encontrados[0] if encontrados else None
+        asignado = mejor is not None and mejor.confianza >= CONFIANZA_AUTOMATICA
+        items.append(ItemFactura(
+            factura=factura,
+            producto_id=mejor.producto_id if asignado else None,
+            codigo=linea.codigo[:50],
+            nombre_producto=linea.descripcion[:200],
+            cantidad=linea.cantidad,
+            precio_unitario=linea.precio_unitario,
+            subtotal=linea.cantidad * linea.precio_unitario,
+            producto_coincidencia=asignado,
+            confianza_coincidencia=mejor.confianza if mejor else None,
+        ))
+    ItemFactura.objects.bulk_create(items)
+    logger.info(f'OCR de factura {factura.id}: {len(texto)} caracteres, {len(items)} items, '
+                f'{sum(item.producto_coincidencia for item in items)} asignados automáticamente')
+    return len(items)
+
+
+def _procesar_factura_local(factura_id):
+    from .models import Factura
+    try:
+        factura = Factura.objects.filter(pk=factura_id).first()
+        if factura is not None:
+            procesar_factura_ocr(factura)
+    except Exception as e:
+        logger.error(f'Error procesando OCR de factura {factura_id}: {str(e)}', exc_info=True)
+    finally:
+        close_old_connections()
+
 
-    lineas = texto.split("\n")
+def encolar_ocr_factura(factura_id):
+    """
+    Procesa el OCR de la factura fuera del request: en Celery si hay broker,
+    o en un worker local (un hilo que a su vez reparte páginas en procesos).
     
-    for linea in lineas:
-        linea = linea.strip()
-        if len(linea) < 10:
+    Returns:
+        str: 'celery' o 'local'
+    """
+    global _pool_local
+    try:
+        from .tasks import broker_disponible, procesar_factura_ocr_async
+        if broker_disponible():
+            procesar_factura_ocr_async.apply_async(args=[factura_id], retry=False)
+            return 'celery'
+    except Exception as e:
+        logger.warning(f'Celery no disponible para OCR de factura {factura_id} ({str(e)}); usando worker local')
+    with _pool_lock:
+        if _pool_local is None:
+            _pool_local = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ocr')
+    _pool_local.submit(_procesar_factura_local, factura_id)
+    return 'local'
+
+
+# Números con formato chileno: punto de miles y coma decimal ("12.990", "1,5")
+_NUMERO = re.compile(r'^\$?(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d{1,2}))?$')
+# Código al inicio de la línea: alfanumérico con al menos un dígito
+_CODIGO = re.compile(r'^(?=[A-Za-z0-9\-]*\d)[A-Za-z0-9][A-Za-z0-9\-]{2,19}$')
+_NO_ITEMS = re.compile(r'^(sub\s*total|total|neto|iva|descuento|rut|fecha|folio)\b', re.IGNORECASE)
+# Tope de ItemFactura.precio_unitario y subtotal (DecimalField max_digits=10, sin decimales):
+# un número que lo supera es ruido del OCR y haría fallar el INSERT de toda la factura
+MAX_IMPORTE_ITEM = 10 ** 10 - 1
+MAX_CANTIDAD_ITEM = 2 ** 31 - 1  # ItemFactura.cantidad (IntegerField)
+
+
+@dataclass
+class LineaFactura:
+    """Línea de detalle reconocida en el texto de una factura"""
+    codigo: str
+    descripcion: str
+    cantidad: int
+    precio_unitario: int
+    total: int
+
+
+def _numero(token):
+    """Convierte '12.990' / '$1.234,50' a float, o None si no es un número"""
+    match = _NUMERO.match(token)
+    if not match:
+        return None
+    return float(match.group(1).replace('.', '') + ('.' + match.group(2) if match.group(2) else ''))
+
+
+def _cantidad_precio_total(numeros):
+    """
+    Interpreta los números del final de la línea.
+
+    Con tres o más se toman como cantidad, precio unitario y total (se
+    verifica que cantidad x precio ~ total); con dos, cantidad y precio si el
+    primero parece una cantidad, o precio y total si no; con uno, el precio.
+    """
+    if len(numeros) >= 3:
+        cantidad, precio, total = numeros[-3:]
+        if cantidad and abs(cantidad * precio - total) <= max(1, total * 0.02):
+            return int(cantidad), precio, total
+        cantidad = round(total / precio) if precio else 1
+        return max(1, cantidad), precio, total
+    if len(numeros) == 2:
+        primero, segundo = numeros
+        if primero.is_integer() and 0 < primero < 1000 and segundo >= primero:
+            return int(primero), segundo, primero * segundo
+        cantidad = max(1, round(segundo / primero)) if primero else 1
+        return cantidad, primero, segundo
+    return 1, numeros[0], numeros[0]
+
+
+def extraer_lineas_factura(texto):
+    """
+    Reconoce las líneas de detalle de una factura: código (opcional),
+    descripción, cantidad, precio unitario y total.
+
+    Una línea se considera item si termina en números y empieza con un código,
+    o si trae al menos dos números (cantidad y precio). Los totales, IVA y
+    encabezados se ignoran, y también las líneas cuyos importes no caben en
+    ItemFactura (MAX_CANTIDAD_ITEM, MAX_IMPORTE_ITEM).
+
+    Args:
+        texto: Texto extraído por OCR
+
+    Returns:
+        list[LineaFactura]
+    """
+    lineas = []
+    for linea in (texto or '').splitlines():
+        tokens = linea.split()
+        if len(tokens) < 2:
+            continue
+
+        numeros = []
+        while tokens and len(numeros) < 3:
+            valor = _numero(tokens[-1])
+            if valor is None:
+                break
+            numeros.insert(0, valor)
+            tokens.pop()
+        if not numeros or not tokens:
             continue
-        
-        # Buscar líneas con códigos y precios
-        match_codigo = re.match(r"^(\d{4,8})\s+(.+)", linea)
-        if match_codigo:
-            resto_linea = match_codigo.group(2)
-            
-            # Buscar números (precios)
-            numeros = re.findall(r"(\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?)", resto_linea)
-            
-            if numeros:
-                # Convertir números
-                precios = []
-                for num_str in numeros:
-                    try:
-                        num_limpio = num_str.replace(".", "").replace(",", ".")
-                        num_valor = float(num_limpio)
-                        if 1000 <= num_valor <= 100000:
-                            precios.append(int(num_valor))
-                    except:
-                        continue
-                
-                if precios:
-                    precio = max(precios)
-                    cantidad = 1
-                    
-                    # Extraer nombre básico
-                    nombre = resto_linea
-                    for num_str in numeros:
-                        nombre = nombre.replace(num_str, " ", 1)
-                    nombre = re.sub(r'\s+', ' ', nombre).strip()
-                    
-                    if len(nombre) >= 3:
-                        items.append({
-                            "nombre": nombre,
-                            "cantidad": cantidad,
-                            "precio": precio
-                        })
-
-    return items
+
+        codigo = ''
+        if len(tokens) > 1 and _CODIGO.match(tokens[0]):
+            codigo = tokens.pop(0)
+        descripcion = ' '.join(tokens).strip(' -:|')
+        if len(descripcion) < 3 or _NO_ITEMS.match(descripcion) or (not codigo and len(numeros) < 2):
+            continue
+
+        cantidad, precio, total = _cantidad_precio_total(numeros)
+        if precio <= 0:
+            continue
+        if (cantidad > MAX_CANTIDAD_ITEM or cantidad * round(precio) > MAX_IMPORTE_ITEM
+                or total > MAX_IMPORTE_ITEM):
+            logger.debug(f'Línea de factura descartada por importes fuera de rango: {linea.strip()}')
+            continue
+        lineas.append(LineaFactura(
+            codigo=codigo,
+            descripcion=descripcion,
+            cantidad=cantidad,
+            precio_unitario=int(round(precio)),
+            total=int(round(total)),
+        ))
+    return lineas
+
+
+def extraer_items_factura(texto):
+    """
+    Extrae items desde texto OCR de facturas (ver extraer_lineas_factura).
+
+    Returns:
+        list[dict]: Dicts con 'codigo', 'nombre', 'cantidad' y 'precio'
+    """
+    return [
+        {
+            'codigo': linea.codigo,
+            'nombre': linea.descripcion,
+            'cantidad': linea.cantidad,
+            'precio': linea.precio_unitario,
+        }
+        for linea in extraer_lineas_factura(texto)
+    ]
@@ -0,0 +1,202 @@
+"""
+Paginación por cursor (keyset) para tablas de historial grandes
+
+En vez de COUNT(*) + OFFSET, cada página se pide "después de" (o "antes de")
+la última fila vista, ordenando por (fecha, id) descendente. Con los índices
+compuestos (-fecha, -id) cualquier página cuesta lo mismo que la primera.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Más allá de este número el conteo se muestra como "10.000+" sin contar todo
+TOPE_CONTEO = 10000
+
+SIGUIENTE = 's'
+ANTERIOR = 'a'
+
+
+def codificar_cursor(direccion: str, fecha, pk: int) -> str:
+    """Cursor opaco para la URL: dirección, fecha y id de la fila de referencia"""
+    crudo = f'{direccion}|{fecha.isoformat()}|{pk}'.encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor: Optional[str]) -> Optional[Tuple[str, object, int]]:
+    """
+    Returns:
+        tuple: (direccion, fecha, pk), o None si el cursor falta o es inválido
+    """
+    if not cursor:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        direccion, fecha_texto, pk = crudo.split('|')
+        fecha = parse_datetime(fecha_texto)
+        pk = int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+    if fecha is None or direccion not in (SIGUIENTE, ANTERIOR):
+        return None
+    return direccion, fecha, pk
+
+
+@dataclass(frozen=True)
+class ConteoEstimado:
+    """Cantidad de filas: exacta, estimada por el planificador (~) o acotada (+)"""
+    valor: int
+    signo: str = ''
+
+    def __str__(self):
+        numero = f'{self.valor:,}'.replace(',', '.')
+        if self.signo == '~':
+            return f'~{numero}'
+        return f'{numero}{self.signo}'
+
+
+def conteo_estimado(queryset, tope: int = TOPE_CONTEO) -> ConteoEstimado:
+    """
+    Cantidad aproximada de filas sin recorrer la tabla completa.
+
+    En PostgreSQL se usa la estimación del planificador (EXPLAIN); en otros
+    motores, un COUNT acotado a `tope` filas.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        try:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            return ConteoEstimado(int(plan[0]['Plan']['Plan Rows']), '~')
+        except (ValueError, KeyError, IndexError, TypeError):
+            pass
+    valor = queryset.order_by()[:tope + 1].count()
+    return ConteoEstimado(tope, '+') if valor > tope else ConteoEstimado(valor)
+
+
+class PaginaKeyset:
+    """
+    Página de resultados. Se itera como una lista y expone
+    has_next/has_previous (como Page de Django) y las URLs de navegación.
+    """
+    es_keyset = True
+
+    def __init__(self, object_list, request, cursor_siguiente=None, cursor_anterior=None, conteo=None):
+        self.object_list = object_list
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.conteo = conteo
+        self._request = request
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _url(self, cursor):
+        if cursor is None:
+            return None
+        parametros = self._request.GET.copy()
+        parametros.pop('page', None)
+        parametros['cursor'] = cursor
+        return f'?{parametros.urlencode()}'
+
+    @property
+    def url_siguiente(self):
+        """Query string de la página siguiente (conserva los filtros)"""
+        return self._url(self.cursor_siguiente)
+
+    @property
+    def url_anterior(self):
+        return self._url(self.cursor_anterior)
+
+
+def paginar_keyset(queryset, request, por_pagina: int = 50, campo: str = 'fecha',
+                   contar: bool = False) -> PaginaKeyset:
+    """
+    Pagina `queryset` por (campo, id) descendente usando el parámetro ?cursor=.
+
+    Args:
+        queryset: QuerySet ya filtrado (su orden se reemplaza)
+        request: Request actual (cursor y filtros de la URL)
+        por_pagina: Filas por página
+        campo: Campo de fecha del orden
+        contar: Calcular además un conteo estimado (ver conteo_estimado)
+
+    Returns:
+        PaginaKeyset
+    """
+    referencia = decodificar_cursor(request.GET.get('cursor'))
+    direccion = referencia[0] if referencia else SIGUIENTE
+
+    if referencia is None:
+        filas = list(queryset.order_by(f'-{campo}', '-pk')[:por_pagina + 1])
+    elif direccion == SIGUIENTE:
+        _, fecha, pk = referencia
+        filas = list(
+            queryset.filter(Q(**{f'{campo}__lt': fecha}) | Q(**{campo: fecha, 'pk__lt': pk}))
+            .order_by(f'-{campo}', '-pk')[:por_pagina + 1]
+        )
+    else:
+        _, fecha, pk = referencia
+        filas = list(
+            queryset.filter(Q(**{f'{campo}__gt': fecha}) | Q(**{campo: fecha, 'pk__gt': pk}))
+            .order_by(campo, 'pk')[:por_pagina + 1]
+        )
+
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if direccion == ANTERIOR:
+        filas.reverse()
+
+    def cursor(dir_cursor, fila):
+        return codificar_cursor(dir_cursor, getattr(fila, campo), fila.pk)
+
+    # Hacia adelante hay siguiente si sobró una fila, y anterior si se llegó con
+    # un cursor; hacia atrás siempre hay siguiente (de ahí se vino)
+    if direccion == SIGUIENTE:
+        tiene_siguiente, tiene_anterior = hay_mas, referencia is not None
+    else:
+        tiene_siguiente, tiene_anterior = True, hay_mas
+    siguiente = cursor(SIGUIENTE, filas[-1]) if filas and tiene_siguiente else None
+    anterior = cursor(ANTERIOR, filas[0]) if filas and tiene_anterior else None
+
+    return PaginaKeyset(
+        filas, request,
+        cursor_siguiente=siguiente,
+        cursor_anterior=anterior,
+        conteo=conteo_estimado(queryset) if contar else None,
+    )
+
+
+def paginar_historial(queryset, request, por_pagina: int = 50, campo: str = 'fecha', contar: bool = True):
+    """
+    Paginación de las vistas HTML de historial: por cursor salvo que la URL
+    traiga ?page=N (enlaces antiguos), en cuyo caso se usa Paginator.
+
+    Returns:
+        PaginaKeyset o Page (el template inventario/paginacion.html maneja ambos)
+    """
+    if request.GET.get('page'):
+        return Paginator(queryset.order_by(f'-{campo}', '-pk'), por_pagina).get_page(request.GET.get('page'))
+    return paginar_keyset(queryset, request, por_pagina, campo, contar=contar)
@@ -0,0 +1,303 @@
+"""
+Herramientas comunes para generar PDFs (tickets, cotizaciones, listas y reportes)
+
+Los estilos de párrafo y de tabla se definen de forma declarativa y se
+construyen una sola vez por proceso; el logo se decodifica una sola vez.
+Cada documento elige una plantilla (tamaño de página y márgenes), arma su
+lista de flowables con los bloques de este módulo y se escribe a un stream:
+una respuesta HTTP (respuesta_pdf) o un archivo cacheado en disco
+(archivo_en_cache).
+"""
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.http import FileResponse
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch, mm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Flowable
+
+from .utils_logging import span
+
+logger = logging.getLogger('inventario')
+
+NEGOCIO_NOMBRE = "BOTILLERÍA LA PREVIA"
+NEGOCIO_DIRECCION = "Lautaro 948"
+NEGOCIO_CIUDAD = "Santa Juana, Bio Bio, Chile"
+NEGOCIO_TELEFONO = "+56956499437"
+
+FILAS_POR_TABLA = 40
+COLOR_MARCA = colors.HexColor('#667eea')
+
+
+@dataclass(frozen=True)
+class PlantillaPDF:
+    """Tamaño de página y márgenes de un tipo de documento"""
+    pagina: Tuple[float, float]
+    margen_horizontal: float = inch
+    margen_vertical: float = inch
+    # Ancho de la línea divisoria en caracteres
+    divisor: int = 50
+
+
+PLANTILLAS = {
+    # Impresora térmica de 58mm (rollo de 80mm, alto variable)
+    'termica': PlantillaPDF((80 * mm, 250 * mm), 3 * mm, 4 * mm, divisor=32),
+    'termica_larga': PlantillaPDF((80 * mm, 300 * mm), 3 * mm, 5 * mm, divisor=32),
+    'a4': PlantillaPDF(A4, 20 * mm, 20 * mm),
+    'reporte': PlantillaPDF(A4),
+}
+
+
+# ----------------------------------------------------------------------------
+# Estilos (se construyen una vez al importar el módulo)
+# ----------------------------------------------------------------------------
+
+# nombre -> (estilo base de reportlab, atributos)
+_DEFINICION_ESTILOS = {
+    'normal': ('Normal', {}),
+    'seccion': ('Heading2', {}),
+    'reporte.titulo': ('Heading1', dict(fontSize=20, textColor=COLOR_MARCA, spaceAfter=20, alignment=1)),
+    'reporte.categoria': ('Heading3', dict(textColor=COLOR_MARCA, spaceBefore=10, spaceAfter=4)),
+
+    'termica.negocio': ('Normal', dict(fontSize=11, leading=13, alignment=1, fontName='Helvetica-Bold', spaceAfter=4)),
+    'termica.direccion': ('Normal', dict(fontSize=7, leading=9, alignment=1, spaceAfter=2)),
+    'termica.titulo': ('Normal', dict(fontSize=10, alignment=1, fontName='Helvetica-Bold', spaceAfter=6)),
+    'termica.normal': ('Normal', dict(fontSize=7, leading=9, alignment=0)),
+    'termica.centro': ('Normal', dict(fontSize=7, leading=9, alignment=1)),
+    'termica.negrita': ('Normal', dict(fontSize=7, leading=9, alignment=0, fontName='Helvetica-Bold')),
+    'termica.derecha': ('Normal', dict(fontSize=7, leading=9, alignment=2)),
+    'termica.total': ('Normal', dict(fontSize=8, leading=10, alignment=2, fontName='Helvetica-Bold')),
+    'termica.contacto': ('Normal', dict(fontSize=8, alignment=1, fontName='Helvetica-Bold')),
+
+    'a4.negocio': ('Normal', dict(fontSize=16, leading=18, alignment=1, fontName='Helvetica-Bold', spaceAfter=6)),
+    'a4.direccion': ('Normal', dict(fontSize=11, leading=13, alignment=1, spaceAfter=3)),
+    'a4.titulo': ('Heading1', dict(fontSize=24, textColor=COLOR_MARCA, alignment=1, fontName='Helvetica-Bold', spaceAfter=20)),
+    'a4.divisor': ('Normal', dict(fontSize=10, alignment=1)),
+    'a4.pie': ('Normal', dict(fontSize=11, alignment=1)),
+    'a4.pie_gris': ('Normal', dict(fontSize=9, alignment=1, textColor=colors.grey)),
+    'a4.contacto': ('Normal', dict(fontSize=11, alignment=1, fontName='Helvetica-Bold')),
+}
+
+
+def _construir_estilos() -> Dict[str, ParagraphStyle]:
+    base = getSampleStyleSheet()
+    return {
+        nombre: ParagraphStyle(nombre, parent=base[padre], **atributos)
+        for nombre, (padre, atributos) in _DEFINICION_ESTILOS.items()
+    }
+
+
+ESTILOS = _construir_estilos()
+
+
+def estilo(nombre: str) -> ParagraphStyle:
+    """Estilo de párrafo ya construido (ver _DEFINICION_ESTILOS)"""
+    return ESTILOS[nombre]
+
+
+TABLA_REPORTE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), COLOR_MARCA),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige]),
+])
+
+TABLA_ITEMS_TERMICA = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 4),
+    ('TOPPADDING', (0, 0), (-1, 0), 4),
+    ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # Cantidad centrada
+    ('ALIGN', (1, 0), (1, -1), 'LEFT'),    # Producto a la izquierda
+    ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),  # Precio y Total a la derecha
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTSIZE', (0, 0), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+])
+
+TABLA_ITEMS_A4 = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), COLOR_MARCA),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # Cantidad centrada
+    ('ALIGN', (1, 0), (1, -1), 'LEFT'),    # Producto a la izquierda
+    ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),  # Precio y Total a la derecha
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+TABLA_FICHA_A4 = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+
+@lru_cache(maxsize=None)
+def estilo_totales_a4(fila_total: int) -> TableStyle:
+    """Estilo de la tabla de totales A4 con la fila `fila_total` destacada"""
+    return TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('FONTSIZE', (-1, fila_total), (-1, fila_total), 14),
+        ('FONTNAME', (-1, fila_total), (-1, fila_total), 'Helvetica-Bold'),
+    ])
+
+
+# ----------------------------------------------------------------------------
+# Logo
+# ----------------------------------------------------------------------------
+
+@lru_cache(maxsize=1)
+def logo_negocio() -> Optional[ImageReader]:
+    """Logo configurado en PDF_LOGO_PATH, decodificado una sola vez por proceso"""
+    ruta = getattr(settings, 'PDF_LOGO_PATH', '')
+    if not ruta or not os.path.exists(ruta):
+        return None
+    try:
+        return ImageReader(str(ruta))
+    except Exception as exc:
+        logger.warning(f'No se pudo cargar el logo para PDFs ({ruta}): {str(exc)}')
+        return None
+
+
+class _Logo(Flowable):
+    """Dibuja el logo cacheado centrado, escalado a un alto fijo"""
+
+    def __init__(self, imagen: ImageReader, alto: float):
+        super().__init__()
+        ancho_original, alto_original = imagen.getSize()
+        self.imagen = imagen
+        self.alto = alto
+        self.ancho = ancho_original * alto / alto_original
+
+    def wrap(self, ancho_disponible, alto_disponible):
+        self._ancho_disponible = ancho_disponible
+        return ancho_disponible, self.alto
+
+    def draw(self):
+        x = (self._ancho_disponible - self.ancho) / 2
+        self.canv.drawImage(self.imagen, x, 0, self.ancho, self.alto, mask='auto')
+
+
+# ----------------------------------------------------------------------------
+# Bloques reutilizables
+# ----------------------------------------------------------------------------
+
+def divisor(plantilla: PlantillaPDF, formato: str = 'a4') -> Paragraph:
+    """Línea de guiones que separa secciones"""
+    return Paragraph("-" * plantilla.divisor, estilo('termica.centro' if formato == 'termica' else 'a4.divisor'))
+
+
+def encabezado_negocio(formato: str = 'a4') -> List[Flowable]:
+    """Logo (si hay), nombre y dirección del negocio"""
+    elementos = []
+    logo = logo_negocio()
+    if logo is not None:
+        elementos.append(_Logo(logo, 12 * mm if formato == 'termica' else 20 * mm))
+        elementos.append(Spacer(1, 2 * mm))
+    elementos += [
+        Paragraph(NEGOCIO_NOMBRE, estilo(f'{formato}.negocio')),
+        Paragraph(NEGOCIO_DIRECCION, estilo(f'{formato}.direccion')),
+        Paragraph(NEGOCIO_CIUDAD, estilo(f'{formato}.direccion')),
+        Paragraph(f"Tel: {NEGOCIO_TELEFONO}", estilo(f'{formato}.direccion')),
+    ]
+    return elementos
+
+
+def contacto_negocio(formato: str = 'a4') -> List[Flowable]:
+    """Bloque de contacto al pie del documento"""
+    return [
+        Paragraph("<b>CONTACTO</b>", estilo(f'{formato}.contacto')),
+        Paragraph(NEGOCIO_NOMBRE, estilo(f'{formato}.direccion')),
+        Paragraph(f"{NEGOCIO_DIRECCION}, {NEGOCIO_CIUDAD}", estilo(f'{formato}.direccion')),
+        Paragraph(f"Teléfono: {NEGOCIO_TELEFONO}", estilo(f'{formato}.direccion')),
+    ]
+
+
+def tablas_por_bloques(encabezados: Sequence[str], filas: Iterable[Sequence], anchos=None,
+                       estilo_tabla: TableStyle = TABLA_REPORTE,
+                       filas_por_tabla: int = FILAS_POR_TABLA) -> List[Table]:
+    """
+    Reparte las filas en tablas de `filas_por_tabla` filas con los mismos
+    encabezados: el layout de una sola tabla enorme crece más que linealmente.
+    """
+    tablas, bloque = [], []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) == filas_por_tabla:
+            tablas.append(Table([list(encabezados)] + bloque, colWidths=anchos, style=estilo_tabla, repeatRows=1))
+            bloque = []
+    if bloque or not tablas:
+        tablas.append(Table([list(encabezados)] + bloque, colWidths=anchos, style=estilo_tabla, repeatRows=1))
+    return tablas
+
+
+# ----------------------------------------------------------------------------
+# Salida
+# ----------------------------------------------------------------------------
+
+@span('render_pdf')
+def renderizar_pdf(salida, plantilla: PlantillaPDF, elementos: List[Flowable]) -> None:
+    """Escribe los flowables en `salida` con la página y márgenes de la plantilla"""
+    doc = SimpleDocTemplate(salida, pagesize=plantilla.pagina,
+                            rightMargin=plantilla.margen_horizontal, leftMargin=plantilla.margen_horizontal,
+                            topMargin=plantilla.margen_vertical, bottomMargin=plantilla.margen_vertical)
+    doc.build(elementos)
+
+
+def documento_tabla(salida, titulo: str, encabezados: Sequence[str], filas: Iterable[Sequence], anchos=None) -> None:
+    """Reporte simple: título y tabla de datos en A4"""
+    elementos = [Paragraph(titulo, estilo('reporte.titulo')), Spacer(1, 0.2 * inch)]
+    elementos += tablas_por_bloques(encabezados, filas, anchos)
+    renderizar_pdf(salida, PLANTILLAS['reporte'], elementos)
+
+
+def respuesta_pdf(escribir: Callable, nombre_archivo: str, as_attachment: bool = False,
+                  content_type: str = 'application/pdf') -> FileResponse:
+    """
+    Genera el documento en un temporal (en memoria hasta 10 MB) y lo envía
+    por partes. `escribir` recibe el archivo de salida.
+    """
+    archivo = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    escribir(archivo)
+    archivo.seek(0)
+    return FileResponse(archivo, as_attachment=as_attachment, filename=nombre_archivo, content_type=content_type)
+
+
+def archivo_en_cache(ruta: Path, escribir: Callable) -> Path:
+    """
+    Devuelve `ruta` si ya existe; si no, la genera con `escribir`. Se escribe a
+    un temporal y se renombra, así nadie lee un archivo a medio escribir.
+    """
+    if ruta.exists():
+        return ruta
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            escribir(archivo)
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.unlink(temporal)
+        raise
+    return ruta
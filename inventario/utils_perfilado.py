@@ -0,0 +1,230 @@
+"""
+Perfilado opt-in de requests lentas
+
+PerfiladoMiddleware perfila una request cuando:
+- trae la cabecera X-Perfilar y el usuario es administrador (o la cabecera
+  coincide con PERFILADO_TOKEN),
+- el usuario está en la lista de usuarios a perfilar, o
+- cae en la fracción de muestreo.
+
+La lista de usuarios, el muestreo, el umbral y el modo se cambian desde la
+página de perfiles (se guardan en el caché), sin volver a desplegar.
+
+Modos:
+- 'muestreo': un hilo toma la pila del request cada PERFILADO_INTERVALO_MS y
+  se guardan las pilas agregadas en formato "collapsed" (flamegraph.pl,
+  speedscope). El costo es casi nulo para el request.
+- 'cprofile': cProfile completo; se guarda el .prof (snakeviz, flameprof).
+
+Sólo se guardan las requests que superan el umbral (o las pedidas por cabecera).
+"""
+import cProfile
+import hmac
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('inventario')
+
+MODO_MUESTREO = 'muestreo'
+MODO_CPROFILE = 'cprofile'
+
+CLAVE_CONFIG = 'perfilado:config'
+# Cada proceso relee la configuración del caché como máximo cada tantos segundos
+REFRESCO_CONFIG = 5
+
+_config_local = {'valor': None, 'leido': 0.0}
+
+
+def _directorio() -> Path:
+    return Path(getattr(settings, 'PERFILADO_DIR', Path(settings.BASE_DIR) / 'cache' / 'perfiles'))
+
+
+def config_por_defecto() -> dict:
+    return {
+        'usuarios': [],
+        'muestreo': float(getattr(settings, 'PERFILADO_MUESTREO', 0.0)),
+        'umbral_ms': int(getattr(settings, 'PERFILADO_UMBRAL_MS', 2000)),
+        'modo': getattr(settings, 'PERFILADO_MODO', MODO_MUESTREO),
+    }
+
+
+def config_perfilado() -> dict:
+    """Configuración vigente: la del caché (si se cambió desde la página) o la de settings"""
+    ahora = time.monotonic()
+    if _config_local['valor'] is None or ahora - _config_local['leido'] >= REFRESCO_CONFIG:
+        config = config_por_defecto()
+        try:
+            config.update(cache.get(CLAVE_CONFIG) or {})
+        except Exception as e:
+            logger.warning(f'No se pudo leer la configuración de perfilado: {e}')
+        _config_local['valor'], _config_local['leido'] = config, ahora
+    return _config_local['valor']
+
+
+def guardar_config_perfilado(usuarios=None, muestreo=None, umbral_ms=None, modo=None) -> dict:
+    """
+    Cambia la configuración para todos los procesos (vía caché).
+
+    Returns:
+        dict: La configuración resultante
+    """
+    config = dict(config_perfilado())
+    if usuarios is not None:
+        config['usuarios'] = sorted({u.strip() for u in usuarios if u.strip()})
+    if muestreo is not None:
+        config['muestreo'] = min(max(float(muestreo), 0.0), 1.0)
+    if umbral_ms is not None:
+        config['umbral_ms'] = max(int(umbral_ms), 0)
+    if modo in (MODO_MUESTREO, MODO_CPROFILE):
+        config['modo'] = modo
+    cache.set(CLAVE_CONFIG, config, None)
+    _config_local['valor'], _config_local['leido'] = config, time.monotonic()
+    return config
+
+
+def motivo_perfilado(request, config: dict) -> Optional[str]:
+    """
+    Returns:
+        str: 'cabecera', 'usuario' o 'muestreo' si hay que perfilar la request; None si no
+    """
+    cabecera = request.headers.get('X-Perfilar')
+    if cabecera:
+        token = getattr(settings, 'PERFILADO_TOKEN', '')
+        roles = getattr(request, 'roles', None)
+        if (token and hmac.compare_digest(cabecera.encode(), token.encode())) or (roles is not None and roles.es_admin):
+            return 'cabecera'
+    usuario = getattr(request, 'user', None)
+    if config['usuarios'] and usuario is not None and usuario.is_authenticated \
+            and usuario.username in config['usuarios']:
+        return 'usuario'
+    if config['muestreo'] > 0 and random.random() < config['muestreo']:
+        return 'muestreo'
+    return None
+
+
+def _nombre_marco(codigo) -> str:
+    partes = Path(codigo.co_filename).parts
+    return f'{codigo.co_name} ({"/".join(partes[-2:])}:{codigo.co_firstlineno})'
+
+
+class MuestreadorPila:
+    """
+    Toma la pila de un hilo cada `intervalo` segundos desde otro hilo
+    (sys._current_frames) y acumula las pilas en formato collapsed.
+    """
+
+    def __init__(self, intervalo: float = 0.005):
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._objetivo = threading.get_ident()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='perfilado', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self._objetivo)
+            pila = []
+            while marco is not None:
+                pila.append(_nombre_marco(marco.f_code))
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    @property
+    def muestras(self) -> int:
+        return sum(self.pilas.values())
+
+    def collapsed(self) -> str:
+        """Una línea "marco;marco;marco N" por pila (entrada de flamegraph.pl / speedscope)"""
+        return ''.join(f'{pila} {cantidad}\n' for pila, cantidad in self.pilas.most_common())
+
+
+class Perfilador:
+    """Envuelve el perfilado de una request en cualquiera de los dos modos"""
+
+    def __init__(self, modo: str):
+        self.modo = modo
+        self.muestras = 0
+        if modo == MODO_CPROFILE:
+            self._perfil = cProfile.Profile()
+        else:
+            intervalo = getattr(settings, 'PERFILADO_INTERVALO_MS', 5) / 1000
+            self._perfil = MuestreadorPila(intervalo)
+
+    def iniciar(self):
+        if self.modo == MODO_CPROFILE:
+            self._perfil.enable()
+        else:
+            self._perfil.iniciar()
+
+    def detener(self):
+        if self.modo == MODO_CPROFILE:
+            self._perfil.disable()
+            self.muestras = len(self._perfil.getstats())  # funciones distintas
+        else:
+            self._perfil.detener()
+            self.muestras = self._perfil.muestras
+
+    def guardar(self, ruta: Path):
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        if self.modo == MODO_CPROFILE:
+            self._perfil.dump_stats(str(ruta))
+        else:
+            ruta.write_text(self._perfil.collapsed(), encoding='utf-8')
+
+    @property
+    def extension(self) -> str:
+        return 'prof' if self.modo == MODO_CPROFILE else 'folded'
+
+
+def guardar_perfil(perfilador: Perfilador, request, duracion_ms: float, motivo: str):
+    """
+    Guarda el archivo del perfil y su registro (PerfilRequest), y borra los
+    más viejos por encima de PERFILADO_MAXIMO.
+    """
+    from .models import PerfilRequest
+
+    match = getattr(request, 'resolver_match', None)
+    usuario = getattr(request, 'user', None)
+    nombre = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}.{perfilador.extension}'
+    perfilador.guardar(_directorio() / nombre)
+    perfil = PerfilRequest.objects.create(
+        vista=(match.view_name or match._func_path) if match else '',
+        ruta=request.get_full_path()[:500],
+        metodo=request.method,
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+        duracion_ms=duracion_ms,
+        modo=perfilador.modo,
+        motivo=motivo,
+        muestras=perfilador.muestras,
+        archivo=nombre,
+    )
+    logger.info(f'Perfil guardado: {perfil.vista} {duracion_ms:.0f} ms',
+                extra={'perfil_id': perfil.id, 'motivo': motivo, 'modo': perfilador.modo})
+
+    maximo = getattr(settings, 'PERFILADO_MAXIMO', 200)
+    for viejo in PerfilRequest.objects.order_by('-fecha', '-id')[maximo:]:
+        ruta_perfil(viejo).unlink(missing_ok=True)
+        viejo.delete()
+    return perfil
+
+
+def ruta_perfil(perfil) -> Path:
+    return _directorio() / perfil.archivo
@@ -0,0 +1,253 @@
+"""
+Instrumentación de rendimiento por vista
+
+RendimientoMiddleware mide cada request (tiempo total, tiempo en la base de
+datos, cantidad de consultas y consultas repetidas) y deja la muestra en un
+buffer circular en memoria. Cada RENDIMIENTO_INTERVALO segundos el buffer se
+agrega por vista y se guarda en MetricaVista: una fila por vista y período,
+no una por request.
+
+Las consultas repetidas (mismo SQL, distintos parámetros) son la huella de un
+N+1: una vista que lista 50 ventas y hace 50 veces la misma consulta de items.
+"""
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('inventario')
+
+# Duraciones que se guardan por vista y período para calcular percentiles
+MAX_DURACIONES = 200
+
+
+def _config(nombre: str, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+@dataclass(frozen=True)
+class Muestra:
+    """Mediciones de una request"""
+    vista: str
+    duracion_ms: float
+    db_ms: float
+    consultas: int
+    duplicadas: int
+    sql_duplicada: str = ''
+
+
+class ContadorConsultas:
+    """
+    execute_wrapper de Django: cuenta consultas y su tiempo sin depender de
+    DEBUG ni guardar el SQL de cada una (sólo un contador por texto SQL).
+    """
+    __slots__ = ('consultas', 'db_ms', 'por_sql')
+
+    def __init__(self):
+        self.consultas = 0
+        self.db_ms = 0.0
+        self.por_sql = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+            self.por_sql[sql] += 1
+
+    @property
+    def duplicadas(self) -> int:
+        """Consultas que repiten un SQL ya ejecutado en la misma request"""
+        return self.consultas - len(self.por_sql)
+
+    @property
+    def sql_mas_repetida(self) -> str:
+        if not self.duplicadas:
+            return ''
+        sql, _ = self.por_sql.most_common(1)[0]
+        return sql
+
+
+class BufferMuestras:
+    """Buffer circular de muestras, compartido por los hilos del proceso"""
+
+    def __init__(self, capacidad: int):
+        self._muestras = deque(maxlen=capacidad)
+        self._lock = threading.Lock()
+        self.ultimo_volcado = time.monotonic()
+
+    def agregar(self, muestra: Muestra):
+        # deque.append es atómico; el lock sólo protege el vaciado
+        self._muestras.append(muestra)
+
+    def tomar(self) -> List[Muestra]:
+        """Saca y devuelve todas las muestras pendientes"""
+        with self._lock:
+            muestras = list(self._muestras)
+            self._muestras.clear()
+            self.ultimo_volcado = time.monotonic()
+        return muestras
+
+    def vencido(self, intervalo: float) -> bool:
+        return time.monotonic() - self.ultimo_volcado >= intervalo
+
+    def __len__(self):
+        return len(self._muestras)
+
+
+buffer_muestras = BufferMuestras(_config('RENDIMIENTO_BUFFER', 5000))
+
+
+def debe_muestrear() -> bool:
+    """Si esta request se mide (RENDIMIENTO_MUESTREO, fracción entre 0 y 1)"""
+    fraccion = _config('RENDIMIENTO_MUESTREO', 1.0)
+    return fraccion >= 1 or random.random() < fraccion
+
+
+def agregar_muestras(muestras: List[Muestra]) -> Dict[str, dict]:
+    """
+    Agrega muestras por vista.
+
+    Returns:
+        dict: vista -> peticiones, sumas de tiempos/consultas, duraciones
+        (acotadas a MAX_DURACIONES) y el SQL más repetido
+    """
+    por_vista = defaultdict(lambda: {
+        'peticiones': 0, 'tiempo_total_ms': 0.0, 'tiempo_db_ms': 0.0,
+        'consultas': 0, 'duplicadas': 0, 'duplicadas_max': 0,
+        'duraciones': [], 'sql_duplicada': '',
+    })
+    for muestra in muestras:
+        datos = por_vista[muestra.vista]
+        datos['peticiones'] += 1
+        datos['tiempo_total_ms'] += muestra.duracion_ms
+        datos['tiempo_db_ms'] += muestra.db_ms
+        datos['consultas'] += muestra.consultas
+        datos['duplicadas'] += muestra.duplicadas
+        if muestra.duplicadas > datos['duplicadas_max']:
+            datos['duplicadas_max'] = muestra.duplicadas
+            datos['sql_duplicada'] = muestra.sql_duplicada
+        if len(datos['duraciones']) < MAX_DURACIONES:
+            datos['duraciones'].append(round(muestra.duracion_ms, 1))
+    return dict(por_vista)
+
+
+def volcar_muestras() -> int:
+    """
+    Guarda el buffer agregado en MetricaVista (o en el log si la base falla).
+
+    Returns:
+        int: Cantidad de muestras volcadas
+    """
+    from .models import MetricaVista
+
+    muestras = buffer_muestras.tomar()
+    if not muestras:
+        return 0
+    periodo = timezone.now().replace(second=0, microsecond=0)
+    agregadas = agregar_muestras(muestras)
+    try:
+        MetricaVista.objects.bulk_create([
+            MetricaVista(vista=vista, periodo=periodo, **datos)
+            for vista, datos in agregadas.items()
+        ])
+    except Exception as e:
+        logger.warning(f'No se pudieron guardar las métricas de rendimiento: {e}')
+        for vista, datos in agregadas.items():
+            logger.info(
+                f"rendimiento vista={vista} peticiones={datos['peticiones']} "
+                f"ms={datos['tiempo_total_ms']:.0f} db_ms={datos['tiempo_db_ms']:.0f} "
+                f"consultas={datos['consultas']} duplicadas={datos['duplicadas']}"
+            )
+    return len(muestras)
+
+
+def podar_metricas(dias: Optional[int] = None) -> int:
+    """
+    Borra las métricas más viejas que la retención (RENDIMIENTO_RETENCION_DIAS).
+    Cada proceso guarda una fila por vista y minuto: sin podar, la tabla y el
+    resumen crecen sin límite.
+
+    Returns:
+        int: Filas borradas
+    """
+    from .models import MetricaVista
+
+    dias = _config('RENDIMIENTO_RETENCION_DIAS', 14) if dias is None else dias
+    borradas = MetricaVista.objects.filter(periodo__lt=timezone.now() - timedelta(days=dias)).delete()[0]
+    logger.info(f'Métricas de rendimiento podadas: {borradas}')
+    return borradas
+
+
+def registrar_muestra(muestra: Muestra):
+    """Agrega la muestra y vuelca el buffer si pasó el intervalo"""
+    buffer_muestras.agregar(muestra)
+    if buffer_muestras.vencido(_config('RENDIMIENTO_INTERVALO', 60)):
+        volcar_muestras()
+
+
+def _percentil(valores: List[float], p: int) -> float:
+    if not valores:
+        return 0.0
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def resumen_rendimiento(horas: int = 24, top: Optional[int] = None) -> List[dict]:
+    """
+    Resumen por vista de las últimas `horas`: p50/p95 de latencia, tiempo de
+    base de datos y consultas por request, y consultas repetidas (N+1).
+
+    Returns:
+        list: Un dict por vista, de la más lenta (p95) a la más rápida
+    """
+    from .models import MetricaVista
+
+    filas = MetricaVista.objects.filter(periodo__gte=timezone.now() - timedelta(hours=horas))
+    por_vista = defaultdict(lambda: {'peticiones': 0, 'tiempo_db_ms': 0.0, 'consultas': 0,
+                                     'duplicadas': 0, 'duplicadas_max': 0, 'sql_duplicada': '',
+                                     'duraciones': []})
+    for fila in filas.iterator():
+        datos = por_vista[fila.vista]
+        datos['peticiones'] += fila.peticiones
+        datos['tiempo_db_ms'] += fila.tiempo_db_ms
+        datos['consultas'] += fila.consultas
+        datos['duplicadas'] += fila.duplicadas
+        datos['duraciones'].extend(fila.duraciones or [])
+        if fila.duplicadas_max > datos['duplicadas_max']:
+            datos['duplicadas_max'] = fila.duplicadas_max
+            datos['sql_duplicada'] = fila.sql_duplicada
+
+    resumen = []
+    for vista, datos in por_vista.items():
+        peticiones = datos['peticiones'] or 1
+        resumen.append({
+            'vista': vista,
+            'peticiones': datos['peticiones'],
+            'p50_ms': round(_percentil(datos['duraciones'], 50), 1),
+            'p95_ms': round(_percentil(datos['duraciones'], 95), 1),
+            'db_ms': round(datos['tiempo_db_ms'] / peticiones, 1),
+            'consultas': round(datos['consultas'] / peticiones, 1),
+            'duplicadas': round(datos['duplicadas'] / peticiones, 1),
+            'duplicadas_max': datos['duplicadas_max'],
+            'sql_duplicada': datos['sql_duplicada'],
+        })
+    resumen.sort(key=lambda v: v['p95_ms'], reverse=True)
+    return resumen[:top] if top else resumen
+
+
+def peores_n_mas_1(resumen: List[dict], top: int = 10) -> List[dict]:
+    """Vistas con más consultas repetidas por request (candidatas a N+1)"""
+    candidatas = [v for v in resumen if v['duplicadas'] > 0]
+    return sorted(candidatas, key=lambda v: v['duplicadas'], reverse=True)[:top]
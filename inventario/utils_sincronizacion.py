@@ -0,0 +1,163 @@
+"""
+Sincronización incremental del catálogo para las terminales POS
+
+Cada alta, edición, venta o borrado de un producto deja una fila en
+CambioCatalogo. Las terminales descargan el catálogo una vez (por páginas)
+y después piden sólo los cambios posteriores a su cursor (el id del último
+cambio visto): productos vigentes con precio, promo y stock, y las bajas
+(borrados o desactivados) como lápidas.
+
+El cursor que se devuelve no avanza sobre los cambios de los últimos
+MARGEN_CURSOR segundos: en PostgreSQL una transacción puede confirmar un id
+más bajo después de que otra confirmó uno más alto, y así no se pierde.
+Esos cambios recientes se vuelven a enviar en la próxima consulta (aplicarlos
+de nuevo no tiene efecto).
+"""
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CambioCatalogo, Producto
+
+logger = logging.getLogger('inventario')
+
+LIMITE_PAGINA = 5000
+MARGEN_CURSOR = 30
+DIAS_RETENCION = 7
+
+CAMPOS_POS = ('id', 'nombre', 'sku', 'precio', 'precio_promo', 'stock')
+
+
+def registrar_cambios_catalogo(producto_ids: Iterable[int], eliminado: bool = False) -> None:
+    """
+    Anota productos cambiados (para los UPDATE que no disparan señales)
+
+    Args:
+        producto_ids: IDs de los productos
+        eliminado: True si se borraron
+    """
+    CambioCatalogo.objects.bulk_create([
+        CambioCatalogo(producto_id=producto_id, eliminado=eliminado) for producto_id in producto_ids
+    ])
+
+
+def _datos_pos(productos) -> List[Dict[str, Any]]:
+    return [
+        {
+            'id': producto['id'],
+            'nombre': producto['nombre'],
+            'sku': producto['sku'] or '',
+            'precio': float(producto['precio']),
+            'precio_promo': float(producto['precio_promo']) if producto['precio_promo'] else None,
+            'stock': producto['stock'],
+        }
+        for producto in productos
+    ]
+
+
+def cursor_seguro(hasta: Optional[int] = None) -> int:
+    """
+    Último id de cambio que ya no puede quedar detrás de una transacción en
+    curso (ver MARGEN_CURSOR)
+
+    Args:
+        hasta: No pasar de este id (el último cambio enviado)
+    """
+    cambios = CambioCatalogo.objects.filter(fecha__lt=timezone.now() - timedelta(seconds=MARGEN_CURSOR))
+    if hasta is not None:
+        cambios = cambios.filter(id__lte=hasta)
+    return cambios.aggregate(ultimo=Max('id'))['ultimo'] or 0
+
+
+def version_catalogo() -> str:
+    """
+    Versión exacta del catálogo para el ETag de la sincronización: el último
+    cambio registrado y el cursor seguro (que avanza con el tiempo aunque no
+    haya cambios nuevos). Se lee de la base, no del caché, así que es la
+    misma en todos los workers.
+    """
+    ultimo = CambioCatalogo.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+    return f'{ultimo}.{cursor_seguro()}'
+
+
+def catalogo_completo(despues_de: int = 0, limite: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Una página del catálogo vigente ordenado por id
+
+    La primera página (despues_de=0) trae el cursor desde el que la terminal
+    debe pedir cambios; se toma antes de leer los productos para no perder
+    los que cambien durante la descarga.
+
+    Returns:
+        Dict con 'productos', 'siguiente' (id desde el que seguir o None) y,
+        en la primera página, 'cursor'
+    """
+    limite = limite or LIMITE_PAGINA
+    respuesta = {}
+    if not despues_de:
+        respuesta['cursor'] = cursor_seguro()
+    productos = _datos_pos(
+        Producto.objects.filter(activo=True, id__gt=despues_de).order_by('id').values(*CAMPOS_POS)[:limite]
+    )
+    respuesta['productos'] = productos
+    respuesta['siguiente'] = productos[-1]['id'] if len(productos) == limite else None
+    return respuesta
+
+
+def cambios_catalogo(cursor: int, limite: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Cambios del catálogo posteriores a `cursor`
+
+    Returns:
+        Dict con:
+        - 'productos': estado actual de los productos vigentes que cambiaron
+        - 'eliminados': ids borrados o desactivados
+        - 'cursor': cursor para la próxima consulta
+        - 'mas': True si quedaron cambios sin enviar (volver a pedir ya)
+        - 'reiniciar': True si el cursor es anterior a lo que se conserva y
+          hay que descargar el catálogo completo
+    """
+    limite = limite or LIMITE_PAGINA
+    primero = CambioCatalogo.objects.order_by('id').values_list('id', flat=True).first()
+    if cursor and primero is not None and cursor < primero - 1:
+        return {'reiniciar': True}
+
+    cambios = list(
+        CambioCatalogo.objects.filter(id__gt=cursor).order_by('id').values_list('id', 'producto_id')[:limite]
+    )
+    if not cambios:
+        return {'productos': [], 'eliminados': [], 'cursor': cursor, 'mas': False}
+
+    ids = {producto_id for _, producto_id in cambios}
+    vigentes = _datos_pos(Producto.objects.filter(id__in=ids, activo=True).values(*CAMPOS_POS))
+    eliminados = sorted(ids - {producto['id'] for producto in vigentes})
+    ultimo = cambios[-1][0]
+    mas = len(cambios) == limite
+    return {
+        'productos': vigentes,
+        'eliminados': eliminados,
+        # Con una página llena se avanza igual: si no, una carga masiva reciente se repetiría sin fin
+        'cursor': ultimo if mas else max(cursor, cursor_seguro(hasta=ultimo)),
+        'mas': mas,
+    }
+
+
+def podar_cambios_catalogo(dias: int = DIAS_RETENCION) -> int:
+    """
+    Borra los cambios más viejos que `dias`. Siempre conserva el último, así
+    una terminal con un cursor podado se detecta y se reinicia.
+
+    Returns:
+        int: Filas borradas
+    """
+    ultimo = CambioCatalogo.objects.aggregate(ultimo=Max('id'))['ultimo']
+    if ultimo is None:
+        return 0
+    borrados = CambioCatalogo.objects.filter(
+        fecha__lt=timezone.now() - timedelta(days=dias)
+    ).exclude(id=ultimo).delete()[0]
+    logger.info(f'Cambios de catálogo podados: {borrados}')
+    return borrados
@@ -0,0 +1,289 @@
+"""
+Tickets de venta pre-generados
+
+Una venta no cambia después de registrarse (la cancelación es un estado aparte
+que no se imprime), así que cada ticket se genera una sola vez por formato y se
+guarda en disco. Las reimpresiones son lecturas de archivo. La generación se
+encola al confirmar la venta; si no hay worker, se genera al primer pedido.
+Los archivos se podan pasados TICKETS_RETENCION_DIAS (se regeneran si se
+vuelven a pedir) y se borran con la venta.
+"""
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib.units import mm
+from reportlab.platypus import Table, Paragraph, Spacer
+
+from .models import Venta
+from .utils_pdf import (
+    PLANTILLAS, NEGOCIO_NOMBRE, NEGOCIO_DIRECCION, NEGOCIO_CIUDAD, NEGOCIO_TELEFONO,
+    TABLA_ITEMS_TERMICA, TABLA_ITEMS_A4, TABLA_FICHA_A4,
+    estilo, estilo_totales_a4, divisor, encabezado_negocio, contacto_negocio,
+    renderizar_pdf, archivo_en_cache,
+)
+from .utils_logging import span
+
+logger = logging.getLogger('inventario')
+
+# Impresora térmica de 58mm: 32 columnas con la fuente A
+ANCHO_ESCPOS = 32
+
+
+def _ticket_termico_pdf(venta, items, salida):
+    """Ticket PDF para impresora térmica 58mm"""
+    plantilla = PLANTILLAS['termica']
+    normal, centro, total = estilo('termica.normal'), estilo('termica.centro'), estilo('termica.total')
+    fecha_chile = timezone.localtime(venta.fecha)
+
+    elements = encabezado_negocio('termica')
+    elements += [Spacer(1, 3*mm), divisor(plantilla, 'termica'), Spacer(1, 3*mm)]
+
+    # ===== INFORMACIÓN DE LA VENTA =====
+    elements += [
+        Paragraph("TICKET DE VENTA", estilo('termica.negocio')),
+        Spacer(1, 2*mm),
+        Paragraph(f"Venta #: {venta.numero_venta}", normal),
+        Paragraph(f"Fecha: {fecha_chile.strftime('%d/%m/%Y')}", normal),
+        Paragraph(f"Hora: {fecha_chile.strftime('%H:%M')}", normal),
+    ]
+    if venta.usuario:
+        elements.append(Paragraph(f"Vendedor: {venta.usuario.username}", normal))
+    elements += [Spacer(1, 2*mm), divisor(plantilla, 'termica'), Spacer(1, 2*mm)]
+
+    # ===== PRODUCTOS =====
+    if items:
+        data = [['Cant.', 'Producto', 'Precio', 'Total']]
+        for item in items:
+            # Truncar nombre si es muy largo
+            nombre = item.nombre_producto[:25] + '...' if len(item.nombre_producto) > 25 else item.nombre_producto
+            data.append([str(item.cantidad), nombre, f"${item.precio_unitario:,.0f}", f"${item.subtotal:,.0f}"])
+        elements.append(Table(data, colWidths=[8*mm, 32*mm, 18*mm, 18*mm], style=TABLA_ITEMS_TERMICA))
+    else:
+        elements.append(Paragraph("No hay productos en esta venta.", centro))
+    elements += [Spacer(1, 2*mm), divisor(plantilla, 'termica'), Spacer(1, 2*mm)]
+
+    # ===== TOTALES Y PAGO =====
+    elements.append(Paragraph(f"Subtotal: ${venta.subtotal:,.0f}", total))
+    if venta.descuento > 0:
+        elements.append(Paragraph(f"Descuento: -${venta.descuento:,.0f}", total))
+    elements += [Paragraph(f"TOTAL: ${venta.total:,.0f}", total), Spacer(1, 3*mm)]
+
+    elements.append(Paragraph(f"Método de Pago: {venta.get_metodo_pago_display()}", normal))
+    if venta.metodo_pago in ['efectivo', 'mixto']:
+        elements.append(Paragraph(f"Monto Recibido: ${venta.monto_recibido:,.0f}", normal))
+        elements.append(Paragraph(f"Cambio: ${venta.cambio:,.0f}", normal))
+
+    elements += [
+        Spacer(1, 5*mm),
+        Paragraph("¡Gracias por su compra!", centro),
+        Spacer(1, 2*mm),
+        Paragraph("--- STOCKEX ---", centro),
+    ]
+    renderizar_pdf(salida, plantilla, elements)
+
+
+def _ticket_a4_pdf(venta, items, salida):
+    """Ticket PDF en formato A4, similar a las cotizaciones"""
+    plantilla = PLANTILLAS['a4']
+    fecha_chile = timezone.localtime(venta.fecha)
+
+    elements = encabezado_negocio('a4')
+    elements += [Spacer(1, 8*mm), divisor(plantilla), Spacer(1, 8*mm)]
+    elements += [Paragraph("TICKET DE VENTA", estilo('a4.titulo')), Spacer(1, 10*mm)]
+
+    # Información de la venta
+    info_data = [
+        ['Número de Venta:', venta.numero_venta],
+        ['Fecha:', fecha_chile.strftime('%d/%m/%Y')],
+        ['Hora:', fecha_chile.strftime('%H:%M')],
+        ['Método de Pago:', venta.get_metodo_pago_display()],
+    ]
+    if venta.usuario:
+        info_data.append(['Vendedor:', venta.usuario.username])
+    elements += [Table(info_data, colWidths=[60*mm, None], style=TABLA_FICHA_A4), Spacer(1, 10*mm)]
+
+    # Items
+    elements.append(Paragraph("<b>PRODUCTOS</b>", estilo('seccion')))
+    items_data = [['Cantidad', 'Producto', 'Precio Unit.', 'Subtotal']]
+    for item in items:
+        items_data.append([str(item.cantidad), item.nombre_producto,
+                           f"${item.precio_unitario:,.0f}", f"${item.subtotal:,.0f}"])
+    elements += [Table(items_data, colWidths=[40*mm, None, 50*mm, 50*mm], style=TABLA_ITEMS_A4), Spacer(1, 10*mm)]
+
+    # Totales
+    totales_data = [['Subtotal:', f"${venta.subtotal:,.0f}"]]
+    if venta.descuento > 0:
+        totales_data.append(['Descuento:', f"-${venta.descuento:,.0f}"])
+    totales_data.append(['<b>TOTAL:</b>', f"<b>${venta.total:,.0f}</b>"])
+    fila_total = len(totales_data) - 1
+    if venta.metodo_pago in ['efectivo', 'mixto']:
+        totales_data.append(['Monto Recibido:', f"${venta.monto_recibido:,.0f}"])
+        totales_data.append(['Cambio:', f"${venta.cambio:,.0f}"])
+    elements.append(Table(totales_data, colWidths=[None, 50*mm], style=estilo_totales_a4(fila_total)))
+
+    if venta.notas:
+        elements += [Spacer(1, 10*mm), Paragraph("<b>NOTAS:</b>", estilo('normal')), Paragraph(venta.notas, estilo('normal'))]
+
+    elements += [Spacer(1, 15*mm), Paragraph("¡Gracias por su compra!", estilo('a4.pie')), Spacer(1, 10*mm)]
+
+    # ===== DATOS DE CONTACTO AL FINAL =====
+    elements += [divisor(plantilla), Spacer(1, 5*mm)]
+    elements += contacto_negocio('a4')
+    elements.append(Spacer(1, 5*mm))
+    renderizar_pdf(salida, plantilla, elements)
+
+
+# ESC/POS: comandos básicos comunes a las impresoras térmicas
+ESC_INICIAR = b'\x1b@'
+ESC_TABLA_PC858 = b'\x1bt\x13'  # Multilingüe con €, cubre acentos y ñ
+ESC_CENTRO = b'\x1ba\x01'
+ESC_IZQUIERDA = b'\x1ba\x00'
+ESC_NEGRITA = b'\x1bE\x01'
+ESC_NORMAL = b'\x1bE\x00'
+ESC_DOBLE_ALTO = b'\x1d!\x01'
+ESC_TAMANO_NORMAL = b'\x1d!\x00'
+ESC_CORTE = b'\x1dVB\x03'  # Avanza 3 líneas y corta
+
+
+def _linea_escpos(izquierda: str, derecha: str = '') -> str:
+    espacio = ANCHO_ESCPOS - len(derecha)
+    return f"{izquierda[:max(espacio - 1, 0)]:<{espacio}}{derecha}\n"
+
+
+def _ticket_escpos(venta, items, salida):
+    """Ticket como bytes ESC/POS para enviar directo a la impresora térmica"""
+    fecha_chile = timezone.localtime(venta.fecha)
+    separador = '-' * ANCHO_ESCPOS + '\n'
+
+    def texto(valor: str) -> bytes:
+        return valor.encode('cp858', errors='replace')
+
+    partes = [ESC_INICIAR, ESC_TABLA_PC858, ESC_CENTRO, ESC_NEGRITA, ESC_DOBLE_ALTO,
+              texto(f"{NEGOCIO_NOMBRE}\n"), ESC_TAMANO_NORMAL, ESC_NORMAL,
+              texto(f"{NEGOCIO_DIRECCION}\n{NEGOCIO_CIUDAD}\nTel: {NEGOCIO_TELEFONO}\n"),
+              texto(separador), ESC_NEGRITA, texto("TICKET DE VENTA\n"), ESC_NORMAL, ESC_IZQUIERDA,
+              texto(f"Venta #: {venta.numero_venta}\n"),
+              texto(f"Fecha: {fecha_chile.strftime('%d/%m/%Y')}  Hora: {fecha_chile.strftime('%H:%M')}\n")]
+    if venta.usuario:
+        partes.append(texto(f"Vendedor: {venta.usuario.username}\n"))
+    partes.append(texto(separador))
+
+    if items:
+        for item in items:
+            partes.append(texto(f"{item.nombre_producto[:ANCHO_ESCPOS]}\n"))
+            partes.append(texto(_linea_escpos(f"  {item.cantidad} x ${item.precio_unitario:,.0f}", f"${item.subtotal:,.0f}")))
+    else:
+        partes.append(texto("No hay productos en esta venta.\n"))
+    partes.append(texto(separador))
+
+    partes.append(texto(_linea_escpos("Subtotal:", f"${venta.subtotal:,.0f}")))
+    if venta.descuento > 0:
+        partes.append(texto(_linea_escpos("Descuento:", f"-${venta.descuento:,.0f}")))
+    partes += [ESC_NEGRITA, texto(_linea_escpos("TOTAL:", f"${venta.total:,.0f}")), ESC_NORMAL]
+    partes.append(texto(f"Método de Pago: {venta.get_metodo_pago_display()}\n"))
+    if venta.metodo_pago in ['efectivo', 'mixto']:
+        partes.append(texto(_linea_escpos("Monto Recibido:", f"${venta.monto_recibido:,.0f}")))
+        partes.append(texto(_linea_escpos("Cambio:", f"${venta.cambio:,.0f}")))
+
+    partes += [ESC_CENTRO, texto("\n¡Gracias por su compra!\n--- STOCKEX ---\n"), ESC_CORTE]
+    salida.write(b''.join(partes))
+
+
+# formato -> (generador, content type, extensión)
+FORMATOS_TICKET = {
+    'termica': (_ticket_termico_pdf, 'application/pdf', 'pdf'),
+    'a4': (_ticket_a4_pdf, 'application/pdf', 'pdf'),
+    'escpos': (_ticket_escpos, 'application/octet-stream', 'bin'),
+}
+
+
+def directorio_tickets() -> Path:
+    return Path(settings.PDF_CACHE_DIR) / 'tickets'
+
+
+def ruta_ticket(venta, formato: str) -> Path:
+    """Archivo del ticket de una venta en un formato"""
+    extension = FORMATOS_TICKET[formato][2]
+    return directorio_tickets() / f'{venta.pk}_{venta.numero_venta}_{formato}.{extension}'
+
+
+def borrar_tickets_venta(venta) -> None:
+    """Borra los tickets generados de una venta (todos los formatos) al confirmar la transacción"""
+    rutas = [ruta_ticket(venta, formato) for formato in FORMATOS_TICKET]
+    transaction.on_commit(lambda: [ruta.unlink(missing_ok=True) for ruta in rutas])
+
+
+def podar_tickets(dias: Optional[int] = None) -> int:
+    """
+    Borra los tickets generados hace más de TICKETS_RETENCION_DIAS. Se guardan
+    tres archivos por venta: sin podar, el directorio crece sin límite. Una
+    reimpresión de una venta podada vuelve a generar su ticket.
+
+    Returns:
+        int: Archivos borrados
+    """
+    dias = getattr(settings, 'TICKETS_RETENCION_DIAS', 30) if dias is None else dias
+    limite = time.time() - dias * 86400
+    borrados = 0
+    for archivo in directorio_tickets().glob('*'):
+        try:
+            if archivo.is_file() and archivo.stat().st_mtime < limite:
+                archivo.unlink()
+                borrados += 1
+        except OSError:
+            pass
+    logger.info(f'Tickets de venta podados: {borrados}')
+    return borrados
+
+
+def obtener_ticket(venta, formato: str = 'termica') -> Path:
+    """
+    Devuelve el ticket de la venta, generándolo sólo si todavía no existe.
+
+    Args:
+        venta: Venta ya registrada
+        formato: 'termica', 'a4' o 'escpos'
+
+    Returns:
+        Path: Archivo del ticket
+    """
+    generador = FORMATOS_TICKET[formato][0]
+    return archivo_en_cache(
+        ruta_ticket(venta, formato),
+        lambda archivo: generador(venta, list(venta.items.all()), archivo),
+    )
+
+
+def generar_tickets_venta(venta_id: int) -> int:
+    """
+    Genera todos los formatos de ticket de una venta.
+
+    Returns:
+        Cantidad de formatos generados (0 si la venta no existe)
+    """
+    venta = Venta.objects.select_related('usuario').filter(pk=venta_id).first()
+    if venta is None:
+        return 0
+    for formato in FORMATOS_TICKET:
+        with span('ticket', formato=formato, venta_id=venta_id):
+            obtener_ticket(venta, formato)
+    return len(FORMATOS_TICKET)
+
+
+def encolar_tickets_venta(venta_id: int) -> None:
+    """
+    Encola la generación de tickets en el worker de Celery. Si no hay broker
+    no se bloquea la venta: el ticket se generará al primer pedido.
+    """
+    try:
+        from .tasks import broker_disponible, generar_tickets_venta_async
+        if not broker_disponible():
+            return
+        generar_tickets_venta_async.apply_async(args=[venta_id], retry=False)
+    except Exception as exc:
+        logger.warning(f'No se pudo encolar la generación de tickets de la venta {venta_id}: {str(exc)}')
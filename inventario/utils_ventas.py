@@ -0,0 +1,337 @@
+"""
+Registro de ventas: camino común para el POS y la conversión de cotizaciones
+
+Bloquea los productos en una sola consulta, descuenta el stock con un UPDATE
+condicional y crea items, movimientos e historial con bulk_create.
+"""
+import logging
+import re
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Optional, List, Dict, Any, Tuple
+
+from django.db import transaction, IntegrityError
+from django.db.models import Q, F, Case, When, IntegerField
+from django.utils import timezone
+
+from .models import (
+    Producto, Venta, ItemVenta, MovimientoStock, HistorialCambio,
+    NotificacionStock, CuentaPorCobrar, Cotizacion,
+)
+from .utils import invalidar_espacio_cache
+from .utils_logging import span
+from .utils_sincronizacion import registrar_cambios_catalogo
+from .utils_tickets import encolar_tickets_venta
+
+logger = logging.getLogger('inventario')
+
+DIAS_CREDITO_DEFAULT = 30
+CLAVE_IDEMPOTENCIA = re.compile(r'[A-Za-z0-9_-]{8,64}')
+
+
+class VentaError(ValueError):
+    """
+    Error de negocio al registrar una venta (producto inexistente, stock insuficiente, etc.)
+
+    `conflictos` detalla los productos sin stock suficiente: dicts con
+    'producto_id', 'nombre', 'disponible' y 'solicitado'.
+    """
+
+    def __init__(self, mensaje: str, conflictos: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(mensaje)
+        self.conflictos = conflictos or []
+
+
+def _bloquear_productos(cantidades: Dict[int, int]) -> Dict[int, Producto]:
+    """
+    Carga y bloquea los productos de la venta en una sola consulta, siempre en
+    orden de id para que dos ventas concurrentes no se bloqueen mutuamente.
+    """
+    productos = {
+        producto.pk: producto
+        for producto in Producto.objects.select_for_update().filter(pk__in=cantidades).order_by('pk')
+    }
+    for producto_id in cantidades:
+        if producto_id not in productos:
+            raise VentaError(f'Producto no encontrado (ID: {producto_id})')
+    conflictos = [
+        {'producto_id': producto_id, 'nombre': productos[producto_id].nombre,
+         'disponible': productos[producto_id].stock, 'solicitado': cantidad}
+        for producto_id, cantidad in cantidades.items()
+        if productos[producto_id].stock < cantidad
+    ]
+    if conflictos:
+        conflicto = conflictos[0]
+        raise VentaError(
+            f'Stock insuficiente para {conflicto["nombre"]}. '
+            f'Disponible: {conflicto["disponible"]}, Solicitado: {conflicto["solicitado"]}',
+            conflictos=conflictos,
+        )
+    return productos
+
+
+def _descontar_stock(cantidades: Dict[int, int]) -> None:
+    """
+    Descuenta el stock de todos los productos en un UPDATE. Cada fila sólo se
+    actualiza si todavía tiene stock suficiente, así que si alguna no cumple
+    (p.ej. motores sin SELECT FOR UPDATE) se aborta la venta completa.
+    """
+    condicion = Q()
+    for producto_id, cantidad in cantidades.items():
+        condicion |= Q(pk=producto_id, stock__gte=cantidad)
+    actualizados = Producto.objects.filter(condicion).update(
+        stock=Case(
+            *[When(pk=producto_id, then=F('stock') - cantidad) for producto_id, cantidad in cantidades.items()],
+            output_field=IntegerField(),
+        ),
+        fecha_actualizacion=timezone.now(),
+    )
+    if actualizados != len(cantidades):
+        raise VentaError('El stock cambió mientras se procesaba la venta. Intente nuevamente.')
+    # El UPDATE no dispara post_save: el caché del catálogo y el registro de cambios se actualizan a mano
+    invalidar_espacio_cache('catalogo')
+    invalidar_espacio_cache('reportes')
+    registrar_cambios_catalogo(cantidades)
+
+
+@span('registrar_venta')
+def registrar_venta(usuario, lineas: List[Dict[str, Any]], subtotal, descuento, total,
+                    metodo_pago: str = 'efectivo', monto_recibido=0, cambio=0, notas: str = '',
+                    cliente=None, es_credito: bool = False,
+                    dias_credito: int = DIAS_CREDITO_DEFAULT,
+                    clave_idempotencia: Optional[str] = None, fecha_offline=None,
+                    permitir_sin_producto: bool = False) -> Venta:
+    """
+    Registra una venta completa dentro de una transacción.
+
+    Args:
+        usuario: Vendedor que registra la venta
+        lineas: Dicts con 'producto_id', 'cantidad', 'precio_unitario' y
+                opcionalmente 'nombre_producto'
+        subtotal, descuento, total: Montos de la venta
+        metodo_pago: Método de pago (se fuerza 'credito' si es_credito)
+        monto_recibido, cambio: Montos del pago en efectivo
+        notas: Notas de la venta
+        cliente: Cliente asociado (obligatorio si es_credito)
+        es_credito: Si True, crea la cuenta por cobrar
+        dias_credito: Días hasta el vencimiento de la cuenta por cobrar
+        clave_idempotencia: Clave de la terminal (ver registrar_venta_idempotente)
+        fecha_offline: Cuándo se cobró, si se registró sin conexión
+        permitir_sin_producto: Acepta líneas con producto_id None (productos
+            borrados de una cotización); se registran sin descontar stock
+
+    Returns:
+        Venta: La venta creada
+
+    Raises:
+        VentaError: Si no hay items, falta un producto o no alcanza el stock
+    """
+    if not lineas:
+        raise VentaError('No hay items en la venta')
+    if es_credito and cliente is None:
+        raise VentaError('Se debe seleccionar un cliente para ventas a crédito')
+
+    # Cantidad total por producto (un producto puede venir en varias líneas)
+    cantidades = OrderedDict()
+    for linea in lineas:
+        if int(linea['cantidad']) < 1:
+            raise VentaError('La cantidad debe ser mayor a cero')
+        if not linea.get('producto_id'):
+            if not permitir_sin_producto:
+                raise VentaError('Hay un item sin producto')
+            continue
+        producto_id = int(linea['producto_id'])
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + int(linea['cantidad'])
+
+    with transaction.atomic():
+        with span('bloqueo_stock', productos=len(cantidades)):
+            productos = _bloquear_productos(cantidades)
+
+        venta = Venta.objects.create(
+            cliente=cliente,
+            usuario=usuario,
+            subtotal=subtotal,
+            descuento=descuento,
+            total=total,
+            metodo_pago='credito' if es_credito else metodo_pago,
+            monto_recibido=monto_recibido,
+            cambio=cambio,
+            es_credito=es_credito,
+            notas=notas,
+            clave_idempotencia=clave_idempotencia,
+            fecha_offline=fecha_offline,
+        )
+
+        if cantidades:
+            with span('descontar_stock', productos=len(cantidades)):
+                _descontar_stock(cantidades)
+
+        items, movimientos, historial = [], [], []
+        stock_actual = {producto_id: producto.stock for producto_id, producto in productos.items()}
+        for linea in lineas:
+            cantidad = int(linea['cantidad'])
+            precio_unitario = Decimal(str(linea['precio_unitario']))
+            producto = productos.get(int(linea['producto_id'])) if linea.get('producto_id') else None
+            if producto is None:
+                items.append(ItemVenta(
+                    venta=venta, producto=None,
+                    nombre_producto=linea.get('nombre_producto') or 'Producto eliminado',
+                    cantidad=cantidad, precio_unitario=precio_unitario,
+                    subtotal=precio_unitario * cantidad,
+                    stock_anterior=0, stock_despues=0,
+                ))
+                continue
+
+            stock_anterior = stock_actual[producto.pk]
+            stock_nuevo = stock_anterior - cantidad
+            stock_actual[producto.pk] = stock_nuevo
+            items.append(ItemVenta(
+                venta=venta, producto=producto,
+                nombre_producto=linea.get('nombre_producto') or producto.nombre,
+                cantidad=cantidad, precio_unitario=precio_unitario,
+                subtotal=precio_unitario * cantidad,
+                stock_anterior=stock_anterior, stock_despues=stock_nuevo,
+            ))
+            movimientos.append(MovimientoStock(
+                producto=producto, tipo='salida', cantidad=cantidad, motivo='venta',
+                stock_anterior=stock_anterior, stock_nuevo=stock_nuevo,
+                usuario=usuario, notas=f'Venta #{venta.numero_venta}',
+            ))
+            historial.append(HistorialCambio(
+                producto=producto, usuario=usuario, tipo_cambio='stock',
+                campo_modificado='stock', valor_anterior=str(stock_anterior), valor_nuevo=str(stock_nuevo),
+                descripcion=f'Venta: {cantidad} unidades - Venta #{venta.numero_venta}',
+            ))
+
+        ItemVenta.objects.bulk_create(items)
+        MovimientoStock.objects.bulk_create(movimientos)
+        HistorialCambio.objects.bulk_create(historial)
+
+        # Alertas de stock bajo (lo que hacía Producto.save al cruzar el mínimo)
+        NotificacionStock.objects.bulk_create([
+            NotificacionStock(producto=producto, stock_anterior=producto.stock, stock_actual=stock_actual[producto_id])
+            for producto_id, producto in productos.items()
+            if producto.stock > producto.stock_minimo >= stock_actual[producto_id]
+        ])
+
+        if es_credito:
+            hoy = timezone.now().date()
+            cuenta = CuentaPorCobrar.objects.create(
+                cliente=cliente,
+                venta=venta,
+                monto_total=total,
+                fecha_emision=hoy,
+                fecha_vencimiento=hoy + timedelta(days=dias_credito),
+                notas=f'Venta #{venta.numero_venta}'
+            )
+            logger.info(f'Cuenta por cobrar creada para venta #{venta.numero_venta}',
+                        extra={'user': getattr(usuario, 'username', None), 'cuenta_id': cuenta.id})
+
+        # El ticket que se imprime justo después del cobro ya estará en disco
+        venta_id = venta.pk
+        transaction.on_commit(lambda: encolar_tickets_venta(venta_id))
+
+    logger.info(f'Venta #{venta.numero_venta} registrada. Total: ${venta.total}',
+                extra={'user': getattr(usuario, 'username', None), 'venta_id': venta.id,
+                       'items': len(items), 'total': float(venta.total)})
+    return venta
+
+
+def _venta_por_clave(clave: str, usuario) -> Optional[Venta]:
+    venta = Venta.objects.filter(clave_idempotencia=clave).first()
+    if venta is not None and venta.usuario_id != getattr(usuario, 'pk', None):
+        raise VentaError('La clave de idempotencia pertenece a otra venta')
+    return venta
+
+
+def registrar_venta_idempotente(clave: str, usuario, **datos) -> Tuple[Venta, bool]:
+    """
+    Registra una venta una sola vez por clave generada en la terminal.
+
+    Si la terminal reintenta (se cortó la conexión antes de recibir la
+    respuesta) se devuelve la venta original sin volver a descontar stock.
+    Dos envíos simultáneos con la misma clave chocan en el índice único:
+    el segundo devuelve la venta del primero.
+
+    Args:
+        clave: Clave de idempotencia (8 a 64 caracteres: letras, números, - y _)
+        usuario: Vendedor
+        **datos: Resto de argumentos de registrar_venta
+
+    Returns:
+        Tuple[Venta, bool]: La venta y si ya estaba registrada
+
+    Raises:
+        VentaError: Si la clave es inválida, es de otro usuario o la venta se rechaza
+    """
+    if not CLAVE_IDEMPOTENCIA.fullmatch(clave or ''):
+        raise VentaError('Clave de idempotencia inválida')
+    existente = _venta_por_clave(clave, usuario)
+    if existente is not None:
+        return existente, True
+    try:
+        return registrar_venta(usuario, clave_idempotencia=clave, **datos), False
+    except IntegrityError:
+        existente = _venta_por_clave(clave, usuario)
+        if existente is None:
+            raise
+        return existente, True
+
+
+def convertir_cotizacion(cotizacion_id: int, usuario, metodo_pago: str = 'efectivo',
+                         queryset=None) -> Venta:
+    """
+    Convierte una cotización en venta por el mismo camino que el POS.
+
+    La cotización se bloquea antes de verificar convertida_en_venta y se marca
+    con un UPDATE condicional, así dos conversiones simultáneas no generan dos
+    ventas ni descuentan el stock dos veces.
+
+    Args:
+        cotizacion_id: ID de la cotización
+        usuario: Usuario que convierte
+        metodo_pago: Método de pago de la venta
+        queryset: QuerySet de Cotizacion permitido al usuario (por defecto, todas)
+
+    Returns:
+        Venta: La venta creada
+
+    Raises:
+        Cotizacion.DoesNotExist: Si la cotización no existe en el queryset
+        VentaError: Si ya fue convertida o no alcanza el stock
+    """
+    queryset = Cotizacion.objects.all() if queryset is None else queryset
+    with transaction.atomic():
+        cotizacion = queryset.select_for_update().get(pk=cotizacion_id)
+        if cotizacion.convertida_en_venta_id:
+            raise VentaError('Esta cotización ya fue convertida en venta')
+
+        lineas = [
+            {
+                'producto_id': item['producto_id'],
+                'cantidad': item['cantidad'],
+                'precio_unitario': item['precio_unitario'],
+                'nombre_producto': item['nombre_producto'],
+            }
+            for item in cotizacion.items.order_by('id').values('producto_id', 'cantidad', 'precio_unitario', 'nombre_producto')
+        ]
+        venta = registrar_venta(
+            usuario=usuario,
+            lineas=lineas,
+            subtotal=cotizacion.subtotal,
+            descuento=cotizacion.descuento,
+            total=cotizacion.total,
+            metodo_pago=metodo_pago,
+            cliente=cotizacion.cliente,
+            notas=f'Convertida desde cotización {cotizacion.numero_cotizacion}',
+            permitir_sin_producto=True,
+        )
+
+        marcada = Cotizacion.objects.filter(pk=cotizacion.pk, convertida_en_venta__isnull=True).update(
+            estado='aprobada', convertida_en_venta=venta
+        )
+        if not marcada:
+            raise VentaError('Esta cotización ya fue convertida en venta')
+
+    return venta
@@ -12,9 +12,14 @@ from django.db.models.functions import Lower, Replace
 from django.core.exceptions import ValidationError
 from django.core.cache import cache
 from datetime import timedelta
+import hashlib
+import json
 from .models import Producto, Categoria, HistorialCambio, ProductoFavorito, MovimientoStock
 from .forms import ProductoForm, CategoriaForm
-from .utils import es_admin_bossa, normalizar_texto, registrar_cambio, logger, get_categorias_cached
+from .utils import (
+    es_admin_bossa, normalizar_texto, registrar_cambio, logger, get_categorias_cached,
+    clave_cache, version_cache,
+)
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -162,39 +167,67 @@ def eliminar_producto(request, producto_id):
         'es_admin': True,
     })
 
-@login_required
-def inicio(request):
-    # Optimización: usar select_related para evitar N+1 queries
-    # NO usar only() aquí porque puede causar problemas con select_related
-    productos = Producto.objects.filter(activo=True).select_related('categoria')
-    query = request.GET.get('q', '')
+
+ORDENES_CATALOGO = {
+    'nombre_asc': 'nombre',
+    'nombre_desc': '-nombre',
+    'precio_asc': 'precio',
+    'precio_desc': '-precio',
+    'stock_asc': 'stock',
+    'stock_desc': '-stock',
+    'fecha_desc': '-fecha_creacion',
+}
+
+
+def _precio_filtro(valor, nombre, request):
+    """Convierte un filtro de precio; los inválidos se ignoran (y se registran)"""
+    if not valor:
+        return None
+    try:
+        return float(valor)
+    except (ValueError, TypeError):
+        logger.warning(f'{nombre} inválido: {valor}', extra={'user': request.user.username})
+        return None
+
+
+def _filtros_catalogo(request):
+    """
+    Filtros de inicio normalizados: los valores que no cambian el resultado
+    (espacios, precios inválidos, orden desconocido) no generan claves distintas.
+    """
     orden = request.GET.get('orden', 'nombre_asc')
-    categoria_id = request.GET.get('categoria', '')
-    precio_min = request.GET.get('precio_min', '')
-    precio_max = request.GET.get('precio_max', '')
-    stock_bajo = request.GET.get('stock_bajo', '')
-    con_imagen = request.GET.get('con_imagen', '')
-    vista = request.GET.get('vista', 'grid')  # grid o lista
+    return {
+        'q': request.GET.get('q', '').strip(),
+        'categoria': request.GET.get('categoria', '').strip(),
+        'precio_min': _precio_filtro(request.GET.get('precio_min', ''), 'Precio mínimo', request),
+        'precio_max': _precio_filtro(request.GET.get('precio_max', ''), 'Precio máximo', request),
+        'stock_bajo': request.GET.get('stock_bajo', '') == '1',
+        'con_imagen': request.GET.get('con_imagen', '') if request.GET.get('con_imagen', '') in ('0', '1') else '',
+        'orden': orden if orden in ORDENES_CATALOGO else '',
+    }
+
+
+def _filtrar_catalogo(filtros):
+    """Queryset de productos activos que cumplen los filtros, ya ordenado"""
+    productos = Producto.objects.filter(activo=True)
+    query = filtros['q']
+    categoria_id = filtros['categoria']
+    precio_min = filtros['precio_min']
+    precio_max = filtros['precio_max']
+    con_imagen = filtros['con_imagen']
+    orden = filtros['orden']
     
     # Filtros avanzados
     if categoria_id:
         productos = productos.filter(categoria_id=categoria_id)
     
-    if precio_min:
-        try:
-            productos = productos.filter(precio__gte=float(precio_min))
-        except (ValueError, TypeError):
-            logger.warning(f'Precio mínimo inválido: {precio_min}', extra={'user': request.user.username})
-            pass
+    if precio_min is not None:
+        productos = productos.filter(precio__gte=precio_min)
     
-    if precio_max:
-        try:
-            productos = productos.filter(precio__lte=float(precio_max))
-        except (ValueError, TypeError):
-            logger.warning(f'Precio máximo inválido: {precio_max}', extra={'user': request.user.username})
-            pass
+    if precio_max is not None:
+        productos = productos.filter(precio__lte=precio_max)
     
-    if stock_bajo == '1':
+    if filtros['stock_bajo']:
         productos = productos.filter(stock__lte=F('stock_minimo'))
     
     if con_imagen == '1':
@@ -249,26 +282,47 @@ def inicio(request):
         else:
             productos = productos_filtrados
     
-    # Ordenamiento
-    if orden == 'nombre_asc':
-        productos = productos.order_by('nombre')
-    elif orden == 'nombre_desc':
-        productos = productos.order_by('-nombre')
-    elif orden == 'precio_asc':
-        productos = productos.order_by('precio')
-    elif orden == 'precio_desc':
-        productos = productos.order_by('-precio')
-    elif orden == 'stock_asc':
-        productos = productos.order_by('stock')
-    elif orden == 'stock_desc':
-        productos = productos.order_by('-stock')
-    elif orden == 'fecha_desc':
-        productos = productos.order_by('-fecha_creacion')
+    # Ordenamiento (el id desempata para que el orden sea estable al cachearlo)
+    if orden:
+        productos = productos.order_by(ORDENES_CATALOGO[orden], 'id')
+    return productos
+
+
+def ids_catalogo(filtros):
+    """
+    IDs de los productos que cumplen los filtros, en orden, cacheados por
+    combinación de filtros y versión del catálogo (cualquier alta, edición o
+    venta los deja obsoletos al instante).
+
+    Args:
+        filtros: Dict devuelto por _filtros_catalogo
+
+    Returns:
+        list: IDs de productos
+    """
+    firma = hashlib.blake2b(json.dumps(filtros, sort_keys=True).encode('utf-8'), digest_size=12).hexdigest()
+    clave = clave_cache('catalogo', 'ids_inicio', firma)
+    return cache.get_or_set(clave, lambda: list(_filtrar_catalogo(filtros).values_list('id', flat=True)), 600)
+
+
+@login_required
+def inicio(request):
+    filtros = _filtros_catalogo(request)
+    query = filtros['q']
+    orden = request.GET.get('orden', 'nombre_asc')
+    categoria_id = request.GET.get('categoria', '')
+    precio_min = request.GET.get('precio_min', '')
+    precio_max = request.GET.get('precio_max', '')
+    stock_bajo = request.GET.get('stock_bajo', '')
+    con_imagen = request.GET.get('con_imagen', '')
+    vista = request.GET.get('vista', 'grid')  # grid o lista
     
-    # Paginación - IMPORTANTE: No evaluar el queryset antes de paginar
-    paginator = Paginator(productos, 24)  # 24 productos por página
+    # Paginación sobre la lista cacheada de IDs: sólo se cargan los productos de la página
+    paginator = Paginator(ids_catalogo(filtros), 24)  # 24 productos por página
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    en_pagina = Producto.objects.select_related('categoria').in_bulk(page_obj.object_list)
+    page_obj.object_list = [en_pagina[i] for i in page_obj.object_list if i in en_pagina]
     
     # Pre-calcular valores para evitar queries adicionales en el template
     total_resultados = paginator.count
@@ -284,25 +338,16 @@ def inicio(request):
     categorias = list(Categoria.objects.filter(id__in=categoria_ids).order_by('nombre')) if categoria_ids else []
     
     # Estadísticas rápidas - usar agregación en una sola consulta cuando sea posible
-    # OPTIMIZACIÓN: Cachear estas estadísticas si no hay filtros activos
-    # Usar try/except para evitar bloqueos si el cache falla
-    cache_key_stats = 'stats_inicio_global'  # Cache global, no por usuario
+    # Sin filtros se cachean en el espacio 'catalogo' (se invalida al guardar productos)
     if not query and not categoria_id and not precio_min and not precio_max and not stock_bajo and not con_imagen:
-        try:
-            stats = cache.get(cache_key_stats, timeout=1)  # Timeout corto para evitar bloqueos
-        except Exception:
-            stats = None
-        if stats is None:
+        def calcular_stats():
             # Calcular ambas estadísticas en una sola consulta usando agregación
             stats_data = Producto.objects.filter(activo=True).aggregate(
                 total=Count('id'),
                 stock_bajo=Count(Case(When(stock__lte=F('stock_minimo'), then=1), output_field=IntegerField()))
             )
-            stats = {'total': stats_data['total'] or 0, 'stock_bajo': stats_data['stock_bajo'] or 0}
-            try:
-                cache.set(cache_key_stats, stats, 300)  # Cache por 5 minutos
-            except Exception:
-                pass  # Si el cache falla, continuar sin cache
+            return {'total': stats_data['total'] or 0, 'stock_bajo': stats_data['stock_bajo'] or 0}
+        stats = cache.get_or_set(clave_cache('catalogo', 'stats_inicio'), calcular_stats, 300)  # Cache por 5 minutos
         total_productos = stats['total']
         productos_stock_bajo_count = stats['stock_bajo']
     else:
@@ -314,19 +359,13 @@ def inicio(request):
     # OPTIMIZACIÓN: Usar try/except para evitar bloqueos si el cache falla
     favoritos_ids = set()
     if request.user.is_authenticated:
-        cache_key_favoritos = f'favoritos_{request.user.id}'
-        try:
-            favoritos_ids = cache.get(cache_key_favoritos, timeout=1)  # Timeout corto
-        except Exception:
-            favoritos_ids = None
+        cache_key_favoritos = f'favoritos_{request.user.id}'  # Se invalida en signals al marcar/desmarcar
+        favoritos_ids = cache.get(cache_key_favoritos)
         if favoritos_ids is None:
             favoritos_ids = set(ProductoFavorito.objects.filter(
                 usuario=request.user
             ).values_list('producto_id', flat=True))
-            try:
-                cache.set(cache_key_favoritos, favoritos_ids, 300)  # Cache por 5 minutos
-            except Exception:
-                pass  # Si el cache falla, continuar sin cache
+            cache.set(cache_key_favoritos, favoritos_ids, 300)  # Cache por 5 minutos
         else:
             favoritos_ids = set(favoritos_ids)
     
@@ -348,6 +387,7 @@ def inicio(request):
         'page_range': page_range,  # Pre-calculado para evitar query en template
         'es_admin': es_admin_bossa(request.user),
         'favoritos_ids': favoritos_ids,  # IDs de productos favoritos
+        'version_categorias': version_cache('categorias'),  # parte de la clave de las tarjetas
     }
     
     return render(request, 'inventario/inicio.html', context)
@@ -6,8 +6,10 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Q
 from .models import Producto
 from .utils import normalizar_texto, logger
+from .utils_condicional import condicional
 
 @login_required
+@condicional('catalogo')
 def buscar_productos_api(request):
     """API para autocompletado de búsqueda de productos"""
     query = request.GET.get('q', '').strip()
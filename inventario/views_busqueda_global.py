@@ -11,6 +11,7 @@ from .models import (
     HistorialBusqueda, LogAccion
 )
 from .utils import normalizar_texto, logger, es_admin_bossa
+from .utils_condicional import condicional
 import json
 
 def get_client_ip(request):
@@ -170,6 +171,7 @@ def busqueda_global(request):
     return render(request, 'inventario/busqueda_global.html', context)
 
 @login_required
+@condicional('catalogo', 'clientes', 'ventas', 'cotizaciones')
 def busqueda_global_api(request):
     """API para búsqueda global con autocompletado"""
     query = request.GET.get('q', '').strip()
@@ -4,9 +4,10 @@ Vistas para gestión de clientes
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Sum, Count
+from django.db.models import Q
 from django.core.paginator import Paginator
 from django.http import JsonResponse
+import uuid
 from .models import Cliente, Venta, CuentaPorCobrar
 from .utils import es_admin_bossa, normalizar_texto, logger
 
@@ -39,10 +40,9 @@ def listar_clientes(request):
     if orden == 'nombre':
         clientes = clientes.order_by('nombre')
     elif orden == 'total_compras':
-        clientes = clientes.annotate(total=Sum('ventas__total')).order_by('-total')
+        clientes = clientes.order_by('-total_compras', 'nombre')
     elif orden == 'saldo_pendiente':
-        # Ordenar por saldo pendiente (más complejo, se hace después)
-        pass
+        clientes = clientes.order_by('-saldo_pendiente', 'nombre')
     
     # Paginación
     paginator = Paginator(clientes, 20)
@@ -116,7 +116,7 @@ def detalle_cliente(request, cliente_id):
     # Cuentas por cobrar
     cuentas_por_cobrar = CuentaPorCobrar.objects.filter(cliente=cliente).order_by('-fecha_emision')[:10]
     
-    # Estadísticas
+    # Estadísticas (columnas desnormalizadas, ver Cliente.ajustar_totales)
     total_ventas = cliente.total_compras
     cantidad_ventas = cliente.cantidad_ventas
     saldo_pendiente = cliente.saldo_pendiente
@@ -128,6 +128,7 @@ def detalle_cliente(request, cliente_id):
         'total_ventas': total_ventas,
         'cantidad_ventas': cantidad_ventas,
         'saldo_pendiente': saldo_pendiente,
+        'clave_pago': uuid.uuid4().hex,
         'es_admin': es_admin_bossa(request.user),
     }
     
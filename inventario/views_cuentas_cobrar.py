@@ -4,13 +4,14 @@ Vistas para gestión de cuentas por cobrar
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Sum
+from django.db.models import Q
 from django.core.paginator import Paginator
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Sum
-from .models import Cliente, CuentaPorCobrar, PagoCliente, Venta
+import uuid
+from .models import Cliente, CuentaPorCobrar
 from .utils import es_admin_bossa, logger
+from .utils_cobranza import calcular_antiguedad_saldos, aplicar_pago_cliente
 
 
 @login_required
@@ -32,7 +33,7 @@ def listar_cuentas_cobrar(request):
         hoy = timezone.now().date()
         cuentas = cuentas.filter(
             fecha_vencimiento__lt=hoy,
-            estado__in=['pendiente', 'parcial']
+            estado__in=CuentaPorCobrar.ESTADOS_ABIERTOS
         )
     
     # Búsqueda
@@ -53,10 +54,9 @@ def listar_cuentas_cobrar(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Estadísticas
-    total_pendiente = cuentas.filter(estado__in=['pendiente', 'parcial']).aggregate(
-        total=Sum('monto_total') - Sum('monto_pagado')
-    )['total'] or 0
+    # Estadísticas: saldo por tramo de antigüedad de las cuentas filtradas
+    antiguedad = calcular_antiguedad_saldos(cuentas=cuentas)
+    total_pendiente = antiguedad['totales']['total']
     
     context = {
         'cuentas': page_obj,
@@ -66,6 +66,7 @@ def listar_cuentas_cobrar(request):
         'vencidas': vencidas,
         'orden': orden,
         'total_pendiente': max(0, total_pendiente),
+        'antiguedad_por_tramo': antiguedad['por_tramo'],
         'es_admin': es_admin_bossa(request.user),
     }
     
@@ -81,61 +82,80 @@ def detalle_cuenta_cobrar(request, cuenta_id):
     context = {
         'cuenta': cuenta,
         'pagos': pagos,
+        'clave_pago': uuid.uuid4().hex,
         'es_admin': es_admin_bossa(request.user),
     }
     
     return render(request, 'inventario/detalle_cuenta_cobrar.html', context)
 
 
+def _procesar_pago(request, cliente_id, cuenta_ids=None):
+    """
+    Lee el formulario de pago y lo aplica con aplicar_pago_cliente.
+    Devuelve True si el pago quedó registrado (o ya lo estaba).
+    """
+    fecha_pago = request.POST.get('fecha_pago', '')
+    if fecha_pago:
+        from datetime import datetime
+        try:
+            fecha_pago = datetime.strptime(fecha_pago, '%Y-%m-%d').date()
+        except ValueError:
+            messages.error(request, 'Fecha de pago inválida.')
+            return False
+    
+    try:
+        resultado = aplicar_pago_cliente(
+            cliente_id=cliente_id,
+            monto=request.POST.get('monto', '0'),
+            fecha_pago=fecha_pago or None,
+            metodo_pago=request.POST.get('metodo_pago', 'efectivo'),
+            referencia=request.POST.get('referencia', '').strip() or None,
+            notas=request.POST.get('notas', '').strip() or None,
+            usuario=request.user,
+            cuenta_ids=cuenta_ids,
+            clave_idempotencia=request.POST.get('clave_idempotencia', '').strip() or None,
+        )
+    except ValueError as e:
+        messages.error(request, str(e))
+        return False
+    except Exception as e:
+        logger.error(f'Error al registrar pago: {str(e)}')
+        messages.error(request, f'Error al registrar pago: {str(e)}')
+        return False
+    
+    if resultado['duplicado']:
+        messages.info(request, 'Este pago ya había sido registrado.')
+    else:
+        messages.success(
+            request,
+            f"Pago de ${resultado['monto_aplicado']:,.0f} registrado exitosamente "
+            f"en {len(resultado['pagos'])} cuenta(s)."
+        )
+    return True
+
+
 @login_required
 def registrar_pago(request, cuenta_id):
     """Registrar un pago a una cuenta por cobrar"""
     cuenta = get_object_or_404(CuentaPorCobrar, id=cuenta_id)
     
     if request.method == 'POST':
-        monto = request.POST.get('monto', '0')
-        fecha_pago = request.POST.get('fecha_pago', '')
-        metodo_pago = request.POST.get('metodo_pago', 'efectivo')
-        referencia = request.POST.get('referencia', '').strip() or None
-        notas = request.POST.get('notas', '').strip() or None
-        
-        try:
-            monto = float(monto)
-            if monto <= 0:
-                messages.error(request, 'El monto debe ser mayor a cero.')
-            elif monto > cuenta.saldo_pendiente:
-                messages.error(request, f'El monto no puede ser mayor al saldo pendiente (${cuenta.saldo_pendiente:,.0f}).')
-            else:
-                if not fecha_pago:
-                    fecha_pago = timezone.now().date()
-                else:
-                    from datetime import datetime
-                    fecha_pago = datetime.strptime(fecha_pago, '%Y-%m-%d').date()
-                
-                pago = PagoCliente.objects.create(
-                    cuenta_por_cobrar=cuenta,
-                    monto=monto,
-                    fecha_pago=fecha_pago,
-                    metodo_pago=metodo_pago,
-                    referencia=referencia,
-                    notas=notas,
-                    usuario=request.user
-                )
-                
-                # Actualizar cuenta
-                cuenta.refresh_from_db()
-                
-                messages.success(request, f'Pago de ${monto:,.0f} registrado exitosamente.')
-                return redirect('detalle_cuenta_cobrar', cuenta_id=cuenta.id)
-        except ValueError:
-            messages.error(request, 'Monto inválido.')
-        except Exception as e:
-            logger.error(f'Error al registrar pago: {str(e)}')
-            messages.error(request, f'Error al registrar pago: {str(e)}')
+        _procesar_pago(request, cuenta.cliente_id, cuenta_ids=[cuenta.id])
     
     return redirect('detalle_cuenta_cobrar', cuenta_id=cuenta.id)
 
 
+@login_required
+def registrar_pago_cliente(request, cliente_id):
+    """Registrar un pago de un cliente repartido entre sus cuentas abiertas, de la más antigua a la más nueva"""
+    cliente = get_object_or_404(Cliente, id=cliente_id)
+    
+    if request.method == 'POST':
+        _procesar_pago(request, cliente.id)
+    
+    return redirect('detalle_cliente', cliente_id=cliente.id)
+
+
 @login_required
 def crear_cuenta_cobrar(request, cliente_id=None):
     """Crear una cuenta por cobrar manualmente"""
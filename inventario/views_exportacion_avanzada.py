@@ -12,20 +12,15 @@ from django.conf import settings
 from django.template.loader import render_to_string
 import json
 import csv
-import io
 from datetime import datetime, timedelta
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 from .models import (
     Producto, Cliente, Venta, Cotizacion, 
     Factura, Proveedor, OrdenCompra, LogAccion
 )
-from .utils import es_admin_bossa, logger
+from .utils import es_admin_bossa, logger, rango_fechas
+from .utils_pdf import documento_tabla, respuesta_pdf
 
 @login_required
 def exportacion_avanzada(request):
@@ -95,10 +90,7 @@ def exportar_json(request, tipo_datos, fecha_desde, fecha_hasta, incluir_inactiv
     
     elif tipo_datos == 'ventas':
         ventas = Venta.objects.filter(cancelada=False).select_related('cliente', 'usuario')
-        if fecha_desde:
-            ventas = ventas.filter(fecha__date__gte=fecha_desde)
-        if fecha_hasta:
-            ventas = ventas.filter(fecha__date__lte=fecha_hasta)
+        ventas = ventas.filter(rango_fechas('fecha', fecha_desde, fecha_hasta))
         
         datos['ventas'] = [
             {
@@ -189,55 +181,33 @@ def exportar_excel_avanzado(request, tipo_datos, fecha_desde, fecha_hasta, inclu
 
 def exportar_pdf_avanzado(request, tipo_datos, fecha_desde, fecha_hasta, incluir_inactivos):
     """Exporta datos a PDF con formato avanzado"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        textColor=colors.HexColor('#667eea'),
-        spaceAfter=20,
-        alignment=1
-    )
-    
-    elements.append(Paragraph(f"Reporte de {tipo_datos.title()}", title_style))
-    elements.append(Spacer(1, 0.2*inch))
+    encabezados, filas = ['Sin datos'], []
     
     if tipo_datos == 'productos':
         productos = Producto.objects.all()
         if not incluir_inactivos:
             productos = productos.filter(activo=True)
-        productos = productos.select_related('categoria')
+        productos = productos.select_related('categoria').only(
+            'sku', 'nombre', 'precio', 'stock', 'categoria__nombre'
+        )
         
-        data = [['SKU', 'Nombre', 'Categoría', 'Precio', 'Stock']]
-        for producto in productos:
-            data.append([
+        encabezados = ['SKU', 'Nombre', 'Categoría', 'Precio', 'Stock']
+        filas = (
+            [
                 producto.sku or '-',
                 producto.nombre[:30],
                 (producto.categoria.nombre[:15] if producto.categoria else '-'),
                 f"${producto.precio:,.0f}",
                 str(producto.stock)
-            ])
-    
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{tipo_datos}_{datetime.now().strftime("%Y%m%d")}.pdf"'
-    return response
+            ]
+            for producto in productos.iterator(chunk_size=2000)
+        )
+    
+    return respuesta_pdf(
+        lambda salida: documento_tabla(salida, f"Reporte de {tipo_datos.title()}", encabezados, filas),
+        f'{tipo_datos}_{datetime.now().strftime("%Y%m%d")}.pdf',
+        as_attachment=True,
+    )
 
 def exportar_csv_avanzado(request, tipo_datos, fecha_desde, fecha_hasta, incluir_inactivos):
     """Exporta datos a CSV con opciones avanzadas"""
@@ -9,17 +9,39 @@ from django.utils import timezone
 from django.views.decorators.http import require_POST
 from datetime import timedelta
 import csv
-import io
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 from .models import Producto, Categoria, HistorialCambio
 from .forms import ProductoForm, CategoriaForm
-from .utils import es_admin_bossa, registrar_cambio, logger
+from .utils import es_admin_bossa, registrar_cambio, logger, clave_cache
+from .utils_cache import cached_computation
+from .utils_cobranza import obtener_resumen_antiguedad
+from .utils_pdf import documento_tabla, respuesta_pdf
+
+def _estadisticas_dashboard(hoy):
+    """Agregados del dashboard (los widgets caros); se cachean por día en el espacio 'catalogo'"""
+    total_productos = Producto.objects.count()
+    productos_activos = Producto.objects.filter(activo=True).count()
+    return {
+        'total_productos': total_productos,
+        'productos_activos': productos_activos,
+        'productos_inactivos': total_productos - productos_activos,
+        'productos_stock_bajo': Producto.objects.filter(activo=True).filter(stock__lte=F('stock_minimo')).count(),
+        'productos_sin_imagen': Producto.objects.filter(imagen__isnull=True).count(),
+        # Valor del inventario
+        'valor_inventario': Producto.objects.aggregate(
+            total=Sum(F('precio') * F('stock'))
+        )['total'] or 0,
+        # Productos por categoría
+        'productos_por_categoria': list(Categoria.objects.annotate(
+            cantidad=Count('producto')
+        ).order_by('-cantidad')[:10]),
+        # Estadísticas de tiempo
+        'productos_hoy': Producto.objects.filter(fecha_creacion__date=hoy).count(),
+        'productos_semana': Producto.objects.filter(fecha_creacion__gte=hoy - timedelta(days=7)).count(),
+        'productos_mes': Producto.objects.filter(fecha_creacion__gte=hoy - timedelta(days=30)).count(),
+    }
+
 
 @login_required
 def dashboard(request):
@@ -28,22 +50,13 @@ def dashboard(request):
         messages.error(request, 'No tienes permisos para acceder al dashboard.')
         return redirect('inicio')
     
-    # Estadísticas generales
-    total_productos = Producto.objects.count()
-    productos_activos = Producto.objects.filter(activo=True).count()
-    productos_inactivos = total_productos - productos_activos
-    productos_stock_bajo = Producto.objects.filter(activo=True).filter(stock__lte=F('stock_minimo')).count()
-    productos_sin_imagen = Producto.objects.filter(imagen__isnull=True).count()
-    
-    # Valor del inventario
-    valor_inventario = Producto.objects.aggregate(
-        total=Sum(F('precio') * F('stock'))
-    )['total'] or 0
-    
-    # Productos por categoría
-    productos_por_categoria = Categoria.objects.annotate(
-        cantidad=Count('producto')
-    ).order_by('-cantidad')[:10]
+    # Estadísticas generales: cacheadas sin estampidas al vencer
+    hoy = timezone.now().date()
+    estadisticas = cached_computation(
+        clave_cache('catalogo', 'dashboard', hoy.isoformat()),
+        lambda: _estadisticas_dashboard(hoy),
+        300,
+    )
     
     # Productos con stock bajo - Optimización: select_related
     productos_bajo_stock = Producto.objects.filter(
@@ -57,26 +70,12 @@ def dashboard(request):
     # Cambios recientes
     cambios_recientes = HistorialCambio.objects.select_related('producto', 'usuario').order_by('-fecha')[:10]
     
-    # Estadísticas de tiempo
-    hoy = timezone.now().date()
-    productos_hoy = Producto.objects.filter(fecha_creacion__date=hoy).count()
-    productos_semana = Producto.objects.filter(fecha_creacion__gte=hoy - timedelta(days=7)).count()
-    productos_mes = Producto.objects.filter(fecha_creacion__gte=hoy - timedelta(days=30)).count()
-    
     context = {
-        'total_productos': total_productos,
-        'productos_activos': productos_activos,
-        'productos_inactivos': productos_inactivos,
-        'productos_stock_bajo': productos_stock_bajo,
-        'productos_sin_imagen': productos_sin_imagen,
-        'valor_inventario': valor_inventario,
-        'productos_por_categoria': productos_por_categoria,
+        **estadisticas,
         'productos_bajo_stock': productos_bajo_stock,
         'productos_recientes': productos_recientes,
         'cambios_recientes': cambios_recientes,
-        'productos_hoy': productos_hoy,
-        'productos_semana': productos_semana,
-        'productos_mes': productos_mes,
+        'resumen_antiguedad': obtener_resumen_antiguedad(),
         'es_admin': True,
     }
     
@@ -172,57 +171,25 @@ def exportar_excel(request):
 def exportar_pdf(request):
     """Exporta productos a PDF"""
     # Optimización: usar select_related para evitar N+1 queries
-    productos = Producto.objects.filter(activo=True).select_related('categoria').order_by('nombre')
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#667eea'),
-        spaceAfter=30,
-        alignment=1
-    )
-    
-    # Título
-    elements.append(Paragraph("Lista de Productos", title_style))
-    elements.append(Spacer(1, 0.2*inch))
+    productos = Producto.objects.filter(activo=True).select_related('categoria').only(
+        'sku', 'nombre', 'precio', 'stock', 'categoria__nombre'
+    ).order_by('nombre')
     
-    # Tabla de datos
-    data = [['SKU', 'Nombre', 'Categoría', 'Precio', 'Stock']]
-    
-    for producto in productos:
-        data.append([
+    filas = (
+        [
             producto.sku or '-',
             producto.nombre[:30],
             producto.categoria.nombre[:15] if producto.categoria else '-',
             f"${producto.precio:,.0f}",
             str(producto.stock)
-        ])
-    
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="productos.pdf"'
-    return response
+        ]
+        for producto in productos.iterator(chunk_size=2000)
+    )
+    return respuesta_pdf(
+        lambda salida: documento_tabla(salida, "Lista de Productos", ['SKU', 'Nombre', 'Categoría', 'Precio', 'Stock'], filas),
+        'productos.pdf',
+        as_attachment=True,
+    )
 
 @login_required
 def exportar_csv(request):
@@ -6,8 +6,10 @@ from django.core.paginator import Paginator
 from django.http import JsonResponse
 from .models import Factura, ItemFactura, Proveedor, Producto, HistorialCambio, Categoria
 from .forms_facturas import FacturaForm, ItemFacturaForm, ProveedorForm
-from .utils_ocr import extraer_texto_ocr, extraer_items_factura
-from .utils import es_admin_bossa, registrar_cambio
+from .utils_ocr import encolar_ocr_factura, procesar_factura_ocr, texto_ocr_cacheado
+from .utils_coincidencias import CONFIANZA_SUGERENCIA, obtener_indice
+from .utils import es_admin_bossa, registrar_cambio, logger
+from django.db import transaction
 from django.conf import settings
 
 @login_required
@@ -55,110 +57,38 @@ def subir_factura(request):
             factura.save()  # Guardar primero para tener el archivo disponible
 
             # =====================
-            # PROCESAR OCR (ASÍNCRONO CON CELERY SI ESTÁ DISPONIBLE)
+            # PROCESAR OCR (SIEMPRE FUERA DEL REQUEST)
             # =====================
-            texto_extraido = ""
-            usar_celery = not getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False)
-            
+            # Si este mismo archivo ya pasó por OCR, el texto está cacheado y
+            # los items se crean al tiro; si no, lo procesa Celery o el worker local
             try:
-                # Intentar usar Celery si está disponible
-                if usar_celery:
-                    try:
-                        from .tasks import procesar_factura_ocr_async
-                        # Procesar de forma asíncrona
-                        task = procesar_factura_ocr_async.delay(factura.id)
-                        messages.info(
+                if texto_ocr_cacheado(factura.archivo.path) is not None:
+                    items_detectados = procesar_factura_ocr(factura)
+                    if items_detectados:
+                        messages.success(
                             request,
-                            f'Factura subida exitosamente. El procesamiento OCR está en curso. '
-                            f'ID de tarea: {task.id}. La factura se actualizará automáticamente cuando termine.'
+                            f'Factura procesada exitosamente. Se detectaron {items_detectados} item(s).'
                         )
-                        # No esperamos el resultado, se procesará en background
-                        texto_extraido = ""  # Se procesará después
-                    except Exception as celery_error:
-                        # Si Celery falla, procesar de forma síncrona
-                        usar_celery = False
-                        messages.warning(
+                    else:
+                        messages.info(
                             request,
-                            f'Celery no disponible ({str(celery_error)}). Procesando OCR de forma síncrona...'
+                            'Factura subida correctamente. No se detectaron items automáticamente. '
+                            'Puedes agregarlos manualmente en la siguiente pantalla.'
                         )
-                
-                # Procesar de forma síncrona si Celery no está disponible o falló
-                if not usar_celery:
-                    ruta_imagen = factura.archivo.path
-                    
-                    # Verificar que el archivo existe
-                    import os
-                    if not os.path.exists(ruta_imagen):
-                        messages.error(request, f'El archivo no se encontró en: {ruta_imagen}')
-                    else:
-                        texto_extraido = extraer_texto_ocr(ruta_imagen)
-                        factura.texto_extraido = texto_extraido
-                        factura.save()
-                        
-                        # Debug: mostrar longitud del texto extraído
-                        if texto_extraido:
-                            messages.success(
-                                request, 
-                                f'OCR completado exitosamente. Se extrajeron {len(texto_extraido)} caracteres de texto.'
-                            )
-                        else:
-                            messages.warning(
-                                request,
-                                'OCR completado pero no se extrajo texto. '
-                                'Verifica que la imagen sea legible y tenga buena calidad.'
-                            )
-                        
+                else:
+                    factura_id = factura.id
+                    transaction.on_commit(lambda: encolar_ocr_factura(factura_id))
+                    messages.info(
+                        request,
+                        'Factura subida exitosamente. El procesamiento OCR está en curso; '
+                        'recarga la página en unos segundos para ver el texto y los items detectados.'
+                    )
             except Exception as e:
-                import traceback
-                error_detalle = traceback.format_exc()
+                logger.error(f'Error al iniciar el OCR de la factura {factura.id}: {str(e)}', exc_info=True)
                 messages.error(
                     request, 
                     f'Error al procesar OCR: {str(e)}. '
-                    'Verifica la consola del servidor para más detalles.'
-                )
-                print(f"Error detallado en OCR:\n{error_detalle}")
-
-            # =====================
-            # EXTRAER ITEMS DE LA FACTURA
-            # =====================
-            items_detectados = []
-            if texto_extraido:
-                try:
-                    items_detectados = extraer_items_factura(texto_extraido)
-                except Exception as e:
-                    messages.warning(
-                        request, 
-                        f'Error al extraer items automáticamente: {str(e)}. '
-                        'Puedes agregarlos manualmente.'
-                    )
-
-            # Crear items detectados en la base de datos
-            for item in items_detectados:
-                try:
-                    ItemFactura.objects.create(
-                        factura=factura,
-                        nombre_producto=item['nombre'],
-                        cantidad=item['cantidad'],
-                        precio_unitario=item['precio'],
-                        subtotal=item['cantidad'] * item['precio']
-                    )
-                except Exception as e:
-                    messages.warning(
-                        request, 
-                        f'Error al guardar item "{item.get("nombre", "desconocido")}": {str(e)}'
-                    )
-
-            # Mensajes de resultado
-            if not items_detectados:
-                messages.info(
-                    request,
-                    'Factura subida correctamente. No se detectaron items automáticamente. '
-                    'Puedes agregarlos manualmente en la siguiente pantalla.'
-                )
-            else:
-                messages.success(
-                    request,
-                    f'Factura procesada exitosamente. Se detectaron {len(items_detectados)} item(s).'
+                    'Puedes agregar los items manualmente.'
                 )
 
             return redirect('editar_factura', factura_id=factura.id)
@@ -317,6 +247,16 @@ def editar_factura(request, factura_id):
             messages.success(request, 'Item agregado correctamente.')
             return redirect('editar_factura', factura_id=factura.id)
     
+    # Sugerencia de producto para los items sin asignar (un solo índice en memoria)
+    items = list(items)
+    pendientes = [item for item in items if not item.producto_id]
+    if pendientes:
+        indice = obtener_indice()
+        for item in pendientes:
+            candidatos = indice.buscar(item.codigo, item.nombre_producto, limite=1)
+            if candidatos and candidatos[0].confianza >= CONFIANZA_SUGERENCIA:
+                item.sugerencia = candidatos[0]
+    
     context = {
         'factura': factura,
         'items': items,
@@ -354,7 +294,6 @@ def eliminar_factura(request, factura_id):
         if factura.archivo:
             try:
                 import os
-                from django.conf import settings
                 file_path = settings.MEDIA_ROOT / factura.archivo.name
                 if file_path.exists():
                     os.remove(file_path)
@@ -8,7 +8,8 @@ from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils import timezone
 from .models import Producto, HistorialPrecio
-from .utils import es_admin_bossa, logger
+from .utils import es_admin_bossa, logger, rango_fechas
+from .utils_paginacion import paginar_historial
 
 
 @login_required
@@ -21,10 +22,7 @@ def historial_precios_producto(request, producto_id):
     fecha_desde = request.GET.get('fecha_desde', '')
     fecha_hasta = request.GET.get('fecha_hasta', '')
     
-    if fecha_desde:
-        historial = historial.filter(fecha__date__gte=fecha_desde)
-    if fecha_hasta:
-        historial = historial.filter(fecha__date__lte=fecha_hasta)
+    historial = historial.filter(rango_fechas('fecha', fecha_desde, fecha_hasta))
     
     # Paginación
     paginator = Paginator(historial, 20)
@@ -70,10 +68,7 @@ def historial_precios_general(request):
     
     if producto_id:
         historial = historial.filter(producto_id=producto_id)
-    if fecha_desde:
-        historial = historial.filter(fecha__date__gte=fecha_desde)
-    if fecha_hasta:
-        historial = historial.filter(fecha__date__lte=fecha_hasta)
+    historial = historial.filter(rango_fechas('fecha', fecha_desde, fecha_hasta))
     if busqueda:
         historial = historial.filter(
             Q(producto__nombre__icontains=busqueda) |
@@ -81,10 +76,8 @@ def historial_precios_general(request):
             Q(motivo__icontains=busqueda)
         )
     
-    # Paginación
-    paginator = Paginator(historial, 30)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor sobre (fecha, id)
+    page_obj = paginar_historial(historial, request, 30)
     
     # Productos para el filtro
     productos = Producto.objects.filter(activo=True).order_by('nombre')[:100]
@@ -1,18 +1,20 @@
 """
 Vistas para historial y auditoría mejorada
 """
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
 from django.utils import timezone
 from datetime import timedelta
 import json
 import csv
-from .models import LogAccion
-from .utils import es_admin_bossa, logger
+from .models import LogAccion, PerfilRequest
+from .utils import es_admin_bossa, logger, rango_fechas
+from .utils_paginacion import paginar_historial, conteo_estimado
+from .utils_perfilado import MODO_CPROFILE, MODO_MUESTREO, config_perfilado, guardar_config_perfilado, ruta_perfil
+from .utils_rendimiento import peores_n_mas_1, resumen_rendimiento, volcar_muestras
 
 @login_required
 def listar_logs(request):
@@ -38,25 +40,21 @@ def listar_logs(request):
         logs = logs.filter(tipo_accion=tipo_accion)
     if usuario_id:
         logs = logs.filter(usuario_id=usuario_id)
-    if fecha_desde:
-        logs = logs.filter(fecha__date__gte=fecha_desde)
-    if fecha_hasta:
-        logs = logs.filter(fecha__date__lte=fecha_hasta)
+    logs = logs.filter(rango_fechas('fecha', fecha_desde, fecha_hasta))
     if busqueda:
         logs = logs.filter(
             Q(descripcion__icontains=busqueda) |
             Q(objeto_tipo__icontains=busqueda)
         )
     
-    # Paginación
-    paginator = Paginator(logs, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor sobre (fecha, id)
+    page_obj = paginar_historial(logs, request, 50)
     
-    # Estadísticas
-    total_logs = logs.count()
-    logs_hoy = logs.filter(fecha__date=timezone.now().date()).count()
-    logs_semana = logs.filter(fecha__date__gte=timezone.now().date() - timedelta(days=7)).count()
+    # Estadísticas (el total es acotado: no se cuentan millones de filas)
+    total_logs = getattr(page_obj, 'conteo', None) or conteo_estimado(logs)
+    hoy = timezone.localdate()
+    logs_hoy = logs.filter(rango_fechas('fecha', hoy)).count()
+    logs_semana = logs.filter(rango_fechas('fecha', hoy - timedelta(days=7))).count()
     
     # Obtener módulos y tipos únicos para filtros
     modulos = LogAccion.MODULO_CHOICES
@@ -125,3 +123,71 @@ def exportar_logs(request):
     
     return response
 
+
+@login_required
+def rendimiento_vistas(request):
+    """Latencia (p50/p95) y consultas por vista, con las peores candidatas a N+1"""
+    if not es_admin_bossa(request.user):
+        messages.error(request, 'No tienes permisos para acceder a esta sección.')
+        return redirect('inicio')
+    
+    try:
+        horas = min(max(int(request.GET.get('horas', 24)), 1), 24 * 30)
+    except ValueError:
+        horas = 24
+    
+    # Incluir lo medido por este proceso desde el último volcado
+    volcar_muestras()
+    resumen = resumen_rendimiento(horas)
+    
+    context = {
+        'resumen': resumen,
+        'n_mas_1': peores_n_mas_1(resumen),
+        'horas': horas,
+        'total_peticiones': sum(v['peticiones'] for v in resumen),
+        'es_admin': True
+    }
+    
+    return render(request, 'inventario/rendimiento_vistas.html', context)
+
+@login_required
+def listar_perfiles(request):
+    """Perfiles de requests lentas y configuración del perfilado (sin redeploy)"""
+    if not es_admin_bossa(request.user):
+        messages.error(request, 'No tienes permisos para acceder a esta sección.')
+        return redirect('inicio')
+    
+    if request.method == 'POST':
+        try:
+            guardar_config_perfilado(
+                usuarios=request.POST.get('usuarios', '').replace(',', ' ').split(),
+                muestreo=request.POST.get('muestreo') or 0,
+                umbral_ms=request.POST.get('umbral_ms') or 0,
+                modo=request.POST.get('modo'),
+            )
+            messages.success(request, 'Configuración de perfilado actualizada.')
+        except ValueError:
+            messages.error(request, 'Valores de perfilado inválidos.')
+        return redirect('listar_perfiles')
+    
+    context = {
+        'perfiles': PerfilRequest.objects.select_related('usuario')[:100],
+        'config': config_perfilado(),
+        'modos': [(MODO_MUESTREO, 'Muestreo de pila'), (MODO_CPROFILE, 'cProfile')],
+        'es_admin': True
+    }
+    
+    return render(request, 'inventario/listar_perfiles.html', context)
+
+@login_required
+def descargar_perfil(request, perfil_id):
+    """Descarga el perfil: .folded (flamegraph.pl, speedscope) o .prof (snakeviz)"""
+    if not es_admin_bossa(request.user):
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    
+    perfil = get_object_or_404(PerfilRequest, id=perfil_id)
+    ruta = ruta_perfil(perfil)
+    if not ruta.exists():
+        raise Http404('El archivo del perfil ya no existe')
+    content_type = 'application/octet-stream' if perfil.modo == MODO_CPROFILE else 'text/plain; charset=utf-8'
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=perfil.archivo, content_type=content_type)
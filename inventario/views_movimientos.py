@@ -2,13 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q, Sum, Count, F, Avg
-from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.utils import timezone
 from django.db import transaction
 from datetime import timedelta
 from .models import Producto, MovimientoStock
-from .utils import es_admin_bossa, registrar_cambio
+from .utils import es_admin_bossa, registrar_cambio, rango_fechas
+from .utils_paginacion import paginar_historial
 
 @login_required
 @transaction.atomic
@@ -98,15 +98,10 @@ def listar_movimientos(request):
         movimientos = movimientos.filter(producto_id=producto_id)
     if tipo:
         movimientos = movimientos.filter(tipo=tipo)
-    if fecha_desde:
-        movimientos = movimientos.filter(fecha__gte=fecha_desde)
-    if fecha_hasta:
-        movimientos = movimientos.filter(fecha__lte=fecha_hasta)
+    movimientos = movimientos.filter(rango_fechas('fecha', fecha_desde, fecha_hasta))
     
-    # Paginación
-    paginator = Paginator(movimientos, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor sobre (fecha, id)
+    page_obj = paginar_historial(movimientos, request, 50)
     
     # Estadísticas
     total_entradas = movimientos.filter(tipo='entrada').aggregate(Sum('cantidad'))['cantidad__sum'] or 0
@@ -8,7 +8,8 @@ from django.db.models import Q, Count, F
 from django.utils import timezone
 from datetime import timedelta
 from .models import NotificacionUsuario, CuentaPorCobrar, OrdenCompra, Producto
-from .utils import es_admin_bossa, logger
+from .utils import es_admin_bossa, logger, invalidar_espacio_cache
+from .utils_condicional import condicional
 
 @login_required
 def centro_notificaciones(request):
@@ -48,10 +49,12 @@ def marcar_todas_leidas(request):
         usuario=request.user,
         leida=False
     ).update(leida=True)
+    invalidar_espacio_cache(f'notificaciones:{request.user.pk}')  # update() no dispara señales
     
     return JsonResponse({'success': True})
 
 @login_required
+@condicional('notificaciones:{usuario}')
 def obtener_notificaciones_api(request):
     """API para obtener notificaciones no leídas (para polling)"""
     notificaciones = NotificacionUsuario.objects.filter(
@@ -82,7 +85,7 @@ def crear_notificaciones_automaticas():
     
     # Notificaciones de cuentas por cobrar vencidas
     cuentas_vencidas = CuentaPorCobrar.objects.filter(
-        estado__in=['pendiente', 'parcial'],
+        estado__in=CuentaPorCobrar.ESTADOS_ABIERTOS,
         fecha_vencimiento__lt=timezone.now().date()
     )
     
@@ -3,33 +3,69 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.db.models import Q, Sum, Count, F
-from django.core.paginator import Paginator
 from django.utils import timezone
-from django.db import transaction
+from django.db import DatabaseError, transaction
 from django.core.exceptions import ValidationError
-from datetime import timedelta
-from decimal import Decimal
-from .models import Producto, Venta, ItemVenta, MovimientoStock, Cliente, CuentaPorCobrar
-from .utils import es_admin_bossa, registrar_cambio, logger
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import etag
+from decimal import Decimal, InvalidOperation
+import hashlib
+import json
+from .models import Producto, Venta, MovimientoStock, Cliente, VentaOfflineRechazada
+from .utils import es_admin_bossa, logger, rango_fechas
+from .utils_ventas import registrar_venta, registrar_venta_idempotente, VentaError
+from .utils_paginacion import paginar_historial
+from .utils_sincronizacion import catalogo_completo, cambios_catalogo, version_catalogo
+
+# Ventas offline por envío a sincronizar_ventas_pos
+MAX_VENTAS_PENDIENTES = 100
 
 @login_required
 def punto_venta(request):
     """Vista principal del punto de venta - Accesible para todos los usuarios"""
     
-    # Obtener productos activos para búsqueda
-    productos = Producto.objects.filter(activo=True).order_by('nombre')
+    # Los productos no se incluyen en la página: la terminal los guarda en el
+    # navegador y los mantiene al día con sincronizar_catalogo_pos
     
     # Obtener clientes activos para selección
     clientes = Cliente.objects.filter(activo=True).order_by('nombre')
     
     context = {
-        'productos': productos,
         'clientes': clientes,
         'es_admin': es_admin_bossa(request.user),
     }
     
     return render(request, 'inventario/punto_venta.html', context)
 
+def _etag_catalogo_pos(request):
+    return hashlib.blake2b(
+        f'{request.get_full_path()}|{version_catalogo()}'.encode('utf-8'), digest_size=16
+    ).hexdigest()
+
+@login_required
+@etag(_etag_catalogo_pos)
+def sincronizar_catalogo_pos(request):
+    """
+    API de sincronización del catálogo del POS - Accesible para todos
+
+    - ?completo=1&despues_de=<id>: página del catálogo completo
+    - ?cursor=<n>: cambios posteriores al cursor
+
+    Si nada cambió responde 304. El ETag sale del último CambioCatalogo
+    (version_catalogo), no de las versiones del caché: un worker que no vio
+    la invalidación no puede ocultar cambios de precio o stock.
+    """
+    try:
+        if request.GET.get('completo'):
+            respuesta = JsonResponse(catalogo_completo(int(request.GET.get('despues_de') or 0)))
+        else:
+            respuesta = JsonResponse(cambios_catalogo(int(request.GET.get('cursor') or 0)))
+    except ValueError:
+        return JsonResponse({'error': 'Cursor inválido'}, status=400)
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
 @login_required
 def buscar_producto_pos(request):
     """API para buscar producto por código de barras en el POS - Accesible para todos"""
@@ -80,149 +116,109 @@ def buscar_producto_pos(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def _datos_venta(datos) -> dict:
+    """
+    Argumentos de registrar_venta a partir de un formulario del POS o de una
+    venta de la cola offline (dict JSON)
+
+    Raises:
+        VentaError: Si faltan items o el cliente de una venta a crédito
+        ValueError: Si algún número es inválido
+    """
+    items_data = datos.get('items') or '[]'
+    if isinstance(items_data, str):
+        items_data = json.loads(items_data)
+    if not items_data:
+        raise VentaError('No hay items en la venta')
+
+    es_credito = str(datos.get('es_credito', 'false')).lower() == 'true'
+    cliente = None
+    if es_credito:
+        cliente_id = datos.get('cliente_id') or None
+        if not cliente_id:
+            raise VentaError('Se debe seleccionar un cliente para ventas a crédito')
+        try:
+            cliente = Cliente.objects.get(id=cliente_id, activo=True)
+        except Cliente.DoesNotExist:
+            raise VentaError('Cliente no encontrado')
+
+    fecha_offline = None
+    if datos.get('fecha_offline'):
+        fecha_offline = parse_datetime(str(datos['fecha_offline']))
+        if fecha_offline is None:
+            raise ValueError('fecha_offline inválida')
+        if timezone.is_naive(fecha_offline):
+            fecha_offline = timezone.make_aware(fecha_offline)
+
+    if not isinstance(items_data, list):
+        raise ValueError('items debe ser una lista')
+    lineas = []
+    for item_data in items_data:
+        if not isinstance(item_data, dict):
+            raise ValueError('Item inválido')
+        try:
+            lineas.append({
+                'producto_id': item_data.get('producto_id'),
+                'cantidad': int(item_data.get('cantidad', 1)),
+                'precio_unitario': Decimal(str(item_data.get('precio', '0'))),
+            })
+        except (TypeError, ValueError, InvalidOperation):
+            raise ValueError('Cantidad o precio inválido')
+
+    try:
+        return {
+            'lineas': lineas,
+            'subtotal': Decimal(str(datos.get('subtotal', '0'))),
+            'descuento': Decimal(str(datos.get('descuento', '0'))),
+            'total': Decimal(str(datos.get('total', '0'))),
+            'metodo_pago': datos.get('metodo_pago', 'efectivo'),
+            'monto_recibido': Decimal(str(datos.get('monto_recibido', '0'))),
+            'cambio': Decimal(str(datos.get('cambio', '0'))),
+            'notas': datos.get('notas', ''),
+            'cliente': cliente,
+            'es_credito': es_credito,
+            'fecha_offline': fecha_offline,
+        }
+    except InvalidOperation:
+        raise ValueError('Monto inválido')
+
 @login_required
 @transaction.atomic
 def procesar_venta(request):
-    """Procesa una venta y descuenta el stock - Accesible para todos"""
+    """
+    Procesa una venta y descuenta el stock - Accesible para todos
+
+    La terminal manda una clave de idempotencia por venta (campo
+    clave_idempotencia o cabecera Idempotency-Key): si reintenta el envío,
+    recibe la venta ya registrada con 'repetida': True.
+    """
     
     if request.method != 'POST':
         return JsonResponse({'error': 'Método no permitido'}, status=405)
     
     try:
-        import json
-        items_data = json.loads(request.POST.get('items', '[]'))
-        subtotal = Decimal(request.POST.get('subtotal', '0'))
-        descuento = Decimal(request.POST.get('descuento', '0'))
-        total = Decimal(request.POST.get('total', '0'))
-        metodo_pago = request.POST.get('metodo_pago', 'efectivo')
-        monto_recibido = Decimal(request.POST.get('monto_recibido', '0'))
-        cambio = Decimal(request.POST.get('cambio', '0'))
-        notas = request.POST.get('notas', '')
-        cliente_id = request.POST.get('cliente_id', '') or None
-        es_credito = request.POST.get('es_credito', 'false') == 'true'
-        
-        if not items_data:
-            return JsonResponse({'error': 'No hay items en la venta'}, status=400)
-        
-        # Validar cliente si es crédito
-        cliente = None
-        if es_credito:
-            if not cliente_id:
-                return JsonResponse({'error': 'Se debe seleccionar un cliente para ventas a crédito'}, status=400)
-            try:
-                cliente = Cliente.objects.get(id=cliente_id, activo=True)
-            except Cliente.DoesNotExist:
-                return JsonResponse({'error': 'Cliente no encontrado'}, status=400)
-        
-        # Crear venta
-        venta = Venta.objects.create(
-            cliente=cliente,
-            usuario=request.user,
-            subtotal=subtotal,
-            descuento=descuento,
-            total=total,
-            metodo_pago=metodo_pago if not es_credito else 'credito',
-            monto_recibido=monto_recibido,
-            cambio=cambio,
-            es_credito=es_credito,
-            notas=notas
-        )
-        
-        # Procesar items y descontar stock
-        # Usar select_for_update() para bloquear registros y evitar condiciones de carrera
-        items_creados = []
-        productos_actualizados = []
-        
-        for item_data in items_data:
-            producto_id = item_data.get('producto_id')
-            cantidad = int(item_data.get('cantidad', 1))
-            precio_unitario = Decimal(item_data.get('precio', '0'))
-            
-            # Bloquear el registro del producto hasta que termine la transacción
-            # Esto previene que otro usuario venda el mismo producto simultáneamente
-            try:
-                producto = Producto.objects.select_for_update().get(id=producto_id)
-            except Producto.DoesNotExist:
-                venta.delete()
-                logger.error(f'Producto {producto_id} no encontrado al procesar venta', 
-                           extra={'user': request.user.username, 'venta_id': venta.id})
-                return JsonResponse({
-                    'error': f'Producto no encontrado (ID: {producto_id})'
-                }, status=400)
-            
-            # Verificar stock disponible ANTES de descontar
-            if producto.stock < cantidad:
-                venta.delete()  # Cancelar venta si no hay stock
-                logger.warning(f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}, Solicitado: {cantidad}',
-                             extra={'user': request.user.username, 'producto_id': producto_id, 'venta_id': venta.id})
-                return JsonResponse({
-                    'error': f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}, Solicitado: {cantidad}'
-                }, status=400)
-            
-            stock_anterior = producto.stock
-            producto.stock -= cantidad
-            producto.save()
-            productos_actualizados.append(producto)
-            
-            # Crear item de venta
-            item = ItemVenta.objects.create(
-                venta=venta,
-                producto=producto,
-                nombre_producto=producto.nombre,
-                cantidad=cantidad,
-                precio_unitario=precio_unitario,
-                stock_anterior=stock_anterior,
-                stock_despues=producto.stock
-            )
-            items_creados.append(item)
-            
-            # Registrar movimiento de stock
-            MovimientoStock.objects.create(
-                producto=producto,
-                tipo='salida',
-                cantidad=cantidad,
-                motivo='venta',
-                stock_anterior=stock_anterior,
-                stock_nuevo=producto.stock,
-                usuario=request.user,
-                notas=f'Venta #{venta.numero_venta}'
-            )
-            
-            # Registrar en historial
-            registrar_cambio(
-                producto,
-                request.user,
-                'stock',
-                'stock',
-                stock_anterior,
-                producto.stock,
-                f'Venta: {cantidad} unidades - Venta #{venta.numero_venta}'
-            )
+        clave = (request.POST.get('clave_idempotencia') or request.headers.get('Idempotency-Key', '')).strip()
+        repetida = False
         
-        # Si es venta a crédito, crear cuenta por cobrar
-        if es_credito and cliente:
-            fecha_vencimiento = timezone.now().date() + timedelta(days=30)  # 30 días por defecto
-            
-            cuenta_por_cobrar = CuentaPorCobrar.objects.create(
-                cliente=cliente,
-                venta=venta,
-                monto_total=total,
-                fecha_emision=timezone.now().date(),
-                fecha_vencimiento=fecha_vencimiento,
-                notas=f'Venta #{venta.numero_venta}'
-            )
-            logger.info(f'Cuenta por cobrar creada para venta #{venta.numero_venta}', 
-                       extra={'user': request.user.username, 'cuenta_id': cuenta_por_cobrar.id})
-        
-        logger.info(f'Venta #{venta.numero_venta} procesada exitosamente. Total: ${venta.total}',
-                   extra={'user': request.user.username, 'venta_id': venta.id, 'total': float(venta.total)})
+        # Registrar venta: bloqueo de productos, descuento de stock, items,
+        # movimientos e historial (mismo camino que la conversión de cotizaciones)
+        try:
+            datos = _datos_venta(request.POST)
+            if clave:
+                venta, repetida = registrar_venta_idempotente(clave, usuario=request.user, **datos)
+            else:
+                venta = registrar_venta(usuario=request.user, **datos)
+        except VentaError as e:
+            logger.warning(f'Venta rechazada: {str(e)}', extra={'user': request.user.username})
+            return JsonResponse({'error': str(e), 'conflictos': e.conflictos}, status=400)
         
         return JsonResponse({
             'success': True,
             'venta_id': venta.id,
             'numero_venta': venta.numero_venta,
             'total': float(venta.total),
-            'es_credito': es_credito,
+            'es_credito': venta.es_credito,
+            'repetida': repetida,
             'mensaje': f'Venta #{venta.numero_venta} procesada exitosamente'
         })
         
@@ -243,6 +239,90 @@ def procesar_venta(request):
                     exc_info=True, extra={'user': request.user.username})
         return JsonResponse({'error': 'Error interno del servidor. Por favor, intente nuevamente.'}, status=500)
 
+@login_required
+def sincronizar_ventas_pos(request):
+    """
+    Recibe las ventas que la terminal cobró sin conexión - Accesible para todos
+
+    Cuerpo JSON: {"ventas": [{"clave": ..., "items": [...], "total": ..., ...}]}
+    Las ventas se registran en el orden recibido, cada una en su transacción:
+    una rechazada (p.ej. sin stock) no impide registrar las siguientes. Las
+    que ya se habían registrado (reintentos) se informan como 'repetida'.
+
+    Respuesta: {"resultados": [{"clave", "estado", ...}]} con estado
+    'registrada', 'repetida', 'rechazada' (con 'error' y 'conflictos'; queda
+    guardada en VentaOfflineRechazada para resolverla) o 'error' (falla
+    pasajera de la base de datos: la terminal la conserva y la reintenta).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    try:
+        ventas = json.loads(request.body or b'{}').get('ventas') or []
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    if not isinstance(ventas, list):
+        return JsonResponse({'error': 'Se esperaba una lista de ventas'}, status=400)
+    if len(ventas) > MAX_VENTAS_PENDIENTES:
+        return JsonResponse({'error': f'Como máximo {MAX_VENTAS_PENDIENTES} ventas por envío'}, status=400)
+    
+    resultados = []
+    for datos in ventas:
+        clave = str(datos.get('clave', '')) if isinstance(datos, dict) else ''
+        resultado = {'clave': clave}
+        try:
+            if not isinstance(datos, dict):
+                raise ValueError('Venta inválida')
+            venta, repetida = registrar_venta_idempotente(clave, usuario=request.user, **_datos_venta(datos))
+            resultado.update({
+                'estado': 'repetida' if repetida else 'registrada',
+                'venta_id': venta.id,
+                'numero_venta': venta.numero_venta,
+                'total': float(venta.total),
+            })
+        except VentaError as e:
+            resultado.update({'estado': 'rechazada', 'error': str(e), 'conflictos': e.conflictos})
+        except (ValueError, ValidationError, Producto.DoesNotExist) as e:
+            resultado.update({'estado': 'rechazada', 'error': f'Datos inválidos: {str(e)}', 'conflictos': []})
+        except Exception as e:
+            # Falla de la base de datos (o inesperada): la venta ya se cobró, así que
+            # no se rechaza; la terminal la mantiene en su cola y la reintenta
+            logger.error(f'Error al registrar venta offline: {str(e)}',
+                        exc_info=not isinstance(e, DatabaseError), extra={'user': request.user.username})
+            resultado.update({'estado': 'error', 'error': 'Error temporal al registrar la venta'})
+        if resultado['estado'] == 'rechazada' and not _guardar_rechazada(request.user, clave, datos, resultado):
+            resultado.update({'estado': 'error', 'error': 'Error temporal al registrar la venta'})
+        resultados.append(resultado)
+    
+    rechazadas = sum(1 for resultado in resultados if resultado['estado'] == 'rechazada')
+    errores = sum(1 for resultado in resultados if resultado['estado'] == 'error')
+    logger.info('Ventas offline sincronizadas',
+                extra={'user': request.user.username, 'ventas': len(resultados),
+                       'rechazadas': rechazadas, 'errores': errores})
+    return JsonResponse({'resultados': resultados})
+
+
+def _guardar_rechazada(usuario, clave: str, datos, resultado: dict) -> bool:
+    """
+    Guarda la venta rechazada para resolverla desde el admin. Sólo si quedó
+    guardada se informa como 'rechazada' (y la terminal la saca de su cola).
+
+    Returns:
+        bool: True si se guardó
+    """
+    try:
+        campos = {'usuario': usuario, 'datos': datos, 'error': resultado['error'],
+                  'conflictos': resultado.get('conflictos') or []}
+        if clave:
+            VentaOfflineRechazada.objects.update_or_create(clave=clave[:64], defaults=campos)
+        else:
+            VentaOfflineRechazada.objects.create(clave='', **campos)
+        return True
+    except Exception as e:
+        logger.error(f'No se pudo guardar la venta offline rechazada: {str(e)}', exc_info=True,
+                     extra={'user': usuario.username})
+        return False
+
 @login_required
 def listar_ventas(request):
     """Lista todas las ventas - Usuarios normales solo ven sus propias ventas"""
@@ -259,10 +339,7 @@ def listar_ventas(request):
     metodo_pago = request.GET.get('metodo_pago', '')
     numero_venta = request.GET.get('numero_venta', '')
     
-    if fecha_desde:
-        ventas = ventas.filter(fecha__gte=fecha_desde)
-    if fecha_hasta:
-        ventas = ventas.filter(fecha__lte=fecha_hasta)
+    ventas = ventas.filter(rango_fechas('fecha', fecha_desde, fecha_hasta))
     if metodo_pago:
         ventas = ventas.filter(metodo_pago=metodo_pago)
     if numero_venta:
@@ -272,10 +349,8 @@ def listar_ventas(request):
     total_ventas = ventas.aggregate(Sum('total'))['total__sum'] or 0
     total_ventas_count = ventas.count()
     
-    # Paginación
-    paginator = Paginator(ventas, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor sobre (fecha, id)
+    page_obj = paginar_historial(ventas, request, 50, contar=False)
     
     context = {
         'ventas': page_obj,
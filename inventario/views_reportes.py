@@ -17,43 +17,26 @@ from .models import (
     Producto, MovimientoStock, Categoria, Venta, ItemVenta,
     Cliente, CuentaPorCobrar, Almacen, OrdenCompra
 )
-from .utils import es_admin_bossa
+from .utils import es_admin_bossa, rango_fechas, clave_cache
+from .utils_cache import cached_computation
 
-@login_required
-def reportes_avanzados(request):
-    """Dashboard de reportes avanzados con gráficos y análisis"""
-    if not es_admin_bossa(request.user):
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('inicio')
-    
-    # Obtener fechas personalizadas o usar período predefinido
-    fecha_desde_str = request.GET.get('fecha_desde', '')
-    fecha_hasta_str = request.GET.get('fecha_hasta', '')
-    dias = request.GET.get('dias', '')
-    
-    # Si hay fechas personalizadas, usarlas
-    if fecha_desde_str and fecha_hasta_str:
-        try:
-            fecha_desde = datetime.strptime(fecha_desde_str, '%Y-%m-%d').date()
-            fecha_hasta = datetime.strptime(fecha_hasta_str, '%Y-%m-%d').date()
-            if fecha_desde > fecha_hasta:
-                fecha_desde, fecha_hasta = fecha_hasta, fecha_desde
-            dias = 'personalizado'  # Indicar que es rango personalizado
-        except:
-            # Si hay error, usar período por defecto
-            dias = int(dias) if dias else 30
-            fecha_desde = timezone.now().date() - timedelta(days=dias)
-            fecha_hasta = timezone.now().date()
-    else:
-        # Usar período predefinido
-        dias = int(dias) if dias else 30
-        fecha_desde = timezone.now().date() - timedelta(days=dias)
-        fecha_hasta = timezone.now().date()
-    
+
+def _resumen_reportes(fecha_desde, fecha_hasta):
+    """
+    Agregados de reportes_avanzados para un rango de fechas
+
+    Los querysets se materializan para poder cachear el resultado.
+
+    Args:
+        fecha_desde: Fecha inicial (inclusive)
+        fecha_hasta: Fecha final (inclusive)
+
+    Returns:
+        dict: Datos del contexto que no dependen de la request
+    """
     # ========== ANÁLISIS DE VENTAS ==========
     ventas_periodo = Venta.objects.filter(
-        fecha__date__gte=fecha_desde,
-        fecha__date__lte=fecha_hasta,
+        rango_fechas('fecha', fecha_desde, fecha_hasta),
         cancelada=False
     )
     
@@ -90,8 +73,7 @@ def reportes_avanzados(request):
     # ========== ANÁLISIS DE PRODUCTOS ==========
     # Productos más vendidos
     productos_mas_vendidos = ItemVenta.objects.filter(
-        venta__fecha__date__gte=fecha_desde,
-        venta__fecha__date__lte=fecha_hasta,
+        rango_fechas('venta__fecha', fecha_desde, fecha_hasta),
         venta__cancelada=False
     ).values('producto__nombre', 'producto__id').annotate(
         total_vendido=Sum('cantidad'),
@@ -102,9 +84,8 @@ def reportes_avanzados(request):
     productos_rotacion = []
     for producto in Producto.objects.filter(activo=True):
         movimientos = MovimientoStock.objects.filter(
+            rango_fechas('fecha', fecha_desde, fecha_hasta),
             producto=producto,
-            fecha__date__gte=fecha_desde,
-            fecha__date__lte=fecha_hasta
         )
         entradas = movimientos.filter(tipo='entrada').aggregate(Sum('cantidad'))['cantidad__sum'] or 0
         salidas = movimientos.filter(tipo='salida').aggregate(Sum('cantidad'))['cantidad__sum'] or 0
@@ -136,16 +117,14 @@ def reportes_avanzados(request):
         activo=True
     ).exclude(
         id__in=MovimientoStock.objects.filter(
-            fecha__date__gte=fecha_desde,
-            fecha__date__lte=fecha_hasta
+            rango_fechas('fecha', fecha_desde, fecha_hasta)
         ).values_list('producto_id', flat=True)
     )[:10]
     
     # ========== ANÁLISIS DE CLIENTES ==========
     # Top clientes por compras
     top_clientes_raw = Venta.objects.filter(
-        fecha__date__gte=fecha_desde,
-        fecha__date__lte=fecha_hasta,
+        rango_fechas('fecha', fecha_desde, fecha_hasta),
         cancelada=False,
         cliente__isnull=False
     ).values('cliente__nombre', 'cliente__id').annotate(
@@ -163,14 +142,12 @@ def reportes_avanzados(request):
     
     # Clientes con saldo pendiente
     clientes_saldo = Cliente.objects.filter(
-        activo=True
-    ).annotate(
-        saldo=Sum('cuentas_por_cobrar__monto_total') - Sum('cuentas_por_cobrar__monto_pagado')
-    ).filter(saldo__gt=0).order_by('-saldo')[:10]
+        activo=True, saldo_pendiente__gt=0
+    ).order_by('-saldo_pendiente')[:10]
     
     # ========== ANÁLISIS DE CUENTAS POR COBRAR ==========
     cuentas_pendientes = CuentaPorCobrar.objects.filter(
-        estado__in=['pendiente', 'parcial']
+        estado__in=CuentaPorCobrar.ESTADOS_ABIERTOS
     )
     total_pendiente = cuentas_pendientes.aggregate(
         total=Sum('monto_total') - Sum('monto_pagado')
@@ -222,23 +199,7 @@ def reportes_avanzados(request):
     total_compras = ordenes_periodo.aggregate(Sum('total'))['total__sum'] or 0
     ordenes_pendientes = ordenes_periodo.filter(estado__in=['pendiente', 'parcial']).count()
     
-    # Normalizar dias para el template
-    if isinstance(dias, str) and dias == 'personalizado':
-        dias_template = 'personalizado'
-    elif isinstance(dias, int):
-        dias_template = dias
-    else:
-        try:
-            dias_template = int(dias) if dias else 30
-        except:
-            dias_template = 30
-    
-    context = {
-        'dias': dias_template,
-        'fecha_desde': fecha_desde.strftime('%Y-%m-%d'),
-        'fecha_hasta': fecha_hasta.strftime('%Y-%m-%d'),
-        'fecha_desde_display': fecha_desde.strftime('%d/%m/%Y'),
-        'fecha_hasta_display': fecha_hasta.strftime('%d/%m/%Y'),
+    return {
         # Ventas
         'total_ventas_periodo': total_ventas_periodo,
         'cantidad_ventas': cantidad_ventas,
@@ -250,11 +211,11 @@ def reportes_avanzados(request):
         'ventas_por_dia_total': json.dumps([ventas_por_dia.get(f, {}).get('total', 0) for f in fechas_ordenadas]),
         'ventas_por_dia_cantidad': json.dumps([ventas_por_dia.get(f, {}).get('cantidad', 0) for f in fechas_ordenadas]),
         # Productos
-        'productos_mas_vendidos': productos_mas_vendidos,
+        'productos_mas_vendidos': list(productos_mas_vendidos),
         'productos_rotacion': productos_rotacion,
         'productos_rentables': productos_rentables,
-        'productos_sin_movimiento': productos_sin_movimiento,
-        'productos_por_categoria': productos_por_categoria,
+        'productos_sin_movimiento': list(productos_sin_movimiento),
+        'productos_por_categoria': list(productos_por_categoria),
         # Inventario
         'total_productos': total_productos,
         'productos_con_margen': productos_con_margen,
@@ -262,7 +223,7 @@ def reportes_avanzados(request):
         'ganancia_potencial_total': ganancia_potencial_total,
         # Clientes
         'top_clientes': list(top_clientes),
-        'clientes_saldo': clientes_saldo,
+        'clientes_saldo': list(clientes_saldo),
         # Cuentas por cobrar
         'total_pendiente': total_pendiente,
         'total_vencido': total_vencido,
@@ -272,6 +233,65 @@ def reportes_avanzados(request):
         # Compras
         'total_compras': total_compras,
         'ordenes_pendientes': ordenes_pendientes,
+    }
+
+
+@login_required
+def reportes_avanzados(request):
+    """Dashboard de reportes avanzados con gráficos y análisis"""
+    if not es_admin_bossa(request.user):
+        messages.error(request, 'No tienes permisos para acceder a esta sección.')
+        return redirect('inicio')
+    
+    # Obtener fechas personalizadas o usar período predefinido
+    fecha_desde_str = request.GET.get('fecha_desde', '')
+    fecha_hasta_str = request.GET.get('fecha_hasta', '')
+    dias = request.GET.get('dias', '')
+    
+    # Si hay fechas personalizadas, usarlas
+    if fecha_desde_str and fecha_hasta_str:
+        try:
+            fecha_desde = datetime.strptime(fecha_desde_str, '%Y-%m-%d').date()
+            fecha_hasta = datetime.strptime(fecha_hasta_str, '%Y-%m-%d').date()
+            if fecha_desde > fecha_hasta:
+                fecha_desde, fecha_hasta = fecha_hasta, fecha_desde
+            dias = 'personalizado'  # Indicar que es rango personalizado
+        except:
+            # Si hay error, usar período por defecto
+            dias = int(dias) if dias else 30
+            fecha_desde = timezone.now().date() - timedelta(days=dias)
+            fecha_hasta = timezone.now().date()
+    else:
+        # Usar período predefinido
+        dias = int(dias) if dias else 30
+        fecha_desde = timezone.now().date() - timedelta(days=dias)
+        fecha_hasta = timezone.now().date()
+    
+    # Los agregados se cachean por rango; al vencer sólo una request recalcula
+    resumen = cached_computation(
+        clave_cache('reportes', fecha_desde.isoformat(), fecha_hasta.isoformat()),
+        lambda: _resumen_reportes(fecha_desde, fecha_hasta),
+        300,
+    )
+    
+    # Normalizar dias para el template
+    if isinstance(dias, str) and dias == 'personalizado':
+        dias_template = 'personalizado'
+    elif isinstance(dias, int):
+        dias_template = dias
+    else:
+        try:
+            dias_template = int(dias) if dias else 30
+        except:
+            dias_template = 30
+    
+    context = {
+        'dias': dias_template,
+        'fecha_desde': fecha_desde.strftime('%Y-%m-%d'),
+        'fecha_hasta': fecha_hasta.strftime('%Y-%m-%d'),
+        'fecha_desde_display': fecha_desde.strftime('%d/%m/%Y'),
+        'fecha_hasta_display': fecha_hasta.strftime('%d/%m/%Y'),
+        **resumen,
         'es_admin': True,
     }
     
@@ -189,6 +189,9 @@ def ejecutar_reporte_ahora(request, reporte_id):
         
         # Generar reporte (simulado)
         mensaje = f"Reporte {reporte.get_tipo_reporte_display()} generado automáticamente."
+        if reporte.tipo_reporte in ('cuentas_cobrar', 'completo'):
+            from .utils_cobranza import obtener_resumen_antiguedad, formatear_resumen_antiguedad
+            mensaje += '\n\n' + formatear_resumen_antiguedad(obtener_resumen_antiguedad())
         
         # Enviar email
         send_mail(
@@ -0,0 +1,190 @@
+/**
+ * Catálogo local del Punto de Venta
+ * Descarga el catálogo una sola vez, lo guarda en IndexedDB y después pide
+ * sólo los cambios (precio, promo, stock, bajas) cada pocos segundos.
+ * Ver /pos/catalogo/ (views_pos.sincronizar_catalogo_pos).
+ */
+
+(function() {
+    'use strict';
+
+    const URL_CATALOGO = '/pos/catalogo/';
+    const INTERVALO_MS = 5000;
+    const DB_NOMBRE = 'stockex-pos';
+    const DB_VERSION = 1;
+
+    const productos = new Map();
+    const oyentes = [];
+    let cursor = null;
+    let db = null;
+    let sincronizando = false;
+
+    // ---------- IndexedDB (si no está disponible, el catálogo vive sólo en memoria) ----------
+
+    function abrirDB() {
+        return new Promise(resolve => {
+            if (!window.indexedDB) {
+                resolve(null);
+                return;
+            }
+            const pedido = indexedDB.open(DB_NOMBRE, DB_VERSION);
+            pedido.onupgradeneeded = () => {
+                pedido.result.createObjectStore('productos', { keyPath: 'id' });
+                pedido.result.createObjectStore('meta');
+            };
+            pedido.onsuccess = () => resolve(pedido.result);
+            pedido.onerror = () => resolve(null);
+        });
+    }
+
+    function cargarLocal() {
+        return new Promise(resolve => {
+            if (!db) {
+                resolve();
+                return;
+            }
+            const tx = db.transaction(['productos', 'meta'], 'readonly');
+            tx.objectStore('productos').getAll().onsuccess = e => {
+                e.target.result.forEach(p => productos.set(p.id, p));
+            };
+            tx.objectStore('meta').get('cursor').onsuccess = e => {
+                cursor = e.target.result === undefined ? null : e.target.result;
+            };
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => resolve();
+        });
+    }
+
+    function guardarLocal(cambiados, eliminados, nuevoCursor, vaciar) {
+        if (!db) {
+            return Promise.resolve();
+        }
+        return new Promise(resolve => {
+            const tx = db.transaction(['productos', 'meta'], 'readwrite');
+            const store = tx.objectStore('productos');
+            if (vaciar) {
+                store.clear();
+            }
+            cambiados.forEach(p => store.put(p));
+            eliminados.forEach(id => store.delete(id));
+            if (nuevoCursor !== undefined) {
+                tx.objectStore('meta').put(nuevoCursor, 'cursor');
+            }
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => resolve();
+        });
+    }
+
+    // ---------- Sincronización ----------
+
+    async function pedir(parametros) {
+        // no-cache: el navegador revalida con If-None-Match y un 304 no trae cuerpo
+        const respuesta = await fetch(URL_CATALOGO + '?' + new URLSearchParams(parametros), {
+            cache: 'no-cache',
+            credentials: 'same-origin',
+            headers: { 'Accept': 'application/json' },
+        });
+        if (!respuesta.ok) {
+            throw new Error('HTTP ' + respuesta.status);
+        }
+        return respuesta.json();
+    }
+
+    async function descargarCompleto() {
+        let pagina = await pedir({ completo: 1 });
+        const nuevoCursor = pagina.cursor;
+        productos.clear();
+        let primera = true;
+        while (true) {
+            pagina.productos.forEach(p => productos.set(p.id, p));
+            await guardarLocal(pagina.productos, [], undefined, primera);
+            primera = false;
+            if (!pagina.siguiente) {
+                break;
+            }
+            pagina = await pedir({ completo: 1, despues_de: pagina.siguiente });
+        }
+        cursor = nuevoCursor;
+        await guardarLocal([], [], cursor, false);
+    }
+
+    async function aplicarCambios() {
+        let hayCambios = false;
+        while (true) {
+            const datos = await pedir({ cursor: cursor });
+            if (datos.reiniciar) {
+                await descargarCompleto();
+                return true;
+            }
+            datos.productos.forEach(p => productos.set(p.id, p));
+            datos.eliminados.forEach(id => productos.delete(id));
+            hayCambios = hayCambios || datos.productos.length > 0 || datos.eliminados.length > 0;
+            cursor = datos.cursor;
+            await guardarLocal(datos.productos, datos.eliminados, cursor, false);
+            if (!datos.mas) {
+                return hayCambios;
+            }
+        }
+    }
+
+    async function sincronizar() {
+        if (sincronizando) {
+            return;
+        }
+        sincronizando = true;
+        try {
+            let hayCambios;
+            if (cursor === null) {
+                await descargarCompleto();
+                hayCambios = true;
+            } else {
+                hayCambios = await aplicarCambios();
+            }
+            if (hayCambios) {
+                oyentes.forEach(oyente => oyente());
+            }
+        } catch (error) {
+            // Sin conexión o error del servidor: se sigue con el catálogo local
+            console.warn('No se pudo sincronizar el catálogo del POS:', error);
+        } finally {
+            sincronizando = false;
+        }
+    }
+
+    // ---------- API para la página ----------
+
+    window.catalogoPOS = {
+        /** Productos cuyo nombre o SKU contiene el texto (como mucho `limite`) */
+        buscar(texto, limite) {
+            const busqueda = (texto || '').toLowerCase();
+            const resultado = [];
+            for (const p of productos.values()) {
+                if (!busqueda || p.nombre.toLowerCase().includes(busqueda) || p.sku.toLowerCase().includes(busqueda)) {
+                    resultado.push(p);
+                    if (resultado.length >= limite) {
+                        break;
+                    }
+                }
+            }
+            return resultado.sort((a, b) => a.nombre.localeCompare(b.nombre));
+        },
+        obtener(id) {
+            return productos.get(id);
+        },
+        /** Llama a `oyente` cada vez que el catálogo cambia */
+        alCambiar(oyente) {
+            oyentes.push(oyente);
+        },
+        sincronizar: sincronizar,
+    };
+
+    document.addEventListener('DOMContentLoaded', async () => {
+        db = await abrirDB();
+        await cargarLocal();
+        if (productos.size) {
+            oyentes.forEach(oyente => oyente());
+        }
+        await sincronizar();
+        setInterval(sincronizar, INTERVALO_MS);
+    });
+})();
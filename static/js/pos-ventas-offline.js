@@ -0,0 +1,136 @@
+/**
+ * Cola de ventas offline del Punto de Venta
+ * Si una venta no llega al servidor (sin conexión o error 5xx) se guarda en
+ * localStorage con su clave de idempotencia y se reenvía cuando vuelve la
+ * conexión. El servidor registra cada clave una sola vez, así que reenviar
+ * una venta que sí había llegado no la duplica. Las que el servidor rechaza
+ * (p.ej. sin stock) quedan guardadas allá como VentaOfflineRechazada.
+ * Ver /pos/ventas-pendientes/ (views_pos.sincronizar_ventas_pos).
+ */
+
+(function() {
+    'use strict';
+
+    const URL_PENDIENTES = '/pos/ventas-pendientes/';
+    const CLAVE_COLA = 'stockex-pos-ventas-pendientes';
+    const INTERVALO_MS = 15000;
+    const MAX_POR_ENVIO = 100;
+
+    let enviando = false;
+    const oyentes = [];
+
+    function leerCola() {
+        try {
+            return JSON.parse(localStorage.getItem(CLAVE_COLA)) || [];
+        } catch (error) {
+            return [];
+        }
+    }
+
+    function guardarCola(cola) {
+        localStorage.setItem(CLAVE_COLA, JSON.stringify(cola));
+        oyentes.forEach(oyente => oyente(cola.length));
+    }
+
+    function nuevaClave() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+    }
+
+    function csrfToken() {
+        const cookie = document.cookie.split(';').map(c => c.trim()).find(c => c.startsWith('csrftoken='));
+        return cookie ? decodeURIComponent(cookie.substring('csrftoken='.length)) : '';
+    }
+
+    /**
+     * Reenvía las ventas pendientes en el orden en que se cobraron.
+     * Devuelve los resultados rechazados (p.ej. sin stock) para mostrarlos.
+     */
+    async function sincronizar() {
+        if (enviando || !leerCola().length) {
+            return [];
+        }
+        enviando = true;
+        const rechazadas = [];
+        try {
+            let cola = leerCola();
+            while (cola.length) {
+                const lote = cola.slice(0, MAX_POR_ENVIO);
+                const respuesta = await fetch(URL_PENDIENTES, {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken() },
+                    body: JSON.stringify({ ventas: lote }),
+                });
+                if (!respuesta.ok) {
+                    throw new Error('HTTP ' + respuesta.status);
+                }
+                const datos = await respuesta.json();
+                // Las rechazadas salen de la cola (reenviarlas daría el mismo conflicto):
+                // el servidor las guardó para resolverlas. Las de estado 'error' fueron
+                // fallas pasajeras y se quedan para el próximo ciclo.
+                const procesadas = new Set(datos.resultados.filter(r => r.estado !== 'error').map(r => r.clave));
+                datos.resultados.filter(r => r.estado === 'rechazada').forEach(r => {
+                    const venta = lote.find(v => v.clave === r.clave);
+                    rechazadas.push(Object.assign({ venta: venta }, r));
+                });
+                // La cola pudo crecer mientras se enviaba: se relee antes de guardar
+                cola = leerCola().filter(v => !procesadas.has(v.clave));
+                guardarCola(cola);
+                if (datos.resultados.some(r => r.estado === 'error')) {
+                    break;
+                }
+            }
+        } catch (error) {
+            // Sigue sin conexión: se reintenta en el próximo ciclo
+            console.warn('No se pudieron enviar las ventas pendientes:', error);
+        } finally {
+            enviando = false;
+        }
+        if (rechazadas.length) {
+            avisarRechazadas(rechazadas);
+        }
+        return rechazadas;
+    }
+
+    function avisarRechazadas(rechazadas) {
+        const lineas = rechazadas.map(r => {
+            const detalle = (r.conflictos || [])
+                .map(c => `${c.nombre}: disponible ${c.disponible}, vendido ${c.solicitado}`)
+                .join('; ');
+            const fecha = r.venta && r.venta.fecha_offline ? new Date(r.venta.fecha_offline).toLocaleString() : '';
+            return `- Venta ${fecha} ($${r.venta ? Number(r.venta.total).toLocaleString() : '?'}): ${r.error}` +
+                (detalle ? ` (${detalle})` : '');
+        });
+        alert('Ventas sin conexión que no se pudieron registrar (quedaron guardadas para revisión):\n' +
+            lineas.join('\n'));
+    }
+
+    window.ventasOffline = {
+        nuevaClave: nuevaClave,
+        /** Agrega una venta (con su 'clave') a la cola */
+        encolar(venta) {
+            const cola = leerCola();
+            if (!cola.some(v => v.clave === venta.clave)) {
+                cola.push(Object.assign({ fecha_offline: new Date().toISOString() }, venta));
+                guardarCola(cola);
+            }
+        },
+        pendientes() {
+            return leerCola().length;
+        },
+        /** Llama a `oyente(pendientes)` cada vez que cambia la cola */
+        alCambiar(oyente) {
+            oyentes.push(oyente);
+        },
+        sincronizar: sincronizar,
+    };
+
+    window.addEventListener('online', sincronizar);
+    document.addEventListener('DOMContentLoaded', () => {
+        sincronizar();
+        setInterval(sincronizar, INTERVALO_MS);
+    });
+})();
@@ -1,6 +1,11 @@
 """
 Configuración global de pytest para el proyecto
 """
+import json
+import os
+import platform
+from datetime import datetime
+
 import pytest
 from django.contrib.auth.models import User
 from inventario.models import Categoria, Producto
@@ -79,3 +84,46 @@ def authenticated_api_client(api_client, admin_user):
     api_client.force_authenticate(user=admin_user)
     return api_client
 
+
+
+# ========== BENCHMARKS (tests/test_rendimiento.py) ==========
+
+def pytest_addoption(parser):
+    grupo = parser.getgroup('rendimiento')
+    grupo.addoption(
+        '--bench-escala', type=int, default=1,
+        help='Multiplica el tamaño de los datos de los tests de rendimiento (por defecto 1)'
+    )
+    grupo.addoption(
+        '--bench-json', default=None,
+        help='Archivo JSON donde guardar consultas y tiempos de los tests de rendimiento'
+    )
+
+
+@pytest.fixture(scope='session')
+def escala_benchmark(request):
+    """Multiplicador de tamaño de los datos de rendimiento"""
+    return max(1, request.config.getoption('--bench-escala'))
+
+
+@pytest.fixture(scope='session')
+def registro_rendimiento(request, escala_benchmark):
+    """
+    Acumula las mediciones de los tests de rendimiento y, si se pasó
+    --bench-json, las guarda al final de la sesión para comparar corridas.
+    """
+    resultados = []
+    yield resultados
+    ruta = request.config.getoption('--bench-json')
+    if not ruta or not resultados:
+        return
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'escala': escala_benchmark,
+            'python': platform.python_version(),
+            'resultados': sorted(resultados, key=lambda r: r['vista']),
+        }, f, indent=2, ensure_ascii=False)
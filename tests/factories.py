@@ -4,7 +4,10 @@ Factories para crear datos de prueba con factory_boy
 import factory
 from factory.django import DjangoModelFactory
 from django.contrib.auth.models import User
-from inventario.models import Categoria, Producto, Venta, ItemVenta, Cotizacion, ItemCotizacion
+from inventario.models import (
+    Categoria, Producto, Venta, ItemVenta, Cotizacion, ItemCotizacion,
+    Cliente, MovimientoStock,
+)
 
 
 class UserFactory(DjangoModelFactory):
@@ -44,3 +47,84 @@ class ProductoFactory(DjangoModelFactory):
     stock_minimo = 10
     activo = True
 
+
+
+class ClienteFactory(DjangoModelFactory):
+    """Factory para crear clientes de prueba"""
+    class Meta:
+        model = Cliente
+    
+    nombre = factory.Sequence(lambda n: f'Cliente {n}')
+    rut = factory.Sequence(lambda n: f'{10000000 + n}-{n % 10}')
+    email = factory.LazyAttribute(lambda obj: f'cliente{obj.rut[:8]}@test.com')
+
+
+class VentaFactory(DjangoModelFactory):
+    """Factory para crear ventas de prueba (sin items)"""
+    class Meta:
+        model = Venta
+    
+    numero_venta = factory.Sequence(lambda n: f'V-TEST-{n:06d}')
+    usuario = factory.SubFactory(UserFactory)
+    total = factory.Faker('pyint', min_value=1000, max_value=200000)
+    subtotal = factory.LazyAttribute(lambda obj: obj.total)
+    metodo_pago = 'efectivo'
+
+
+class ItemVentaFactory(DjangoModelFactory):
+    """Factory para crear items de venta de prueba"""
+    class Meta:
+        model = ItemVenta
+    
+    venta = factory.SubFactory(VentaFactory)
+    producto = factory.SubFactory(ProductoFactory)
+    nombre_producto = factory.LazyAttribute(lambda obj: obj.producto.nombre)
+    cantidad = factory.Faker('pyint', min_value=1, max_value=5)
+    precio_unitario = factory.LazyAttribute(lambda obj: obj.producto.precio)
+    subtotal = factory.LazyAttribute(lambda obj: obj.precio_unitario * obj.cantidad)
+
+
+class MovimientoStockFactory(DjangoModelFactory):
+    """Factory para crear movimientos de stock de prueba"""
+    class Meta:
+        model = MovimientoStock
+    
+    producto = factory.SubFactory(ProductoFactory)
+    tipo = 'entrada'
+    motivo = 'compra'
+    cantidad = factory.Faker('pyint', min_value=1, max_value=20)
+    stock_anterior = factory.LazyAttribute(lambda obj: obj.producto.stock)
+    stock_nuevo = factory.LazyAttribute(lambda obj: obj.producto.stock + obj.cantidad)
+
+
+def crear_dataset(usuario, productos=20, categorias=4, clientes=10, ventas=15, items_por_venta=3, movimientos=30):
+    """
+    Crea un conjunto de datos relacionado (categorías, productos, clientes,
+    ventas con items y movimientos) para tests de rendimiento.
+    
+    Returns:
+        Dict con las listas creadas por tipo de objeto
+    """
+    lista_categorias = CategoriaFactory.create_batch(categorias)
+    lista_productos = [
+        ProductoFactory(categoria=lista_categorias[i % categorias], stock=(i * 7) % 40)
+        for i in range(productos)
+    ]
+    lista_clientes = ClienteFactory.create_batch(clientes)
+    lista_ventas = []
+    for i in range(ventas):
+        venta = VentaFactory(usuario=usuario, cliente=lista_clientes[i % clientes] if clientes and i % 2 else None)
+        for j in range(items_por_venta):
+            ItemVentaFactory(venta=venta, producto=lista_productos[(i + j) % productos])
+        lista_ventas.append(venta)
+    lista_movimientos = [
+        MovimientoStockFactory(producto=lista_productos[i % productos], usuario=usuario)
+        for i in range(movimientos)
+    ]
+    return {
+        'categorias': lista_categorias,
+        'productos': lista_productos,
+        'clientes': lista_clientes,
+        'ventas': lista_ventas,
+        'movimientos': lista_movimientos,
+    }
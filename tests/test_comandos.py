@@ -0,0 +1,87 @@
+"""
+Tests para los comandos de gestión de la aplicación inventario
+"""
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from inventario.models import Producto, Venta, ItemVenta, CuentaPorCobrar, Cliente, MovimientoStock, Lote
+
+
+def _generar(**opciones):
+    parametros = {
+        'productos': 60, 'categorias': 5, 'clientes': 20, 'ventas': 120, 'movimientos': 50,
+        'almacenes': 2, 'lotes': 10, 'proveedores': 3, 'dias': 90, 'tasa_credito': 0.5,
+        'tamano_lote': 25, 'stdout': StringIO(),
+    }
+    parametros.update(opciones)
+    call_command('generar_datos_sinteticos', **parametros)
+
+
+@pytest.mark.django_db
+class TestGenerarDatosSinteticos:
+    """Tests para el comando generar_datos_sinteticos"""
+    
+    def test_genera_volumenes_pedidos(self):
+        """Test que se crean las cantidades pedidas y los totales de clientes cuadran"""
+        _generar()
+        
+        assert Producto.objects.filter(sku__startswith='SINT-').count() == 60
+        assert Venta.objects.filter(numero_venta__startswith='SINT-').count() == 120
+        assert ItemVenta.objects.count() >= 120
+        assert MovimientoStock.objects.count() == 50
+        assert Lote.objects.count() == 10
+        assert CuentaPorCobrar.objects.exists()
+        
+        cliente = Cliente.objects.filter(cantidad_ventas__gt=0).first()
+        ventas = Venta.objects.filter(cliente=cliente, cancelada=False)
+        assert cliente.cantidad_ventas == ventas.count()
+        assert cliente.total_compras == sum(v.total for v in ventas)
+    
+    def test_misma_semilla_mismos_datos(self):
+        """Test que la semilla fija hace reproducible la generación"""
+        _generar(semilla=7)
+        primera = list(Venta.objects.order_by('numero_venta').values_list('numero_venta', 'total', 'fecha'))
+        
+        _generar(semilla=7, limpiar=True)
+        segunda = list(Venta.objects.order_by('numero_venta').values_list('numero_venta', 'total', 'fecha'))
+        
+        assert primera == segunda
+    
+    def test_no_duplica_sin_limpiar(self):
+        """Test que una segunda corrida sin --limpiar se rechaza"""
+        from django.core.management.base import CommandError
+        _generar()
+        with pytest.raises(CommandError):
+            _generar()
+    
+    def test_limpiar_borra_por_lotes_sin_senales(self):
+        """Test que --limpiar borra todo lo sintético con DELETE directos, sin señales por fila"""
+        from django.db.models.signals import post_delete
+        from inventario.models import CambioCatalogo, Categoria, Proveedor, Almacen, StockAlmacen
+        _generar()
+        real = Cliente.objects.create(nombre='Cliente real', email='real@ejemplo.cl')
+        Venta.objects.filter(numero_venta__startswith='SINT-').update(cliente=real)
+        Cliente.recalcular_totales(Cliente.objects.filter(pk=real.pk))
+        ids_productos = set(Producto.objects.values_list('pk', flat=True))
+        
+        senales = []
+        receptor = lambda sender, **kwargs: senales.append(sender)
+        post_delete.connect(receptor)
+        try:
+            from inventario.management.commands.generar_datos_sinteticos import Command
+            comando = Command(stdout=StringIO())
+            comando.lote = 25
+            comando.limpiar()
+        finally:
+            post_delete.disconnect(receptor)
+        
+        assert senales == []
+        assert not Producto.objects.exists() and not Venta.objects.exists()
+        assert not ItemVenta.objects.exists() and not MovimientoStock.objects.exists()
+        assert not Lote.objects.exists() and not StockAlmacen.objects.exists()
+        assert not CuentaPorCobrar.objects.exists() and not Almacen.objects.exists()
+        assert not Categoria.objects.exists() and not Proveedor.objects.exists()
+        assert list(Cliente.objects.all()) == [real]
+        real.refresh_from_db()
+        assert (real.cantidad_ventas, real.total_compras) == (0, 0)
+        assert set(CambioCatalogo.objects.filter(eliminado=True).values_list('producto_id', flat=True)) == ids_productos
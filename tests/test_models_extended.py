@@ -5,11 +5,11 @@ Cubre más casos de uso y validaciones
 import pytest
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
 from inventario.models import (
     Producto, Categoria, Venta, ItemVenta, Cliente, 
     CuentaPorCobrar, Almacen, OrdenCompra, Cotizacion,
-    Transferencia, ItemTransferencia, StockAlmacen
+    Transferencia, ItemTransferencia, StockAlmacen, PagoCliente
 )
 
 
@@ -32,6 +32,65 @@ class TestCliente:
         """Test el método __str__ del cliente"""
         cliente = Cliente.objects.create(nombre='Cliente Test')
         assert str(cliente) == 'Cliente Test'
+    
+    def test_totales_se_actualizan_con_ventas(self, admin_user):
+        """Test que ventas y cancelaciones mantienen total_compras y cantidad_ventas"""
+        cliente = Cliente.objects.create(nombre='Cliente Totales')
+        Venta.objects.create(cliente=cliente, usuario=admin_user, total=10000, numero_venta='V-T1')
+        venta = Venta.objects.create(cliente=cliente, usuario=admin_user, total=5000, numero_venta='V-T2')
+        cliente.refresh_from_db()
+        assert cliente.total_compras == 15000
+        assert cliente.cantidad_ventas == 2
+        
+        venta = Venta.objects.get(pk=venta.pk)
+        venta.cancelada = True
+        venta.save()
+        cliente.refresh_from_db()
+        assert cliente.total_compras == 10000
+        assert cliente.cantidad_ventas == 1
+    
+    def test_saldo_pendiente_se_actualiza_con_pagos(self, admin_user):
+        """Test que cuentas y pagos mantienen saldo_pendiente"""
+        cliente = Cliente.objects.create(nombre='Cliente Saldo')
+        cuenta = CuentaPorCobrar.objects.create(
+            cliente=cliente,
+            monto_total=100000,
+            fecha_emision=timezone.now().date(),
+            fecha_vencimiento=(timezone.now() + timedelta(days=30)).date(),
+        )
+        cliente.refresh_from_db()
+        assert cliente.saldo_pendiente == 100000
+        
+        PagoCliente.objects.create(
+            cuenta_por_cobrar=cuenta, monto=40000,
+            fecha_pago=timezone.now().date(), usuario=admin_user
+        )
+        cliente.refresh_from_db()
+        assert cliente.saldo_pendiente == 60000
+        
+        cuenta.delete()
+        cliente.refresh_from_db()
+        assert cliente.saldo_pendiente == 0
+    
+    def test_guardar_cliente_no_pisa_totales(self, admin_user):
+        """Test que editar un cliente cargado antes de una venta no pierde el total"""
+        cliente = Cliente.objects.create(nombre='Cliente Edicion')
+        Venta.objects.create(cliente=cliente, usuario=admin_user, total=7000, numero_venta='V-T3')
+        cliente.nombre = 'Cliente Editado'
+        cliente.save()
+        cliente.refresh_from_db()
+        assert cliente.nombre == 'Cliente Editado'
+        assert cliente.total_compras == 7000
+    
+    def test_recalcular_totales(self, admin_user):
+        """Test que recalcular_totales repara totales desviados"""
+        cliente = Cliente.objects.create(nombre='Cliente Recalculo')
+        Venta.objects.create(cliente=cliente, usuario=admin_user, total=3000, numero_venta='V-T4')
+        Cliente.objects.filter(pk=cliente.pk).update(total_compras=0, cantidad_ventas=0)
+        Cliente.recalcular_totales()
+        cliente.refresh_from_db()
+        assert cliente.total_compras == 3000
+        assert cliente.cantidad_ventas == 1
 
 
 @pytest.mark.django_db
@@ -99,6 +158,175 @@ class TestCuentaPorCobrar:
         )
         assert cuenta.cuenta_vencida is True
 
+    def _crear_cuenta(self, cliente, monto, dias_atraso, numero, estado='pendiente'):
+        hoy = timezone.now().date()
+        return CuentaPorCobrar.objects.create(
+            cliente=cliente,
+            numero_documento=numero,
+            monto_total=monto,
+            fecha_emision=hoy - timedelta(days=dias_atraso + 30),
+            fecha_vencimiento=hoy - timedelta(days=dias_atraso),
+            estado=estado
+        )
+
+    def test_antiguedad_saldos_por_tramo(self, admin_user):
+        """Test que el saldo se reparte en los tramos de antigüedad correctos"""
+        from inventario.utils_cobranza import calcular_antiguedad_saldos
+        cliente = Cliente.objects.create(nombre='Cliente Test')
+        otro = Cliente.objects.create(nombre='Otro Cliente')
+        self._crear_cuenta(cliente, 10000, -5, 'AG-1')
+        self._crear_cuenta(cliente, 20000, 15, 'AG-2')
+        self._crear_cuenta(cliente, 30000, 120, 'AG-3', estado='vencido')
+        self._crear_cuenta(otro, 40000, 45, 'AG-4')
+        self._crear_cuenta(otro, 50000, 70, 'AG-5', estado='cancelado')
+
+        antiguedad = calcular_antiguedad_saldos()
+        totales = antiguedad['totales']
+        assert totales['corriente'] == 10000
+        assert totales['dias_1_30'] == 20000
+        assert totales['dias_31_60'] == 40000
+        assert totales['dias_61_90'] == 0
+        assert totales['dias_90_mas'] == 30000
+        assert totales['total'] == 100000
+        assert totales['cuentas'] == 4
+        assert [fila['cliente_id'] for fila in antiguedad['clientes']] == [cliente.pk, otro.pk]
+
+    def test_resumen_antiguedad_respeta_limite_de_cada_llamada(self, admin_user):
+        """Test que el resumen cacheado no fija el límite de clientes del primer llamador"""
+        from django.core.cache import cache
+        from inventario.utils_cobranza import obtener_resumen_antiguedad
+        cache.clear()
+        for i in range(3):
+            cliente = Cliente.objects.create(nombre=f'Cliente {i}')
+            self._crear_cuenta(cliente, 10000 * (i + 1), 10, f'RA-{i}')
+
+        assert len(obtener_resumen_antiguedad(limite_clientes=1)['top_clientes']) == 1
+        resumen = obtener_resumen_antiguedad(limite_clientes=10)
+        assert len(resumen['top_clientes']) == 3
+        assert resumen['clientes_con_saldo'] == 3
+
+    def test_marcar_cuentas_vencidas(self, admin_user):
+        """Test que las cuentas vencidas se marcan en bloque y se notifica"""
+        from inventario.models import NotificacionUsuario
+        from inventario.utils_cobranza import marcar_cuentas_vencidas
+        cliente = Cliente.objects.create(nombre='Cliente Test')
+        vencida = self._crear_cuenta(cliente, 10000, 3, 'MV-1')
+        al_dia = self._crear_cuenta(cliente, 20000, -3, 'MV-2')
+
+        resultado = marcar_cuentas_vencidas()
+
+        assert resultado['cuentas'] == 1
+        assert resultado['monto'] == 10000
+        vencida.refresh_from_db()
+        al_dia.refresh_from_db()
+        assert vencida.estado == 'vencido'
+        assert al_dia.estado == 'pendiente'
+        assert NotificacionUsuario.objects.filter(usuario=admin_user, tipo='cuenta_vencida').count() == 1
+        cliente.refresh_from_db()
+        assert cliente.saldo_pendiente == 30000
+        assert marcar_cuentas_vencidas()['cuentas'] == 0
+
+    def test_aplicar_pago_reparte_de_mas_antigua_a_mas_nueva(self, admin_user):
+        """Test que un pago se reparte entre cuentas empezando por la más antigua"""
+        from inventario.utils_cobranza import aplicar_pago_cliente
+        cliente = Cliente.objects.create(nombre='Cliente Test')
+        nueva = self._crear_cuenta(cliente, 30000, -10, 'AP-1')
+        antigua = self._crear_cuenta(cliente, 20000, 40, 'AP-2', estado='vencido')
+
+        resultado = aplicar_pago_cliente(cliente.pk, 35000, usuario=admin_user)
+
+        assert resultado['duplicado'] is False
+        assert resultado['monto_aplicado'] == 35000
+        antigua.refresh_from_db()
+        nueva.refresh_from_db()
+        assert antigua.monto_pagado == 20000
+        assert antigua.estado == 'pagado'
+        assert nueva.monto_pagado == 15000
+        assert nueva.estado == 'parcial'
+        cliente.refresh_from_db()
+        assert cliente.saldo_pendiente == 15000
+
+        with pytest.raises(ValueError):
+            aplicar_pago_cliente(cliente.pk, 20000)
+
+    def test_aplicar_pago_idempotente(self, admin_user):
+        """Test que reenviar la misma clave no registra el pago dos veces"""
+        from inventario.utils_cobranza import aplicar_pago_cliente
+        cliente = Cliente.objects.create(nombre='Cliente Test')
+        cuenta = self._crear_cuenta(cliente, 30000, 5, 'AP-3', estado='vencido')
+
+        primero = aplicar_pago_cliente(cliente.pk, 10000, clave_idempotencia='abc123')
+        segundo = aplicar_pago_cliente(cliente.pk, 10000, clave_idempotencia='abc123')
+
+        assert segundo['duplicado'] is True
+        assert [p.pk for p in segundo['pagos']] == [p.pk for p in primero['pagos']]
+        cuenta.refresh_from_db()
+        assert cuenta.monto_pagado == 10000
+        assert cuenta.estado == 'vencido'
+        assert PagoCliente.objects.filter(cuenta_por_cobrar=cuenta).count() == 1
+
+    def test_importar_pagos_no_duplica(self, admin_user):
+        """Test que reimportar el mismo lote de pagos no los duplica"""
+        from inventario.utils_cobranza import importar_pagos_clientes
+        cliente = Cliente.objects.create(nombre='Cliente Test')
+        self._crear_cuenta(cliente, 30000, 5, 'AP-4')
+        filas = [
+            {'cliente_id': cliente.pk, 'monto': '5000', 'fecha_pago': '2024-01-10', 'referencia': 'TR-1'},
+            {'cliente_id': cliente.pk, 'monto': '7000', 'fecha_pago': '2024-01-11', 'referencia': 'TR-2'},
+            {'cliente_id': '', 'monto': '1000'},
+        ]
+
+        primero = importar_pagos_clientes(filas)
+        segundo = importar_pagos_clientes(filas)
+
+        assert primero['aplicados'] == 2
+        assert primero['monto_aplicado'] == 12000
+        assert len(primero['errores']) == 1
+        assert segundo['aplicados'] == 0
+        assert segundo['duplicados'] == 2
+        cliente.refresh_from_db()
+        assert cliente.saldo_pendiente == 18000
+
+    def test_importar_pagos_iguales_en_filas_distintas(self, admin_user, tmp_path):
+        """Test que dos pagos idénticos sin referencia en el mismo archivo son dos pagos"""
+        from io import StringIO
+        from django.core.management import call_command
+        cliente = Cliente.objects.create(nombre='Cliente Test')
+        self._crear_cuenta(cliente, 30000, 5, 'AP-5')
+        archivo = tmp_path / 'pagos.csv'
+        archivo.write_text(
+            'cliente_id,monto,fecha_pago,metodo_pago\n'
+            f'{cliente.pk},5000,2024-01-10,efectivo\n'
+            f'{cliente.pk},5000,2024-01-10,efectivo\n',
+            encoding='utf-8',
+        )
+
+        call_command('importar_pagos_clientes', str(archivo), stdout=StringIO())
+        call_command('importar_pagos_clientes', str(archivo), stdout=StringIO())
+
+        cliente.refresh_from_db()
+        assert cliente.saldo_pendiente == 20000
+
+    def test_importar_pagos_fechas(self, admin_user):
+        """Test que se aceptan fechas DD/MM/AAAA y una fecha inválida es un error de esa fila"""
+        from inventario.utils_cobranza import importar_pagos_clientes
+        cliente = Cliente.objects.create(nombre='Cliente Test')
+        self._crear_cuenta(cliente, 30000, 5, 'AP-6')
+        filas = [
+            {'cliente_id': cliente.pk, 'monto': '5000', 'fecha_pago': '05/01/2024', 'referencia': 'TF-1'},
+            {'cliente_id': cliente.pk, 'monto': '5000', 'fecha_pago': '31/02/2024', 'referencia': 'TF-2'},
+            {'cliente_id': cliente.pk, 'monto': '5000', 'fecha_pago': 'ayer', 'referencia': 'TF-3'},
+            {'cliente_id': cliente.pk, 'monto': '3000', 'fecha_pago': '2024-01-06', 'referencia': 'TF-4'},
+        ]
+
+        resultado = importar_pagos_clientes(filas)
+
+        assert resultado['aplicados'] == 2
+        assert [numero for numero, _ in resultado['errores']] == [2, 3]
+        assert 'Fecha de pago inválida' in resultado['errores'][1][1]
+        fechas = PagoCliente.objects.filter(cuenta_por_cobrar__cliente=cliente).values_list('fecha_pago', flat=True)
+        assert sorted(fechas) == [date(2024, 1, 5), date(2024, 1, 6)]
+
 
 @pytest.mark.django_db
 class TestCotizacion:
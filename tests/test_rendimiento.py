@@ -0,0 +1,165 @@
+"""
+Tests de rendimiento: cantidad de consultas SQL y tiempo de las vistas más usadas
+
+Cada vista se mide con un conjunto de datos creado con tests/factories.py y
+falla si supera su presupuesto de consultas. Un segundo test mide la misma
+vista con el doble de datos para detectar consultas N+1 (la cantidad de
+consultas no debería crecer con los datos).
+
+Opciones:
+    --bench-escala N   multiplica el tamaño de los datos
+    --bench-json RUTA  guarda consultas y tiempos en JSON para comparar corridas
+"""
+import json
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventario.models import Venta
+from .factories import crear_dataset
+
+
+TAMANO_BASE = {
+    'productos': 20,
+    'categorias': 4,
+    'clientes': 10,
+    'ventas': 15,
+    'items_por_venta': 3,
+    'movimientos': 30,
+}
+
+
+def _peticion_procesar_venta(datos):
+    productos = [p for p in datos['productos'] if p.stock > 0][:3]
+    items = [{'producto_id': p.id, 'cantidad': 1, 'precio': str(p.precio)} for p in productos]
+    total = sum(p.precio for p in productos)
+    return {
+        'items': json.dumps(items),
+        'subtotal': str(total),
+        'descuento': '0',
+        'total': str(total),
+        'metodo_pago': 'efectivo',
+        'monto_recibido': str(total),
+        'cambio': '0',
+    }
+
+
+# nombre -> (método, url, datos de la petición)
+VISTAS = {
+    'inicio': ('get', lambda d: reverse('inicio'), None),
+    'punto_venta': ('get', lambda d: reverse('punto_venta'), None),
+    'procesar_venta': ('post', lambda d: reverse('procesar_venta'), _peticion_procesar_venta),
+    'reportes_avanzados': ('get', lambda d: reverse('reportes_avanzados'), None),
+    'dashboard': ('get', lambda d: reverse('dashboard'), None),
+    'busqueda_global': ('get', lambda d: reverse('busqueda_global') + '?q=Producto', None),
+    'api_productos': ('get', lambda d: '/api/v1/productos/', None),
+    'api_categorias': ('get', lambda d: '/api/v1/categorias/', None),
+    'api_ventas': ('get', lambda d: '/api/v1/ventas/', None),
+    'api_movimientos_stock': ('get', lambda d: '/api/v1/movimientos-stock/', None),
+    'exportar_excel': ('get', lambda d: reverse('exportar_excel'), None),
+    'exportar_pdf': ('get', lambda d: reverse('exportar_pdf'), None),
+    'exportar_csv': ('get', lambda d: reverse('exportar_csv'), None),
+}
+
+# Máximo de consultas SQL por vista con caché vacía y los datos base
+# (escala 1). Subirlo debe ser una decisión explícita en la revisión.
+PRESUPUESTO_CONSULTAS = {
+    'inicio': 12,
+    'punto_venta': 6,
+    'procesar_venta': 14,
+    'reportes_avanzados': 70,
+    'dashboard': 18,
+    'busqueda_global': 12,
+    'api_productos': 6,
+    'api_categorias': 10,
+    'api_ventas': 55,
+    'api_movimientos_stock': 6,
+    'exportar_excel': 5,
+    'exportar_pdf': 5,
+    'exportar_csv': 5,
+}
+
+# N+1 ya conocidos: el test de crecimiento falla a propósito (xfail estricto),
+# así que al corregirlos pasa a XPASS y obliga a sacarlos de aquí y bajar el
+# presupuesto.
+N_MAS_UNO_CONOCIDOS = {
+    'api_categorias': 'CategoriaSerializer.producto_count hace un COUNT por categoría',
+    'api_ventas': 'VentaSerializer.items_count hace un COUNT por venta',
+    'reportes_avanzados': 'la rotación de inventario consulta ventas por producto',
+}
+
+
+def _vistas_crecimiento():
+    return [
+        pytest.param(nombre, marks=pytest.mark.xfail(strict=True, reason=N_MAS_UNO_CONOCIDOS[nombre]))
+        if nombre in N_MAS_UNO_CONOCIDOS else nombre
+        for nombre in sorted(VISTAS)
+    ]
+
+
+def _tamano(escala, factor=1):
+    return {clave: valor * escala * factor for clave, valor in TAMANO_BASE.items()}
+
+
+def _medir(client, nombre, datos):
+    """Ejecuta la petición de la vista con caché vacía y devuelve (respuesta, consultas, segundos)"""
+    metodo, url, cuerpo = VISTAS[nombre]
+    cache.clear()
+    with CaptureQueriesContext(connection) as consultas:
+        inicio = time.perf_counter()
+        if metodo == 'post':
+            respuesta = client.post(url(datos), cuerpo(datos) if cuerpo else {})
+        else:
+            respuesta = client.get(url(datos))
+        if getattr(respuesta, 'streaming', False):
+            b''.join(respuesta.streaming_content)
+        segundos = time.perf_counter() - inicio
+    return respuesta, len(consultas), segundos
+
+
+@pytest.mark.django_db
+class TestRendimientoVistas:
+    """Presupuesto de consultas y tiempos de las vistas principales"""
+    
+    @pytest.mark.parametrize('nombre', sorted(VISTAS))
+    def test_consultas_dentro_del_presupuesto(self, client, bossa_user, nombre, escala_benchmark, registro_rendimiento):
+        """La vista no supera su presupuesto de consultas"""
+        datos = crear_dataset(bossa_user, **_tamano(escala_benchmark))
+        client.force_login(bossa_user)
+        
+        respuesta, consultas, segundos = _medir(client, nombre, datos)
+        registro_rendimiento.append({
+            'vista': nombre,
+            'consultas': consultas,
+            'presupuesto': PRESUPUESTO_CONSULTAS[nombre],
+            'segundos': round(segundos, 4),
+            'escala': escala_benchmark,
+        })
+        
+        assert respuesta.status_code == 200, f'{nombre} respondió {respuesta.status_code}'
+        if consultas > PRESUPUESTO_CONSULTAS[nombre] and nombre in N_MAS_UNO_CONOCIDOS and escala_benchmark > 1:
+            pytest.xfail(N_MAS_UNO_CONOCIDOS[nombre])
+        assert consultas <= PRESUPUESTO_CONSULTAS[nombre], (
+            f'{nombre} hizo {consultas} consultas (presupuesto {PRESUPUESTO_CONSULTAS[nombre]})'
+        )
+    
+    @pytest.mark.parametrize('nombre', _vistas_crecimiento())
+    def test_consultas_no_crecen_con_los_datos(self, client, bossa_user, nombre, escala_benchmark):
+        """Duplicar los datos no agrega consultas (detecta N+1)"""
+        client.force_login(bossa_user)
+        datos = crear_dataset(bossa_user, **_tamano(escala_benchmark))
+        respuesta, consultas_base, _ = _medir(client, nombre, datos)
+        if nombre == 'procesar_venta':
+            # numero_venta se genera por segundo: sin esto la segunda venta choca
+            Venta.objects.filter(pk=respuesta.json()['venta_id']).delete()
+        
+        crear_dataset(bossa_user, **_tamano(escala_benchmark))
+        _, consultas_doble, _ = _medir(client, nombre, datos)
+        
+        assert consultas_doble == consultas_base, (
+            f'{nombre}: {consultas_base} consultas con datos base y {consultas_doble} con el doble'
+        )
@@ -2,6 +2,8 @@
 Tests extendidos para las vistas de la aplicación inventario
 Cubre más funcionalidades y casos de uso
 """
+import io
+
 import pytest
 from django.urls import reverse
 from django.contrib.auth.models import User
@@ -32,6 +34,50 @@ class TestVentasViews:
         """Test que listar ventas requiere autenticación"""
         response = client.get(reverse('listar_ventas'))
         assert response.status_code == 302
+    
+    def test_procesar_venta_descuenta_stock_y_registra_movimientos(self, client, admin_user):
+        """Test que la venta descuenta stock y deja movimientos e historial"""
+        import json
+        from inventario.models import MovimientoStock, HistorialCambio
+        producto = ProductoFactory(stock=10, stock_minimo=2)
+        client.force_login(admin_user)
+        
+        items = [
+            {'producto_id': producto.id, 'cantidad': 3, 'precio': '1000'},
+            {'producto_id': producto.id, 'cantidad': 2, 'precio': '1000'},
+        ]
+        response = client.post(reverse('procesar_venta'), {
+            'items': json.dumps(items), 'subtotal': '5000', 'descuento': '0', 'total': '5000',
+        })
+        
+        assert response.status_code == 200
+        producto.refresh_from_db()
+        assert producto.stock == 5
+        venta = Venta.objects.get(id=response.json()['venta_id'])
+        assert [(i.stock_anterior, i.stock_despues, i.subtotal) for i in venta.items.all()] == [(10, 7, 3000), (7, 5, 2000)]
+        assert MovimientoStock.objects.filter(producto=producto, motivo='venta').count() == 2
+        assert HistorialCambio.objects.filter(producto=producto, tipo_cambio='stock').count() == 2
+    
+    def test_procesar_venta_sin_stock_no_deja_rastros(self, client, admin_user):
+        """Test que si un producto no alcanza, no se descuenta ninguno"""
+        import json
+        con_stock = ProductoFactory(stock=10)
+        sin_stock = ProductoFactory(stock=1)
+        client.force_login(admin_user)
+        
+        items = [
+            {'producto_id': con_stock.id, 'cantidad': 2, 'precio': '1000'},
+            {'producto_id': sin_stock.id, 'cantidad': 2, 'precio': '1000'},
+        ]
+        response = client.post(reverse('procesar_venta'), {
+            'items': json.dumps(items), 'subtotal': '4000', 'descuento': '0', 'total': '4000',
+        })
+        
+        assert response.status_code == 400
+        assert 'Stock insuficiente' in response.json()['error']
+        con_stock.refresh_from_db()
+        assert con_stock.stock == 10
+        assert not Venta.objects.exists()
 
 
 @pytest.mark.django_db
@@ -49,6 +95,21 @@ class TestClientesViews:
         response = client.get(reverse('listar_clientes'))
         assert response.status_code == 200
     
+    def test_listar_clientes_ordena_por_saldo(self, client, admin_user):
+        """Test que se puede ordenar clientes por saldo pendiente"""
+        from django.utils import timezone
+        poco = Cliente.objects.create(nombre='A Poco Saldo')
+        mucho = Cliente.objects.create(nombre='B Mucho Saldo')
+        for cliente, monto in ((poco, 1000), (mucho, 50000)):
+            CuentaPorCobrar.objects.create(
+                cliente=cliente, monto_total=monto, numero_documento=f'CC-{monto}',
+                fecha_emision=timezone.now().date(), fecha_vencimiento=timezone.now().date()
+            )
+        client.force_login(admin_user)
+        response = client.get(reverse('listar_clientes'), {'orden': 'saldo_pendiente'})
+        assert response.status_code == 200
+        assert list(response.context['clientes'])[:2] == [mucho, poco]
+    
     def test_crear_cliente_requiere_admin(self, client, normal_user):
         """Test que crear cliente requiere ser admin"""
         client.force_login(normal_user)
@@ -86,6 +147,68 @@ class TestCotizacionesViews:
         """Test que crear cotización requiere autenticación"""
         response = client.get(reverse('crear_cotizacion'))
         assert response.status_code == 302
+    
+    def _cotizacion_con_items(self, usuario, productos_cantidades):
+        from inventario.models import ItemCotizacion
+        cotizacion = Cotizacion.objects.create(
+            usuario=usuario, numero_cotizacion=f'COT-TEST-{Cotizacion.objects.count() + 1}',
+            subtotal=0, total=0, fecha_vencimiento='2030-01-01'
+        )
+        for producto, cantidad in productos_cantidades:
+            ItemCotizacion.objects.create(
+                cotizacion=cotizacion, producto=producto, nombre_producto=producto.nombre,
+                cantidad=cantidad, precio_unitario=producto.precio
+            )
+        return cotizacion
+    
+    def test_imprimir_cotizacion_termica_y_a4(self, client, admin_user):
+        """Test que la cotización se imprime en ambos formatos"""
+        cotizacion = self._cotizacion_con_items(admin_user, [(ProductoFactory(), 2)])
+        client.force_login(admin_user)
+        for tipo in ('termica', 'a4'):
+            response = client.get(reverse('imprimir_cotizacion', args=[cotizacion.id]), {'tipo': tipo})
+            assert response.status_code == 200
+            assert response['Content-Type'] == 'application/pdf'
+            assert f'cotizacion_{tipo}_' in response['Content-Disposition']
+            assert b''.join(response.streaming_content).startswith(b'%PDF')
+    
+    def test_convertir_cotizacion_en_venta(self, client, admin_user):
+        """Test que convertir descuenta stock, registra movimientos y no se repite"""
+        from inventario.models import MovimientoStock
+        producto = ProductoFactory(stock=10)
+        otro = ProductoFactory(stock=5)
+        cotizacion = self._cotizacion_con_items(admin_user, [(producto, 4), (otro, 5)])
+        client.force_login(admin_user)
+        url = reverse('convertir_cotizacion_en_venta', args=[cotizacion.id])
+        
+        response = client.post(url)
+        assert response.status_code == 200
+        cotizacion.refresh_from_db()
+        assert cotizacion.estado == 'aprobada'
+        assert cotizacion.convertida_en_venta_id == response.json()['venta_id']
+        producto.refresh_from_db()
+        otro.refresh_from_db()
+        assert (producto.stock, otro.stock) == (6, 0)
+        assert MovimientoStock.objects.filter(motivo='venta').count() == 2
+        
+        response = client.post(url)
+        assert response.status_code == 400
+        producto.refresh_from_db()
+        assert producto.stock == 6
+        assert Venta.objects.count() == 1
+    
+    def test_convertir_cotizacion_sin_stock(self, client, admin_user):
+        """Test que una cotización sin stock suficiente no se convierte"""
+        producto = ProductoFactory(stock=2)
+        cotizacion = self._cotizacion_con_items(admin_user, [(producto, 3)])
+        client.force_login(admin_user)
+        
+        response = client.post(reverse('convertir_cotizacion_en_venta', args=[cotizacion.id]))
+        
+        assert response.status_code == 400
+        cotizacion.refresh_from_db()
+        assert cotizacion.convertida_en_venta is None
+        assert not Venta.objects.exists()
 
 
 @pytest.mark.django_db
@@ -141,6 +264,472 @@ class TestExportacion:
         """Test que exportar PDF requiere autenticación"""
         response = client.get(reverse('exportar_pdf'))
         assert response.status_code == 302
+    
+    def test_exportar_pdf_en_tablas_por_bloques(self, client, admin_user):
+        """Test que la exportación reparte los productos en varias tablas"""
+        from inventario import utils_pdf
+        ProductoFactory.create_batch(utils_pdf.FILAS_POR_TABLA + 5, activo=True)
+        tablas = utils_pdf.tablas_por_bloques(['A'], ([n] for n in range(utils_pdf.FILAS_POR_TABLA + 5)))
+        assert [len(tabla._cellvalues) for tabla in tablas] == [utils_pdf.FILAS_POR_TABLA + 1, 6]
+        
+        client.force_login(admin_user)
+        response = client.get(reverse('exportar_pdf'))
+        assert response.status_code == 200
+        assert b''.join(response.streaming_content).startswith(b'%PDF')
+    
+    def test_logo_se_decodifica_una_vez(self, settings, tmp_path):
+        """Test que el logo de los PDFs se carga una sola vez por proceso"""
+        from PIL import Image
+        from inventario import utils_pdf
+        ruta = tmp_path / 'logo.png'
+        Image.new('RGB', (40, 20), 'red').save(ruta)
+        settings.PDF_LOGO_PATH = str(ruta)
+        utils_pdf.logo_negocio.cache_clear()
+        try:
+            assert utils_pdf.logo_negocio() is utils_pdf.logo_negocio()
+            assert utils_pdf.logo_negocio.cache_info().misses == 1
+            salida = io.BytesIO()
+            utils_pdf.renderizar_pdf(salida, utils_pdf.PLANTILLAS['termica'], utils_pdf.encabezado_negocio('termica'))
+            assert b'/Subtype /Image' in salida.getvalue()
+        finally:
+            utils_pdf.logo_negocio.cache_clear()
+
+
+@pytest.mark.django_db
+class TestEtiquetas:
+    """Tests para la impresión de etiquetas"""
+    
+    def test_hoja_agrupa_etiquetas_por_pagina(self, client, bossa_user):
+        """Test que una hoja Avery pone 30 etiquetas por página"""
+        producto = ProductoFactory(sku='SKU-ETQ-1', activo=True)
+        client.force_login(bossa_user)
+        response = client.get(reverse('generar_etiquetas_pdf'), {
+            'producto_id': producto.id, 'plantilla': 'avery_5160', 'cantidad': 45,
+        })
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/pdf'
+        contenido = b''.join(response.streaming_content)
+        assert contenido.startswith(b'%PDF')
+        assert contenido.count(b'/Type /Page\n') == 2
+    
+    def test_copias_reutilizan_el_dibujo(self, client, bossa_user):
+        """Test que las copias referencian el mismo dibujo en vez de repetirlo"""
+        producto = ProductoFactory(sku='SKU-ETQ-2', activo=True)
+        client.force_login(bossa_user)
+        url = reverse('generar_etiquetas_pdf')
+        una = b''.join(client.get(url, {'producto_id': producto.id, 'plantilla': 'a4_65', 'cantidad': 1}).streaming_content)
+        muchas = b''.join(client.get(url, {'producto_id': producto.id, 'plantilla': 'a4_65', 'cantidad': 500}).streaming_content)
+        # Cada copia es sólo una referencia al Form XObject (unos pocos bytes)
+        assert (len(muchas) - len(una)) / 499 < 50
+    
+    def test_cantidad_acotada(self, client, bossa_user):
+        """Test que ?cantidad enorme se acota a MAX_COPIAS_ETIQUETA"""
+        from inventario.views_impresion import MAX_COPIAS_ETIQUETA
+        producto = ProductoFactory(sku='SKU-ETQ-3', activo=True)
+        client.force_login(bossa_user)
+        response = client.get(reverse('generar_etiquetas_pdf'), {
+            'producto_id': producto.id, 'plantilla': 'avery_5160', 'cantidad': 1000000,
+        })
+        contenido = b''.join(response.streaming_content)
+        assert contenido.count(b'/Type /Page\n') == -(-MAX_COPIAS_ETIQUETA // 30)
+    
+    def test_codigo_barras_se_cachea(self):
+        """Test que el Code128 de un SKU se construye una sola vez"""
+        from inventario.utils_etiquetas import codigo_barras
+        codigo_barras.cache_clear()
+        codigo_barras('SKU-CACHE', 100, 20)
+        codigo_barras('SKU-CACHE', 100, 20)
+        info = codigo_barras.cache_info()
+        assert info.misses == 1
+        assert info.hits == 1
+    
+    def test_posicion_inicial_reaprovecha_hoja(self):
+        """Test que posicion_inicial salta las etiquetas ya usadas"""
+        import io
+        from inventario.utils_etiquetas import FORMATOS_ETIQUETA, DatosEtiqueta, generar_pdf_etiquetas
+        formato = FORMATOS_ETIQUETA['avery_5160']
+        salida = io.BytesIO()
+        datos = DatosEtiqueta(clave='1', nombre='Producto', precio='$1.000', sku='ABC')
+        impresas = generar_pdf_etiquetas(salida, formato, [(datos, 5)], posicion_inicial=28)
+        assert impresas == 5
+        assert salida.getvalue().count(b'/Type /Page\n') == 2
+    
+    def test_etiquetas_requiere_admin(self, client, normal_user, producto):
+        """Test que sólo el administrador puede generar etiquetas"""
+        client.force_login(normal_user)
+        response = client.get(reverse('generar_etiquetas_pdf'), {'producto_id': producto.id})
+        assert response.status_code == 403
+
+
+@pytest.mark.django_db
+class TestListaPrecios:
+    """Tests para la lista de precios en PDF"""
+    
+    @pytest.fixture(autouse=True)
+    def cache_pdf(self, settings, tmp_path):
+        settings.PDF_CACHE_DIR = tmp_path
+        return tmp_path
+    
+    def test_lista_agrupada_en_varias_paginas(self, client, admin_user):
+        """Test que una lista grande se reparte en varias páginas"""
+        categoria = CategoriaFactory()
+        ProductoFactory.create_batch(120, categoria=categoria, activo=True)
+        client.force_login(admin_user)
+        response = client.get(reverse('generar_lista_precios_pdf'))
+        assert response.status_code == 200
+        contenido = b''.join(response.streaming_content)
+        assert contenido.startswith(b'%PDF')
+        assert contenido.count(b'/Type /Page\n') > 1
+    
+    def test_lista_sin_cambios_se_sirve_desde_disco(self, client, admin_user, producto, monkeypatch, cache_pdf):
+        """Test que la segunda impresión no vuelve a generar el PDF"""
+        from inventario import utils_lista_precios
+        generaciones = []
+        original = utils_lista_precios.generar_pdf_lista_precios
+        monkeypatch.setattr(utils_lista_precios, 'generar_pdf_lista_precios',
+                            lambda *args, **kwargs: generaciones.append(1) or original(*args, **kwargs))
+        client.force_login(admin_user)
+        url = reverse('generar_lista_precios_pdf')
+        primera = b''.join(client.get(url).streaming_content)
+        segunda = b''.join(client.get(url).streaming_content)
+        assert primera == segunda
+        assert len(generaciones) == 1
+        assert len(list(cache_pdf.glob('lista_precios_*.pdf'))) == 1
+        
+        # Un cambio de precio genera una lista nueva
+        producto.precio = producto.precio + 1000
+        producto.save()
+        client.get(url)
+        assert len(generaciones) == 2
+        
+        # Renombrar la categoría también (los encabezados de la lista la muestran)
+        producto.categoria.nombre = 'Categoría renombrada'
+        producto.categoria.save()
+        client.get(url)
+        assert len(generaciones) == 3
+    
+    def test_lista_categoria_inexistente(self, client, admin_user):
+        """Test que una categoría inexistente devuelve 404"""
+        client.force_login(admin_user)
+        response = client.get(reverse('generar_lista_precios_pdf'), {'categoria': 999999})
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestTicketsVenta:
+    """Tests para los tickets de venta pre-generados"""
+    
+    @pytest.fixture(autouse=True)
+    def cache_pdf(self, settings, tmp_path):
+        settings.PDF_CACHE_DIR = tmp_path
+        return tmp_path
+    
+    @pytest.fixture
+    def venta(self, admin_user):
+        from tests.factories import VentaFactory, ItemVentaFactory
+        venta = VentaFactory(usuario=admin_user)
+        ItemVentaFactory(venta=venta, nombre_producto='Pisco Añejo', cantidad=2, precio_unitario=5000, subtotal=10000)
+        return venta
+    
+    def test_venta_encola_tickets_al_confirmar(self, client, admin_user, monkeypatch, django_capture_on_commit_callbacks):
+        """Test que procesar una venta encola la generación de sus tickets"""
+        import json
+        from inventario import utils_ventas
+        encoladas = []
+        monkeypatch.setattr(utils_ventas, 'encolar_tickets_venta', encoladas.append)
+        producto = ProductoFactory(stock=10)
+        client.force_login(admin_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(reverse('procesar_venta'), {
+                'items': json.dumps([{'producto_id': producto.id, 'cantidad': 1, 'precio': '1000'}]),
+                'subtotal': '1000', 'descuento': '0', 'total': '1000',
+            })
+        assert encoladas == [response.json()['venta_id']]
+    
+    def test_sin_broker_no_espera_a_celery(self, settings, monkeypatch):
+        """Test que sin broker la venta no intenta encolar (ni espera los reintentos de Celery)"""
+        import time
+        from inventario import tasks
+        from inventario.utils_tickets import encolar_tickets_venta
+        settings.CELERY_TASK_ALWAYS_EAGER = False
+        settings.CELERY_BROKER_URL = 'redis://127.0.0.1:9/1'
+        monkeypatch.setitem(tasks._sondeo_broker, 'fecha', None)
+        
+        def no_encolar(*args, **kwargs):
+            raise AssertionError('No debería encolarse sin broker')
+        monkeypatch.setattr(tasks.generar_tickets_venta_async, 'apply_async', no_encolar)
+        inicio = time.monotonic()
+        encolar_tickets_venta(1)
+        encolar_tickets_venta(2)
+        assert time.monotonic() - inicio < 1
+        assert tasks.broker_disponible() is False
+    
+    def test_reimpresion_lee_el_archivo_generado(self, client, admin_user, venta, monkeypatch):
+        """Test que una vez generado, el ticket no se vuelve a renderizar"""
+        from inventario import utils_tickets
+        assert utils_tickets.generar_tickets_venta(venta.id) == 3
+        
+        def no_renderizar(*args):
+            raise AssertionError('El ticket no debería regenerarse')
+        monkeypatch.setitem(utils_tickets.FORMATOS_TICKET, 'termica', (no_renderizar, 'application/pdf', 'pdf'))
+        client.force_login(admin_user)
+        response = client.get(reverse('imprimir_ticket_venta', args=[venta.id]), {'tipo': 'termica'})
+        assert response.status_code == 200
+        contenido = b''.join(response.streaming_content)
+        assert contenido == utils_tickets.ruta_ticket(venta, 'termica').read_bytes()
+        assert contenido.startswith(b'%PDF')
+    
+    def test_tickets_se_podan_y_se_borran_con_la_venta(self, venta, django_capture_on_commit_callbacks):
+        """Test que los tickets viejos se podan y los de una venta borrada se eliminan"""
+        import os
+        import time
+        from tests.factories import VentaFactory
+        from inventario import utils_tickets
+        otra = VentaFactory(usuario=venta.usuario)
+        utils_tickets.generar_tickets_venta(venta.id)
+        utils_tickets.generar_tickets_venta(otra.id)
+        hace_60_dias = time.time() - 60 * 86400
+        for formato in utils_tickets.FORMATOS_TICKET:
+            os.utime(utils_tickets.ruta_ticket(venta, formato), (hace_60_dias, hace_60_dias))
+        
+        assert utils_tickets.podar_tickets(dias=30) == 3
+        assert not utils_tickets.ruta_ticket(venta, 'termica').exists()
+        assert utils_tickets.ruta_ticket(otra, 'termica').exists()
+        
+        rutas = [utils_tickets.ruta_ticket(otra, formato) for formato in utils_tickets.FORMATOS_TICKET]
+        with django_capture_on_commit_callbacks(execute=True):
+            otra.delete()
+        assert not any(ruta.exists() for ruta in rutas)
+        assert list(utils_tickets.directorio_tickets().iterdir()) == []
+    
+    def test_ticket_escpos(self, client, admin_user, venta):
+        """Test que el ticket ESC/POS son bytes de impresora, sin PDF"""
+        client.force_login(admin_user)
+        response = client.get(reverse('imprimir_ticket_venta', args=[venta.id]), {'tipo': 'escpos'})
+        assert response.status_code == 200
+        contenido = b''.join(response.streaming_content)
+        assert contenido.startswith(b'\x1b@')
+        assert contenido.endswith(b'\x1dVB\x03')
+        assert 'Pisco Añejo'.encode('cp858') in contenido
+        assert venta.numero_venta.encode() in contenido
+    
+    def test_ticket_de_otro_vendedor(self, client, normal_user, venta):
+        """Test que un vendedor no puede ver tickets de otro"""
+        client.force_login(normal_user)
+        response = client.get(reverse('imprimir_ticket_venta', args=[venta.id]))
+        assert response.status_code == 302
+
+
+@pytest.mark.django_db
+class TestOCRFacturas:
+    """Tests para el procesamiento OCR de facturas"""
+    
+    @pytest.fixture(autouse=True)
+    def directorios(self, settings, tmp_path):
+        settings.OCR_CACHE_DIR = tmp_path / 'ocr'
+        settings.MEDIA_ROOT = tmp_path / 'media'
+        return tmp_path
+    
+    @pytest.fixture
+    def tesseract(self, monkeypatch):
+        """Reemplaza Tesseract (no está instalado en CI) y cuenta las llamadas"""
+        from inventario import utils_ocr
+        llamadas = []
+        
+        def image_to_string(img, lang=None, config=None):
+            llamadas.append(img.mode)
+            return '12345 Cerveza Lager 350cc 12.990'
+        monkeypatch.setattr(utils_ocr.pytesseract, 'image_to_string', image_to_string)
+        return llamadas
+    
+    def _imagen(self, ruta, color):
+        from PIL import Image
+        Image.new('RGB', (200, 100), color).save(ruta)
+        return ruta
+    
+    def test_variante_por_heuristica(self, directorios):
+        """Test que se elige una sola variante según la saturación"""
+        from PIL import Image
+        from inventario.utils_ocr import elegir_variante
+        assert elegir_variante(Image.new('RGB', (50, 50), (240, 240, 240))) == 'gris'
+        assert elegir_variante(Image.new('RGB', (50, 50), (200, 30, 30))) == 'color'
+    
+    def test_ocr_se_cachea_por_contenido(self, directorios, tesseract):
+        """Test que el mismo contenido con otro nombre no repite el OCR"""
+        import shutil
+        from inventario.utils_ocr import extraer_texto_ocr
+        original = str(self._imagen(directorios / 'factura.png', 'white'))
+        copia = str(directorios / 'factura_copia.png')
+        shutil.copy(original, copia)
+        
+        assert extraer_texto_ocr(original) == extraer_texto_ocr(copia) == '12345 Cerveza Lager 350cc 12.990'
+        assert tesseract == ['L']
+    
+    def test_sin_broker_usa_el_worker_local(self, settings, monkeypatch):
+        """Test que sin broker el OCR va directo al worker local, sin esperar a Celery"""
+        import time
+        from inventario import tasks, utils_ocr
+        settings.CELERY_TASK_ALWAYS_EAGER = False
+        settings.CELERY_BROKER_URL = 'redis://127.0.0.1:9/1'
+        monkeypatch.setitem(tasks._sondeo_broker, 'fecha', None)
+        procesadas = []
+        monkeypatch.setattr(utils_ocr, '_procesar_factura_local', procesadas.append)
+        inicio = time.monotonic()
+        assert utils_ocr.encolar_ocr_factura(7) == 'local'
+        assert time.monotonic() - inicio < 1
+        utils_ocr._pool_local.submit(lambda: None).result(timeout=5)
+        assert procesadas == [7]
+    
+    def test_pool_de_paginas_reutilizado_sin_fork(self):
+        """Test que las páginas de los PDF usan un solo pool, arrancado sin fork"""
+        from inventario import utils_ocr
+        pool = utils_ocr._pool_procesos()
+        assert utils_ocr._pool_procesos() is pool
+        assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
+    
+    def test_subir_factura_no_bloquea_el_request(self, client, bossa_user, directorios, tesseract,
+                                                  monkeypatch, django_capture_on_commit_callbacks):
+        """Test que la subida encola el OCR y la re-subida usa el caché"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from inventario import views_facturas
+        from inventario.models import Factura
+        from inventario.utils_ocr import procesar_factura_ocr
+        encoladas = []
+        monkeypatch.setattr(views_facturas, 'encolar_ocr_factura', encoladas.append)
+        contenido = self._imagen(directorios / 'f.png', 'white').read_bytes()
+        client.force_login(bossa_user)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(reverse('subir_factura'), {
+                'archivo': SimpleUploadedFile('f.png', contenido, content_type='image/png'),
+            })
+        assert response.status_code == 302
+        factura = Factura.objects.get()
+        assert encoladas == [factura.id]
+        assert tesseract == []
+        
+        # El worker procesa la factura
+        assert procesar_factura_ocr(factura) == 1
+        assert factura.items.get().precio_unitario == 12990
+        
+        # Re-subir el mismo archivo no encola nada ni vuelve a llamar a Tesseract
+        response = client.post(reverse('subir_factura'), {
+            'archivo': SimpleUploadedFile('f_otra_vez.png', contenido, content_type='image/png'),
+        })
+        assert response.status_code == 302
+        assert len(encoladas) == 1
+        assert len(tesseract) == 1
+        assert Factura.objects.latest('id').items.count() == 1
+
+
+@pytest.mark.django_db
+class TestCoincidenciaFacturas:
+    """Tests para la extracción de líneas y la coincidencia con productos"""
+    
+    @pytest.fixture
+    def catalogo(self, categoria):
+        from inventario.models import Producto
+        return {
+            nombre: Producto.objects.create(nombre=nombre, sku=sku, precio=1000, stock=5, categoria=categoria)
+            for nombre, sku in [
+                ('Cerveza Lager 350 cc', 'CER-350'),
+                ('Cerveza Stout 500cc', 'CER-500'),
+                ('Pisco Especial 35° 750ml', 'PIS-750'),
+                ('Agua Mineral Sin Gas 1.5L', 'AGU-150'),
+            ]
+        }
+    
+    def test_extrae_cantidad_precio_y_total(self):
+        """Test que se separan código, descripción, cantidad, precio y total"""
+        from inventario.utils_ocr import extraer_lineas_factura
+        texto = """FACTURA ELECTRONICA N° 1234
+        CER-350 Cerveza Lager 350cc 24 890 21.360
+        Pisco Especial 35° 750ml 6 5.990
+        12345 Agua Mineral 1.290
+        TOTAL 28.640
+        IVA 19% 4.573"""
+        lineas = extraer_lineas_factura(texto)
+        
+        assert [(l.codigo, l.descripcion, l.cantidad, l.precio_unitario, l.total) for l in lineas] == [
+            ('CER-350', 'Cerveza Lager 350cc', 24, 890, 21360),
+            ('', 'Pisco Especial 35° 750ml', 6, 5990, 35940),
+            ('12345', 'Agua Mineral', 1, 1290, 1290),
+        ]
+    
+    def test_coincidencia_por_sku_nombre_y_similitud(self, catalogo):
+        """Test que el índice resuelve por SKU, nombre normalizado y tokens"""
+        from inventario.utils_coincidencias import obtener_indice
+        indice = obtener_indice()
+        
+        por_sku = indice.buscar('cer350', 'cualquier texto')[0]
+        assert (por_sku.producto_id, por_sku.confianza) == (catalogo['Cerveza Lager 350 cc'].id, 100)
+        
+        por_nombre = indice.buscar('', 'CERVEZA LAGER 350CC')[0]
+        assert por_nombre.producto_id == catalogo['Cerveza Lager 350 cc'].id
+        assert por_nombre.criterio == 'nombre'
+        
+        parecido = indice.buscar('', 'Pisco Especial 750ml')[0]
+        assert parecido.producto_id == catalogo['Pisco Especial 35° 750ml'].id
+        assert 60 <= parecido.confianza < 95
+        
+        assert indice.buscar('', 'Detergente') == []
+    
+    def test_factura_asigna_productos_seguros(self, catalogo, settings, tmp_path, monkeypatch):
+        """Test que el OCR asigna sólo las coincidencias de alta confianza"""
+        from django.core.files.base import ContentFile
+        from inventario import utils_ocr
+        from inventario.models import Factura
+        settings.MEDIA_ROOT = tmp_path
+        monkeypatch.setattr(utils_ocr, 'extraer_texto_ocr', lambda ruta: (
+            "CER-500 Cerveza Negra 12 1.200 14.400\n"
+            "Agua Mineral Gas 6 700 4.200\n"
+        ))
+        factura = Factura.objects.create(archivo=ContentFile(b'x', name='f.png'))
+        
+        assert utils_ocr.procesar_factura_ocr(factura) == 2
+        stout, agua = factura.items.order_by('id')
+        assert (stout.producto_id, stout.producto_coincidencia, stout.confianza_coincidencia) == (
+            catalogo['Cerveza Stout 500cc'].id, True, 100)
+        assert stout.codigo == 'CER-500' and stout.subtotal == 14400
+        assert agua.producto_id is None and not agua.producto_coincidencia
+    
+    def test_linea_con_importes_fuera_de_rango_se_descarta(self, settings, tmp_path, monkeypatch):
+        """Test que un número inflado por el OCR no impide guardar los demás items"""
+        from django.core.files.base import ContentFile
+        from inventario import utils_ocr
+        from inventario.models import Factura
+        settings.MEDIA_ROOT = tmp_path
+        texto = (
+            "Producto raro 999 76.123.456\n"
+            "CER-500 Cerveza Negra 12 1.200 14.400\n"
+            "ABC-1 Otro raro 1 1 99.999.999.999\n"
+        )
+        assert [l.descripcion for l in utils_ocr.extraer_lineas_factura(texto)] == ['Cerveza Negra']
+        
+        monkeypatch.setattr(utils_ocr, 'extraer_texto_ocr', lambda ruta: texto)
+        factura = Factura.objects.create(archivo=ContentFile(b'x', name='f.png'))
+        assert utils_ocr.procesar_factura_ocr(factura) == 1
+        assert factura.items.get().subtotal == 14400
+    
+    def test_coincidencia_escala_con_el_catalogo(self, categoria, django_assert_max_num_queries):
+        """Test que 60 líneas contra 3.000 productos se resuelven con el índice en memoria"""
+        import time
+        from inventario.models import Producto
+        from inventario.utils_coincidencias import obtener_indice
+        from inventario.utils_ocr import LineaFactura
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i} Marca{i % 40} {i % 7 * 250}cc', sku=f'SKU-{i:05d}',
+                     precio=1000, stock=1, categoria=categoria)
+            for i in range(3000)
+        ])
+        lineas = [LineaFactura('', f'Producto {i * 37} Marca{i * 37 % 40} {i * 37 % 7 * 250} cc', 1, 1000, 1000)
+                  for i in range(60)]
+        
+        inicio = time.perf_counter()
+        with django_assert_max_num_queries(2):
+            resultados = obtener_indice().emparejar(lineas, limite=1)
+        assert time.perf_counter() - inicio < 5
+        assert all(r and r[0].criterio == 'nombre' for r in resultados)
 
 
 @pytest.mark.django_db
@@ -175,3 +764,1035 @@ class TestLogsAuditoria:
         # Debería redirigir o mostrar error
         assert response.status_code in [302, 403]
 
+
+
+class TestTraducciones:
+    """Tests para el context processor y el tag de traducciones"""
+    
+    def test_context_processor_es_perezoso(self, rf, monkeypatch):
+        """Test que el idioma se resuelve sólo si se usa, y una vez por request"""
+        from inventario import translations as modulo
+        from inventario.context_processors import translations
+        llamadas = []
+        original = modulo.resolver_idioma
+        monkeypatch.setattr(modulo, 'resolver_idioma', lambda codigo: llamadas.append(codigo) or original(codigo))
+        request = rf.get('/')
+        request.session = {'language': 'en-US'}
+        
+        contexto = translations(request)
+        assert llamadas == []
+        assert contexto['t']['Ventas'] == 'Sales'
+        assert contexto['translate']('Volver') == 'Back'
+        assert contexto['current_language'] == 'en'
+        assert llamadas == ['en-US']
+        
+        with pytest.raises(TypeError):
+            contexto['t']['Ventas'] = 'otra cosa'
+    
+    def test_tag_trans_usa_el_idioma_de_la_request(self, rf):
+        """Test que {% trans %} traduce literales y variables según la request"""
+        from django.template import engines
+        plantilla = engines['django'].from_string(
+            '{% load translate_tags %}{% trans "Ventas" %}|{% trans nombre %}|{% trans "Ventas" as v %}{{ v }}|{% trans "<b>" %}'
+        )
+        request = rf.get('/')
+        request.COOKIES['django_language'] = 'pt'
+        assert plantilla.render({'nombre': 'Volver'}, request=request) == 'Vendas|Voltar|Vendas|<b>'
+        
+        request = rf.get('/')
+        request.COOKIES['django_language'] = 'xx'
+        assert plantilla.render({'nombre': 'Volver'}, request=request) == 'Ventas|Volver|Ventas|<b>'
+
+
+@pytest.mark.django_db
+class TestRoles:
+    """Tests para los roles memorizados por request"""
+    
+    def test_roles_se_consultan_una_vez(self, normal_user, django_assert_num_queries):
+        """Test que varias verificaciones de rol hacen una sola consulta de grupos"""
+        from django.contrib.auth.models import Group
+        from inventario.models import Producto
+        from inventario.utils import es_admin_bossa, es_vendedor, es_almacenero, tiene_permiso
+        normal_user.groups.add(Group.objects.create(name='Vendedor'))
+        
+        with django_assert_num_queries(1):
+            assert not es_admin_bossa(normal_user)
+            assert es_vendedor(normal_user)
+            assert not es_almacenero(normal_user)
+            assert not es_admin_bossa(normal_user)
+        with django_assert_num_queries(2):
+            assert not tiene_permiso(normal_user, 'add_producto', Producto)
+            assert not tiene_permiso(normal_user, 'inventario.change_producto')
+    
+    def test_cambiar_grupos_invalida_los_roles(self, normal_user):
+        """Test que agregar al usuario a Administrador se refleja de inmediato"""
+        from django.contrib.auth.models import Group
+        from inventario.utils import es_admin_bossa
+        assert not es_admin_bossa(normal_user)
+        normal_user.groups.add(Group.objects.create(name='Administrador'))
+        assert es_admin_bossa(normal_user)
+    
+    def test_cambiar_grupos_desde_el_grupo_invalida_los_roles(self, normal_user):
+        """Test que group.user_set.add/remove/clear también invalida los roles memorizados"""
+        from django.contrib.auth.models import Group
+        from inventario.utils import es_admin_bossa
+        grupo = Group.objects.create(name='Administrador')
+        assert not es_admin_bossa(normal_user)
+        grupo.user_set.add(normal_user.pk)
+        assert es_admin_bossa(normal_user)
+        grupo.user_set.remove(normal_user)
+        assert not es_admin_bossa(normal_user)
+        grupo.user_set.add(normal_user)
+        assert es_admin_bossa(normal_user)
+        grupo.user_set.clear()
+        assert not es_admin_bossa(normal_user)
+    
+    def test_middleware_expone_request_roles(self, rf, bossa_user, django_assert_num_queries):
+        """Test que request.roles es perezoso y se comparte con las utilidades"""
+        from inventario.middleware import RolesMiddleware
+        from inventario.utils import es_admin_bossa
+        request = rf.get('/')
+        request.user = bossa_user
+        
+        with django_assert_num_queries(0):
+            RolesMiddleware(lambda r: None)(request)
+        with django_assert_num_queries(1):
+            assert request.roles.es_admin
+            assert es_admin_bossa(request.user)
+
+
+@pytest.mark.django_db
+class TestPaginacionKeyset:
+    """Tests para la paginación por cursor de los historiales"""
+    
+    @pytest.fixture
+    def movimientos(self, producto, bossa_user):
+        from django.utils import timezone
+        from inventario.models import MovimientoStock
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(producto=producto, tipo='entrada', cantidad=1, motivo='compra',
+                            stock_anterior=i, stock_nuevo=i + 1, usuario=bossa_user)
+            for i in range(7)
+        ])
+        # Varias filas con la misma fecha: el id desempata
+        ahora = timezone.now()
+        ids = list(MovimientoStock.objects.order_by('id').values_list('id', flat=True))
+        MovimientoStock.objects.filter(id__in=ids[:4]).update(fecha=ahora)
+        MovimientoStock.objects.filter(id__in=ids[4:]).update(fecha=ahora + timezone.timedelta(minutes=1))
+        return list(MovimientoStock.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+    
+    def test_recorre_todas_las_paginas_sin_repetir(self, rf, movimientos, django_assert_num_queries):
+        """Test que avanzar y retroceder visita cada fila una vez y en orden"""
+        from inventario.models import MovimientoStock
+        from inventario.utils_paginacion import paginar_keyset
+        
+        vistos, paginas, url = [], [], '/'
+        while url:
+            with django_assert_num_queries(1):
+                pagina = paginar_keyset(MovimientoStock.objects.all(), rf.get(url), por_pagina=3)
+            paginas.append(pagina)
+            vistos += [m.id for m in pagina]
+            url = '/' + pagina.url_siguiente if pagina.has_next else None
+        assert vistos == movimientos
+        assert [len(p) for p in paginas] == [3, 3, 1]
+        assert not paginas[0].has_previous
+        
+        atras = paginar_keyset(MovimientoStock.objects.all(), rf.get('/' + paginas[2].url_anterior), por_pagina=3)
+        assert [m.id for m in atras] == movimientos[3:6]
+        assert atras.has_previous and atras.has_next
+    
+    def test_vista_y_api_usan_cursor(self, client, bossa_user, movimientos):
+        """Test que la vista conserva los filtros y la API responde con next/previous"""
+        client.force_login(bossa_user)
+        
+        response = client.get(reverse('listar_movimientos') + '?tipo=entrada')
+        assert response.status_code == 200
+        assert response.context['movimientos'].es_keyset
+        assert str(response.context['movimientos'].conteo) == '7'
+        
+        response = client.get('/api/v1/movimientos-stock/?page_size=5&contar=1')
+        datos = response.json()
+        assert [m['id'] for m in datos['results']] == movimientos[:5]
+        assert datos['count_estimado'] == 7 and datos['count_tipo'] == 'exacto'
+        assert datos['previous'] is None
+        siguiente = client.get(datos['next']).json()
+        assert [m['id'] for m in siguiente['results']] == movimientos[5:]
+        
+        # Clientes antiguos con ?page=N siguen recibiendo la paginación numerada
+        assert client.get('/api/v1/movimientos-stock/?page=1').json()['count'] == 7
+        
+        # Con otro orden que el del cursor, también numerada (y respetando el orden)
+        datos = client.get('/api/v1/movimientos-stock/?ordering=fecha').json()
+        assert datos['count'] == 7
+        assert [m['id'] for m in datos['results']][0] in movimientos[3:]
+
+
+@pytest.mark.django_db
+class TestPlanIndices:
+    """Tests que las consultas de los reportes usan los índices de la migración 0021"""
+    
+    @pytest.fixture
+    def explicar(self):
+        from django.db import connection
+        if connection.vendor == 'postgresql':
+            # Con tablas vacías el planificador prefiere recorrerlas enteras
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return lambda queryset: queryset.explain()
+    
+    @pytest.fixture
+    def periodo(self):
+        from django.utils import timezone
+        from inventario.utils import rango_fechas
+        hasta = timezone.localdate()
+        return lambda campo: rango_fechas(campo, hasta - timezone.timedelta(days=30), hasta)
+    
+    def test_reportes_de_ventas(self, explicar, periodo):
+        """Test que las ventas vigentes del período usan el índice parcial"""
+        ventas = Venta.objects.filter(periodo('fecha'), cancelada=False)
+        assert 'venta_vigente_fecha_idx' in explicar(ventas)
+        
+        mas_vendidos = ItemVenta.objects.filter(
+            periodo('venta__fecha'), venta__cancelada=False
+        ).values('producto_id')
+        plan = explicar(mas_vendidos)
+        assert 'venta_vigente_fecha_idx' in plan
+        assert 'itemventa_venta_prod_idx' in plan
+    
+    def test_movimientos_e_historial(self, explicar, periodo, producto):
+        """Test que movimientos por producto/tipo e historial reciente usan sus índices"""
+        from inventario.models import HistorialCambio, MovimientoStock
+        
+        movimientos = MovimientoStock.objects.filter(periodo('fecha'), producto=producto, tipo='entrada')
+        assert 'movstock_prod_tipo_fecha_idx' in explicar(movimientos)
+        assert 'histcambio_fecha_idx' in explicar(HistorialCambio.objects.all()[:20])
+        assert 'histcambio_prod_fecha_idx' in explicar(HistorialCambio.objects.filter(producto=producto)[:20])
+    
+    def test_rango_fechas_incluye_dias_completos(self, producto, bossa_user):
+        """Test que rango_fechas equivale a fecha__date entre desde y hasta"""
+        from django.utils import timezone
+        from inventario.models import MovimientoStock
+        from inventario.utils import rango_fechas
+        
+        hoy = timezone.localdate()
+        movimiento = MovimientoStock.objects.create(
+            producto=producto, tipo='entrada', cantidad=1, motivo='compra',
+            stock_anterior=0, stock_nuevo=1, usuario=bossa_user,
+        )
+        MovimientoStock.objects.filter(pk=movimiento.pk).update(
+            fecha=timezone.make_aware(timezone.datetime.combine(hoy, timezone.datetime.max.time()))
+        )
+        assert MovimientoStock.objects.filter(rango_fechas('fecha', hoy, hoy)).count() == 1
+        assert MovimientoStock.objects.filter(rango_fechas('fecha', hasta=hoy.isoformat())).count() == 1
+        assert not MovimientoStock.objects.filter(rango_fechas('fecha', hoy + timezone.timedelta(days=1))).exists()
+        assert MovimientoStock.objects.filter(rango_fechas('fecha', 'no-es-fecha')).count() == 1
+
+
+@pytest.mark.django_db
+class TestRendimientoVistas:
+    """Tests para la instrumentación de rendimiento por vista"""
+    
+    @pytest.fixture(autouse=True)
+    def buffer_vacio(self):
+        from inventario.utils_rendimiento import buffer_muestras
+        buffer_muestras.tomar()
+        yield
+        buffer_muestras.tomar()
+    
+    def test_middleware_mide_consultas_repetidas(self, client, bossa_user, producto):
+        """Test que cada request deja una muestra con consultas y repetidas"""
+        from inventario.utils_rendimiento import buffer_muestras
+        client.force_login(bossa_user)
+        
+        client.get(reverse('listar_logs'))
+        muestras = buffer_muestras.tomar()
+        assert [m.vista for m in muestras] == ['listar_logs']
+        assert muestras[0].consultas > 0 and muestras[0].db_ms > 0
+        
+        from django.db import connection
+        from inventario.utils_rendimiento import ContadorConsultas
+        contador = ContadorConsultas()
+        with connection.execute_wrapper(contador):
+            for _ in range(3):
+                Producto.objects.filter(pk=producto.pk).first()
+        assert contador.consultas == 3 and contador.duplicadas == 2
+        assert 'inventario_producto' in contador.sql_mas_repetida
+    
+    def test_volcado_y_resumen(self, client, bossa_user):
+        """Test que el buffer se agrega por vista y el resumen calcula percentiles"""
+        from inventario.models import MetricaVista
+        from inventario.utils_rendimiento import (
+            Muestra, buffer_muestras, peores_n_mas_1, resumen_rendimiento, volcar_muestras
+        )
+        for duracion in range(1, 101):
+            buffer_muestras.agregar(Muestra('listar_ventas', duracion, 1.0, 12, 10, 'SELECT ... item'))
+        buffer_muestras.agregar(Muestra('inicio', 5, 1.0, 2, 0))
+        
+        assert volcar_muestras() == 101
+        assert MetricaVista.objects.count() == 2
+        resumen = resumen_rendimiento()
+        assert resumen[0]['vista'] == 'listar_ventas'
+        assert resumen[0]['p50_ms'] == 50.5 and resumen[0]['p95_ms'] == 95.0
+        assert [v['vista'] for v in peores_n_mas_1(resumen)] == ['listar_ventas']
+        
+        client.force_login(bossa_user)
+        response = client.get(reverse('rendimiento_vistas'))
+        assert response.status_code == 200
+        assert b'SELECT ... item' in response.content
+    
+    def test_poda_de_metricas_viejas(self):
+        """Test que la poda borra sólo las métricas fuera de la retención"""
+        from django.utils import timezone
+        from inventario.models import MetricaVista
+        from inventario.utils_rendimiento import podar_metricas
+        ahora = timezone.now()
+        MetricaVista.objects.create(vista='vieja', periodo=ahora - timezone.timedelta(days=30))
+        MetricaVista.objects.create(vista='reciente', periodo=ahora - timezone.timedelta(days=1))
+        assert podar_metricas(dias=14) == 1
+        assert list(MetricaVista.objects.values_list('vista', flat=True)) == ['reciente']
+
+
+class TestLoggingEstructurado:
+    """Tests para el formato JSON, los spans y la escritura en cola"""
+    
+    def test_json_conserva_extra_y_correlacion(self):
+        """Test que el formato JSON incluye los campos de extra y el id de la request"""
+        import json
+        import logging
+        from inventario.utils_logging import FormatoJSON, iniciar_correlacion, terminar_correlacion
+        
+        record = logging.makeLogRecord({'msg': 'Venta #%s registrada', 'args': (7,), 'levelname': 'INFO',
+                                        'venta_id': 7, 'total': 1500.0})
+        token = iniciar_correlacion('abc123')
+        try:
+            datos = json.loads(FormatoJSON().format(record))
+        finally:
+            terminar_correlacion(token)
+        assert datos['mensaje'] == 'Venta #7 registrada'
+        assert datos['venta_id'] == 7 and datos['total'] == 1500.0
+        assert datos['correlacion'] == 'abc123'
+    
+    def test_span_anidado_y_decorador(self, caplog):
+        """Test que los spans registran ruta, duración y error"""
+        from inventario.utils_logging import span
+        
+        @span('render_pdf')
+        def renderizar():
+            return 'ok'
+        
+        with caplog.at_level('INFO', logger='inventario.spans'):
+            with span('registrar_venta'):
+                with span('bloqueo_stock', productos=2):
+                    pass
+                assert renderizar() == 'ok'
+            with pytest.raises(ValueError):
+                with span('descontar_stock'):
+                    raise ValueError('sin stock')
+        
+        registros = {r.span: r for r in caplog.records}
+        assert list(registros) == ['registrar_venta/bloqueo_stock', 'registrar_venta/render_pdf',
+                                   'registrar_venta', 'descontar_stock']
+        assert registros['registrar_venta/bloqueo_stock'].productos == 2
+        assert registros['registrar_venta'].duracion_ms >= 0
+        assert registros['descontar_stock'].error == 'ValueError'
+    
+    def test_archivo_en_cola(self, tmp_path):
+        """Test que el handler en cola escribe las líneas JSON desde su hilo"""
+        import json
+        import logging
+        from inventario.utils_logging import ArchivoEnCola, FormatoJSON
+        
+        handler = ArchivoEnCola(str(tmp_path / 'app.jsonl'))
+        handler.setFormatter(FormatoJSON())
+        log = logging.getLogger('tests.cola')
+        log.addHandler(handler)
+        try:
+            try:
+                raise RuntimeError('falla')
+            except RuntimeError:
+                log.error('Error %s', 'procesando', exc_info=True, extra={'factura_id': 3})
+        finally:
+            log.removeHandler(handler)
+            handler.close()
+        
+        datos = json.loads((tmp_path / 'app.jsonl').read_text(encoding='utf-8'))
+        assert datos['mensaje'] == 'Error procesando' and datos['factura_id'] == 3
+        assert 'RuntimeError: falla' in datos['excepcion']
+    
+    @pytest.mark.django_db
+    def test_middleware_devuelve_request_id(self, client):
+        """Test que la respuesta trae el id de correlación (el recibido si es válido)"""
+        response = client.get(reverse('login'))
+        assert len(response['X-Request-ID']) == 16
+        response = client.get(reverse('login'), HTTP_X_REQUEST_ID='proxy-42')
+        assert response['X-Request-ID'] == 'proxy-42'
+        response = client.get(reverse('login'), HTTP_X_REQUEST_ID='no válido!')
+        assert response['X-Request-ID'] != 'no válido!'
+
+
+@pytest.mark.django_db
+class TestPerfilado:
+    """Tests para el perfilado opt-in de requests"""
+    
+    @pytest.fixture(autouse=True)
+    def perfilado(self, settings, tmp_path):
+        from django.core.cache import cache
+        from inventario import utils_perfilado
+        settings.PERFILADO_DIR = tmp_path
+        cache.delete(utils_perfilado.CLAVE_CONFIG)
+        utils_perfilado._config_local['valor'] = None
+        yield
+        cache.delete(utils_perfilado.CLAVE_CONFIG)
+        utils_perfilado._config_local['valor'] = None
+    
+    def test_muestreador_genera_pilas_collapsed(self):
+        """Test que el muestreador registra la función que está corriendo"""
+        import time
+        from inventario.utils_perfilado import MuestreadorPila
+        
+        def calculo_lento():
+            fin = time.perf_counter() + 0.05
+            while time.perf_counter() < fin:
+                pass
+        
+        muestreador = MuestreadorPila(intervalo=0.001)
+        muestreador.iniciar()
+        calculo_lento()
+        muestreador.detener()
+        lineas = muestreador.collapsed().splitlines()
+        assert muestreador.muestras > 0
+        assert any('calculo_lento (tests/test_views_extended.py' in linea for linea in lineas)
+        assert all(linea.rsplit(' ', 1)[1].isdigit() for linea in lineas)
+    
+    def test_cabecera_solo_para_admin(self, client, bossa_user, normal_user):
+        """Test que X-Perfilar guarda un perfil descargable sólo para administradores"""
+        from inventario.models import PerfilRequest
+        
+        client.force_login(normal_user)
+        assert 'X-Perfil-ID' not in client.get(reverse('inicio'), HTTP_X_PERFILAR='1')
+        
+        client.force_login(bossa_user)
+        response = client.get(reverse('listar_logs'), HTTP_X_PERFILAR='1')
+        perfil = PerfilRequest.objects.get(id=response['X-Perfil-ID'])
+        assert perfil.vista == 'listar_logs' and perfil.motivo == 'cabecera'
+        
+        descarga = client.get(reverse('descargar_perfil', args=[perfil.id]))
+        assert descarga.status_code == 200
+        assert descarga['Content-Disposition'].endswith('.folded"')
+    
+    def test_cabecera_con_token(self, rf, settings):
+        """Test que el token de PERFILADO_TOKEN habilita el perfilado sin ser admin"""
+        from inventario.utils_perfilado import motivo_perfilado
+        settings.PERFILADO_TOKEN = 'secreto'
+        config = {'usuarios': [], 'muestreo': 0}
+        assert motivo_perfilado(rf.get('/', HTTP_X_PERFILAR='secreto'), config) == 'cabecera'
+        assert motivo_perfilado(rf.get('/', HTTP_X_PERFILAR='secret0'), config) is None
+        assert motivo_perfilado(rf.get('/', HTTP_X_PERFILAR='señal'), config) is None
+    
+    def test_usuario_configurado_y_umbral(self, client, bossa_user):
+        """Test que la configuración guardada desde la página aplica el umbral"""
+        from inventario.models import PerfilRequest
+        client.force_login(bossa_user)
+        
+        client.post(reverse('listar_perfiles'), {'usuarios': bossa_user.username, 'muestreo': '0',
+                                                 'umbral_ms': '600000', 'modo': 'cprofile'})
+        client.get(reverse('listar_logs'))
+        assert not PerfilRequest.objects.exists()
+        
+        client.post(reverse('listar_perfiles'), {'usuarios': bossa_user.username, 'muestreo': '0',
+                                                 'umbral_ms': '0', 'modo': 'cprofile'})
+        response = client.get(reverse('listar_logs'))
+        perfil = PerfilRequest.objects.get(id=response['X-Perfil-ID'])
+        assert perfil.motivo == 'usuario' and perfil.modo == 'cprofile'
+        assert client.get(reverse('listar_perfiles')).status_code == 200
+
+
+class TestCacheDosNiveles:
+    """Tests para el backend de caché L1 (proceso) + L2 (compartido)"""
+    
+    @pytest.fixture
+    def crear(self, settings):
+        settings.CACHES = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'l2': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'l2-tests'},
+        }
+        import os
+        from django.core.cache import caches
+        from inventario.cache_dos_niveles import CacheDosNiveles
+        caches['l2'].clear()
+        
+        class CanalFalso:
+            """Reparte lo publicado a todos los procesos simulados, como Redis pub/sub"""
+            procesos = []
+            
+            def publish(self, canal, mensaje):
+                for proceso in self.procesos:
+                    proceso._recibir(mensaje)
+        
+        canal = CanalFalso()
+        
+        def crear_proceso(**opciones):
+            backend = CacheDosNiveles('redis://falso', {'OPTIONS': dict({'L2': 'l2', 'ESPERA_REINTENTO': 60}, **opciones)})
+            backend._pid = os.getpid()  # sin hilo de suscripción
+            backend._redis = canal
+            canal.procesos.append(backend)
+            return backend
+        return crear_proceso
+    
+    def test_l1_coherente_entre_procesos(self, crear):
+        """Test que una escritura en un proceso invalida el L1 del otro"""
+        a, b = crear(), crear()
+        a.set('categorias', ['Bebidas'])
+        assert b.get('categorias') == ['Bebidas']
+        assert len(b.l1) == 1  # la próxima lectura no sale del proceso
+        
+        a.set('categorias', ['Bebidas', 'Snacks'])
+        assert b.get('categorias') == ['Bebidas', 'Snacks']
+        a.delete('categorias')
+        assert b.get('categorias') is None
+    
+    def test_l1_entrega_copias(self, crear):
+        """Test que modificar lo leído de L1 no altera lo que reciben los demás llamadores"""
+        a = crear()
+        a.set('categorias', ['Bebidas'])
+        a.get('categorias').append('Snacks')
+        assert a.get('categorias') == ['Bebidas']
+        
+        original = {'tramos': [1, 2]}
+        a.set('resumen', original)
+        original['tramos'].append(3)
+        assert a.get('resumen') == {'tramos': [1, 2]}
+    
+    def test_interruptor_sirve_desde_l1(self, crear, monkeypatch):
+        """Test que con Redis caído se deja de consultarlo y se usa L1"""
+        from inventario.cache_dos_niveles import CacheDosNiveles
+        backend = crear(UMBRAL_FALLOS=2)
+        backend.set('stats', {'total': 5})
+        
+        llamadas = []
+        
+        class RedisCaido:
+            def __getattr__(self, nombre):
+                def fallar(*args, **kwargs):
+                    llamadas.append(nombre)
+                    raise ConnectionError('Redis no responde')
+                return fallar
+        
+        monkeypatch.setattr(CacheDosNiveles, 'l2', property(lambda self: RedisCaido()))
+        assert backend.get('stats') == {'total': 5}
+        backend.get('otra')
+        backend.get('otra')
+        assert backend.interruptor.abierto
+        cantidad = len(llamadas)
+        backend.set('nueva', 1)
+        assert backend.get('nueva') == 1
+        assert len(llamadas) == cantidad
+    
+    def test_get_or_set_calcula_una_sola_vez(self, crear):
+        """Test que varios hilos con la clave vacía recalculan una sola vez"""
+        import threading
+        import time
+        backend = crear()
+        calculos = []
+        
+        def calcular():
+            calculos.append(1)
+            time.sleep(0.05)
+            return 42
+        
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(backend.get_or_set('lento', calcular)))
+                 for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        assert resultados == [42] * 8 and len(calculos) == 1
+        assert crear().get_or_set('lento', calcular) == 42 and len(calculos) == 1
+    
+    @pytest.mark.django_db
+    def test_espacio_versionado(self, producto):
+        """Test que guardar un producto invalida las claves del catálogo"""
+        from inventario.utils import clave_cache
+        clave = clave_cache('catalogo', 'stats_inicio')
+        assert clave_cache('catalogo', 'stats_inicio') == clave
+        producto.save()
+        assert clave_cache('catalogo', 'stats_inicio') != clave
+
+
+class TestCachedComputation:
+    """Tests para cached_computation (sin estampidas al vencer el caché)"""
+    
+    @pytest.fixture(autouse=True)
+    def limpiar_cache(self):
+        from django.core.cache import cache
+        cache.clear()
+        yield
+        cache.clear()
+    
+    def test_en_frio_calcula_una_sola_vez(self):
+        """Test que varios hilos con la clave vacía esperan un único cálculo"""
+        import threading
+        import time
+        from inventario.utils_cache import cached_computation
+        calculos = []
+        
+        def calcular():
+            calculos.append(1)
+            time.sleep(0.05)
+            return 42
+        
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(cached_computation('frio', calcular, 60)))
+                 for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        assert resultados == [42] * 8 and len(calculos) == 1
+    
+    def test_vencido_se_sirve_mientras_otro_recalcula(self):
+        """Test que sin el candado se devuelve el valor anterior en vez de recalcular"""
+        import time
+        from django.core.cache import cache
+        from inventario.utils_cache import Entrada, cached_computation, candado
+        cache.set('vencido', Entrada('anterior', time.time() - 1, 0.1), 60)
+        with candado('vencido', esperar=False) as obtenido:
+            assert obtenido
+            assert cached_computation('vencido', lambda: 'nuevo', 60) == 'anterior'
+        assert cached_computation('vencido', lambda: 'nuevo', 60) == 'nuevo'
+        assert cached_computation('vencido', lambda: 'otro', 60) == 'nuevo'
+    
+    def test_refresco_anticipado(self):
+        """Test que un cálculo caro cerca de vencer se renueva antes de tiempo"""
+        import time
+        from django.core.cache import cache
+        from inventario.utils_cache import Entrada, cached_computation
+        # Vence en 1 s pero calcularlo tarda 1000 s: se refresca casi seguro
+        cache.set('caro', Entrada('viejo', time.time() + 1, 1000), 60)
+        assert cached_computation('caro', lambda: 'nuevo', 60) == 'nuevo'
+        # Uno barato y lejos de vencer no se toca
+        cache.set('barato', Entrada('viejo', time.time() + 60, 0.001), 60)
+        assert cached_computation('barato', lambda: 'nuevo', 60) == 'viejo'
+    
+    @pytest.mark.django_db
+    def test_reportes_avanzados_cachea_agregados(self, client, admin_user):
+        """Test que la segunda carga de reportes no repite las consultas de agregados"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        client.force_login(admin_user)
+        url = reverse('reportes_avanzados')
+        with CaptureQueriesContext(connection) as primera:
+            assert client.get(url).status_code == 200
+        with CaptureQueriesContext(connection) as segunda:
+            assert client.get(url).status_code == 200
+        assert len(segunda) < len(primera)
+        
+        # Una venta nueva o cancelada invalida el resumen cacheado
+        venta = Venta.objects.create(usuario=admin_user, total=4500, numero_venta='V-REP-1')
+        assert client.get(url).context['cantidad_ventas'] == 1
+        venta.cancelada = True
+        venta.save()
+        assert client.get(url).context['cantidad_ventas'] == 0
+    
+    def test_candado_sin_cache_compartido(self):
+        """Test que con LocMemCache el candado no usa el caché (no cruza procesos) sino la base o el proceso"""
+        import threading
+        from django.core.cache import cache
+        from inventario.utils_cache import cache_compartido, candado
+        assert cache_compartido() is False
+        
+        otros = []
+        with candado('calculo', esperar=False) as obtenido:
+            assert obtenido
+            assert cache.get('calculo:candado') is None
+            hilo = threading.Thread(target=lambda: otros.append(candado('calculo', esperar=False).__enter__()))
+            hilo.start()
+            hilo.join()
+        assert otros == [False]
+        with candado('calculo', esperar=False) as obtenido:
+            assert obtenido
+    
+    @pytest.mark.django_db
+    def test_candado_advisory_en_postgresql(self, monkeypatch):
+        """Test que en PostgreSQL el candado es un advisory lock"""
+        from contextlib import contextmanager
+        from inventario import utils_cache
+        sentencias = []
+        
+        class Cursor:
+            def execute(self, sql, params):
+                sentencias.append((sql.split('(')[0], params[0]))
+            
+            def fetchone(self):
+                return (True,)
+        
+        @contextmanager
+        def cursor():
+            yield Cursor()
+        monkeypatch.setattr(utils_cache.connection, 'vendor', 'postgresql')
+        monkeypatch.setattr(utils_cache.connection, 'cursor', cursor)
+        with utils_cache.candado('calculo', esperar=True) as obtenido:
+            assert obtenido
+        identificador = utils_cache._id_advisory('calculo')
+        assert sentencias == [('SELECT pg_try_advisory_lock', identificador),
+                              ('SELECT pg_advisory_unlock', identificador)]
+
+
+@pytest.mark.django_db
+class TestCacheCatalogoInicio:
+    """Tests para los IDs filtrados y las tarjetas cacheadas de inicio"""
+    
+    @pytest.fixture(autouse=True)
+    def limpiar_cache(self):
+        from django.core.cache import cache
+        cache.clear()
+        yield
+        cache.clear()
+    
+    def test_filtros_equivalentes_comparten_clave(self, client, admin_user, producto):
+        """Test que espacios y precios inválidos no generan otra búsqueda"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        client.force_login(admin_user)
+        url = reverse('inicio')
+        client.get(url, {'q': 'Producto'})
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get(url, {'q': '  Producto ', 'precio_min': 'abc'})
+        assert 'Producto Test' in response.content.decode()
+        assert not any('LIKE' in c['sql'] for c in consultas.captured_queries)
+    
+    def test_edicion_se_ve_al_instante(self, client, admin_user, producto):
+        """Test que editar un producto cambia su tarjeta y los resultados filtrados"""
+        client.force_login(admin_user)
+        url = reverse('inicio')
+        assert 'Producto Test' in client.get(url).content.decode()
+        producto.nombre = 'Producto Renombrado'
+        producto.save()
+        contenido = client.get(url).content.decode()
+        assert 'Producto Renombrado' in contenido and 'Producto Test' not in contenido
+        producto.categoria.nombre = 'Categoria Renombrada'
+        producto.categoria.save()
+        assert 'Categoria Renombrada' in client.get(url).content.decode()
+    
+    def test_venta_invalida_listados(self, client, admin_user, producto, django_capture_on_commit_callbacks):
+        """Test que el UPDATE de stock de una venta deja obsoletos los IDs cacheados"""
+        from inventario.utils_ventas import registrar_venta
+        client.force_login(admin_user)
+        url = reverse('inicio')
+        assert 'Producto Test' not in client.get(url, {'stock_bajo': '1'}).content.decode()
+        with django_capture_on_commit_callbacks(execute=True):
+            registrar_venta(admin_user, [{'producto_id': producto.id, 'cantidad': 45, 'precio_unitario': 10000}],
+                            450000, 0, 450000)
+        assert 'Producto Test' in client.get(url, {'stock_bajo': '1'}).content.decode()
+
+
+
+@pytest.mark.django_db
+class TestGetCondicional:
+    """Tests para ETag / Last-Modified en las APIs de lectura"""
+    
+    @pytest.fixture(autouse=True)
+    def limpiar_cache(self, monkeypatch):
+        from django.core.cache import cache
+        from inventario import utils_condicional
+        # Las versiones se leen del caché: se simula uno compartido entre procesos
+        monkeypatch.setattr(utils_condicional, 'cache_compartido', lambda: True)
+        cache.clear()
+        yield
+        cache.clear()
+    
+    def test_sin_cache_compartido_no_hay_304(self, authenticated_api_client, producto, monkeypatch):
+        """Test que con un caché por proceso las respuestas van completas, sin validadores"""
+        from inventario import utils_condicional
+        monkeypatch.setattr(utils_condicional, 'cache_compartido', lambda: False)
+        response = authenticated_api_client.get('/api/v1/productos/', HTTP_IF_NONE_MATCH='"cualquiera"')
+        assert response.status_code == 200
+        assert not response.has_header('ETag') and not response.has_header('Last-Modified')
+        assert 'no-cache' in response['Cache-Control']
+    
+    def test_api_productos_304_hasta_que_cambia(self, authenticated_api_client, producto):
+        """Test que el listado responde 304 sin consultas y cambia de ETag al editar"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = '/api/v1/productos/'
+        response = authenticated_api_client.get(url)
+        etag = response['ETag']
+        assert response.status_code == 200 and response.has_header('Last-Modified')
+        with CaptureQueriesContext(connection) as consultas:
+            response = authenticated_api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304 and not response.content
+        assert not any('inventario_producto' in c['sql'] for c in consultas.captured_queries)
+        
+        producto.precio = 12000
+        producto.save()
+        response = authenticated_api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200 and response['ETag'] != etag
+    
+    def test_if_modified_since(self, authenticated_api_client, categoria):
+        """Test que If-Modified-Since con la fecha recibida responde 304"""
+        url = '/api/v1/categorias/'
+        response = authenticated_api_client.get(url)
+        ultima = response['Last-Modified']
+        assert authenticated_api_client.get(url, HTTP_IF_MODIFIED_SINCE=ultima).status_code == 304
+    
+    def test_notificaciones_por_usuario(self, client, admin_user, normal_user):
+        """Test que el ETag de notificaciones cambia sólo para el usuario notificado"""
+        from inventario.models import NotificacionUsuario
+        url = reverse('obtener_notificaciones_api')
+        client.force_login(admin_user)
+        etag_admin = client.get(url)['ETag']
+        client.force_login(normal_user)
+        etag_normal = client.get(url)['ETag']
+        assert etag_admin != etag_normal
+        
+        NotificacionUsuario.objects.create(usuario=admin_user, tipo='sistema', titulo='Aviso', mensaje='Hola')
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag_normal).status_code == 304
+        client.force_login(admin_user)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag_admin)
+        assert response.status_code == 200 and response.json()['total'] == 1
+        
+        client.post(reverse('marcar_todas_leidas'))
+        assert client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 200
+
+
+@pytest.mark.django_db
+class TestSincronizacionCatalogoPOS:
+    """Tests para la sincronización incremental del catálogo del POS"""
+    
+    @pytest.fixture(autouse=True)
+    def limpiar_cache(self):
+        from django.core.cache import cache
+        cache.clear()
+        yield
+        cache.clear()
+    
+    @pytest.fixture
+    def sincronizar(self, client, normal_user):
+        client.force_login(normal_user)
+        return lambda headers=None, **params: client.get(reverse('sincronizar_catalogo_pos'), params, headers=headers)
+    
+    def test_descarga_completa_paginada(self, sincronizar, categoria, monkeypatch):
+        """Test que el catálogo completo se pagina por id y trae el cursor inicial"""
+        from inventario import utils_sincronizacion
+        monkeypatch.setattr(utils_sincronizacion, 'LIMITE_PAGINA', 2)
+        for i in range(3):
+            ProductoFactory(categoria=categoria, activo=True, nombre=f'Prod {i}')
+        ProductoFactory(categoria=categoria, activo=False)
+        
+        primera = sincronizar(completo=1).json()
+        assert 'cursor' in primera
+        ids = [p['id'] for p in primera['productos']]
+        siguiente = primera['siguiente']
+        while siguiente:
+            pagina = sincronizar(completo=1, despues_de=siguiente).json()
+            ids += [p['id'] for p in pagina['productos']]
+            siguiente = pagina['siguiente']
+        assert sorted(ids) == sorted(Producto.objects.filter(activo=True).values_list('id', flat=True))
+    
+    def test_cambios_y_lapidas(self, sincronizar, producto, categoria, admin_user):
+        """Test que los cambios de precio, venta, desactivación y borrado llegan como delta"""
+        from inventario.utils_ventas import registrar_venta
+        cursor = sincronizar(completo=1).json()['cursor']
+        otro = ProductoFactory(categoria=categoria, activo=True)
+        
+        producto.precio_promo = 8000
+        producto.save()
+        registrar_venta(admin_user, [{'producto_id': producto.id, 'cantidad': 5, 'precio_unitario': 8000}],
+                        40000, 0, 40000)
+        otro_id = otro.id
+        otro.delete()
+        
+        delta = sincronizar(cursor=cursor).json()
+        assert delta['eliminados'] == [otro_id]
+        assert delta['productos'] == [{
+            'id': producto.id, 'nombre': producto.nombre, 'sku': producto.sku,
+            'precio': 10000.0, 'precio_promo': 8000.0, 'stock': 45,
+        }]
+        
+        producto.activo = False
+        producto.save()
+        assert producto.id in sincronizar(cursor=cursor).json()['eliminados']
+    
+    def test_sin_cambios_responde_304(self, sincronizar, producto):
+        """Test que el polling sin cambios responde 304"""
+        response = sincronizar(cursor=0)
+        assert response.status_code == 200 and 'no-cache' in response['Cache-Control']
+        assert sincronizar(cursor=0, headers={'If-None-Match': response['ETag']}).status_code == 304
+        producto.save()
+        assert sincronizar(cursor=0, headers={'If-None-Match': response['ETag']}).status_code == 200
+    
+    def test_304_no_depende_del_cache(self, sincronizar, producto):
+        """Test que una venta cambia el ETag aunque el worker no haya visto la invalidación del caché"""
+        from django.core.cache import cache
+        from inventario.utils_ventas import _descontar_stock
+        response = sincronizar(cursor=0)
+        version = cache.get('version:catalogo')
+        _descontar_stock({producto.id: 1})
+        cache.set('version:catalogo', version, None)  # otro worker, con su LocMemCache desactualizado
+        assert sincronizar(cursor=0, headers={'If-None-Match': response['ETag']}).status_code == 200
+    
+    def test_cursor_podado_pide_reiniciar(self, sincronizar, categoria):
+        """Test que un cursor anterior a lo conservado obliga a descargar todo"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from inventario.models import CambioCatalogo
+        from inventario.utils_sincronizacion import podar_cambios_catalogo
+        for _ in range(3):
+            ProductoFactory(categoria=categoria)
+        primero = CambioCatalogo.objects.order_by('id').first().id
+        CambioCatalogo.objects.update(fecha=timezone.now() - timedelta(days=30))
+        assert podar_cambios_catalogo() == 2
+        assert sincronizar(cursor=primero).json() == {'reiniciar': True}
+        assert 'reiniciar' not in sincronizar(cursor=CambioCatalogo.objects.get().id).json()
+
+
+@pytest.mark.django_db
+class TestVentasIdempotentes:
+    """Tests para las ventas con clave de idempotencia y la cola offline del POS"""
+    
+    @pytest.fixture(autouse=True)
+    def sin_tickets(self, monkeypatch):
+        from inventario import utils_ventas
+        monkeypatch.setattr(utils_ventas, 'encolar_tickets_venta', lambda venta_id: None)
+    
+    @staticmethod
+    def _venta(producto, cantidad, **extra):
+        import json
+        total = str(1000 * cantidad)
+        datos = {
+            'items': json.dumps([{'producto_id': producto.id, 'cantidad': cantidad, 'precio': '1000'}]),
+            'subtotal': total, 'descuento': '0', 'total': total,
+        }
+        datos.update(extra)
+        return datos
+    
+    def test_reintento_devuelve_la_misma_venta(self, client, normal_user):
+        """Test que reenviar con la misma clave no descuenta stock dos veces"""
+        producto = ProductoFactory(stock=10)
+        client.force_login(normal_user)
+        datos = self._venta(producto, 3, clave_idempotencia='venta-0001')
+        primera = client.post(reverse('procesar_venta'), datos).json()
+        segunda = client.post(reverse('procesar_venta'), datos).json()
+        assert primera['repetida'] is False and segunda['repetida'] is True
+        assert segunda['venta_id'] == primera['venta_id']
+        assert Venta.objects.filter(clave_idempotencia='venta-0001').count() == 1
+        producto.refresh_from_db()
+        assert producto.stock == 7
+    
+    def test_clave_de_otro_usuario(self, client, normal_user, admin_user):
+        """Test que la clave de otro vendedor no devuelve su venta"""
+        producto = ProductoFactory(stock=10)
+        client.force_login(admin_user)
+        client.post(reverse('procesar_venta'), self._venta(producto, 1, clave_idempotencia='venta-0002'))
+        client.force_login(normal_user)
+        response = client.post(reverse('procesar_venta'), self._venta(producto, 1, clave_idempotencia='venta-0002'))
+        assert response.status_code == 400
+        assert 'venta_id' not in response.json()
+    
+    def test_cola_offline_en_orden_con_conflictos(self, client, normal_user):
+        """Test que la cola se registra en orden y reporta la venta sin stock sin frenar las demás"""
+        import json
+        producto = ProductoFactory(stock=5, nombre='Ron Oscuro')
+        otro = ProductoFactory(stock=5)
+        client.force_login(normal_user)
+        client.post(reverse('procesar_venta'), self._venta(producto, 1, clave_idempotencia='venta-a'*2))
+        
+        def pendiente(clave, item, cantidad):
+            return {'clave': clave, 'items': [{'producto_id': item.id, 'cantidad': cantidad, 'precio': 1000}],
+                    'subtotal': 1000 * cantidad, 'descuento': 0, 'total': 1000 * cantidad,
+                    'metodo_pago': 'efectivo', 'fecha_offline': '2026-10-19T10:00:00Z'}
+        ventas = [
+            pendiente('venta-a' * 2, producto, 1),   # ya llegó antes de cortarse la conexión
+            pendiente('venta-b' * 2, producto, 3),
+            pendiente('venta-c' * 2, producto, 3),   # ya no alcanza el stock
+            pendiente('venta-d' * 2, otro, 2),
+            pendiente('corta', otro, 1),
+        ]
+        response = client.post(reverse('sincronizar_ventas_pos'), json.dumps({'ventas': ventas}),
+                               content_type='application/json')
+        resultados = response.json()['resultados']
+        assert [r['estado'] for r in resultados] == ['repetida', 'registrada', 'rechazada', 'registrada', 'rechazada']
+        assert resultados[2]['conflictos'] == [{
+            'producto_id': producto.id, 'nombre': 'Ron Oscuro', 'disponible': 1, 'solicitado': 3,
+        }]
+        producto.refresh_from_db()
+        otro.refresh_from_db()
+        assert (producto.stock, otro.stock) == (1, 3)
+        assert Venta.objects.get(clave_idempotencia='venta-b' * 2).fecha_offline is not None
+        
+        # Las rechazadas quedan guardadas para resolverlas (una sola vez aunque se reenvíen)
+        from inventario.models import VentaOfflineRechazada
+        client.post(reverse('sincronizar_ventas_pos'), json.dumps({'ventas': ventas[2:3]}),
+                    content_type='application/json')
+        rechazada = VentaOfflineRechazada.objects.get(clave='venta-c' * 2)
+        assert rechazada.usuario == normal_user and not rechazada.resuelta
+        assert rechazada.datos == ventas[2] and rechazada.conflictos[0]['solicitado'] == 3
+        assert VentaOfflineRechazada.objects.count() == 2
+    
+    def test_venta_danada_no_frena_la_cola(self, client, normal_user, monkeypatch):
+        """Test que una venta mal formada se rechaza sola y una falla pasajera se informa para reintentar"""
+        import json
+        from django.db import OperationalError
+        from inventario import views_pos
+        from inventario.models import VentaOfflineRechazada
+        producto = ProductoFactory(stock=10)
+        client.force_login(normal_user)
+        
+        def pendiente(clave, items):
+            return {'clave': clave, 'items': items, 'subtotal': 1000, 'descuento': 0, 'total': 1000}
+        item = {'producto_id': producto.id, 'cantidad': 1, 'precio': 1000}
+        ventas = [
+            pendiente('venta-e' * 2, [item]),
+            pendiente('venta-f' * 2, [{'producto_id': producto.id, 'cantidad': None, 'precio': 1000}]),
+            pendiente('venta-g' * 2, ['no-es-un-item']),
+            pendiente('venta-h' * 2, [item]),
+            pendiente('venta-i' * 2, [item]),
+        ]
+        registrar = views_pos.registrar_venta_idempotente
+        
+        def falla_en_h(clave, **kwargs):
+            if clave == 'venta-h' * 2:
+                raise OperationalError('database is locked')
+            if clave == 'venta-i' * 2:
+                raise RuntimeError('error inesperado')
+            return registrar(clave, **kwargs)
+        monkeypatch.setattr(views_pos, 'registrar_venta_idempotente', falla_en_h)
+        
+        response = client.post(reverse('sincronizar_ventas_pos'), json.dumps({'ventas': ventas}),
+                               content_type='application/json')
+        assert response.status_code == 200
+        estados = [r['estado'] for r in response.json()['resultados']]
+        assert estados == ['registrada', 'rechazada', 'rechazada', 'error', 'error']
+        assert VentaOfflineRechazada.objects.filter(clave__in=['venta-h' * 2, 'venta-i' * 2]).count() == 0
+        producto.refresh_from_db()
+        assert producto.stock == 9
+        
+        # En el reintento (la terminal las conservó) se registran
+        monkeypatch.setattr(views_pos, 'registrar_venta_idempotente', registrar)
+        response = client.post(reverse('sincronizar_ventas_pos'), json.dumps({'ventas': ventas[3:]}),
+                               content_type='application/json')
+        assert [r['estado'] for r in response.json()['resultados']] == ['registrada', 'registrada']
+        
+        # Si la rechazada no se puede guardar, tampoco se informa como rechazada
+        def falla_al_guardar(*args, **kwargs):
+            raise OperationalError('database is locked')
+        monkeypatch.setattr(VentaOfflineRechazada.objects, 'update_or_create', falla_al_guardar)
+        response = client.post(reverse('sincronizar_ventas_pos'), json.dumps({'ventas': ventas[1:2]}),
+                               content_type='application/json')
+        assert response.json()['resultados'][0]['estado'] == 'error'
+    
+    def test_item_sin_producto_se_rechaza(self, client, normal_user):
+        """Test que el POS y la cola offline no aceptan items sin producto"""
+        import json
+        client.force_login(normal_user)
+        items = [{'cantidad': 1, 'precio': 100}]
+        response = client.post(reverse('procesar_venta'), {
+            'items': json.dumps(items), 'subtotal': '100', 'descuento': '0', 'total': '100',
+        })
+        assert response.status_code == 400
+        response = client.post(reverse('sincronizar_ventas_pos'), json.dumps({'ventas': [
+            {'clave': 'venta-j' * 2, 'items': items, 'subtotal': 100, 'descuento': 0, 'total': 100},
+        ]}), content_type='application/json')
+        assert response.json()['resultados'][0]['estado'] == 'rechazada'
+        assert not Venta.objects.exists()